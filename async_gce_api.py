@@ -0,0 +1,459 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to provide asynchronous wrapper of Google Compute Engine API.
+
+AsyncGceApi has the same methods as GceApi, but each method returns
+ApiFuture immediately instead of blocking.  API requests are sent by a
+bounded pool of worker threads, each of which keeps its own persistent HTTP
+connection, so that thousands of requests can be issued concurrently without
+opening thousands of connections.
+
+The API is called through its REST interface, and the endpoint URL can be
+changed, so that the class can be tested against a local fake server.
+"""
+
+
+
+import json
+import logging
+import Queue
+import threading
+import time
+import urllib
+
+import apiclient
+import apiclient.errors
+import httplib2
+
+from gce_api import GceApi
+
+
+API_ROOT = 'https://www.googleapis.com/compute/'
+
+
+class ApiFuture(object):
+  """Result of asynchronous API call, which becomes available later."""
+
+  def __init__(self):
+    self._done = threading.Event()
+    self._result = None
+    self._exception = None
+    self._callbacks = []
+    self._lock = threading.Lock()
+
+  def _SetResult(self, result, exception=None):
+    with self._lock:
+      self._result = result
+      self._exception = exception
+      self._done.set()
+      callbacks, self._callbacks = self._callbacks, []
+    for callback in callbacks:
+      callback(self)
+
+  def Done(self):
+    """Returns True if the call has completed."""
+    return self._done.is_set()
+
+  def AddDoneCallback(self, callback):
+    """Adds function called with the future when the call completes."""
+    with self._lock:
+      if not self._done.is_set():
+        self._callbacks.append(callback)
+        return
+    callback(self)
+
+  def Result(self, timeout=None):
+    """Waits for and returns the result of the call.
+
+    Args:
+      timeout: Seconds to wait.  None to wait forever.
+    Returns:
+      Return value of the call.
+    Raises:
+      Exception raised by the call.  RuntimeError on timeout.
+    """
+    # Wait in short slices, so that KeyboardInterrupt is delivered.
+    deadline = None if timeout is None else time.time() + timeout
+    while not self._done.wait(1):
+      if deadline is not None and time.time() > deadline:
+        raise RuntimeError('API call timed out')
+    if self._exception:
+      raise self._exception
+    return self._result
+
+
+def WaitAll(futures, timeout=None):
+  """Waits for all futures and returns their results in the same order."""
+  return [f.Result(timeout) for f in futures]
+
+
+class AsyncGceApi(GceApi):
+  """Asynchronous Google Compute Engine API with bounded concurrency."""
+
+  def __init__(self, name, client_id, client_secret, project, zone,
+               rate_limiter=None, credentials=None, max_concurrency=20,
+               api_root=API_ROOT):
+    """Constructor.
+
+    Args:
+      name: Name of the user of the class.
+      client_id: Client ID of the user of the class.
+      client_secret: Client secret of the user of the class.
+      project: Project ID.
+      zone: Zone name, e.g. 'us-east-a'
+      rate_limiter: RateLimiter object to limit the rate of API calls.
+      credentials: Object with authorize() method to authorize HTTP
+          requests, such as gce_credentials.CachedCredentials.  None sends
+          requests without authorization, which is only useful against
+          fake server.
+      max_concurrency: Maximum number of API requests in flight.
+      api_root: Root URL of Compute Engine REST API.
+    """
+    super(AsyncGceApi, self).__init__(
+        name, client_id, client_secret, project, zone,
+        rate_limiter=rate_limiter, credentials=credentials)
+    self._api_root = api_root
+    self._queue = Queue.Queue()
+    self._workers = []
+    for i in xrange(max_concurrency):
+      worker = threading.Thread(target=self._Work,
+                                name='AsyncGceApi-%d' % i)
+      worker.daemon = True
+      worker.start()
+      self._workers.append(worker)
+
+  def Close(self):
+    """Stops worker threads after pending requests are processed."""
+    for _ in self._workers:
+      self._queue.put(None)
+    for worker in self._workers:
+      worker.join()
+
+  def _MakeHttp(self):
+    """Makes HTTP object authorized with current access token."""
+    http = httplib2.Http(timeout=60)
+    if self._credentials:
+      http = self._credentials.authorize(http)
+    return http
+
+  def _Work(self):
+    """Worker thread to send requests in the queue."""
+    http = self._MakeHttp()
+    while True:
+      item = self._queue.get()
+      if item is None:
+        return
+      future, method, path, query, body = item
+      try:
+        try:
+          result = self._Request(http, method, path, query, body)
+        except apiclient.errors.HttpError as e:
+          if not self._credentials or e.resp.status != 401:
+            raise
+          # Access token authorized at the start of the worker has expired.
+          # Authorize again with fresh token from the credentials, and retry
+          # once.
+          http = self._MakeHttp()
+          result = self._Request(http, method, path, query, body)
+      except Exception as e:  # pylint: disable=broad-except
+        future._SetResult(None, e)
+      else:
+        future._SetResult(result)
+
+  def _Request(self, http, method, path, query=None, body=None):
+    """Sends REST API request.
+
+    Args:
+      http: httplib2.Http object to send the request with.
+      method: HTTP method.
+      path: Path under zone of the project, e.g. 'instances/foo'.
+      query: Dictionary of query parameters.
+      body: Request body in dictionary.
+    Returns:
+      Response in dictionary.
+    Raises:
+      HttpError on API error.
+    """
+    if self._rate_limiter:
+      self._rate_limiter.Acquire()
+    url = '%s%s/projects/%s/zones/%s/%s' % (
+        self._api_root, self.COMPUTE_ENGINE_API_VERSION, self._project,
+        self._zone, path)
+    query = dict((k, v) for k, v in (query or {}).items() if v is not None)
+    if query:
+      url += '?' + urllib.urlencode(query)
+    headers = {}
+    if body is not None:
+      body = json.dumps(body)
+      headers['Content-Type'] = 'application/json'
+    response, content = http.request(url, method, body=body, headers=headers)
+    if response.status >= 300:
+      raise apiclient.errors.HttpError(response, content, uri=url)
+    return json.loads(content) if content else {}
+
+  def _Submit(self, method, path, query=None, body=None, transform=None):
+    """Queues API request.
+
+    Args:
+      method: HTTP method.
+      path: Path under zone of the project.
+      query: Dictionary of query parameters.
+      body: Request body in dictionary.
+      transform: Function to convert response, or exception, into result.
+          It's called with response and exception, one of which is None.
+    Returns:
+      ApiFuture of the result.
+    """
+    future = ApiFuture()
+    if transform:
+      raw = ApiFuture()
+
+      def Transform(done):
+        try:
+          future._SetResult(transform(done._result, done._exception))
+        except Exception as e:  # pylint: disable=broad-except
+          future._SetResult(None, e)
+
+      raw.AddDoneCallback(Transform)
+      self._queue.put((raw, method, path, query, body))
+    else:
+      self._queue.put((future, method, path, query, body))
+    return future
+
+  @staticmethod
+  def _Spawn(function, *args):
+    """Runs function in new thread, and returns ApiFuture of its result.
+
+    Used for compound operations that wait for other API calls.  Those don't
+    occupy API worker threads while waiting.
+    """
+    future = ApiFuture()
+
+    def Run():
+      try:
+        future._SetResult(function(*args))
+      except Exception as e:  # pylint: disable=broad-except
+        future._SetResult(None, e)
+
+    thread = threading.Thread(target=Run)
+    thread.daemon = True
+    thread.start()
+    return future
+
+  def _ResultOrNone(self, response, exception):
+    """Converts 'not found' error to None."""
+    if exception:
+      if (isinstance(exception, apiclient.errors.HttpError) and
+          self.IsNotFoundError(exception)):
+        return None
+      raise exception
+    return response
+
+  def _OperationResult(self, title):
+    """Returns function to convert operation response to boolean."""
+    def Transform(response, exception):
+      if exception:
+        raise exception
+      return self._ParseOperation(response, title)
+    return Transform
+
+  def _IterItems(self, path, filter_string, fields):
+    """Lists resources page by page through the request queue.
+
+    Args:
+      path: Path of the collection, e.g. 'instances'.
+      filter_string: Filtering condition, evaluated by the server.
+      fields: List of resource field names to return.  None for all.
+    Yields:
+      Resource in dictionary.
+    """
+    page_token = None
+    while True:
+      result = self._Submit('GET', path, query={
+          'filter': filter_string,
+          'fields': self._MakeFieldsParam(fields),
+          'maxResults': self.MAX_RESULTS_PER_PAGE,
+          'pageToken': page_token}).Result()
+      for item in result.get('items', []):
+        yield item
+      page_token = result.get('nextPageToken')
+      if not page_token:
+        return
+
+  def _ListAll(self, path, filter_string, fields):
+    return list(self._IterItems(path, filter_string, fields))
+
+  def GetInstance(self, instance_name):
+    """Gets instance information.  Future of None if not found."""
+    return self._Submit('GET', 'instances/%s' % instance_name,
+                        transform=self._ResultOrNone)
+
+  def GetInstances(self, instance_names):
+    """Gets information of many instances concurrently.
+
+    Args:
+      instance_names: List of instance names.
+    Returns:
+      List of ApiFuture, in the same order as instance_names.
+    """
+    return [self.GetInstance(name) for name in instance_names]
+
+  def IterInstances(self, filter_string=None, fields=None):
+    """Lists instances page by page.  Iterator of compute#instance."""
+    return self._IterItems('instances', filter_string, fields)
+
+  def ListInstances(self, filter_string=None, fields=None):
+    """Lists instances.  Future of list of compute#instance of all pages."""
+    return self._Spawn(self._ListAll, 'instances', filter_string, fields)
+
+  def CreateInstance(self, instance_name, machine_type, disk,
+                     startup_script='', service_accounts=None,
+                     metadata=None, labels=None):
+    """Creates instance.  Future of boolean to indicate success."""
+    body = self._MakeInstanceBody(
+        instance_name, machine_type, disk, startup_script, service_accounts,
+        metadata, labels)
+    return self._Submit(
+        'POST', 'instances', body=body,
+        transform=self._OperationResult(
+            'Instance creation: %s' % instance_name))
+
+  def DeleteInstance(self, instance_name):
+    """Deletes instance.  Future of boolean to indicate success."""
+    return self._Submit(
+        'DELETE', 'instances/%s' % instance_name,
+        transform=self._OperationResult(
+            'Instance deletion: %s' % instance_name))
+
+  def GetDisk(self, disk_name):
+    """Gets persistent disk information.  Future of None if not found."""
+    return self._Submit('GET', 'disks/%s' % disk_name,
+                        transform=self._ResultOrNone)
+
+  def IterDisks(self, filter_string=None, fields=None):
+    """Lists persistent disks page by page.  Iterator of compute#disk."""
+    return self._IterItems('disks', filter_string, fields)
+
+  def ListDisks(self, filter_string=None, fields=None):
+    """Lists persistent disks.  Future of list of compute#disk of all pages."""
+    return self._Spawn(self._ListAll, 'disks', filter_string, fields)
+
+  def CreateDisk(self, disk_name, size_gb=10, image=None, labels=None):
+    """Creates persistent disk.  Future of boolean to indicate success."""
+    source_image = self._ResourceUrlFromPath(image) if image else None
+    return self._Submit(
+        'POST', 'disks', query={'sourceImage': source_image},
+        body=self._MakeDiskBody(disk_name, size_gb, labels),
+        transform=self._OperationResult('Disk creation %s' % disk_name))
+
+  def DeleteDisk(self, disk_name):
+    """Deletes persistent disk.  Future of boolean to indicate success."""
+    return self._Submit(
+        'DELETE', 'disks/%s' % disk_name,
+        transform=self._OperationResult('Disk deletion: %s' % disk_name))
+
+  def _WaitForStatus(self, get_method, names, status, interval, max_times):
+    """Polls resources until all of them have the status.
+
+    Args:
+      get_method: Method to get future of the resource.
+      names: List of resource names.
+      status: Expected status, or None to wait for the resources to be gone.
+      interval: Polling interval in seconds.
+      max_times: Maximum number of polling.
+    Returns:
+      List of names of resources that didn't reach the status.
+    """
+    pending = list(names)
+    for _ in xrange(max_times):
+      futures = [get_method(name) for name in pending]
+      still_pending = []
+      for name, future in zip(pending, futures):
+        resource = future.Result()
+        if status is None:
+          done = resource is None
+        else:
+          done = resource is not None and resource.get('status') == status
+        if not done:
+          still_pending.append(name)
+      pending = still_pending
+      if not pending:
+        break
+      logging.info('Waiting for %d resource(s) to be %s...',
+                   len(pending), status or 'deleted')
+      time.sleep(interval)
+    return pending
+
+  def WaitForInstancesStatus(self, instance_names, status='RUNNING',
+                             interval=None, max_times=None):
+    """Waits until all instances have the status.
+
+    Args:
+      instance_names: List of instance names.
+      status: Expected instance status.  None to wait for deletion.
+      interval: Polling interval in seconds.
+      max_times: Maximum number of polling.
+    Returns:
+      ApiFuture of list of names of instances that didn't reach the status.
+    """
+    return self._Spawn(
+        self._WaitForStatus, self.GetInstance, instance_names, status,
+        self.WAIT_INTERVAL if interval is None else interval,
+        max_times or self.MAX_WAIT_TIMES)
+
+  def WaitForDisksStatus(self, disk_names, status='READY',
+                         interval=None, max_times=None):
+    """Waits until all disks have the status.
+
+    Args:
+      disk_names: List of disk names.
+      status: Expected disk status.  None to wait for deletion.
+      interval: Polling interval in seconds.
+      max_times: Maximum number of polling.
+    Returns:
+      ApiFuture of list of names of disks that didn't reach the status.
+    """
+    return self._Spawn(
+        self._WaitForStatus, self.GetDisk, disk_names, status,
+        self.WAIT_INTERVAL if interval is None else interval,
+        max_times or self.MAX_WAIT_TIMES)
+
+  def _CreateInstanceWithNewBootDisk(
+      self, instance_name, machine_type, image, startup_script,
+      service_accounts, metadata, labels):
+    disk_name = instance_name
+    if not self.GetDisk(disk_name).Result():
+      if not self.CreateDisk(disk_name, image=image, labels=labels).Result():
+        return False
+    if self._WaitForStatus(self.GetDisk, [disk_name], 'READY',
+                           self.WAIT_INTERVAL, self.MAX_WAIT_TIMES):
+      logging.error('Persistent disk %s creation timed out.', disk_name)
+      return False
+    return self.CreateInstance(
+        instance_name, machine_type, disk_name, startup_script,
+        service_accounts, metadata, labels).Result()
+
+  def CreateInstanceWithNewBootDisk(
+      self, instance_name, machine_type, image,
+      startup_script='', service_accounts=None, metadata=None, labels=None):
+    """Creates instance with newly created boot disk.
+
+    Returns:
+      ApiFuture of boolean to indicate whether the creation was successful.
+    """
+    return self._Spawn(
+        self._CreateInstanceWithNewBootDisk, instance_name, machine_type,
+        image, startup_script, service_accounts, metadata, labels)
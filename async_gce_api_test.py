@@ -0,0 +1,312 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of async_gce_api.py against local fake Compute Engine server."""
+
+
+
+import BaseHTTPServer
+import json
+import SocketServer
+import threading
+import time
+import unittest
+import urlparse
+
+import apiclient
+import apiclient.errors
+
+from async_gce_api import ApiFuture
+from async_gce_api import AsyncGceApi
+from async_gce_api import WaitAll
+
+
+class _FakeComputeServer(SocketServer.ThreadingMixIn,
+                         BaseHTTPServer.HTTPServer):
+  """Fake Compute Engine REST API server holding resources in memory."""
+
+  daemon_threads = True
+
+  def __init__(self):
+    BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                       _FakeComputeHandler)
+    self.lock = threading.Lock()
+    # Dictionary of resource type to dictionary of name to resource.
+    self.resources = {'instances': {}, 'disks': {}}
+    self.requests = []
+    self.in_flight = 0
+    self.max_in_flight = 0
+    self.delay = 0
+    # Access token that requests must have.  None not to check.
+    self.access_token = None
+
+
+class _FakeComputeHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  """Request handler of fake Compute Engine server."""
+
+  protocol_version = 'HTTP/1.1'
+  # Buffer the response to send it in one packet on persistent connection.
+  wbufsize = -1
+
+  def _Reply(self, status, body):
+    content = json.dumps(body)
+    self.send_response(status)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(content)))
+    self.end_headers()
+    self.wfile.write(content)
+
+  def _Handle(self, method):
+    server = self.server
+    with server.lock:
+      server.in_flight += 1
+      server.max_in_flight = max(server.max_in_flight, server.in_flight)
+    try:
+      time.sleep(server.delay)
+      url = urlparse.urlparse(self.path)
+      query = urlparse.parse_qs(url.query)
+      # Path is /compute/v1/projects/<project>/zones/<zone>/<type>[/<name>]
+      parts = url.path.split('/')[7:]
+      resources = server.resources[parts[0]]
+      with server.lock:
+        server.requests.append((method, url.path, query))
+        if (server.access_token and self.headers.get('Authorization') !=
+            'Bearer ' + server.access_token):
+          self._Reply(401, {'error': {'code': 401}})
+        elif parts[-1] == 'server-error':
+          self._Reply(500, {'error': {'code': 500}})
+        elif method == 'GET' and len(parts) == 1:
+          # Pages are as long as maxResults, and page token is the index of
+          # the first resource of the page.
+          items = [resources[name] for name in sorted(resources)]
+          start = int(query.get('pageToken', ['0'])[0])
+          end = start + int(query.get('maxResults', [len(items)])[0])
+          response = {'items': items[start:end]}
+          if end < len(items):
+            response['nextPageToken'] = str(end)
+          self._Reply(200, response)
+        elif method == 'GET':
+          if parts[1] in resources:
+            resource = resources[parts[1]]
+            self._Reply(200, dict(resource))
+            # Resources become ready on the second look-up.
+            resource['status'] = 'READY' if parts[0] == 'disks' else 'RUNNING'
+          else:
+            self._Reply(404, {'error': {'code': 404}})
+        elif method == 'POST':
+          length = int(self.headers['Content-Length'])
+          body = json.loads(self.rfile.read(length))
+          body['status'] = 'CREATING'
+          resources[body['name']] = body
+          self._Reply(200, {'name': 'operation-insert'})
+        elif method == 'DELETE':
+          resources.pop(parts[1], None)
+          self._Reply(200, {'name': 'operation-delete'})
+    finally:
+      with server.lock:
+        server.in_flight -= 1
+
+  def do_GET(self):  # pylint: disable=invalid-name
+    self._Handle('GET')
+
+  def do_POST(self):  # pylint: disable=invalid-name
+    self._Handle('POST')
+
+  def do_DELETE(self):  # pylint: disable=invalid-name
+    self._Handle('DELETE')
+
+  def log_message(self, *unused_args):
+    pass
+
+
+class _FakeCredentials(object):
+  """Credentials that authorize HTTP with the token at the time."""
+
+  def __init__(self, access_token):
+    self.access_token = access_token
+    self.authorize_count = 0
+
+  def authorize(self, http):
+    self.authorize_count += 1
+    access_token = self.access_token
+    request = http.request
+
+    def Request(uri, method='GET', body=None, headers=None, **kwargs):
+      headers = dict(headers or {})
+      headers['Authorization'] = 'Bearer ' + access_token
+      return request(uri, method, body=body, headers=headers, **kwargs)
+
+    http.request = Request
+    return http
+
+
+class AsyncGceApiTest(unittest.TestCase):
+  """Unit test class of AsyncGceApi."""
+
+  def setUp(self):
+    self.server = _FakeComputeServer()
+    thread = threading.Thread(target=self.server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    self.api = AsyncGceApi(
+        'async_gce_api_test', 'CLIENT_ID', 'CLIENT_SECRET',
+        'project-name', 'zone-name', max_concurrency=8,
+        api_root='http://127.0.0.1:%d/compute/' % self.server.server_port)
+    self.api.WAIT_INTERVAL = 0
+
+  def tearDown(self):
+    self.api.Close()
+    self.server.shutdown()
+    self.server.server_close()
+
+  def testGetInstance_NotFound(self):
+    self.assertIsNone(self.api.GetInstance('no-such-instance').Result())
+
+  def testCreateAndGetInstance(self):
+    self.assertTrue(self.api.CreateInstance(
+        'instance-name', 'machine-type', 'disk-name',
+        metadata={'id': 3}).Result())
+
+    instance = self.api.GetInstance('instance-name').Result()
+
+    self.assertEqual('instance-name', instance['name'])
+    self.assertIn({'key': 'id', 'value': 3}, instance['metadata']['items'])
+    method, path, _ = self.server.requests[0]
+    self.assertEqual('POST', method)
+    self.assertEqual(
+        '/compute/v1/projects/project-name/zones/zone-name/instances', path)
+
+  def testListInstances_Filter(self):
+    WaitAll([self.api.CreateInstance('foo-%03d' % i, 'machine-type', 'disk')
+             for i in xrange(3)])
+
+    instances = self.api.ListInstances('name eq ^foo-.*').Result()
+
+    self.assertEqual(['foo-000', 'foo-001', 'foo-002'],
+                     [i['name'] for i in instances])
+    self.assertEqual({'filter': ['name eq ^foo-.*'], 'maxResults': ['500']},
+                     self.server.requests[-1][2])
+
+  def testListDisks_Pages(self):
+    self.api.MAX_RESULTS_PER_PAGE = 2
+    WaitAll([self.api.CreateDisk('disk-%d' % i) for i in xrange(5)])
+
+    disks = self.api.ListDisks(fields=['name']).Result()
+
+    self.assertEqual(['disk-%d' % i for i in xrange(5)],
+                     [d['name'] for d in disks])
+    list_queries = [query for method, path, query in self.server.requests
+                    if method == 'GET' and path.endswith('/disks')]
+    self.assertEqual([None, ['2'], ['4']],
+                     [q.get('pageToken') for q in list_queries])
+    self.assertEqual(['nextPageToken,items(name)'], list_queries[0]['fields'])
+
+  def testGetInstances_BoundedConcurrency(self):
+    self.server.delay = 0.001
+
+    futures = self.api.GetInstances(['instance-%d' % i for i in xrange(1000)])
+    results = WaitAll(futures)
+
+    self.assertEqual([None] * 1000, results)
+    self.assertEqual(1000, len(self.server.requests))
+    self.assertLessEqual(self.server.max_in_flight, 8)
+    self.assertGreater(self.server.max_in_flight, 1)
+
+  def testCreateInstanceWithNewBootDisk(self):
+    future = self.api.CreateInstanceWithNewBootDisk(
+        'instance-name', 'machine-type', 'projects/p/global/images/image')
+
+    self.assertTrue(future.Result(10))
+    self.assertEqual('READY',
+                     self.api.GetDisk('instance-name').Result()['status'])
+    self.assertIsNotNone(self.api.GetInstance('instance-name').Result())
+    disk_insert = [r for r in self.server.requests
+                   if r[0] == 'POST' and r[1].endswith('/disks')][0]
+    self.assertEqual(
+        ['https://www.googleapis.com/compute/v1/projects/p/global/images/'
+         'image'], disk_insert[2]['sourceImage'])
+
+  def testWaitForInstancesStatus(self):
+    names = ['foo-%03d' % i for i in xrange(5)]
+    WaitAll([self.api.CreateInstance(n, 'machine-type', 'disk')
+             for n in names])
+
+    self.assertEqual([], self.api.WaitForInstancesStatus(names).Result(10))
+
+    WaitAll([self.api.DeleteInstance(n) for n in names])
+    self.assertEqual(
+        [], self.api.WaitForInstancesStatus(names, status=None).Result(10))
+
+  def testWaitForDisksStatus_Timeout(self):
+    self.assertEqual(['no-disk'], self.api.WaitForDisksStatus(
+        ['no-disk'], max_times=2).Result(10))
+
+  def testHttpError(self):
+    future = self.api.GetInstance('server-error')
+
+    self.assertRaises(apiclient.errors.HttpError, future.Result)
+
+  def _MakeAuthorizedApi(self, credentials):
+    api = AsyncGceApi(
+        'async_gce_api_test', 'CLIENT_ID', 'CLIENT_SECRET',
+        'project-name', 'zone-name', credentials=credentials,
+        max_concurrency=1,
+        api_root='http://127.0.0.1:%d/compute/' % self.server.server_port)
+    self.addCleanup(api.Close)
+    return api
+
+  def testTokenExpired(self):
+    credentials = _FakeCredentials('token-1')
+    api = self._MakeAuthorizedApi(credentials)
+    self.server.access_token = 'token-1'
+    self.assertIsNone(api.GetInstance('foo').Result(10))
+
+    # The token expires, and the credentials get new one.
+    self.server.access_token = credentials.access_token = 'token-2'
+
+    self.assertIsNone(api.GetInstance('foo').Result(10))
+    self.assertIsNone(api.GetInstance('foo').Result(10))
+    self.assertEqual(2, credentials.authorize_count)
+
+  def testTokenRejected(self):
+    api = self._MakeAuthorizedApi(_FakeCredentials('bad-token'))
+    self.server.access_token = 'token-1'
+
+    self.assertRaises(apiclient.errors.HttpError,
+                      api.GetInstance('foo').Result, 10)
+    # Retried once.
+    self.assertEqual(2, len(self.server.requests))
+
+
+class ApiFutureTest(unittest.TestCase):
+  """Unit test class of ApiFuture."""
+
+  def testAddDoneCallback(self):
+    future = ApiFuture()
+    called = []
+    future.AddDoneCallback(lambda f: called.append(f.Result()))
+
+    future._SetResult('result')
+    future.AddDoneCallback(lambda f: called.append(f.Result()))
+
+    self.assertTrue(future.Done())
+    self.assertEqual(['result', 'result'], called)
+
+  def testResult_Timeout(self):
+    self.assertRaises(RuntimeError, ApiFuture().Result, 0.1)
+
+
+if __name__ == '__main__':
+  unittest.main()
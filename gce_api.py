@@ -20,6 +20,8 @@
 import logging
 import os
 import os.path
+import re
+import threading
 import time
 
 import apiclient
@@ -36,6 +38,38 @@ class ResourceZoning(object):
   NONE = 0
   GLOBAL = 1
   ZONE = 2
+  REGION = 3
+
+
+class RateLimiter(object):
+  """Thread-safe token bucket to limit the rate of API calls."""
+
+  def __init__(self, rate, burst=None):
+    """Constructor.
+
+    Args:
+      rate: Number of calls allowed per second.
+      burst: Maximum number of calls allowed at once.  Defaults to rate.
+    """
+    self._rate = float(rate)
+    self._burst = float(burst or max(rate, 1))
+    self._tokens = self._burst
+    self._last = time.time()
+    self._lock = threading.Lock()
+
+  def Acquire(self):
+    """Blocks until a call is allowed."""
+    while True:
+      with self._lock:
+        now = time.time()
+        self._tokens = min(self._burst,
+                           self._tokens + (now - self._last) * self._rate)
+        self._last = now
+        if self._tokens >= 1:
+          self._tokens -= 1
+          return
+        wait = (1 - self._tokens) / self._rate
+      time.sleep(wait)
 
 
 class GceApi(object):
@@ -45,8 +79,11 @@ class GceApi(object):
   COMPUTE_ENGINE_API_VERSION = 'v1'
   WAIT_INTERVAL = 3
   MAX_WAIT_TIMES = 100
+  # Maximum number of resources the API returns per page of list request.
+  MAX_RESULTS_PER_PAGE = 500
 
-  def __init__(self, name, client_id, client_secret, project, zone):
+  def __init__(self, name, client_id, client_secret, project, zone,
+               rate_limiter=None, credentials=None):
     """Constructor.
 
     Args:
@@ -55,12 +92,21 @@ class GceApi(object):
       client_secret: Client secret of the user of the class.
       project: Project ID.
       zone: Zone name, e.g. 'us-east-a'
+      rate_limiter: RateLimiter object to limit the rate of API calls.
+          May be shared among multiple GceApi objects.
+      credentials: Object with authorize() method, such as
+          gce_credentials.CachedCredentials, to use instead of the
+          interactive OAuth2 flow.
     """
     self._name = name
     self._client_id = client_id
     self._client_secret = client_secret
     self._project = project
     self._zone = zone
+    # Region of the zone, e.g. 'us-central1' of 'us-central1-a'.
+    self._region = zone.rsplit('-', 1)[0]
+    self._rate_limiter = rate_limiter
+    self._credentials = credentials
 
   def GetApi(self):
     """Does OAuth2 authorization and prepares Google Compute Engine API.
@@ -71,6 +117,14 @@ class GceApi(object):
     Returns:
       Google Client API object for Google Compute Engine.
     """
+    if self._rate_limiter:
+      self._rate_limiter.Acquire()
+
+    if self._credentials:
+      return apiclient.discovery.build(
+          'compute', self.COMPUTE_ENGINE_API_VERSION,
+          http=self._credentials.authorize(httplib2.Http()))
+
     # First, check local file for credentials.
     homedir = os.environ['HOME']
     storage = oauth2client.file.Storage(
@@ -122,6 +176,9 @@ class GceApi(object):
     elif zoning == ResourceZoning.GLOBAL:
       resource_path = 'projects/%s/global/%s/%s' % (
           self._project, resource_type, resource_name)
+    elif zoning == ResourceZoning.REGION:
+      resource_path = 'projects/%s/regions/%s/%s/%s' % (
+          self._project, self._region, resource_type, resource_name)
     else:
       resource_path = 'projects/%s/zones/%s/%s/%s' % (
           self._project, self._zone, resource_type, resource_name)
@@ -171,38 +228,149 @@ class GceApi(object):
         return None
       raise
 
-  def ListInstances(self, filter_string=None):
-    """Lists instances that match filter condition.
+  @staticmethod
+  def _MakeFieldsParam(fields, items='items'):
+    """Makes partial response selector of list request.
+
+    Args:
+      fields: List of resource field names to return.  None for all.
+      items: Path to resources in the response.
+    Returns:
+      Value of 'fields' parameter, or None for full resources.
+    """
+    if not fields:
+      return None
+    return 'nextPageToken,%s(%s)' % (items, ','.join(fields))
+
+  @staticmethod
+  def MakeLabelValue(value):
+    """Converts string into valid label value.
+
+    Label values may contain only lowercase letters, digits, '_' and '-',
+    up to 63 characters.
+    """
+    return re.sub(r'[^a-z0-9_-]', '_', value.lower())[:63]
+
+  @staticmethod
+  def MakeLabelFilter(key, value):
+    """Makes filter string that matches resources with the label.
+
+    Label filter is evaluated on indexed labels, instead of name pattern.
+    """
+    return 'labels.%s eq %s' % (key, GceApi.MakeLabelValue(value))
+
+  def _IterItems(self, collection, filter_string, fields):
+    """Lists resources page by page.
+
+    The next page is requested only when the resources of the previous page
+    have been consumed.
+
+    Each page is requested through GetApi(), so that the rate limiter and
+    authorization apply to every page.
+
+    Args:
+      collection: Name of the collection, e.g. 'instances'.
+      filter_string: Filtering condition, evaluated by the server.
+      fields: List of resource field names to return.  None for all.
+    Yields:
+      Resource in dictionary.
+    """
+    page_token = None
+    while True:
+      result = getattr(self.GetApi(), collection)().list(
+          project=self._project, zone=self._zone, filter=filter_string,
+          fields=self._MakeFieldsParam(fields),
+          maxResults=self.MAX_RESULTS_PER_PAGE,
+          pageToken=page_token).execute()
+      for item in result.get('items', []):
+        yield item
+      page_token = result.get('nextPageToken')
+      if not page_token:
+        return
+
+  def _IterAggregatedItems(self, collection, key, filter_string, fields):
+    """Lists resources of all zones page by page.
+
+    Args:
+      collection: Name of the collection, e.g. 'instances'.
+      key: Key of resources in each zone of the response, e.g. 'instances'.
+      filter_string: Filtering condition, evaluated by the server.
+      fields: List of resource field names to return.  None for all.
+    Yields:
+      Resource in dictionary, with 'zone' set to the zone name.
+    """
+    page_token = None
+    while True:
+      result = getattr(self.GetApi(), collection)().aggregatedList(
+          project=self._project, filter=filter_string,
+          fields=self._MakeFieldsParam(fields, 'items/*/%s' % key),
+          maxResults=self.MAX_RESULTS_PER_PAGE,
+          pageToken=page_token).execute()
+      for scope, scoped_list in sorted(result.get('items', {}).items()):
+        for item in scoped_list.get(key, []):
+          item['zone'] = scope.rsplit('/', 1)[-1]
+          yield item
+      page_token = result.get('nextPageToken')
+      if not page_token:
+        return
+
+  def ListInstancesInAllZones(self, filter_string=None, fields=None):
+    """Lists instances that match filter condition in all zones at once.
+
+    Args:
+      filter_string: Filtering condition.
+      fields: List of field names of compute#instance to return.  None to
+          return whole resources.
+    Returns:
+      List of compute#instance.  'zone' is the zone name of the instance.
+    """
+    return list(self._IterAggregatedItems(
+        'instances', 'instances', filter_string, fields))
+
+  def IterInstances(self, filter_string=None, fields=None):
+    """Lists instances that match filter condition, page by page.
 
     Format of filter string can be found in the following URL.
     https://developers.google.com/compute/docs/reference/latest/instances/list
 
     Args:
       filter_string: Filtering condition.
+      fields: List of field names of compute#instance to return, e.g.
+          ['name', 'status'].  None to return whole resources.
     Returns:
-      List of compute#instance.
+      Iterator of compute#instance.
     """
-    result = self.GetApi().instances().list(
-        project=self._project, zone=self._zone, filter=filter_string).execute()
-    return result.get('items', [])
+    return self._IterItems('instances', filter_string, fields)
 
-  def CreateInstance(self, instance_name, machine_type, disk,
-                     startup_script='', service_accounts=None,
-                     metadata=None):
-    """Creates Google Compute Engine instance.
+  def ListInstances(self, filter_string=None, fields=None):
+    """Lists instances that match filter condition.
+
+    Args:
+      filter_string: Filtering condition.
+      fields: List of field names of compute#instance to return.  None to
+          return whole resources.
+    Returns:
+      List of compute#instance, from all pages.
+    """
+    return list(self.IterInstances(filter_string, fields))
+
+  def _MakeInstanceBody(self, instance_name, machine_type, disk,
+                        startup_script='', service_accounts=None,
+                        metadata=None, labels=None):
+    """Makes request body of instance creation.
 
     Args:
       instance_name: Name of the new instance.
       machine_type: Machine type.  e.g. 'n1-standard-2'
-      disk: Name of the persistent disk to be used as a boot disk.  The disk
-          must preexist in the same zone as the instance.
+      disk: Name of the persistent disk to be used as a boot disk.
       startup_script: Content of start up script to run on the new instance.
       service_accounts: List of scope URLs to give to the instance with
           the service account.
       metadata: Additional key-value pairs in dictionary to add as
           instance metadata.
+      labels: Dictionary of labels to attach to the instance.
     Returns:
-      Boolean to indicate whether the instance creation was successful.
+      compute#instance resource in dictionary.
     """
     params = {
         'kind': 'compute#instance',
@@ -256,6 +424,34 @@ class GceApi(object):
       for key, value in metadata.items():
         params['metadata']['items'].append({'key': key, 'value': value})
 
+    if labels:
+      params['labels'] = dict(labels)
+
+    return params
+
+  def CreateInstance(self, instance_name, machine_type, disk,
+                     startup_script='', service_accounts=None,
+                     metadata=None, labels=None):
+    """Creates Google Compute Engine instance.
+
+    Args:
+      instance_name: Name of the new instance.
+      machine_type: Machine type.  e.g. 'n1-standard-2'
+      disk: Name of the persistent disk to be used as a boot disk.  The disk
+          must preexist in the same zone as the instance.
+      startup_script: Content of start up script to run on the new instance.
+      service_accounts: List of scope URLs to give to the instance with
+          the service account.
+      metadata: Additional key-value pairs in dictionary to add as
+          instance metadata.
+      labels: Dictionary of labels to attach to the instance.
+    Returns:
+      Boolean to indicate whether the instance creation was successful.
+    """
+    params = self._MakeInstanceBody(
+        instance_name, machine_type, disk, startup_script, service_accounts,
+        metadata, labels)
+
     operation = self.GetApi().instances().insert(
         project=self._project, zone=self._zone, body=params).execute()
 
@@ -264,7 +460,7 @@ class GceApi(object):
 
   def CreateInstanceWithNewBootDisk(
       self, instance_name, machine_type, image,
-      startup_script='', service_accounts=None, metadata=None):
+      startup_script='', service_accounts=None, metadata=None, labels=None):
     """Creates Google Compute Engine instance with newly created boot disk.
 
     The boot disk is created with the same name as the instance, if the
@@ -281,6 +477,7 @@ class GceApi(object):
           the service account.
       metadata: Additional key-value pairs in dictionary to add as
           instance metadata.
+      labels: Dictionary of labels to attach to the instance and the disk.
     Returns:
       Boolean to indicate whether the instance creation was successful.
     """
@@ -289,7 +486,7 @@ class GceApi(object):
 
     # If the boot disk doesn't already exist, create.
     if not self.GetDisk(disk_name):
-      if not self.CreateDisk(disk_name, image=image):
+      if not self.CreateDisk(disk_name, image=image, labels=labels):
         return False
 
     # Wait until the new persistent disk is READY.
@@ -306,7 +503,43 @@ class GceApi(object):
 
     return self.CreateInstance(
         instance_name, machine_type, disk_name,
-        startup_script, service_accounts, metadata)
+        startup_script, service_accounts, metadata, labels)
+
+  def SetInstanceMetadata(self, instance_name, metadata, fingerprint):
+    """Replaces metadata of the instance.
+
+    Args:
+      instance_name: Name of the instance.
+      metadata: Key-value pairs in dictionary to set as instance metadata.
+          Existing metadata not in the dictionary is removed.
+      fingerprint: Fingerprint of the current metadata, taken from the
+          instance resource.  The request fails if the metadata was changed
+          after the fingerprint was taken.
+    Returns:
+      Boolean to indicate whether the metadata was updated.  False if the
+      metadata was changed concurrently.
+    Raises:
+      HttpError on API error, except for fingerprint mismatch.
+    """
+    params = {
+        'kind': 'compute#metadata',
+        'fingerprint': fingerprint,
+        'items': [{'key': key, 'value': value}
+                  for key, value in sorted(metadata.items())],
+    }
+    try:
+      operation = self.GetApi().instances().setMetadata(
+          project=self._project, zone=self._zone, instance=instance_name,
+          body=params).execute()
+    except apiclient.errors.HttpError as e:
+      if e.resp['status'] == '412':
+        logging.info('Metadata of %s was changed concurrently.',
+                     instance_name)
+        return False
+      raise
+
+    return self._ParseOperation(
+        operation, 'Instance metadata update: %s' % instance_name)
 
   def DeleteInstance(self, instance_name):
     """Deletes Google Compute Engine instance.
@@ -342,37 +575,78 @@ class GceApi(object):
         return None
       raise
 
-  def ListDisks(self, filter_string=None):
-    """Lists disks that match filter condition.
+  def ListDisksInAllZones(self, filter_string=None, fields=None):
+    """Lists disks that match filter condition in all zones at once.
+
+    Args:
+      filter_string: Filtering condition.
+      fields: List of field names of compute#disk to return.  None to
+          return whole resources.
+    Returns:
+      List of compute#disk.  'zone' is the zone name of the disk.
+    """
+    return list(self._IterAggregatedItems(
+        'disks', 'disks', filter_string, fields))
+
+  def IterDisks(self, filter_string=None, fields=None):
+    """Lists disks that match filter condition, page by page.
 
     Format of filter string can be found in the following URL.
     https://developers.google.com/compute/docs/reference/latest/disks/list
 
     Args:
       filter_string: Filtering condition.
+      fields: List of field names of compute#disk to return.  None to
+          return whole resources.
     Returns:
-      List of compute#disk.
+      Iterator of compute#disk.
     """
-    result = self.GetApi().disks().list(
-        project=self._project, zone=self._zone, filter=filter_string).execute()
-    return result.get('items', [])
+    return self._IterItems('disks', filter_string, fields)
 
-  def CreateDisk(self, disk_name, size_gb=10, image=None):
-    """Creates persistent disk in the zone of this API.
+  def ListDisks(self, filter_string=None, fields=None):
+    """Lists disks that match filter condition.
+
+    Args:
+      filter_string: Filtering condition.
+      fields: List of field names of compute#disk to return.  None to
+          return whole resources.
+    Returns:
+      List of compute#disk, from all pages.
+    """
+    return list(self.IterDisks(filter_string, fields))
+
+  def _MakeDiskBody(self, disk_name, size_gb=10, labels=None):
+    """Makes request body of persistent disk creation.
 
     Args:
       disk_name: Name of the new persistent disk.
       size_gb: Size of the new persistent disk in GB.
-      image: Machine image name for the new disk to base upon.
-          e.g. 'projects/debian-cloud/global/images/debian-7-wheezy-v20131014'
+      labels: Dictionary of labels to attach to the disk.
     Returns:
-      Boolean to indicate whether the disk creation was successful.
+      compute#disk resource in dictionary.
     """
     params = {
         'kind': 'compute#disk',
         'sizeGb': '%d' % size_gb,
         'name': disk_name,
     }
+    if labels:
+      params['labels'] = dict(labels)
+    return params
+
+  def CreateDisk(self, disk_name, size_gb=10, image=None, labels=None):
+    """Creates persistent disk in the zone of this API.
+
+    Args:
+      disk_name: Name of the new persistent disk.
+      size_gb: Size of the new persistent disk in GB.
+      image: Machine image name for the new disk to base upon.
+          e.g. 'projects/debian-cloud/global/images/debian-7-wheezy-v20131014'
+      labels: Dictionary of labels to attach to the disk.
+    Returns:
+      Boolean to indicate whether the disk creation was successful.
+    """
+    params = self._MakeDiskBody(disk_name, size_gb, labels)
     source_image = self._ResourceUrlFromPath(image) if image else None
     operation = self.GetApi().disks().insert(
         project=self._project, zone=self._zone, body=params,
@@ -380,6 +654,269 @@ class GceApi(object):
     return self._ParseOperation(
         operation, 'Disk creation %s' % disk_name)
 
+  def _MakeInstanceTemplateBody(self, template_name, machine_type, image,
+                                startup_script='', service_accounts=None,
+                                metadata=None, labels=None):
+    """Makes request body of instance template creation.
+
+    Instance properties are the same as those of CreateInstance(), except
+    that each instance gets a new boot disk from the image, which is deleted
+    with the instance.
+
+    Args:
+      template_name: Name of the new instance template.
+      machine_type: Machine type.  e.g. 'n1-standard-2'
+      image: Machine image name of boot disks.
+      startup_script: Content of start up script to run on the instances.
+      service_accounts: List of scope URLs to give to the instances with
+          the service account.
+      metadata: Additional key-value pairs in dictionary to add as
+          instance metadata.
+      labels: Dictionary of labels to attach to the instances and disks.
+    Returns:
+      compute#instanceTemplate resource in dictionary.
+    """
+    properties = self._MakeInstanceBody(
+        None, machine_type, None, startup_script, service_accounts,
+        metadata, labels)
+    for key in ('kind', 'name', 'zone'):
+      del properties[key]
+    # Instance templates take machine type name instead of URL.
+    properties['machineType'] = machine_type.rsplit('/', 1)[-1]
+    disk_params = {'sourceImage': self._ResourceUrlFromPath(image)}
+    if labels:
+      disk_params['labels'] = dict(labels)
+    properties['disks'] = [
+        {
+            'kind': 'compute#attachedDisk',
+            'boot': True,
+            'autoDelete': True,
+            'mode': 'READ_WRITE',
+            'type': 'PERSISTENT',
+            'initializeParams': disk_params,
+        },
+    ]
+    return {
+        'kind': 'compute#instanceTemplate',
+        'name': template_name,
+        'properties': properties,
+    }
+
+  def GetInstanceTemplate(self, template_name):
+    """Gets regional instance template in the region of the zone.
+
+    Args:
+      template_name: Name of the instance template.
+    Returns:
+      compute#instanceTemplate resource.  None if not found.
+    """
+    try:
+      return self.GetApi().regionInstanceTemplates().get(
+          project=self._project, region=self._region,
+          instanceTemplate=template_name).execute()
+    except apiclient.errors.HttpError as e:
+      if self.IsNotFoundError(e):
+        return None
+      raise
+
+  def CreateInstanceTemplate(
+      self, template_name, machine_type, image,
+      startup_script='', service_accounts=None, metadata=None, labels=None):
+    """Creates regional instance template and waits until it's created.
+
+    Args:
+      template_name: Name of the new instance template.
+      machine_type: Machine type.  e.g. 'n1-standard-2'
+      image: Machine image name.
+          e.g. 'projects/debian-cloud/global/images/debian-7-wheezy-v20131014'
+      startup_script: Content of start up script to run on the instances.
+      service_accounts: List of scope URLs to give to the instances with
+          the service account.
+      metadata: Additional key-value pairs in dictionary to add as
+          instance metadata.
+      labels: Dictionary of labels to attach to the instances and disks.
+    Returns:
+      Boolean to indicate whether the template creation was successful.
+    """
+    params = self._MakeInstanceTemplateBody(
+        template_name, machine_type, image, startup_script,
+        service_accounts, metadata, labels)
+    operation = self.GetApi().regionInstanceTemplates().insert(
+        project=self._project, region=self._region, body=params).execute()
+    if not self._ParseOperation(
+        operation, 'Instance template creation: %s' % template_name):
+      return False
+
+    for _ in xrange(self.MAX_WAIT_TIMES):
+      if self.GetInstanceTemplate(template_name):
+        return True
+      logging.info('Waiting for instance template %s...', template_name)
+      time.sleep(self.WAIT_INTERVAL)
+    logging.error('Instance template %s creation timed out.', template_name)
+    return False
+
+  def DeleteInstanceTemplate(self, template_name):
+    """Deletes regional instance template.
+
+    Args:
+      template_name: Name of the instance template to delete.
+    Returns:
+      Boolean to indicate whether the template deletion was successful.
+    """
+    operation = self.GetApi().regionInstanceTemplates().delete(
+        project=self._project, region=self._region,
+        instanceTemplate=template_name).execute()
+    return self._ParseOperation(
+        operation, 'Instance template deletion: %s' % template_name)
+
+  def GetInstanceGroupManager(self, group_name):
+    """Gets managed instance group in the zone.
+
+    Args:
+      group_name: Name of the managed instance group.
+    Returns:
+      compute#instanceGroupManager resource.  None if not found.
+    """
+    try:
+      return self.GetApi().instanceGroupManagers().get(
+          project=self._project, zone=self._zone,
+          instanceGroupManager=group_name).execute()
+    except apiclient.errors.HttpError as e:
+      if self.IsNotFoundError(e):
+        return None
+      raise
+
+  def CreateInstanceGroupManager(self, group_name, template_name,
+                                 base_instance_name, size=0):
+    """Creates managed instance group from the regional instance template.
+
+    Args:
+      group_name: Name of the new managed instance group.
+      template_name: Name of the instance template of the instances.
+      base_instance_name: Name prefix of the instances, which are named
+          '<base instance name>-xxxx'.
+      size: Number of instances to create.
+    Returns:
+      Boolean to indicate whether the group creation was successful.
+    """
+    params = {
+        'name': group_name,
+        'instanceTemplate': self._ResourceUrl(
+            'instanceTemplates', template_name, zoning=ResourceZoning.REGION),
+        'baseInstanceName': base_instance_name,
+        'targetSize': size,
+    }
+    operation = self.GetApi().instanceGroupManagers().insert(
+        project=self._project, zone=self._zone, body=params).execute()
+    return self._ParseOperation(
+        operation, 'Managed instance group creation: %s' % group_name)
+
+  def ResizeInstanceGroupManager(self, group_name, size):
+    """Changes number of instances of managed instance group.
+
+    The group creates or deletes instances on the server side.
+
+    Args:
+      group_name: Name of the managed instance group.
+      size: New number of instances.
+    Returns:
+      Boolean to indicate whether the resize was accepted.
+    """
+    operation = self.GetApi().instanceGroupManagers().resize(
+        project=self._project, zone=self._zone,
+        instanceGroupManager=group_name, size=size).execute()
+    return self._ParseOperation(
+        operation, 'Managed instance group resize: %s' % group_name)
+
+  def _IterManagedInstances(self, group_name):
+    """Lists managed instances of managed instance group page by page.
+
+    Yields:
+      Managed instance in dictionary, with 'instance' URL, 'currentAction'
+      and 'lastAttempt'.
+    """
+    page_token = None
+    while True:
+      result = self.GetApi().instanceGroupManagers().listManagedInstances(
+          project=self._project, zone=self._zone,
+          instanceGroupManager=group_name,
+          maxResults=self.MAX_RESULTS_PER_PAGE,
+          pageToken=page_token).execute()
+      for managed_instance in result.get('managedInstances', []):
+        yield managed_instance
+      page_token = result.get('nextPageToken')
+      if not page_token:
+        return
+
+  def ListManagedInstances(self, group_name):
+    """Lists names of instances of managed instance group.
+
+    Instances being created are listed, even before they get instance
+    resources.
+
+    Args:
+      group_name: Name of the managed instance group.
+    Returns:
+      List of instance names.
+    """
+    return [i['instance'].rsplit('/', 1)[-1]
+            for i in self._IterManagedInstances(group_name)]
+
+  def ListManagedInstanceErrors(self, group_name):
+    """Lists errors of the last attempt to create or recreate instances.
+
+    Errors such as quota exceeded or resource stockout are reported on the
+    managed instances that the group fails to create.
+
+    Args:
+      group_name: Name of the managed instance group.
+    Returns:
+      List of error messages, prefixed by instance name.
+    """
+    errors = []
+    for managed_instance in self._IterManagedInstances(group_name):
+      name = managed_instance['instance'].rsplit('/', 1)[-1]
+      for error in managed_instance.get('lastAttempt', {}).get(
+          'errors', {}).get('errors', []):
+        errors.append('%s: %s: %s' % (
+            name, error.get('code', 'NO ERROR CODE'),
+            error.get('message', 'NO ERROR MESSAGE')))
+    return errors
+
+  def DeleteManagedInstances(self, group_name, instance_names):
+    """Deletes the instances of managed instance group.
+
+    The target size of the group is reduced by the number of instances, so
+    that the group doesn't recreate them.
+
+    Args:
+      group_name: Name of the managed instance group.
+      instance_names: List of names of instances to delete.
+    Returns:
+      Boolean to indicate whether the deletion was accepted.
+    """
+    params = {'instances': [self._ResourceUrl('instances', name)
+                            for name in instance_names]}
+    operation = self.GetApi().instanceGroupManagers().deleteInstances(
+        project=self._project, zone=self._zone,
+        instanceGroupManager=group_name, body=params).execute()
+    return self._ParseOperation(
+        operation, 'Managed instance deletion: %s' % ', '.join(instance_names))
+
+  def DeleteInstanceGroupManager(self, group_name):
+    """Deletes managed instance group together with its instances.
+
+    Args:
+      group_name: Name of the managed instance group to delete.
+    Returns:
+      Boolean to indicate whether the group deletion was successful.
+    """
+    operation = self.GetApi().instanceGroupManagers().delete(
+        project=self._project, zone=self._zone,
+        instanceGroupManager=group_name).execute()
+    return self._ParseOperation(
+        operation, 'Managed instance group deletion: %s' % group_name)
+
   def DeleteDisk(self, disk_name):
     """Deletes persistent disk.
 
@@ -393,3 +930,47 @@ class GceApi(object):
 
     return self._ParseOperation(
         operation, 'Disk deletion: %s' % disk_name)
+
+
+class GceApiPool(object):
+  """Pool of GceApi objects that share a rate limiter.
+
+  A GceApi object is created per pair of project and zone, and shared by all
+  users of the same project and zone.
+  """
+
+  def __init__(self, name, client_id, client_secret, rate_limiter=None,
+               credentials=None):
+    """Constructor.
+
+    Args:
+      name: Name of the user of the class.  Used for credentials filename.
+      client_id: Client ID of the user of the class.
+      client_secret: Client secret of the user of the class.
+      rate_limiter: RateLimiter object shared by all GceApi objects.
+      credentials: Credentials shared by all GceApi objects.  None to use
+          the interactive OAuth2 flow.
+    """
+    self._name = name
+    self._client_id = client_id
+    self._client_secret = client_secret
+    self._rate_limiter = rate_limiter
+    self._credentials = credentials
+    self._apis = {}
+    self._lock = threading.Lock()
+
+  def Get(self, project, zone):
+    """Gets GceApi object for the project and the zone.
+
+    Args:
+      project: Project ID.
+      zone: Zone name.
+    Returns:
+      GceApi object.
+    """
+    with self._lock:
+      if (project, zone) not in self._apis:
+        self._apis[(project, zone)] = GceApi(
+            self._name, self._client_id, self._client_secret, project, zone,
+            rate_limiter=self._rate_limiter, credentials=self._credentials)
+      return self._apis[(project, zone)]
@@ -21,6 +21,7 @@ import unittest
 
 import apiclient
 import apiclient.discovery
+import apiclient.errors
 
 import mock
 from mock import MagicMock
@@ -30,6 +31,8 @@ import oauth2client.file
 import oauth2client.tools
 
 from gce_api import GceApi
+from gce_api import GceApiPool
+from gce_api import RateLimiter
 
 
 class GceApiTest(unittest.TestCase):
@@ -174,7 +177,8 @@ class GceApiTest(unittest.TestCase):
 
     self.assertEqual(1, self.gce_api.GetApi.call_count)
     mock_api.instances.return_value.list.assert_called_once_with(
-        project='project-name', zone='zone-name', filter=None)
+        project='project-name', zone='zone-name', filter=None, fields=None,
+        maxResults=500, pageToken=None)
     (mock_api.instances.return_value.list.return_value.execute.
      assert_called_once_with())
     self.assertEqual(['dummy', 'list'], instance_list)
@@ -191,11 +195,83 @@ class GceApiTest(unittest.TestCase):
 
     self.assertEqual(1, self.gce_api.GetApi.call_count)
     mock_api.instances.return_value.list.assert_called_once_with(
-        project='project-name', zone='zone-name', filter='filter condition')
+        project='project-name', zone='zone-name', filter='filter condition',
+        fields=None, maxResults=500, pageToken=None)
     (mock_api.instances.return_value.list.return_value.execute.
      assert_called_once_with())
     self.assertEqual(['dummy', 'list'], instance_list)
 
+  def testListInstances_Pages(self):
+    """Unit test of ListInstances() with multiple pages and fields."""
+    mock_api = MagicMock(name='Mock Google Client API')
+    self.gce_api.GetApi = MagicMock(return_value=mock_api)
+    mock_api.instances.return_value.list.return_value.execute.side_effect = [
+        {'items': [{'name': 'a'}, {'name': 'b'}], 'nextPageToken': 'page2'},
+        {'items': [{'name': 'c'}]},
+    ]
+
+    instance_list = self.gce_api.ListInstances('filter condition',
+                                               fields=['name', 'status'])
+
+    self.assertEqual(['a', 'b', 'c'], [i['name'] for i in instance_list])
+    mock_list = mock_api.instances.return_value.list
+    self.assertEqual(2, mock_list.call_count)
+    # Rate limiter and authorization apply to each page.
+    self.assertEqual(2, self.gce_api.GetApi.call_count)
+    self.assertEqual(
+        {'project': 'project-name', 'zone': 'zone-name',
+         'filter': 'filter condition',
+         'fields': 'nextPageToken,items(name,status)',
+         'maxResults': 500, 'pageToken': 'page2'},
+        mock_list.call_args[1])
+
+  def testListInstancesInAllZones(self):
+    """Unit test of ListInstancesInAllZones() with aggregated list."""
+    mock_api = MagicMock(name='Mock Google Client API')
+    self.gce_api.GetApi = MagicMock(return_value=mock_api)
+    mock_list = mock_api.instances.return_value.aggregatedList
+    mock_list.return_value.execute.side_effect = [
+        {'items': {
+            'zones/us-central1-a': {'instances': [{'name': 'a'}]},
+            'zones/asia-east1-a': {'warning': {'code': 'NO_RESULTS_ON_PAGE'}},
+        }, 'nextPageToken': 'page2'},
+        {'items': {'zones/europe-west1-b': {'instances': [{'name': 'b'}]}}},
+    ]
+
+    instance_list = self.gce_api.ListInstancesInAllZones(
+        'labels.jmeter_cluster eq foo', fields=['name'])
+
+    self.assertEqual([{'name': 'a', 'zone': 'us-central1-a'},
+                      {'name': 'b', 'zone': 'europe-west1-b'}],
+                     instance_list)
+    mock_list.assert_called_with(
+        project='project-name', filter='labels.jmeter_cluster eq foo',
+        fields='nextPageToken,items/*/instances(name)', maxResults=500,
+        pageToken='page2')
+    self.assertEqual(2, self.gce_api.GetApi.call_count)
+
+  def testMakeLabelFilter(self):
+    """Unit test of label value conversion in MakeLabelFilter()."""
+    self.assertEqual('labels.owner eq john_doe-1',
+                     GceApi.MakeLabelFilter('owner', 'John.Doe-1'))
+
+  def testIterDisks_Lazy(self):
+    """Unit test of IterDisks() requesting next page only when needed."""
+    mock_api = MagicMock(name='Mock Google Client API')
+    self.gce_api.GetApi = MagicMock(return_value=mock_api)
+    mock_execute = mock_api.disks.return_value.list.return_value.execute
+    mock_execute.side_effect = [
+        {'items': [{'name': 'a'}], 'nextPageToken': 'page2'},
+        {'items': [{'name': 'b'}]},
+    ]
+
+    disks = self.gce_api.IterDisks()
+
+    self.assertEqual({'name': 'a'}, next(disks))
+    self.assertEqual(1, mock_execute.call_count)
+    self.assertEqual([{'name': 'b'}], list(disks))
+    self.assertEqual(2, mock_execute.call_count)
+
   def testCreateInstance_Success(self):
     """Unit test of CreateInstance() with success result."""
     mock_api = MagicMock(name='Mock Google Client API')
@@ -213,6 +289,83 @@ class GceApiTest(unittest.TestCase):
     (mock_api.instances.return_value.insert.return_value.execute.
      assert_called_once_with())
 
+  def testCreateInstanceWithNewBootDisk_Labels(self):
+    """Unit test of labels attached to both instance and boot disk."""
+    mock_api = MagicMock(name='Mock Google Client API')
+    self.gce_api.GetApi = MagicMock(return_value=mock_api)
+    self.gce_api.WAIT_INTERVAL = 0
+    mock_api.disks.return_value.get.return_value.execute.side_effect = [
+        apiclient.errors.HttpError({'status': '404'}, 'not found'),
+        {'status': 'READY'}]
+    mock_api.disks.return_value.insert.return_value.execute.return_value = {}
+    mock_api.instances.return_value.insert.return_value.execute.return_value = {
+        'name': 'instance-name'
+    }
+
+    self.assertTrue(self.gce_api.CreateInstanceWithNewBootDisk(
+        'instance-name', 'machine-type', 'image-name',
+        labels={'jmeter_cluster': 'foo'}))
+
+    self.assertEqual(
+        {'jmeter_cluster': 'foo'},
+        mock_api.disks.return_value.insert.call_args[1]['body']['labels'])
+    self.assertEqual(
+        {'jmeter_cluster': 'foo'},
+        mock_api.instances.return_value.insert.call_args[1]['body']['labels'])
+
+  def testCreateInstanceTemplate(self):
+    """Unit test of regional instance template creation."""
+    mock_api = MagicMock(name='Mock Google Client API')
+    self.gce_api.GetApi = MagicMock(return_value=mock_api)
+    templates = mock_api.regionInstanceTemplates.return_value
+    templates.insert.return_value.execute.return_value = {}
+    templates.get.return_value.execute.return_value = {'name': 'template'}
+
+    self.assertTrue(self.gce_api.CreateInstanceTemplate(
+        'template', 'n1-standard-2', 'projects/p/global/images/image',
+        labels={'jmeter_cluster': 'foo'}))
+
+    self.assertEqual('zone', templates.insert.call_args[1]['region'])
+    properties = templates.insert.call_args[1]['body']['properties']
+    self.assertEqual('n1-standard-2', properties['machineType'])
+    self.assertEqual(
+        'https://www.googleapis.com/compute/v1/projects/p/global/images/image',
+        properties['disks'][0]['initializeParams']['sourceImage'])
+    self.assertTrue(properties['disks'][0]['autoDelete'])
+    self.assertEqual({'jmeter_cluster': 'foo'}, properties['labels'])
+    self.assertNotIn('name', properties)
+
+  def testListManagedInstances_Pages(self):
+    """Unit test of ListManagedInstances() over pages."""
+    mock_api = MagicMock(name='Mock Google Client API')
+    self.gce_api.GetApi = MagicMock(return_value=mock_api)
+    managers = mock_api.instanceGroupManagers.return_value
+    managers.listManagedInstances.return_value.execute.side_effect = [
+        {'managedInstances': [{'instance': 'https://x/instances/foo-aaaa'}],
+         'nextPageToken': 'token'},
+        {'managedInstances': [{'instance': 'https://x/instances/foo-bbbb'}]}]
+
+    self.assertEqual(['foo-aaaa', 'foo-bbbb'],
+                     self.gce_api.ListManagedInstances('foo'))
+    self.assertEqual(
+        'token', managers.listManagedInstances.call_args[1]['pageToken'])
+
+  def testListManagedInstanceErrors(self):
+    """Unit test of ListManagedInstanceErrors()."""
+    mock_api = MagicMock(name='Mock Google Client API')
+    self.gce_api.GetApi = MagicMock(return_value=mock_api)
+    managers = mock_api.instanceGroupManagers.return_value
+    managers.listManagedInstances.return_value.execute.return_value = {
+        'managedInstances': [
+            {'instance': 'https://x/instances/foo-aaaa'},
+            {'instance': 'https://x/instances/foo-bbbb',
+             'currentAction': 'CREATING',
+             'lastAttempt': {'errors': {'errors': [
+                 {'code': 'QUOTA_EXCEEDED', 'message': 'Quota exceeded'}]}}}]}
+
+    self.assertEqual(['foo-bbbb: QUOTA_EXCEEDED: Quota exceeded'],
+                     self.gce_api.ListManagedInstanceErrors('foo'))
+
   def testCreateInstance_SuccessWithWarning(self):
     """Unit test of CreateInstance() with warning."""
     mock_api = MagicMock(name='Mock Google Client API')
@@ -279,6 +432,118 @@ class GceApiTest(unittest.TestCase):
     (mock_api.instances.return_value.delete.return_value.execute.
      assert_called_once_with())
 
+  def testSetInstanceMetadata(self):
+    """Unit test of SetInstanceMetadata()."""
+    mock_api = MagicMock(name='Mock Google Client API')
+    self.gce_api.GetApi = MagicMock(return_value=mock_api)
+    (mock_api.instances.return_value.setMetadata.return_value.execute.
+     return_value) = {'name': 'operation-name'}
+
+    self.assertTrue(self.gce_api.SetInstanceMetadata(
+        'instance-name', {'id': 3, 'cluster': 'foo'}, 'fingerprint-1'))
+
+    mock_api.instances.return_value.setMetadata.assert_called_once_with(
+        project='project-name', zone='zone-name', instance='instance-name',
+        body={'kind': 'compute#metadata', 'fingerprint': 'fingerprint-1',
+              'items': [{'key': 'cluster', 'value': 'foo'},
+                        {'key': 'id', 'value': 3}]})
+
+  def testSetInstanceMetadata_FingerprintMismatch(self):
+    """Unit test of SetInstanceMetadata() with stale fingerprint."""
+    mock_api = MagicMock(name='Mock Google Client API')
+    self.gce_api.GetApi = MagicMock(return_value=mock_api)
+    (mock_api.instances.return_value.setMetadata.return_value.execute.
+     side_effect) = apiclient.errors.HttpError({'status': '412'}, '')
+
+    self.assertFalse(self.gce_api.SetInstanceMetadata(
+        'instance-name', {'id': 3}, 'stale-fingerprint'))
+
+
+  def testGetApi_RateLimiter(self):
+    """Unit test of GetApi() with rate limiter."""
+    self._MockGoogleClientApi()
+    mock_rate_limiter = MagicMock(spec=RateLimiter)
+    gce_api = GceApi('gce_api_test', 'CLIENT_ID', 'CLIENT_SECRET',
+                     'project-name', 'zone-name',
+                     rate_limiter=mock_rate_limiter)
+
+    gce_api.GetApi()
+    gce_api.GetApi()
+
+    self.assertEqual(2, mock_rate_limiter.Acquire.call_count)
+
+  def testGetApi_Credentials(self):
+    """Unit test of GetApi() with non-interactive credentials."""
+    my_mocks = self._MockGoogleClientApi()
+    mock_credentials = MagicMock(name='Mock Non-interactive Credentials')
+    gce_api = GceApi('gce_api_test', 'CLIENT_ID', 'CLIENT_SECRET',
+                     'project-name', 'zone-name',
+                     credentials=mock_credentials)
+
+    api = gce_api.GetApi()
+
+    self.assertEqual(my_mocks['api'], api)
+    # Neither local credentials file nor OAuth2 dance is used.
+    self.assertFalse(my_mocks['storage_class'].called)
+    self.assertFalse(oauth2client.tools.run.called)
+    self.assertEqual(1, mock_credentials.authorize.call_count)
+    apiclient.discovery.build.assert_called_once_with(
+        'compute', mock.ANY,
+        http=mock_credentials.authorize.return_value)
+
+
+class RateLimiterTest(unittest.TestCase):
+  """Unit test class of RateLimiter."""
+
+  def setUp(self):
+    self.now = [1000.0]
+    self.sleeps = []
+
+    def Sleep(seconds):
+      self.sleeps.append(seconds)
+      self.now[0] += seconds
+
+    mock.patch('time.time', side_effect=lambda: self.now[0]).start()
+    mock.patch('time.sleep', side_effect=Sleep).start()
+
+  def tearDown(self):
+    mock.patch.stopall()
+
+  def testAcquire_Burst(self):
+    rate_limiter = RateLimiter(5)
+
+    for _ in xrange(5):
+      rate_limiter.Acquire()
+
+    self.assertEqual([], self.sleeps)
+
+  def testAcquire_Limited(self):
+    rate_limiter = RateLimiter(2, burst=1)
+
+    for _ in xrange(5):
+      rate_limiter.Acquire()
+
+    # First call is in burst, and the rest wait 0.5 seconds each.
+    self.assertEqual(4, len(self.sleeps))
+    self.assertAlmostEqual(1002.0, self.now[0])
+
+
+class GceApiPoolTest(unittest.TestCase):
+  """Unit test class of GceApiPool."""
+
+  def testGet(self):
+    rate_limiter = RateLimiter(1)
+    pool = GceApiPool('gce_api_test', 'CLIENT_ID', 'CLIENT_SECRET',
+                      rate_limiter=rate_limiter)
+
+    api1 = pool.Get('project-name', 'zone-a')
+    api2 = pool.Get('project-name', 'zone-a')
+    api3 = pool.Get('project-name', 'zone-b')
+
+    self.assertIs(api1, api2)
+    self.assertIsNot(api1, api3)
+    self.assertIs(rate_limiter, api3._rate_limiter)
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to provide non-interactive credentials for Google APIs.
+
+Credential providers obtain OAuth2 access tokens without the interactive
+OAuth2 dance, so that the tools can run on CI runners.  Access tokens are
+cached in a file shared by concurrent processes.  The file is protected by
+a file lock, so that only one process refreshes an expired token while the
+others wait and reuse the result.
+"""
+
+
+
+import calendar
+import fcntl
+import json
+import logging
+import os
+import os.path
+import tempfile
+import threading
+import time
+
+import httplib2
+import oauth2client
+import oauth2client.client
+
+
+METADATA_TOKEN_URL = ('http://metadata/computeMetadata/v1/instance/'
+                      'service-accounts/default/token')
+USER_AGENT = 'jmeter-cluster/1.0'
+
+
+class CredentialsError(Exception):
+  """Error in obtaining access token."""
+
+
+class CredentialProvider(object):
+  """Base class of credential providers."""
+
+  def CacheKey(self):
+    """Returns key to identify tokens of the provider in token cache."""
+    raise NotImplementedError()
+
+  def FetchAccessToken(self):
+    """Fetches new access token.
+
+    Returns:
+      Tuple of access token and its expiry in seconds since epoch.
+    Raises:
+      CredentialsError: Failed to obtain access token.
+    """
+    raise NotImplementedError()
+
+
+class ServiceAccountKeyProvider(CredentialProvider):
+  """Obtains access token with service account private key in JSON file."""
+
+  def __init__(self, key_file, scope):
+    """Constructor.
+
+    Args:
+      key_file: Path to service account key file in JSON, which has
+          'client_email' and 'private_key'.
+      scope: OAuth2 scope URL, or list of them.
+    """
+    self._key_file = key_file
+    self._scope = scope
+
+  def CacheKey(self):
+    return 'service_account:%s:%s' % (os.path.abspath(self._key_file),
+                                      self._scope)
+
+  def FetchAccessToken(self):
+    with open(self._key_file) as f:
+      key = json.load(f)
+    # SignedJwtAssertionCredentials is only available when PyOpenSSL or
+    # PyCrypto is installed.
+    assertion_class = getattr(oauth2client.client,
+                              'SignedJwtAssertionCredentials', None)
+    if not assertion_class:
+      raise CredentialsError(
+          'Service account key requires PyOpenSSL or PyCrypto library.')
+    credentials = assertion_class(
+        key['client_email'], key['private_key'], self._scope,
+        user_agent=USER_AGENT)
+    try:
+      credentials.refresh(httplib2.Http())
+    except oauth2client.client.Error as e:
+      raise CredentialsError('Failed to refresh service account token: %s' % e)
+    expiry = credentials.token_expiry
+    return (credentials.access_token,
+            calendar.timegm(expiry.timetuple()) if expiry else
+            time.time() + 3600)
+
+
+class MetadataServerProvider(CredentialProvider):
+  """Obtains access token of default service account from metadata server.
+
+  It works on Compute Engine instances, or against any stand-in server that
+  serves the same protocol at the URL.
+  """
+
+  def __init__(self, token_url=METADATA_TOKEN_URL):
+    self._token_url = token_url
+
+  def CacheKey(self):
+    return 'metadata:%s' % self._token_url
+
+  def FetchAccessToken(self):
+    try:
+      response, content = httplib2.Http(timeout=10).request(
+          self._token_url, headers={'Metadata-Flavor': 'Google'})
+    except (httplib2.HttpLib2Error, IOError) as e:
+      raise CredentialsError('Metadata server is not reachable: %s' % e)
+    if response.status != 200:
+      raise CredentialsError('Metadata server returned status %d' %
+                             response.status)
+    token = json.loads(content)
+    return token['access_token'], time.time() + int(token['expires_in'])
+
+
+class TokenCache(object):
+  """Access token cache shared by processes through a locked file."""
+
+  def __init__(self, path, min_lifetime=60):
+    """Constructor.
+
+    Args:
+      path: Path to cache file.  '.lock' file is created next to it.
+      min_lifetime: Tokens expiring within the seconds are refreshed.
+    """
+    self._path = path
+    self._min_lifetime = min_lifetime
+    self._memory = {}
+    self._thread_lock = threading.Lock()
+
+  def _IsFresh(self, entry):
+    return entry and entry['expiry'] - time.time() > self._min_lifetime
+
+  def _ReadFile(self):
+    try:
+      with open(self._path) as f:
+        return json.load(f)
+    except (IOError, ValueError):
+      return {}
+
+  def _WriteFile(self, contents):
+    directory = os.path.dirname(os.path.abspath(self._path))
+    f = tempfile.NamedTemporaryFile(
+        'w', dir=directory, prefix='.token-', delete=False)
+    try:
+      os.chmod(f.name, 0600)
+      json.dump(contents, f)
+      f.close()
+      os.rename(f.name, self._path)
+    except:
+      f.close()
+      os.remove(f.name)
+      raise
+
+  def GetAccessToken(self, provider):
+    """Gets valid access token from cache, or from provider if necessary.
+
+    Args:
+      provider: CredentialProvider to fetch new token from.
+    Returns:
+      Access token in string.
+    Raises:
+      CredentialsError: Failed to obtain access token.
+    """
+    key = provider.CacheKey()
+    with self._thread_lock:
+      entry = self._memory.get(key)
+      if self._IsFresh(entry):
+        return entry['access_token']
+
+      with open(self._path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+          contents = self._ReadFile()
+          entry = contents.get(key)
+          if not self._IsFresh(entry):
+            logging.debug('Refreshing access token: %s', key)
+            access_token, expiry = provider.FetchAccessToken()
+            entry = {'access_token': access_token, 'expiry': expiry}
+            contents[key] = entry
+            self._WriteFile(contents)
+        finally:
+          fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+      self._memory[key] = entry
+      return entry['access_token']
+
+
+class CachedCredentials(object):
+  """Authorizes HTTP with access token from provider through token cache."""
+
+  def __init__(self, provider, token_cache):
+    self._provider = provider
+    self._token_cache = token_cache
+
+  def authorize(self, http):
+    """Authorizes HTTP object, as oauth2client.client.Credentials does.
+
+    Args:
+      http: httplib2.Http object.
+    Returns:
+      HTTP object authorized with access token.
+    """
+    access_token = self._token_cache.GetAccessToken(self._provider)
+    credentials = oauth2client.client.AccessTokenCredentials(
+        access_token, USER_AGENT)
+    return credentials.authorize(http)
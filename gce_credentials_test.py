@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of gce_credentials.py."""
+
+
+
+import BaseHTTPServer
+import datetime
+import json
+import os.path
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import mock
+from mock import MagicMock
+
+import gce_credentials
+from gce_credentials import CachedCredentials
+from gce_credentials import CredentialProvider
+from gce_credentials import CredentialsError
+from gce_credentials import MetadataServerProvider
+from gce_credentials import ServiceAccountKeyProvider
+from gce_credentials import TokenCache
+
+
+class FakeProvider(CredentialProvider):
+  """Credential provider that counts token fetches."""
+
+  def __init__(self, lifetime=3600, delay=0):
+    self.lifetime = lifetime
+    self.delay = delay
+    self.fetch_count = 0
+
+  def CacheKey(self):
+    return 'fake'
+
+  def FetchAccessToken(self):
+    time.sleep(self.delay)
+    self.fetch_count += 1
+    return 'token-%d' % self.fetch_count, time.time() + self.lifetime
+
+
+class TokenCacheTest(unittest.TestCase):
+  """Unit test class of TokenCache."""
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.cache_file = os.path.join(self.temp_dir, 'token_cache')
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+  def testGetAccessToken_Cached(self):
+    provider = FakeProvider()
+
+    self.assertEqual('token-1',
+                     TokenCache(self.cache_file).GetAccessToken(provider))
+    # Another cache object, e.g. in another process, reuses the token.
+    self.assertEqual('token-1',
+                     TokenCache(self.cache_file).GetAccessToken(provider))
+    self.assertEqual(1, provider.fetch_count)
+    self.assertEqual(0600, os.stat(self.cache_file).st_mode & 0777)
+
+  def testGetAccessToken_Expired(self):
+    # Token expiring within minimum lifetime is refreshed.
+    provider = FakeProvider(lifetime=30)
+    cache = TokenCache(self.cache_file, min_lifetime=60)
+
+    self.assertEqual('token-1', cache.GetAccessToken(provider))
+    self.assertEqual('token-2', cache.GetAccessToken(provider))
+    self.assertEqual(2, provider.fetch_count)
+
+  def testGetAccessToken_CorruptedFile(self):
+    with open(self.cache_file, 'w') as f:
+      f.write('not JSON')
+
+    self.assertEqual('token-1',
+                     TokenCache(self.cache_file).GetAccessToken(
+                         FakeProvider()))
+
+  def testGetAccessToken_Concurrent(self):
+    provider = FakeProvider(delay=0.2)
+    tokens = []
+
+    def Get():
+      # Each thread has its own cache object, and only shares the file.
+      tokens.append(TokenCache(self.cache_file).GetAccessToken(provider))
+
+    threads = [threading.Thread(target=Get) for _ in xrange(5)]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    self.assertEqual(['token-1'] * 5, tokens)
+    self.assertEqual(1, provider.fetch_count)
+
+
+class _FakeMetadataHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+  """Stand-in of metadata server that serves access token."""
+
+  def do_GET(self):  # pylint: disable=invalid-name
+    if self.headers.get('Metadata-Flavor') != 'Google':
+      self.send_response(403)
+      self.end_headers()
+      return
+    self.send_response(200)
+    self.send_header('Content-Type', 'application/json')
+    self.end_headers()
+    self.wfile.write(json.dumps(
+        {'access_token': 'metadata-token', 'expires_in': 1800,
+         'token_type': 'Bearer'}))
+
+  def log_message(self, *unused_args):
+    pass
+
+
+class MetadataServerProviderTest(unittest.TestCase):
+  """Unit test class of MetadataServerProvider."""
+
+  def setUp(self):
+    self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                            _FakeMetadataHandler)
+    thread = threading.Thread(target=self.server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    self.url = 'http://127.0.0.1:%d/token' % self.server.server_port
+
+  def tearDown(self):
+    mock.patch.stopall()
+    self.server.shutdown()
+    self.server.server_close()
+
+  def testFetchAccessToken(self):
+    token, expiry = MetadataServerProvider(self.url).FetchAccessToken()
+
+    self.assertEqual('metadata-token', token)
+    self.assertAlmostEqual(time.time() + 1800, expiry, delta=10)
+
+  def testFetchAccessToken_Forbidden(self):
+    mock.patch('httplib2.Http.request', return_value=(
+        MagicMock(status=403), '')).start()
+
+    self.assertRaises(CredentialsError,
+                      MetadataServerProvider(self.url).FetchAccessToken)
+
+  def testFetchAccessToken_Unreachable(self):
+    # Nothing listens on port 1.
+    self.assertRaises(
+        CredentialsError,
+        MetadataServerProvider('http://127.0.0.1:1/token').FetchAccessToken)
+
+
+class ServiceAccountKeyProviderTest(unittest.TestCase):
+  """Unit test class of ServiceAccountKeyProvider."""
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.key_file = os.path.join(self.temp_dir, 'key.json')
+    with open(self.key_file, 'w') as f:
+      json.dump({'client_email': 'sa@example.com',
+                 'private_key': 'PRIVATE KEY'}, f)
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+    mock.patch.stopall()
+
+  def testFetchAccessToken(self):
+    mock_credentials_class = mock.patch(
+        'oauth2client.client.SignedJwtAssertionCredentials',
+        create=True).start()
+    mock_credentials = mock_credentials_class.return_value
+    mock_credentials.access_token = 'service-account-token'
+    mock_credentials.token_expiry = datetime.datetime(2030, 1, 1)
+
+    token, expiry = ServiceAccountKeyProvider(
+        self.key_file, 'scope-url').FetchAccessToken()
+
+    mock_credentials_class.assert_called_once_with(
+        'sa@example.com', 'PRIVATE KEY', 'scope-url', user_agent=mock.ANY)
+    self.assertEqual(1, mock_credentials.refresh.call_count)
+    self.assertEqual('service-account-token', token)
+    self.assertEqual(1893456000, expiry)
+
+  def testFetchAccessToken_NoCryptoLibrary(self):
+    mock.patch('oauth2client.client.SignedJwtAssertionCredentials', None,
+               create=True).start()
+
+    self.assertRaises(
+        CredentialsError,
+        ServiceAccountKeyProvider(self.key_file, 'scope').FetchAccessToken)
+
+
+class CachedCredentialsTest(unittest.TestCase):
+  """Unit test class of CachedCredentials."""
+
+  def tearDown(self):
+    mock.patch.stopall()
+
+  def testAuthorize(self):
+    mock_token_cache = MagicMock(spec=TokenCache)
+    mock_token_cache.GetAccessToken.return_value = 'cached-token'
+    mock_credentials_class = mock.patch(
+        'oauth2client.client.AccessTokenCredentials').start()
+    provider = FakeProvider()
+
+    http = CachedCredentials(provider, mock_token_cache).authorize('http')
+
+    mock_token_cache.GetAccessToken.assert_called_once_with(provider)
+    mock_credentials_class.assert_called_once_with(
+        'cached-token', gce_credentials.USER_AGENT)
+    mock_credentials_class.return_value.authorize.assert_called_once_with(
+        'http')
+    self.assertEqual(
+        mock_credentials_class.return_value.authorize.return_value, http)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,404 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to read and write JMeter samples in compact binary format.
+
+Binary results hold the sample fields run reports use: timestamp, elapsed,
+label, response code, success, bytes and hostname.  The file begins with
+MAGIC, followed by blocks of up to block size samples.  Each block is
+
+  header: struct BLOCK_HEADER of sample count, payload length, and minimum
+      and maximum timestamp in ms
+  payload:
+    new strings of label, response code and hostname dictionaries, each as
+        varint count followed by varint length and bytes of each string
+    columns of timestamp, elapsed, label ID, response code ID, hostname ID
+        and bytes, each as varint length in bytes followed by the values
+    success flags packed into bits, least significant bit first
+
+Timestamps are stored as zigzag-encoded deltas from the previous sample,
+the first one from the minimum timestamp of the block, and the other
+integers as varints.  Strings get dictionary IDs in the order they first
+appear, so blocks are read in order.  Blocks out of time range are skipped
+by the header without decoding.
+"""
+
+
+
+import csv
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+import jmeter_report
+
+
+MAGIC = 'JTLB\x01'
+BLOCK_HEADER = struct.Struct('<IIqq')
+DEFAULT_BLOCK_SIZE = 8192
+# Columns of varints in the order they're stored.
+COLUMNS = ['timestamp', 'elapsed', 'label', 'response_code', 'hostname',
+           'bytes']
+# Columns of dictionary IDs.
+DICTIONARY_COLUMNS = ['label', 'response_code', 'hostname']
+
+
+def _AppendVarint(out, value):
+  """Appends unsigned integer to bytearray in varint encoding."""
+  while value >= 0x80:
+    out.append((value & 0x7f) | 0x80)
+    value >>= 7
+  out.append(value)
+
+
+def _DecodeVarints(data):
+  """Decodes all varints of bytearray into list of integers."""
+  values = []
+  append = values.append
+  value = shift = 0
+  for byte in data:
+    if byte < 0x80:
+      append(value | (byte << shift))
+      value = shift = 0
+    else:
+      value |= (byte & 0x7f) << shift
+      shift += 7
+  return values
+
+
+def _ZigZag(value):
+  return (value << 1) if value >= 0 else ((-value << 1) - 1)
+
+
+def _UnZigZag(value):
+  return (value >> 1) if not value & 1 else -((value + 1) >> 1)
+
+
+def IsBinaryResults(path):
+  """Returns whether the file is in binary results format."""
+  with open(path, 'rb') as f:
+    return f.read(len(MAGIC)) == MAGIC
+
+
+class BinaryResultsWriter(object):
+  """Writes samples in binary results format."""
+
+  def __init__(self, output, block_size=DEFAULT_BLOCK_SIZE):
+    """Constructor.
+
+    Args:
+      output: File object opened for binary write.
+      block_size: Number of samples per block.
+    """
+    self._output = output
+    self._block_size = block_size
+    self._dictionaries = dict((column, {}) for column in DICTIONARY_COLUMNS)
+    self._samples = []
+    self.count = 0
+    output.write(MAGIC)
+
+  def Write(self, sample):
+    """Writes sample dictionary, as returned by ReadJtlSamples()."""
+    self._samples.append(sample)
+    if len(self._samples) >= self._block_size:
+      self.Flush()
+
+  def _EncodeStrings(self, payload, samples):
+    for column in DICTIONARY_COLUMNS:
+      dictionary = self._dictionaries[column]
+      new_strings = []
+      for sample in samples:
+        value = sample[column]
+        if value not in dictionary:
+          dictionary[value] = len(dictionary)
+          new_strings.append(value)
+      _AppendVarint(payload, len(new_strings))
+      for value in new_strings:
+        value = value.encode('utf-8') if isinstance(value, unicode) else value
+        _AppendVarint(payload, len(value))
+        payload.extend(value)
+
+  def Flush(self):
+    """Writes samples written so far as a block."""
+    samples = self._samples
+    if not samples:
+      return
+    self._samples = []
+    payload = bytearray()
+    self._EncodeStrings(payload, samples)
+    min_timestamp = min(s['timestamp'] for s in samples)
+    max_timestamp = max(s['timestamp'] for s in samples)
+
+    for column in COLUMNS:
+      data = bytearray()
+      if column == 'timestamp':
+        previous = min_timestamp
+        for sample in samples:
+          _AppendVarint(data, _ZigZag(sample['timestamp'] - previous))
+          previous = sample['timestamp']
+      elif column in DICTIONARY_COLUMNS:
+        dictionary = self._dictionaries[column]
+        for sample in samples:
+          _AppendVarint(data, dictionary[sample[column]])
+      else:
+        for sample in samples:
+          # Negative values can't be encoded, and never make sense here.
+          _AppendVarint(data, max(0, sample[column]))
+      _AppendVarint(payload, len(data))
+      payload.extend(data)
+
+    flags = bytearray((len(samples) + 7) // 8)
+    for position, sample in enumerate(samples):
+      if sample['success']:
+        flags[position >> 3] |= 1 << (position & 7)
+    payload.extend(flags)
+
+    self._output.write(BLOCK_HEADER.pack(len(samples), len(payload),
+                                         min_timestamp, max_timestamp))
+    self._output.write(payload)
+    self.count += len(samples)
+
+  def Close(self):
+    """Writes the last block.  The output file is left open."""
+    self.Flush()
+
+
+class BinaryResultsReader(object):
+  """Reads binary results through memory map.
+
+  The file is mapped rather than read, so that only the blocks being decoded
+  are brought into memory.
+  """
+
+  def __init__(self, path):
+    self._file = open(path, 'rb')
+    self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+    if self._map[:len(MAGIC)] != MAGIC:
+      self.Close()
+      raise ValueError('%s is not in binary results format' % path)
+    # Dictionaries of strings by ID, filled as blocks are read.
+    self.dictionaries = None
+
+  def Close(self):
+    self._map.close()
+    self._file.close()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *unused_exc_info):
+    self.Close()
+
+  def _ReadVarint(self, offset):
+    """Returns tuple of varint at the offset and offset after it."""
+    value = shift = 0
+    while True:
+      byte = ord(self._map[offset])
+      offset += 1
+      value |= (byte & 0x7f) << shift
+      if byte < 0x80:
+        return value, offset
+      shift += 7
+
+  def _ReadStrings(self, offset):
+    for column in DICTIONARY_COLUMNS:
+      count, offset = self._ReadVarint(offset)
+      for _ in xrange(count):
+        length, offset = self._ReadVarint(offset)
+        self.dictionaries[column].append(self._map[offset:offset + length])
+        offset += length
+    return offset
+
+  def IterBlocks(self, start_ms=None, end_ms=None):
+    """Decodes blocks into columns.
+
+    Args:
+      start_ms: Blocks ending before the time are skipped.  None for all.
+      end_ms: Blocks starting after the time are skipped.  None for all.
+    Yields:
+      Dictionary of column name in COLUMNS and 'success' to list of values
+      of the block.  Columns in DICTIONARY_COLUMNS hold IDs, which index
+      the lists of the dictionaries attribute.
+    """
+    self.dictionaries = dict((column, []) for column in DICTIONARY_COLUMNS)
+    offset = len(MAGIC)
+    size = len(self._map)
+    while offset + BLOCK_HEADER.size <= size:
+      count, length, min_timestamp, max_timestamp = BLOCK_HEADER.unpack_from(
+          self._map, offset)
+      offset += BLOCK_HEADER.size
+      end = offset + length
+      if end > size:
+        # Truncated block, e.g. of file that is still being written.
+        return
+      # Dictionary strings are read from all blocks, so that IDs of later
+      # blocks resolve.
+      offset = self._ReadStrings(offset)
+      if ((start_ms is not None and max_timestamp < start_ms) or
+          (end_ms is not None and min_timestamp > end_ms)):
+        offset = end
+        continue
+
+      block = {}
+      for column in COLUMNS:
+        data_length, offset = self._ReadVarint(offset)
+        block[column] = _DecodeVarints(
+            bytearray(buffer(self._map, offset, data_length)))
+        offset += data_length
+      timestamps = block['timestamp']
+      timestamp = min_timestamp
+      for position, delta in enumerate(timestamps):
+        timestamp += _UnZigZag(delta)
+        timestamps[position] = timestamp
+      flags = bytearray(buffer(self._map, offset, (count + 7) // 8))
+      block['success'] = [bool(flags[p >> 3] & (1 << (p & 7)))
+                          for p in xrange(count)]
+      offset = end
+      yield block
+
+  def __iter__(self):
+    """Yields samples in the same dictionaries as ReadJtlSamples()."""
+    for block in self.IterBlocks():
+      labels = self.dictionaries['label']
+      codes = self.dictionaries['response_code']
+      hostnames = self.dictionaries['hostname']
+      for sample in zip(block['timestamp'], block['elapsed'], block['label'],
+                        block['response_code'], block['success'],
+                        block['bytes'], block['hostname']):
+        yield {
+            'timestamp': sample[0],
+            'elapsed': sample[1],
+            'label': labels[sample[2]],
+            'response_code': codes[sample[3]],
+            'success': sample[4],
+            'bytes': sample[5],
+            'hostname': hostnames[sample[6]],
+        }
+
+
+def ConvertJtl(jtl_file, output, block_size=DEFAULT_BLOCK_SIZE):
+  """Converts JMeter CSV results into binary results.
+
+  Args:
+    jtl_file: File object of JMeter CSV result.
+    output: File object to write binary results to.
+    block_size: Number of samples per block.
+  Returns:
+    Number of samples converted.
+  """
+  writer = BinaryResultsWriter(output, block_size)
+  for sample in jmeter_report.ReadJtlSamples(jtl_file):
+    writer.Write(sample)
+  writer.Close()
+  return writer.count
+
+
+def Benchmark(jtl_path, block_size=DEFAULT_BLOCK_SIZE):
+  """Compares size and parse time of CSV results and binary results.
+
+  Args:
+    jtl_path: Path to JMeter CSV result file.
+    block_size: Number of samples per block of binary results.
+  Returns:
+    Dictionary with 'samples', 'csv_bytes', 'binary_bytes', 'convert_seconds'
+    and parse seconds of 'csv_seconds' (ReadJtlSamples()), 'binary_seconds'
+    (samples of BinaryResultsReader) and 'binary_column_seconds'
+    (BinaryResultsReader.IterBlocks()).
+  """
+  fd, binary_path = tempfile.mkstemp(suffix='.jtlb')
+  try:
+    with os.fdopen(fd, 'wb') as output:
+      with open(jtl_path) as jtl_file:
+        start = time.time()
+        samples = ConvertJtl(jtl_file, output, block_size)
+        convert_seconds = time.time() - start
+
+    start = time.time()
+    with open(jtl_path) as jtl_file:
+      for _ in jmeter_report.ReadJtlSamples(jtl_file):
+        pass
+    csv_seconds = time.time() - start
+
+    start = time.time()
+    with BinaryResultsReader(binary_path) as reader:
+      for _ in reader:
+        pass
+    binary_seconds = time.time() - start
+
+    start = time.time()
+    with BinaryResultsReader(binary_path) as reader:
+      for _ in reader.IterBlocks():
+        pass
+    binary_column_seconds = time.time() - start
+
+    return {
+        'samples': samples,
+        'csv_bytes': os.path.getsize(jtl_path),
+        'binary_bytes': os.path.getsize(binary_path),
+        'convert_seconds': convert_seconds,
+        'csv_seconds': csv_seconds,
+        'binary_seconds': binary_seconds,
+        'binary_column_seconds': binary_column_seconds,
+    }
+  finally:
+    os.remove(binary_path)
+
+
+def FormatBenchmark(result):
+  """Returns human readable benchmark result in string."""
+  samples = max(result['samples'], 1)
+  lines = [
+      '%d samples' % result['samples'],
+      '%-24s %12s %12s %14s' % ('', 'bytes', 'bytes/sample', 'samples/s'),
+  ]
+  for name, size, seconds in [
+      ('CSV', result['csv_bytes'], result['csv_seconds']),
+      ('binary', result['binary_bytes'], result['binary_seconds']),
+      ('binary (columns)', result['binary_bytes'],
+       result['binary_column_seconds'])]:
+    lines.append('%-24s %12d %12.1f %14.0f' % (
+        name, size, float(size) / samples,
+        result['samples'] / seconds if seconds else float('inf')))
+  lines.append('Size ratio: %.1fx smaller' % (
+      float(result['csv_bytes']) / max(result['binary_bytes'], 1)))
+  return '\n'.join(lines)
+
+
+def WriteSampleJtl(jtl_file, count, labels=10, hosts=4, start_ms=None):
+  """Writes synthetic JMeter CSV results, e.g. to benchmark with.
+
+  Args:
+    jtl_file: File object to write to.
+    count: Number of samples.
+    labels: Number of distinct labels.
+    hosts: Number of distinct hostnames.
+    start_ms: Timestamp of the first sample.  Defaults to the current time.
+  """
+  writer = csv.writer(jtl_file, lineterminator='\n')
+  writer.writerow(['timeStamp', 'elapsed', 'label', 'responseCode',
+                   'success', 'bytes', 'Hostname'])
+  timestamp = start_ms if start_ms is not None else int(time.time() * 1000)
+  for number in xrange(count):
+    # Deterministic but irregular values, without depending on random.
+    timestamp += number % 3
+    elapsed = 20 + (number * 7919) % 500
+    success = number % 97 != 0
+    writer.writerow([timestamp, elapsed, 'label-%d' % (number % labels),
+                     '200' if success else '500',
+                     'true' if success else 'false',
+                     1000 + (number * 31) % 4000,
+                     'server-%03d' % (number % hosts)])
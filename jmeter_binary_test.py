@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of jmeter_binary.py."""
+
+
+
+import os
+import shutil
+import StringIO
+import tempfile
+import unittest
+
+import jmeter_binary
+from jmeter_binary import BinaryResultsReader
+from jmeter_binary import BinaryResultsWriter
+import jmeter_report
+
+
+JTL = (
+    'timeStamp,elapsed,label,responseCode,success,bytes,Hostname\n'
+    '1400000000000,120,home,200,true,1000,server-000\n'
+    '1400000000005,80,login,200,true,500,server-001\n'
+    # Timestamps may go backwards, as samples are written when they finish.
+    '1399999999990,3000,home,500,false,0,server-000\n'
+    '1400000000300,200,search,200,true,70000,server-001\n'
+    '1400000000310,90,home,200,true,1000,server-000\n')
+
+
+class JMeterBinaryTest(unittest.TestCase):
+  """Unit test class of binary results format."""
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.path = os.path.join(self.temp_dir, 'results.jtlb')
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+  def _Convert(self, jtl, block_size=jmeter_binary.DEFAULT_BLOCK_SIZE):
+    with open(self.path, 'wb') as f:
+      return jmeter_binary.ConvertJtl(StringIO.StringIO(jtl), f, block_size)
+
+  def testVarints(self):
+    data = bytearray()
+    values = [0, 1, 127, 128, 300, 2 ** 35]
+    for value in values:
+      jmeter_binary._AppendVarint(data, value)
+
+    self.assertEqual(values, jmeter_binary._DecodeVarints(data))
+    self.assertEqual(1 + 1 + 1 + 2 + 2 + 6, len(data))
+
+  def testZigZag(self):
+    for value in [0, 1, -1, 63, -64, 10 ** 12, -10 ** 12]:
+      self.assertEqual(value,
+                       jmeter_binary._UnZigZag(jmeter_binary._ZigZag(value)))
+    self.assertEqual([0, 2, 1, 3], [jmeter_binary._ZigZag(v)
+                                    for v in [0, 1, -1, -2]])
+
+  def testConvertAndRead(self):
+    # Blocks of 2 samples, so that dictionaries span blocks.
+    self.assertEqual(5, self._Convert(JTL, block_size=2))
+
+    with BinaryResultsReader(self.path) as reader:
+      samples = list(reader)
+    self.assertEqual(
+        list(jmeter_report.ReadJtlSamples(StringIO.StringIO(JTL))), samples)
+
+  def testIterBlocks(self):
+    self._Convert(JTL, block_size=2)
+
+    with BinaryResultsReader(self.path) as reader:
+      blocks = list(reader.IterBlocks())
+      self.assertEqual(['home', 'login', 'search'],
+                       reader.dictionaries['label'])
+    self.assertEqual([2, 2, 1], [len(b['timestamp']) for b in blocks])
+    self.assertEqual([1399999999990, 1400000000300], blocks[1]['timestamp'])
+    self.assertEqual([0, 2], blocks[1]['label'])
+    self.assertEqual([False, True], blocks[1]['success'])
+    self.assertEqual([70000], blocks[1]['bytes'][1:])
+
+  def testIterBlocks_TimeRange(self):
+    self._Convert(JTL, block_size=2)
+
+    with BinaryResultsReader(self.path) as reader:
+      blocks = list(reader.IterBlocks(start_ms=1400000000100,
+                                      end_ms=1400000000305))
+      # Strings of skipped blocks are still in the dictionaries.
+      self.assertEqual(['home', 'login', 'search'],
+                       reader.dictionaries['label'])
+    self.assertEqual([[1399999999990, 1400000000300]],
+                     [b['timestamp'] for b in blocks])
+
+  def testRead_TruncatedBlock(self):
+    self._Convert(JTL, block_size=2)
+    with open(self.path, 'rb+') as f:
+      f.truncate(os.path.getsize(self.path) - 3)
+
+    with BinaryResultsReader(self.path) as reader:
+      self.assertEqual(4, len(list(reader)))
+
+  def testRead_NotBinary(self):
+    with open(self.path, 'w') as f:
+      f.write(JTL)
+
+    self.assertFalse(jmeter_binary.IsBinaryResults(self.path))
+    self.assertRaises(ValueError, BinaryResultsReader, self.path)
+
+  def testWriter_Empty(self):
+    with open(self.path, 'wb') as f:
+      BinaryResultsWriter(f).Close()
+
+    self.assertTrue(jmeter_binary.IsBinaryResults(self.path))
+    with BinaryResultsReader(self.path) as reader:
+      self.assertEqual([], list(reader))
+
+  def testBenchmark(self):
+    jtl_path = os.path.join(self.temp_dir, 'results.jtl')
+    with open(jtl_path, 'w') as f:
+      jmeter_binary.WriteSampleJtl(f, 1000, start_ms=1400000000000)
+
+    result = jmeter_binary.Benchmark(jtl_path)
+
+    self.assertEqual(1000, result['samples'])
+    self.assertLess(result['binary_bytes'] * 3, result['csv_bytes'])
+    self.assertIn('Size ratio', jmeter_binary.FormatBenchmark(result))
+
+
+if __name__ == '__main__':
+  unittest.main()
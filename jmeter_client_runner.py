@@ -0,0 +1,336 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to run JMeter client headless and manage the run lifecycle.
+
+JMeter client runs in non-GUI remote mode, and its output is parsed into
+structured events, such as periodic summaries.  The run is stopped when it
+exceeds the timeout or on SIGINT.  Stopping sends 'StopTestNow' to the
+client's UDP shutdown port, so that the client stops remote servers cleanly,
+and the process group of the client is terminated only if it doesn't exit
+in time, and killed if it doesn't exit after termination either.
+
+With a segmenter, results are streamed instead of being written to local
+results file.  JMeter client writes results to a named pipe, whose lines
+are rolled into segments and uploaded during the run.
+"""
+
+
+
+import json
+import logging
+import os
+import os.path
+import Queue
+import re
+import signal
+import socket
+import subprocess
+import threading
+import time
+
+import jmeter_segments
+
+
+EVENTS_FILE = 'events.jsonl'
+SUMMARY_FILE = 'summary.json'
+SEGMENTS_DIR = 'segments'
+RESULTS_FILE = 'results.jtl'
+LOG_FILE = 'jmeter.log'
+
+# Default of jmeterengine.nongui.port in jmeter.properties.
+DEFAULT_SHUTDOWN_PORT = 4445
+STOP_GRACE_SECONDS = 30
+# JMeter client listens to the shutdown port only while the test is running,
+# so the stop command is resent until the client exits.
+STOP_RESEND_SECONDS = 5
+
+# Summariser output, e.g.
+#   summary +    523 in  30.1s =   17.4/s Avg:   120 Min:    10 Max:  1200 \
+#   Err:     0 (0.00%) Active: 10 Started: 10 Finished: 0
+# Elapsed time is printed as '00:00:30' by newer JMeter, and active thread
+# counts are not printed by older JMeter.
+SUMMARY_PATTERN = re.compile(
+    r'^summary ([+=])\s+(\d+) in\s+([\d:.]+)s?\s+=\s+([\d.]+)/s\s+'
+    r'Avg:\s+(-?\d+)\s+Min:\s+(-?\d+)\s+Max:\s+(-?\d+)\s+'
+    r'Err:\s+(\d+)\s+\(([\d.]+)%\)'
+    r'(?:\s+Active:\s+(\d+)\s+Started:\s+(\d+)\s+Finished:\s+(\d+))?')
+REMOTE_PATTERN = re.compile(
+    r'^(Starting|Finished) the test on host (\S+)')
+
+
+def _ParseSeconds(elapsed):
+  """Parses elapsed time of summariser, either '30.1' or '00:00:30'."""
+  seconds = 0.0
+  for part in elapsed.split(':'):
+    seconds = seconds * 60 + float(part)
+  return seconds
+
+
+def ParseLine(line):
+  """Parses output line of JMeter client into event.
+
+  Args:
+    line: Line of JMeter client output, without newline.
+  Returns:
+    Event in dictionary with 'type' and type-specific fields.
+  """
+  match = SUMMARY_PATTERN.match(line)
+  if match:
+    event = {
+        'type': 'summary' if match.group(1) == '=' else 'progress',
+        'samples': int(match.group(2)),
+        'seconds': _ParseSeconds(match.group(3)),
+        'throughput': float(match.group(4)),
+        'mean': int(match.group(5)),
+        'min': int(match.group(6)),
+        'max': int(match.group(7)),
+        'errors': int(match.group(8)),
+        'error_rate': float(match.group(9)) / 100,
+    }
+    if match.group(10) is not None:
+      event['active_threads'] = int(match.group(10))
+    return event
+
+  match = REMOTE_PATTERN.match(line)
+  if match:
+    return {'type': 'server_%s' % match.group(1).lower(),
+            'server': match.group(2)}
+  if 'end of run' in line:
+    return {'type': 'end'}
+  if line.startswith('Error') or 'Exception' in line:
+    return {'type': 'error', 'message': line}
+  return {'type': 'output', 'message': line}
+
+
+def _SignalProcessGroup(process, sig):
+  """Sends signal to the process group led by the process.
+
+  jmeter.sh doesn't exec the JVM, so signaling only the process would leave
+  the JVM running with the output pipe open.
+  """
+  try:
+    os.killpg(process.pid, sig)
+  except OSError:
+    # All processes of the group have exited.
+    pass
+
+
+class ClientRunner(object):
+  """Runs JMeter client in non-GUI remote mode and manages the run."""
+
+  def __init__(self, command, results_dir, timeout=None,
+               shutdown_port=DEFAULT_SHUTDOWN_PORT,
+               stop_grace_seconds=STOP_GRACE_SECONDS, on_event=None,
+               segmenter=None):
+    """Constructor.
+
+    Args:
+      command: List of JMeter client command and parameters to prepend,
+          e.g. ['jmeter.sh', '-q', 'cluster.properties'].
+      results_dir: Directory of this run, to write results, JMeter log,
+          events and summary to.
+      timeout: Seconds after which the run is stopped.  None for no limit.
+      shutdown_port: UDP port JMeter client listens to for stop command.
+      stop_grace_seconds: Seconds to wait for JMeter client to exit after
+          stop command before terminating it, and then after termination
+          before killing it.
+      on_event: Function called with each event, e.g. to show progress.
+      segmenter: jmeter_segments.Segmenter object to stream results to.
+          None to write results to local file.
+    """
+    self._command = list(command)
+    self.results_dir = results_dir
+    self._timeout = timeout
+    self._shutdown_port = shutdown_port
+    self._stop_grace_seconds = stop_grace_seconds
+    self._on_event = on_event
+    self._segmenter = segmenter
+    self._interrupted = False
+
+  def _MakeCommand(self, plan, jmeter_args):
+    return self._command + [
+        '-n', '-r', '-t', plan,
+        '-l', os.path.join(self.results_dir, RESULTS_FILE),
+        '-j', os.path.join(self.results_dir, LOG_FILE)] + list(jmeter_args)
+
+  def _SendStopCommand(self, command='StopTestNow'):
+    """Sends stop command to JMeter client over UDP."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+      sock.sendto(command, ('127.0.0.1', self._shutdown_port))
+    except socket.error as e:
+      logging.warning('Failed to send %s to JMeter client: %s', command, e)
+    finally:
+      sock.close()
+
+  def _HandleSigint(self, signum, frame):  # pylint: disable=unused-argument
+    logging.warning('Interrupted.  Stopping test on remote servers...')
+    self._interrupted = True
+
+  @staticmethod
+  def _ReadLines(stream, lines):
+    for line in iter(stream.readline, ''):
+      lines.put(line.rstrip('\r\n'))
+    lines.put(None)
+
+  def _StreamResults(self, path, done):
+    """Reads results from the named pipe until the client exits."""
+    # JMeter client may open the results file more than once.
+    while not done.is_set():
+      with open(path) as f:
+        jmeter_segments.ReadStream(f, self._segmenter)
+
+  @staticmethod
+  def _StopStreaming(path, streamer, done):
+    """Stops results streaming thread after the client exited."""
+    done.set()
+    while streamer.is_alive():
+      # Opening the pipe for write releases the thread waiting in open().
+      try:
+        os.close(os.open(path, os.O_WRONLY | os.O_NONBLOCK))
+      except OSError:
+        pass
+      streamer.join(1)
+
+  def Run(self, plan, jmeter_args=()):
+    """Runs the test plan and waits until the run finishes.
+
+    Args:
+      plan: Path to JMeter test plan.
+      jmeter_args: List of additional parameters passed to JMeter client.
+    Returns:
+      Summary of the run in dictionary, with 'exit_status', 'timed_out',
+      'interrupted', 'duration_seconds', 'servers' and the last cumulative
+      summary of JMeter summariser under 'stats'.  With segmenter, 'results'
+      is URL of uploaded results, and 'segments' and 'results_complete'
+      are added.
+    """
+    if not os.path.isdir(self.results_dir):
+      os.makedirs(self.results_dir)
+    command = self._MakeCommand(plan, jmeter_args)
+    results_path = os.path.join(self.results_dir, RESULTS_FILE)
+    if self._segmenter:
+      os.mkfifo(results_path)
+      streaming_done = threading.Event()
+      streamer = threading.Thread(target=self._StreamResults,
+                                  args=(results_path, streaming_done))
+      streamer.daemon = True
+      streamer.start()
+    logging.info('Running JMeter client: %s', ' '.join(command))
+
+    try:
+      previous_handler = signal.signal(signal.SIGINT, self._HandleSigint)
+    except ValueError:
+      # Not in main thread.  SIGINT is left to the caller.
+      previous_handler = None
+
+    start = time.time()
+    # JMeter client runs in its own process group, so that SIGINT from
+    # terminal doesn't kill it before remote servers are stopped.
+    process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT,
+                               preexec_fn=os.setpgrp)
+    lines = Queue.Queue()
+    reader = threading.Thread(target=self._ReadLines,
+                              args=(process.stdout, lines))
+    reader.daemon = True
+    reader.start()
+
+    summary = {'stats': None, 'servers': [], 'timed_out': False,
+               'interrupted': False}
+    stop_requested = stop_sent = terminated = None
+    killed = False
+    events_path = os.path.join(self.results_dir, EVENTS_FILE)
+    try:
+      with open(events_path, 'w') as events_file:
+        while True:
+          try:
+            line = lines.get(timeout=1)
+          except Queue.Empty:
+            line = ''
+          if line is None:
+            break
+          if line:
+            event = ParseLine(line)
+            event['time'] = time.time()
+            events_file.write(json.dumps(event, sort_keys=True) + '\n')
+            events_file.flush()
+            if event['type'] == 'summary':
+              summary['stats'] = event
+            elif event['type'] == 'server_starting':
+              summary['servers'].append(event['server'])
+            if self._on_event:
+              self._on_event(event)
+
+          now = time.time()
+          if stop_requested is None:
+            if self._interrupted:
+              summary['interrupted'] = True
+            elif self._timeout and now - start > self._timeout:
+              logging.warning('Run exceeded timeout of %d seconds.  '
+                              'Stopping test on remote servers...',
+                              self._timeout)
+              summary['timed_out'] = True
+            if summary['interrupted'] or summary['timed_out']:
+              self._SendStopCommand()
+              stop_requested = stop_sent = now
+          elif killed:
+            pass
+          elif terminated is not None:
+            if now - terminated > self._stop_grace_seconds:
+              logging.warning('JMeter client did not exit.  Killing it.')
+              _SignalProcessGroup(process, signal.SIGKILL)
+              killed = True
+          elif now - stop_requested > self._stop_grace_seconds:
+            logging.warning('JMeter client did not stop in time.  '
+                            'Terminating it.')
+            _SignalProcessGroup(process, signal.SIGTERM)
+            terminated = now
+          elif process.poll() is not None:
+            pass
+          elif now - stop_sent > STOP_RESEND_SECONDS:
+            self._SendStopCommand()
+            stop_sent = now
+      process.wait()
+    finally:
+      if process.poll() is None:
+        _SignalProcessGroup(process, signal.SIGKILL)
+        process.wait()
+      if previous_handler is not None:
+        signal.signal(signal.SIGINT, previous_handler)
+      if self._segmenter:
+        self._StopStreaming(results_path, streamer, streaming_done)
+        os.remove(results_path)
+
+    summary['exit_status'] = process.returncode
+    summary['duration_seconds'] = time.time() - start
+    summary['plan'] = plan
+    if self._segmenter:
+      manifest = self._segmenter.Close()
+      summary['results'] = self._segmenter.url
+      summary['segments'] = len(manifest['segments'])
+      summary['results_complete'] = manifest['complete']
+    else:
+      summary['results'] = results_path
+    with open(os.path.join(self.results_dir, SUMMARY_FILE), 'w') as f:
+      json.dump(summary, f, indent=2, sort_keys=True)
+    return summary
+
+
+def MakeRunDirectory(results_root, name):
+  """Returns per-run results directory named after the name and time."""
+  return os.path.join(results_root, '%s-%s' % (
+      name, time.strftime('%Y%m%d-%H%M%S')))
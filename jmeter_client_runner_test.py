@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of jmeter_client_runner.py."""
+
+
+
+import json
+import os.path
+import shutil
+import socket
+import sys
+import tempfile
+import unittest
+
+import jmeter_client_runner
+from jmeter_client_runner import ClientRunner
+import jmeter_segments
+
+
+# Stand-in of JMeter client.  It writes results, prints summariser output,
+# and then waits for 'StopTestNow' on UDP port given by FAKE_PORT, unless it
+# finishes.
+FAKE_CLIENT = r'''
+import socket
+import sys
+import time
+mode = '%(mode)s'
+if mode == 'wait':
+  sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+  sock.bind(('127.0.0.1', %(port)d))
+print 'Created the tree successfully using plan.jmx'
+print 'Starting the test on host 127.0.0.1:24000 @ Mon Jan 06 2014'
+with open(sys.argv[sys.argv.index('-l') + 1], 'a') as results:
+  results.write('timeStamp,elapsed\n1000,10\n1001,20\n')
+print ('summary +     10 in   1.0s =   10.0/s Avg:   100 Min:    50 '
+       'Max:   200 Err:     1 (10.00%%) Active: 5 Started: 5 Finished: 0')
+sys.stdout.flush()
+if mode == 'wait':
+  if sock.recv(100) != 'StopTestNow':
+    sys.exit(3)
+elif mode == 'hang':
+  time.sleep(60)
+print ('summary =     30 in 00:00:03 =   10.0/s Avg:   110 Min:    50 '
+       'Max:   300 Err:     2 (6.67%%)')
+print 'Finished the test on host 127.0.0.1:24000 @ Mon Jan 06 2014'
+print '... end of run'
+sys.exit(%(exit_status)d)
+'''
+
+
+def _GetFreePort():
+  sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+  sock.bind(('127.0.0.1', 0))
+  port = sock.getsockname()[1]
+  sock.close()
+  return port
+
+
+class ParseLineTest(unittest.TestCase):
+  """Unit test class of ParseLine()."""
+
+  def testProgress(self):
+    event = jmeter_client_runner.ParseLine(
+        'summary +    523 in  30.1s =   17.4/s Avg:   120 Min:    10 '
+        'Max:  1200 Err:     3 (0.57%) Active: 10 Started: 10 Finished: 0')
+
+    self.assertEqual('progress', event['type'])
+    self.assertEqual(523, event['samples'])
+    self.assertEqual(30.1, event['seconds'])
+    self.assertEqual(17.4, event['throughput'])
+    self.assertEqual(1200, event['max'])
+    self.assertEqual(3, event['errors'])
+    self.assertAlmostEqual(0.0057, event['error_rate'])
+    self.assertEqual(10, event['active_threads'])
+
+  def testSummary(self):
+    event = jmeter_client_runner.ParseLine(
+        'summary =   1000 in 00:01:05 =   15.4/s Avg:   118 Min:     9 '
+        'Max:  1500 Err:     0 (0.00%)')
+
+    self.assertEqual('summary', event['type'])
+    self.assertEqual(65, event['seconds'])
+    self.assertNotIn('active_threads', event)
+
+  def testOtherLines(self):
+    self.assertEqual(
+        {'type': 'server_finished', 'server': '127.0.0.1:24001'},
+        jmeter_client_runner.ParseLine(
+            'Finished the test on host 127.0.0.1:24001 @ Mon Jan 06'))
+    self.assertEqual({'type': 'end'},
+                     jmeter_client_runner.ParseLine('... end of run'))
+    self.assertEqual('error', jmeter_client_runner.ParseLine(
+        'Error in NonGUIDriver java.lang.IllegalArgumentException')['type'])
+    self.assertEqual('output', jmeter_client_runner.ParseLine(
+        'Tidying up remote @ Mon Jan 06')['type'])
+
+
+class ClientRunnerTest(unittest.TestCase):
+  """Unit test class of ClientRunner."""
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.results_dir = os.path.join(self.temp_dir, 'run')
+    self.port = _GetFreePort()
+    self.events = []
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+  def _MakeRunner(self, mode, exit_status=0, **kwargs):
+    fake_client = os.path.join(self.temp_dir, 'fake_client.py')
+    with open(fake_client, 'w') as f:
+      f.write(FAKE_CLIENT % {'mode': mode, 'port': self.port,
+                             'exit_status': exit_status})
+    return ClientRunner([sys.executable, fake_client], self.results_dir,
+                        shutdown_port=self.port, on_event=self.events.append,
+                        **kwargs)
+
+  def testRun(self):
+    runner = self._MakeRunner('finish')
+
+    summary = runner.Run('plan.jmx', ['-Jusers=10'])
+
+    self.assertEqual(0, summary['exit_status'])
+    self.assertFalse(summary['timed_out'])
+    self.assertEqual(30, summary['stats']['samples'])
+    self.assertEqual(['127.0.0.1:24000'], summary['servers'])
+    self.assertEqual(
+        ['output', 'server_starting', 'progress', 'summary',
+         'server_finished', 'end'],
+        [e['type'] for e in self.events])
+    with open(os.path.join(self.results_dir, 'events.jsonl')) as f:
+      self.assertEqual(6, len(f.readlines()))
+    with open(os.path.join(self.results_dir, 'summary.json')) as f:
+      self.assertEqual(30, json.load(f)['stats']['samples'])
+    with open(os.path.join(self.results_dir, 'results.jtl')) as f:
+      self.assertEqual(3, len(f.readlines()))
+
+  def testRun_StreamResults(self):
+    store = jmeter_segments.LocalStore(os.path.join(self.temp_dir, 'bucket'))
+    segmenter = jmeter_segments.Segmenter(
+        store, os.path.join(self.results_dir, 'segments'))
+    runner = self._MakeRunner('finish', segmenter=segmenter)
+
+    summary = runner.Run('plan.jmx')
+
+    self.assertEqual(0, summary['exit_status'])
+    self.assertEqual(store.url, summary['results'])
+    self.assertEqual(1, summary['segments'])
+    self.assertTrue(summary['results_complete'])
+    # Results are not left on local disk.
+    self.assertFalse(os.path.exists(
+        os.path.join(self.results_dir, 'results.jtl')))
+    self.assertEqual(['timeStamp,elapsed\n', '1000,10\n', '1001,20\n'],
+                     list(jmeter_segments.ReadSegmentLines(store)))
+
+  def testRun_StreamResults_ClientFailsToStart(self):
+    segmenter = jmeter_segments.Segmenter(
+        jmeter_segments.LocalStore(os.path.join(self.temp_dir, 'bucket')),
+        os.path.join(self.results_dir, 'segments'))
+    # The client exits without opening the results file.
+    runner = ClientRunner([sys.executable, '-c', 'import sys; sys.exit(1)'],
+                          self.results_dir, segmenter=segmenter)
+
+    summary = runner.Run('plan.jmx')
+
+    self.assertEqual(1, summary['exit_status'])
+    self.assertEqual(0, summary['segments'])
+
+  def testRun_ExitStatus(self):
+    summary = self._MakeRunner('finish', exit_status=1).Run('plan.jmx')
+
+    self.assertEqual(1, summary['exit_status'])
+
+  def testRun_Timeout(self):
+    runner = self._MakeRunner('wait', timeout=1)
+
+    summary = runner.Run('plan.jmx')
+
+    # Fake client exits normally only when it receives stop command.
+    self.assertEqual(0, summary['exit_status'])
+    self.assertTrue(summary['timed_out'])
+    self.assertEqual('summary', self.events[-3]['type'])
+
+  def testRun_Interrupted(self):
+    runner = self._MakeRunner('wait')
+    self.events = []
+    # SIGINT arrives while the test is running.
+    runner._on_event = lambda event: runner._HandleSigint(None, None)
+
+    summary = runner.Run('plan.jmx')
+
+    self.assertTrue(summary['interrupted'])
+    self.assertEqual(0, summary['exit_status'])
+
+  def testRun_TerminateAfterGracePeriod(self):
+    runner = self._MakeRunner('hang', timeout=1, stop_grace_seconds=1)
+
+    summary = runner.Run('plan.jmx')
+
+    self.assertTrue(summary['timed_out'])
+    self.assertNotEqual(0, summary['exit_status'])
+    self.assertLess(summary['duration_seconds'], 30)
+
+  def testRun_TerminateWrapper(self):
+    fake_client = os.path.join(self.temp_dir, 'fake_client.py')
+    with open(fake_client, 'w') as f:
+      f.write(FAKE_CLIENT % {'mode': 'hang', 'port': self.port,
+                             'exit_status': 0})
+    # Like jmeter.sh, the wrapper runs the client as its child.
+    runner = ClientRunner(
+        ['sh', '-c', '"$0" "$@"; exit $?', sys.executable, fake_client],
+        self.results_dir, shutdown_port=self.port, timeout=1,
+        stop_grace_seconds=1)
+
+    summary = runner.Run('plan.jmx')
+
+    self.assertTrue(summary['timed_out'])
+    self.assertNotEqual(0, summary['exit_status'])
+    self.assertLess(summary['duration_seconds'], 30)
+
+
+if __name__ == '__main__':
+  unittest.main()
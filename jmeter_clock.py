@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to measure clock offsets of JMeter servers and correct clock skew.
+
+JMeter servers timestamp samples with their own clocks, so skew between
+instances shifts samples of different servers against each other in
+throughput timelines.  The offset of each server's clock from the client's
+clock is measured with NTP-style exchanges over SSH: the client records the
+time before sending a request and after receiving the reply, and assumes the
+server read its clock at the midpoint.  The exchange with the shortest round
+trip gives the tightest bound.
+
+Sample and telemetry timestamps are converted to the client's clock by
+subtracting the offset of the server that recorded them.
+"""
+
+
+
+import json
+import os.path
+import subprocess
+import time
+
+
+# Number of request/reply exchanges per server.
+EXCHANGES = 8
+# Command run on JMeter server, which replies its time in nanoseconds since
+# epoch to each input line.
+REMOTE_CLOCK_COMMAND = 'while read line; do date +%s%N; done'
+
+
+def EstimateOffset(exchanges):
+  """Estimates clock offset from request/reply exchanges.
+
+  Args:
+    exchanges: List of (send time, server time, receive time) in seconds,
+        where send and receive times are of the client's clock.
+  Returns:
+    Dictionary with 'offset_ms', which is server clock minus client clock,
+    and 'round_trip_ms' of the exchange used, which bounds the error of the
+    offset to +/- half of it.
+  """
+  send, remote, receive = min(exchanges, key=lambda e: e[2] - e[0])
+  return {
+      'offset_ms': (remote - (send + receive) / 2.0) * 1000,
+      'round_trip_ms': (receive - send) * 1000,
+  }
+
+
+def MeasureOffset(command, exchanges=EXCHANGES):
+  """Measures clock offset of the server by running the command.
+
+  Args:
+    command: Shell command that runs REMOTE_CLOCK_COMMAND on the server,
+        such as 'gcutil ssh'.
+    exchanges: Number of exchanges to make.
+  Returns:
+    Offset returned by EstimateOffset(), or None if the server didn't reply.
+  """
+  process = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE,
+                             stdout=subprocess.PIPE)
+  results = []
+  try:
+    for _ in xrange(exchanges):
+      send = time.time()
+      try:
+        process.stdin.write('\n')
+        process.stdin.flush()
+      except IOError:
+        # The command has exited.
+        break
+      reply = process.stdout.readline()
+      receive = time.time()
+      if not reply:
+        break
+      try:
+        results.append((send, int(reply) / 1e9, receive))
+      except ValueError:
+        # Not a reply, e.g. login message.
+        continue
+  finally:
+    process.stdin.close()
+    process.stdout.read()
+    process.wait()
+  if not results:
+    return None
+  return EstimateOffset(results)
+
+
+def WriteOffsets(offsets, path):
+  """Writes dictionary of server name to offset to the file in JSON."""
+  with open(path, 'w') as f:
+    json.dump(offsets, f, indent=2, sort_keys=True)
+
+
+def ReadOffsets(path):
+  """Reads offsets written by WriteOffsets().  Empty if there's no file."""
+  if not os.path.exists(path):
+    return {}
+  with open(path) as f:
+    return json.load(f)
+
+
+def _GetCorrections(offsets):
+  """Returns dictionary of short host name to correction in milliseconds."""
+  return dict((name.split('.')[0], int(round(offset['offset_ms'])))
+              for name, offset in offsets.items())
+
+
+def CorrectSamples(samples, offsets):
+  """Converts timestamps of JMeter samples to the client's clock.
+
+  Args:
+    samples: Iterable of samples returned by jmeter_report.ReadJtlSamples().
+        Server is identified by 'hostname', which may be fully qualified.
+    offsets: Dictionary of instance name to offset.
+  Yields:
+    Samples with corrected 'timestamp'.
+  """
+  corrections = _GetCorrections(offsets)
+  # Hostname to correction, to look up each hostname only once.
+  by_hostname = {}
+  for sample in samples:
+    hostname = sample['hostname']
+    if hostname not in by_hostname:
+      by_hostname[hostname] = corrections.get(hostname.split('.')[0], 0)
+    sample['timestamp'] -= by_hostname[hostname]
+    yield sample
+
+
+def CorrectTelemetry(samples_by_server, offsets):
+  """Converts timestamps of telemetry samples to the client's clock.
+
+  Args:
+    samples_by_server: Dictionary of instance name to list of samples
+        returned by jmeter_telemetry.ParseTelemetry().  Modified in place.
+    offsets: Dictionary of instance name to offset.
+  Returns:
+    The samples_by_server.
+  """
+  corrections = _GetCorrections(offsets)
+  for server, samples in samples_by_server.items():
+    correction = corrections.get(server.split('.')[0], 0)
+    for sample in samples:
+      sample['timestamp'] -= correction
+  return samples_by_server
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of jmeter_clock.py."""
+
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import jmeter_clock
+
+
+class JMeterClockTest(unittest.TestCase):
+  """Unit test class of clock offset measurement and correction."""
+
+  def testEstimateOffset(self):
+    # The second exchange has the shortest round trip.
+    offset = jmeter_clock.EstimateOffset([
+        (100.0, 105.2, 100.2),
+        (101.0, 106.01, 101.02),
+        (102.0, 107.5, 102.5),
+    ])
+
+    self.assertAlmostEqual(5000.0, offset['offset_ms'])
+    self.assertAlmostEqual(20.0, offset['round_trip_ms'])
+
+  def testMeasureOffset_LocalClock(self):
+    offset = jmeter_clock.MeasureOffset(jmeter_clock.REMOTE_CLOCK_COMMAND)
+
+    self.assertLess(abs(offset['offset_ms']), 100)
+    self.assertGreaterEqual(offset['round_trip_ms'], 0)
+
+  def testMeasureOffset_SkewedClock(self):
+    # Server clock 5 seconds ahead, after a login message.
+    offset = jmeter_clock.MeasureOffset(
+        'echo Welcome; while read line; do '
+        'echo $(($(date +%s%N) + 5000000000)); done')
+
+    self.assertLess(abs(offset['offset_ms'] - 5000), 100)
+
+  def testMeasureOffset_Unreachable(self):
+    self.assertIsNone(jmeter_clock.MeasureOffset('exit 255'))
+
+  def testWriteAndReadOffsets(self):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      path = os.path.join(tmp_dir, 'foo.clock.json')
+      self.assertEqual({}, jmeter_clock.ReadOffsets(path))
+      offsets = {'foo-000': {'offset_ms': 12.5, 'round_trip_ms': 3.0}}
+      jmeter_clock.WriteOffsets(offsets, path)
+      self.assertEqual(offsets, jmeter_clock.ReadOffsets(path))
+    finally:
+      shutil.rmtree(tmp_dir)
+
+  def testCorrectSamples(self):
+    offsets = {'foo-000': {'offset_ms': 1500.4, 'round_trip_ms': 1.0},
+               'foo-001': {'offset_ms': -250.0, 'round_trip_ms': 1.0}}
+    samples = [
+        {'timestamp': 10000, 'hostname': 'foo-000'},
+        {'timestamp': 10000, 'hostname': 'foo-001.c.project.internal'},
+        {'timestamp': 10000, 'hostname': 'unknown'},
+        {'timestamp': 12000, 'hostname': 'foo-000'},
+    ]
+
+    corrected = list(jmeter_clock.CorrectSamples(iter(samples), offsets))
+
+    self.assertEqual([8500, 10250, 10000, 10500],
+                     [s['timestamp'] for s in corrected])
+
+  def testCorrectTelemetry(self):
+    samples_by_server = {'foo-000': [{'timestamp': 5000},
+                                     {'timestamp': 10000}],
+                         'foo-001': [{'timestamp': 5000}]}
+
+    jmeter_clock.CorrectTelemetry(
+        samples_by_server, {'foo-000': {'offset_ms': 1000.0}})
+
+    self.assertEqual([4000, 9000], [
+        s['timestamp'] for s in samples_by_server['foo-000']])
+    self.assertEqual(5000, samples_by_server['foo-001'][0]['timestamp'])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -24,17 +24,41 @@ in advance.
 
 
 import argparse
+import json
 import logging
 import os
 import os.path
-import re
 import subprocess
 import sys
+import threading
 import time
 
+import apiclient.errors
 import oauth2client
 
+import gce_credentials
 from gce_api import GceApi
+from gce_api import GceApiPool
+from gce_api import RateLimiter
+import jmeter_binary
+import jmeter_client_runner
+import jmeter_clock
+import jmeter_dry_run
+import jmeter_estimate
+import jmeter_jvm
+import jmeter_multi_cluster
+import jmeter_pool
+import jmeter_profile
+import jmeter_properties
+import jmeter_queue
+import jmeter_report
+import jmeter_segments
+import jmeter_start_barrier
+import jmeter_status
+import jmeter_sync
+import jmeter_telemetry
+import jmeter_watchdog
+import jmeter_workloads
 
 
 # Project-related configuration.
@@ -48,6 +72,52 @@ DEFAULT_IMAGE = 'projects/debian-cloud/global/images/debian-7-wheezy-v20131120'
 DEFAULT_MACHINE_TYPE = 'n1-standard-2'
 
 GCE_STATUS_CHECK_INTERVAL = 3
+# Number of times each instance is retried when its creation fails.
+DEFAULT_MAX_RETRIES = 3
+# Seconds to wait for managed instance group to create next instance.
+MANAGED_GROUP_TIMEOUT = 600
+# Instance statuses in which the instance is kept as is by 'start'.
+LIVE_INSTANCE_STATUSES = ('PROVISIONING', 'STAGING', 'RUNNING')
+
+# Provisioning mode in which instances are created by managed instance group.
+MANAGED_GROUP = 'managed_group'
+
+# Labels attached to instances and disks of the cluster.
+CLUSTER_LABEL = 'jmeter_cluster'
+RUN_LABEL = 'jmeter_run'
+OWNER_LABEL = 'jmeter_owner'
+
+# Phases in which operations end, which are not timed.
+DONE_PHASES = ('started', 'shut down')
+
+# Resource telemetry file written by startup.sh on JMeter servers.
+TELEMETRY_FILE = '/var/log/jmeter-telemetry.csv'
+
+
+def _GetCredentials(params):
+  """Creates non-interactive credentials specified by command line options.
+
+  Args:
+    params: argparse.Namespace of command line options.
+  Returns:
+    gce_credentials.CachedCredentials object, or None to use interactive
+    OAuth2 flow.
+  """
+  kind = getattr(params, 'credentials', None) or 'oauth2'
+  if kind == 'oauth2':
+    return None
+  if kind == 'service_account':
+    if not getattr(params, 'service_account_key', None):
+      sys.stderr.write('\nPlease specify service account key file using '
+                       'the --service_account_key option.\n\n')
+      sys.exit(1)
+    provider = gce_credentials.ServiceAccountKeyProvider(
+        params.service_account_key, GceApi.COMPUTE_ENGINE_SCOPE)
+  else:
+    provider = gce_credentials.MetadataServerProvider(
+        params.metadata_token_url)
+  return gce_credentials.CachedCredentials(
+      provider, gce_credentials.TokenCache(params.token_cache))
 
 
 class JMeterFiles(object):
@@ -67,41 +137,96 @@ class JMeterFiles(object):
   def GetStartupScriptPath(cls):
     return cls._GetPath(cls.STARTUP_SCRIPT)
 
+  @classmethod
+  def GetClientCommand(cls):
+    """Returns JMeter client command in list, without JMeter parameters."""
+    return [cls._GetPath(cls.CLIENT_JMETER),
+            '-Djava.rmi.server.hostname=127.0.0.1']
+
   @classmethod
   def RunJmeterClient(cls, *params):
-    executable = cls._GetPath(cls.CLIENT_JMETER)
-    command = ' '.join([executable, '-Djava.rmi.server.hostname=127.0.0.1'] +
-                       list(params))
-    subprocess.call(command, shell=True)
+    command = ' '.join(cls.GetClientCommand() + list(params))
+    return subprocess.call(command, shell=True)
 
   @classmethod
-  def RewriteConfig(cls, regexp_pattern, replace_string):
-    """Rewrite JMeter config file with regular expression rule.
+  def GetClientOverridePath(cls, prefix):
+    """Returns path of per-cluster client configuration override file."""
+    return cls._GetPath([cls.CLIENT_DIR, 'bin', '%s.properties' % prefix])
 
-    The function reads jmeter.properties and overwrites the same file.
+  @classmethod
+  def GetClockOffsetsPath(cls, prefix):
+    """Returns path of per-cluster file of server clock offsets."""
+    return cls._GetPath([cls.CLIENT_DIR, 'bin', '%s.clock.json' % prefix])
 
-    Args:
-      regexp_pattern: Regular expression rule in string to match against.
-      replace_string: New string to replace the rule with.
-    """
-    config_file = cls._GetPath(cls.CLIENT_CONFIG)
+  @classmethod
+  def GetSyncScriptPath(cls, prefix):
+    """Returns path of per-cluster pull script of the last 'sync'."""
+    return cls._GetPath([cls.CLIENT_DIR, 'bin', '%s.sync.sh' % prefix])
 
-    with open(config_file) as f:
-      contents = f.read()
+  @classmethod
+  def WriteClientOverrides(cls, prefix, properties):
+    """Writes per-cluster override of JMeter client configuration.
 
-    new_contents = re.compile(regexp_pattern, re.MULTILINE).sub(
-        replace_string, contents)
+    The shipped jmeter.properties is kept intact.  The override file is
+    passed to JMeter client with '-q' option by 'client' sub-command.
 
-    with open(config_file, 'w') as f:
-      f.write(new_contents)
+    Args:
+      prefix: Name prefix of the cluster.
+      properties: Dictionary of properties to override.
+    """
+    jmeter_properties.WriteOverrideFile(
+        cls.GetClientOverridePath(prefix), properties,
+        comment='Generated by jmeter_cluster.py for cluster %s.' % prefix)
 
 
 class JMeterCluster(object):
   """Class to manipulate JMeter server cluster on Google Compute Engine."""
 
-  def __init__(self, params):
+  def __init__(self, params, api_pool=None):
+    """Constructor.
+
+    Args:
+      params: argparse.Namespace of cluster parameters.
+      api_pool: GceApiPool object to get GceApi from.  If None, the cluster
+          creates its own GceApi object.
+    """
     self.params = params
     self.api = None
+    self.api_pool = api_pool
+    # Seconds spent in each phase, and phases in the order the cluster went
+    # through them, for timings history.
+    self.phase_seconds = {}
+    self.phases = []
+    self._phase = ''
+    self._phase_start = time.time()
+    # Number of instances the last operation created or deleted.
+    self.operation_size = 0
+    # Cluster index to name of instances claimed from warm pool.
+    self._claimed = None
+    # Cluster index to name of instances of managed instance group.
+    self._managed = None
+    # Cluster index to number of retries of failed instance creation.
+    self._retries = {}
+    # Number of JMeter servers per instance read from instance metadata.
+    self._servers_per_node = None
+    # ID of this run, labeled on the resources created.
+    self.run_id = time.strftime('%Y%m%d-%H%M%S')
+
+  @property
+  def phase(self):
+    """Current phase of operation, for progress report."""
+    return self._phase
+
+  @phase.setter
+  def phase(self, phase):
+    now = time.time()
+    if self._phase and self._phase not in DONE_PHASES:
+      self.phase_seconds[self._phase] = (
+          self.phase_seconds.get(self._phase, 0.0) + now - self._phase_start)
+    if phase not in DONE_PHASES and phase not in self.phases:
+      self.phases.append(phase)
+    self._phase = phase
+    self._phase_start = now
 
   def _GetGceApi(self):
     """Set up and get GoogleComputeEngine object if necessary."""
@@ -117,24 +242,172 @@ class JMeterCluster(object):
             '\nPlease specify a project using the --project option.\n\n')
         os.exit(1)
 
-      self.api = GceApi('jmeter_cluster', CLIENT_ID, CLIENT_SECRET,
-                        self.project, self.zone)
+      if self.api_pool:
+        self.api = self.api_pool.Get(self.project, self.zone)
+      else:
+        self.api = GceApi('jmeter_cluster', CLIENT_ID, CLIENT_SECRET,
+                          self.project, self.zone,
+                          credentials=_GetCredentials(self.params))
     return self.api
 
+  def _GetZoneApi(self, zone):
+    """Returns GceApi object of the zone in the project of the cluster."""
+    api = self._GetGceApi()
+    if zone == self.zone:
+      return api
+    if self.api_pool:
+      return self.api_pool.Get(self.project, zone)
+    return GceApi('jmeter_cluster', CLIENT_ID, CLIENT_SECRET,
+                  self.project, zone, credentials=_GetCredentials(self.params))
+
+  def _MakeLabels(self):
+    """Makes labels to attach to resources created for the cluster."""
+    return {
+        CLUSTER_LABEL: GceApi.MakeLabelValue(self.params.prefix),
+        RUN_LABEL: GceApi.MakeLabelValue(self.run_id),
+        OWNER_LABEL: GceApi.MakeLabelValue(os.environ.get('USER', 'unknown')),
+    }
+
+  def _MakeClusterFilter(self):
+    """Makes filter string that matches resources of the cluster."""
+    return GceApi.MakeLabelFilter(CLUSTER_LABEL, self.params.prefix)
+
+  def _GetWarmPool(self):
+    """Returns WarmPool object, or None if warm pool is not used."""
+    pool_prefix = getattr(self.params, 'pool_prefix', None)
+    if not pool_prefix:
+      return None
+    if pool_prefix.startswith(self.params.prefix + '-'):
+      sys.stderr.write('\nPool prefix must not start with cluster prefix '
+                       'followed by "-".\n\n')
+      sys.exit(1)
+    return jmeter_pool.WarmPool(self._GetGceApi(), pool_prefix)
+
+  def _GetClaimedInstances(self):
+    """Returns dictionary of cluster index to name of claimed instance."""
+    if self._claimed is None:
+      warm_pool = self._GetWarmPool()
+      self._claimed = (warm_pool.ListClaimed(self.params.prefix)
+                       if warm_pool else {})
+    return self._claimed
+
+  def _IsManagedGroup(self):
+    return getattr(self.params, 'provisioning', None) == MANAGED_GROUP
+
+  def _GetTemplateName(self):
+    return '%s-template' % self.params.prefix
+
+  def _ListManagedGroupInstances(self):
+    """Returns instance resources of the managed group, with metadata."""
+    api = self._GetGceApi()
+    names = api.ListManagedInstances(self.params.prefix)
+    if not names:
+      return []
+    return api.ListInstances(self._MakeNamesFilter(names),
+                             fields=['name', 'metadata'])
+
+  def _GetManagedInstances(self):
+    """Returns dictionary of cluster index to name of managed instance."""
+    if self._managed is None:
+      self._managed = {}
+      if self._IsManagedGroup() and self._GetGceApi().GetInstanceGroupManager(
+          self.params.prefix):
+        for instance in self._ListManagedGroupInstances():
+          index = jmeter_pool.GetMetadata(instance).get(
+              jmeter_pool.CLUSTER_INDEX_KEY)
+          if index is not None:
+            self._managed[int(index)] = instance['name']
+    return self._managed
+
   def _MakeInstanceName(self, index):
+    claimed_name = (self._GetClaimedInstances().get(index) or
+                    self._GetManagedInstances().get(index))
+    if claimed_name:
+      return claimed_name
     return '%s-%03d' % (self.params.prefix, index)
 
-  def _WaitForAllInstancesRunning(self):
-    """Waits until all instances have status 'RUNNING'."""
-    size = self.params.size
+  def GetServersPerNode(self):
+    """Returns number of JMeter servers on each instance.
+
+    Without --servers-per-node, the value is read from metadata of a live
+    instance of the cluster, which 'start' wrote.  1 if the cluster has no
+    instance.
+    """
+    if getattr(self.params, 'servers_per_node', None):
+      return self.params.servers_per_node
+    if self._servers_per_node is None:
+      self._servers_per_node = 1
+      for instance in self._GetGceApi().ListInstances(
+          self._MakeClusterFilter(), fields=['name', 'metadata']):
+        value = jmeter_pool.GetMetadata(instance).get('servers_per_node')
+        if value:
+          self._servers_per_node = int(value)
+          break
+    return self._servers_per_node
+
+  def _GetServerId(self, index, process=0):
+    """Returns server ID, which determines port numbers of the server.
+
+    Args:
+      index: Index of the instance in the cluster.
+      process: Index of JMeter server process on the instance.
+    """
+    return (getattr(self.params, 'index_offset', 0) +
+            index * self.GetServersPerNode() + process)
+
+  def _CheckDeadline(self, deadline, waiting_for):
+    """Exits if the deadline in epoch seconds has passed, unless None."""
+    if deadline is not None and time.time() > deadline:
+      sys.stderr.write('\nTimed out waiting for %s.\n\n' % waiting_for)
+      sys.exit(1)
+
+  def _CheckServerIdRange(self, size):
+    """Exits if server IDs of the cluster size would reach client ports.
+
+    Server port is 24000 plus server ID, so server IDs must be below
+    jmeter_multi_cluster.MAX_TOTAL_SERVERS not to collide with client RMI
+    port 25000 and RMI ports of servers from 26000.
+    """
+    index_offset = getattr(self.params, 'index_offset', 0)
+    servers_per_node = self.GetServersPerNode()
+    if (index_offset + size * servers_per_node >
+        jmeter_multi_cluster.MAX_TOTAL_SERVERS):
+      sys.stderr.write(
+          '\n%d instance(s) with %d JMeter server(s) each need server IDs '
+          'up to %d, but server IDs must be below %d for server ports not '
+          'to collide with RMI ports.  Specify smaller size or '
+          '--servers-per-node.\n\n' % (
+              size, servers_per_node,
+              index_offset + size * servers_per_node - 1,
+              jmeter_multi_cluster.MAX_TOTAL_SERVERS))
+      sys.exit(1)
+
+  def _WaitForAllInstancesRunning(self, repair=None, indexes=None,
+                                  deadline=None):
+    """Waits until all instances have status 'RUNNING'.
+
+    Args:
+      repair: Function that takes list of indexes of instances that stopped
+          before getting RUNNING, and recreates them.  None not to repair.
+      indexes: Cluster indexes of instances to wait for.  Defaults to all
+          instances of the cluster.
+      deadline: Time in epoch seconds to give up waiting and exit.  None to
+          wait indefinitely.
+    """
+    if indexes is None:
+      indexes = xrange(self.params.size)
+    size = len(indexes)
     while True:
       logging.info('Checking instance status...')
       status_count = {}
-      for index in xrange(size):
+      stopped = []
+      for index in indexes:
         instance_info = self._GetGceApi().GetInstance(
             self._MakeInstanceName(index))
         if instance_info:
           status = instance_info['status']
+          if status not in LIVE_INSTANCE_STATUSES:
+            stopped.append(index)
         else:
           status = 'NOT YET CREATED'
         status_count[status] = status_count.get(status, 0) + 1
@@ -143,15 +416,27 @@ class JMeterCluster(object):
         logging.info('  %s: %d', status, count)
       if status_count.get('RUNNING', 0) == size:
         break
+      if stopped and repair:
+        repair(self._CountRetries(stopped))
+      self._CheckDeadline(deadline, 'instances RUNNING')
       logging.info('Wait for instances RUNNING...')
       time.sleep(GCE_STATUS_CHECK_INTERVAL)
 
-  def _WaitForAllInstancesSshReady(self):
-    """Waits until all instances are ready to SSH."""
-    size = self.params.size
+  def _WaitForAllInstancesSshReady(self, indexes=None, deadline=None):
+    """Waits until all instances are ready to SSH.
+
+    Args:
+      indexes: Cluster indexes of instances to wait for.  Defaults to all
+          instances of the cluster.
+      deadline: Time in epoch seconds to give up waiting and exit.  None to
+          wait indefinitely.
+    """
+    if indexes is None:
+      indexes = xrange(self.params.size)
+    size = len(indexes)
     while True:
       ssh_ready = 0
-      for index in xrange(size):
+      for index in indexes:
         instance_name = self._MakeInstanceName(index)
         command = ('gcutil ssh --project=%s --zone=%s '
                    '--ssh_arg "-o ConnectTimeout=10" '
@@ -166,64 +451,812 @@ class JMeterCluster(object):
       logging.info('%d instances out of %d are ready for SSH', ssh_ready, size)
       if ssh_ready == size:
         break
+      self._CheckDeadline(deadline, 'SSH on instances')
       logging.info('Wait for SSH to get ready on instances...')
       time.sleep(GCE_STATUS_CHECK_INTERVAL)
 
-  def Start(self):
-    """Starts up JMeter server cluster."""
-    size = self.params.size
+  def _GetJvmArgs(self):
+    """Returns JVM options of JMeter servers, or None to use JVM default."""
+    jvm_args = getattr(self.params, 'jvm_args', None)
+    if jvm_args:
+      return jvm_args
+    try:
+      _, memory_mb = jmeter_jvm.GetMachineSpec(self.machine_type)
+    except ValueError:
+      logging.warning('No JVM profile for machine type %s.  JMeter servers '
+                      'run with default JVM options.', self.machine_type)
+      return None
+    servers_per_node = self.GetServersPerNode()
+    max_servers = jmeter_jvm.GetMaxServersPerNode(memory_mb)
+    if servers_per_node > max(max_servers, 1):
+      sys.stderr.write(
+          '\n%d JMeter servers don\'t fit in memory of machine type %s.  '
+          'Specify --servers-per-node of %d or less, or larger machine '
+          'type.\n\n' % (servers_per_node, self.machine_type,
+                           max(max_servers, 1)))
+      sys.exit(1)
+    if not max_servers:
+      logging.warning('Machine type %s is too small for JVM profile.  JMeter '
+                      'server runs with default JVM options.',
+                      self.machine_type)
+      return None
+    return jmeter_jvm.GetJvmArgs(self.machine_type, servers_per_node)
+
+  def _MakeServerMetadata(self, index, jvm_args):
+    """Makes instance metadata for JMeter servers of the cluster index."""
+    metadata = {'id': self._GetServerId(index),
+                'servers_per_node': self.GetServersPerNode()}
+    if jvm_args:
+      metadata[jmeter_jvm.METADATA_KEY] = jvm_args
+    return metadata
+
+  def _RestartServers(self, instance_names):
+    """Restarts JMeter servers to pick up updated instance metadata."""
+    for instance_name in instance_names:
+      logging.info('Restarting JMeter servers on %s', instance_name)
+      command = ('gcutil --project=%s --zone=%s ssh '
+                 '--ssh_arg "-o StrictHostKeyChecking=no" '
+                 '%s "sudo pkill -f ApacheJMeter.jar"') % (
+                     self.project, self.zone, instance_name)
+      subprocess.call(command, shell=True)
+
+  def _GetInventory(self, indexes):
+    """Gets existing instances and boot disks of the cluster indexes.
+
+    Returns:
+      Tuple of dictionaries of instance resources and disk resources, keyed
+      by name.
+    """
+    names_filter = self._MakeNamesFilter(
+        [self._MakeInstanceName(index) for index in indexes])
+    fields = ['name', 'status']
+    instances = dict((i['name'], i) for i in self._GetGceApi().ListInstances(
+        names_filter, fields=fields))
+    disks = dict((d['name'], d) for d in self._GetGceApi().ListDisks(
+        names_filter, fields=fields))
+    return instances, disks
+
+  def _GetMaxRetries(self):
+    max_retries = getattr(self.params, 'max_retries', None)
+    if max_retries is None:
+      return DEFAULT_MAX_RETRIES
+    return max_retries
+
+  def _CountRetries(self, indexes):
+    """Counts a retry of each failed instance against its retry budget.
+
+    Exits if any of the instances has run out of retries, so that 'start'
+    can be run again to resume later.
 
-    startup_script = open(JMeterFiles.GetStartupScriptPath()).read() % (
-        CLOUD_STORAGE)
+    Args:
+      indexes: List of cluster indexes of failed instances.
+    Returns:
+      The indexes, to retry.
+    """
+    max_retries = self._GetMaxRetries()
+    for index in indexes:
+      self._retries[index] = self._retries.get(index, 0) + 1
+    exhausted = [self._MakeInstanceName(index) for index in indexes
+                 if self._retries[index] > max_retries]
+    if exhausted:
+      sys.stderr.write(
+          '\nFailed to start %s after %d retries.  Run start again to '
+          'resume.\n\n' % (', '.join(exhausted), max_retries))
+      sys.exit(1)
+    return indexes
+
+  def _ProvisionInstance(self, index, instance, disk, startup_script,
+                         jvm_args):
+    """Creates instance of the cluster index, unless it's already live.
+
+    Stopped instance is deleted and recreated with the existing boot disk,
+    and failed boot disk is recreated.
 
-    for index in xrange(size):
-      instance_name = self._MakeInstanceName(index)
-      logging.info('Starting instance: %s', instance_name)
-      self._GetGceApi().CreateInstanceWithNewBootDisk(
-          instance_name, self.machine_type, self.image,
+    Args:
+      index: Index of the instance in the cluster.
+      instance: Existing instance resource, or None.
+      disk: Existing boot disk resource, or None.
+      startup_script: Startup script of new instance.
+      jvm_args: JVM options of JMeter servers.
+    Returns:
+      Boolean to indicate whether the instance exists or was created.
+    """
+    instance_name = self._MakeInstanceName(index)
+    names_filter = self._MakeNamesFilter([instance_name])
+    if instance:
+      if instance.get('status') in LIVE_INSTANCE_STATUSES:
+        logging.info('Instance %s already exists: %s', instance_name,
+                     instance['status'])
+        return True
+      logging.info('Instance %s is %s.  Recreating it.', instance_name,
+                   instance.get('status'))
+      self._DeleteResource(
+          names_filter, self._GetGceApi().ListInstances,
+          self._GetGceApi().DeleteInstance, self._GetGceApi().GetInstance)
+    if disk and disk.get('status') == 'FAILED':
+      logging.info('Boot disk %s failed.  Recreating it.', instance_name)
+      self._DeleteResource(
+          names_filter, self._GetGceApi().ListDisks,
+          self._GetGceApi().DeleteDisk, self._GetGceApi().GetDisk)
+
+    logging.info('Starting instance: %s', instance_name)
+    return self._GetGceApi().CreateInstanceWithNewBootDisk(
+        instance_name, self.machine_type, self.image,
+        startup_script=startup_script,
+        service_accounts=[
+            'https://www.googleapis.com/auth/devstorage.read_only'],
+        metadata=self._MakeServerMetadata(index, jvm_args),
+        labels=self._MakeLabels())
+
+  def _CreateInstances(self, indexes, startup_script, jvm_args):
+    """Creates instances of the cluster indexes that are not live yet.
+
+    Existing instances and disks are looked up first, so that interrupted
+    'start' can be resumed.  Instances whose creation fails are retried up
+    to --max_retries times each.
+    """
+    pending = list(indexes)
+    while pending:
+      instances, disks = self._GetInventory(pending)
+      failed = []
+      for index in pending:
+        instance_name = self._MakeInstanceName(index)
+        try:
+          created = self._ProvisionInstance(
+              index, instances.get(instance_name), disks.get(instance_name),
+              startup_script, jvm_args)
+        except apiclient.errors.HttpError as e:
+          logging.error('Instance creation: %s: %s', instance_name, e)
+          created = False
+        if not created:
+          failed.append(index)
+      pending = self._CountRetries(failed)
+      if pending:
+        logging.info('Retrying %d instance(s)...', len(pending))
+        time.sleep(GCE_STATUS_CHECK_INTERVAL)
+
+  def _AssignManagedIndexes(self, size, jvm_args, deadline=None):
+    """Assigns cluster indexes to instances of the managed group.
+
+    Instances of managed group have generated names, so the cluster index of
+    each instance is kept in its metadata, as with instances claimed from
+    warm pool.  New instances get the lowest free indexes, together with
+    server ID of the index.
+
+    Exits if the group reports creation errors, such as quota exceeded, in
+    more than --max_retries consecutive checks, or creates no instance for
+    MANAGED_GROUP_TIMEOUT seconds.
+
+    Args:
+      size: Number of instances the group is resized to.
+      jvm_args: JVM options of JMeter servers.
+      deadline: Time in epoch seconds to give up waiting and exit.  None to
+          wait as long as the group makes progress.
+    Returns:
+      List of names of instances newly assigned indexes.
+    """
+    api = self._GetGceApi()
+    assigned = []
+    created = 0
+    progress_deadline = time.time() + MANAGED_GROUP_TIMEOUT
+    failed_checks = 0
+    while True:
+      instances = self._ListManagedGroupInstances()
+      if len(instances) < size:
+        logging.info('%d instance(s) out of %d created by managed group',
+                     len(instances), size)
+        if len(instances) > created:
+          created = len(instances)
+          progress_deadline = time.time() + MANAGED_GROUP_TIMEOUT
+        errors = api.ListManagedInstanceErrors(self.params.prefix)
+        for error in errors:
+          logging.warning('%s', error)
+        failed_checks = failed_checks + 1 if errors else 0
+        if (failed_checks > self._GetMaxRetries() or
+            time.time() > progress_deadline):
+          sys.stderr.write(
+              '\nManaged instance group %s created %d instance(s) out of '
+              '%d.  Run start again to resume.\n%s\n' % (
+                  self.params.prefix, len(instances), size,
+                  ''.join('  %s\n' % error for error in errors)))
+          sys.exit(1)
+        self._CheckDeadline(deadline, 'managed instance group')
+        time.sleep(GCE_STATUS_CHECK_INTERVAL)
+        continue
+
+      self._managed = {}
+      unassigned = []
+      for instance in sorted(instances, key=lambda i: i['name']):
+        index = jmeter_pool.GetMetadata(instance).get(
+            jmeter_pool.CLUSTER_INDEX_KEY)
+        if index is None or int(index) in self._managed:
+          unassigned.append(instance)
+        else:
+          self._managed[int(index)] = instance['name']
+      free = [i for i in xrange(len(instances)) if i not in self._managed]
+      for index, instance in zip(free, unassigned):
+        metadata = jmeter_pool.GetMetadata(instance)
+        metadata.update(self._MakeServerMetadata(index, jvm_args))
+        metadata[jmeter_pool.CLUSTER_INDEX_KEY] = index
+        if api.SetInstanceMetadata(instance['name'], metadata,
+                                   instance['metadata']['fingerprint']):
+          logging.info('Assigned index %d to %s', index, instance['name'])
+          self._managed[index] = instance['name']
+          assigned.append(instance['name'])
+      if len(self._managed) == len(instances):
+        return assigned
+      # Metadata changed in the meantime.  Assign with the new fingerprint.
+      self._CheckDeadline(deadline, 'managed instance group')
+      time.sleep(GCE_STATUS_CHECK_INTERVAL)
+
+  def _ProvisionManagedGroup(self, size, startup_script, jvm_args,
+                             deadline=None):
+    """Creates instances of the cluster by managed instance group.
+
+    Instance template and managed group are created if they don't exist,
+    and the group is resized by one request, instead of an insert request
+    per instance.
+
+    Args:
+      size: Number of instances of the cluster.
+      startup_script: Startup script of the instances.
+      jvm_args: JVM options of JMeter servers.
+      deadline: Time in epoch seconds to give up waiting for the group and
+          exit.  None to wait as long as the group makes progress.
+    Returns:
+      List of names of instances newly assigned cluster indexes.
+    """
+    api = self._GetGceApi()
+    template_name = self._GetTemplateName()
+    if not api.GetInstanceTemplate(template_name):
+      logging.info('Creating instance template: %s', template_name)
+      if not api.CreateInstanceTemplate(
+          template_name, self.machine_type, self.image,
           startup_script=startup_script,
           service_accounts=[
               'https://www.googleapis.com/auth/devstorage.read_only'],
-          metadata={'id': index})
+          metadata=self._MakeServerMetadata(0, jvm_args),
+          labels=self._MakeLabels()):
+        sys.stderr.write('\nFailed to create instance template %s.\n\n' %
+                         template_name)
+        sys.exit(1)
+    if not api.GetInstanceGroupManager(self.params.prefix):
+      logging.info('Creating managed instance group: %s', self.params.prefix)
+      if not api.CreateInstanceGroupManager(
+          self.params.prefix, template_name, self.params.prefix):
+        sys.stderr.write('\nFailed to create managed instance group %s.\n\n'
+                         % self.params.prefix)
+        sys.exit(1)
+    logging.info('Resizing managed instance group %s to %d',
+                 self.params.prefix, size)
+    if not api.ResizeInstanceGroupManager(self.params.prefix, size):
+      sys.stderr.write('\nFailed to resize managed instance group %s.\n\n'
+                       % self.params.prefix)
+      sys.exit(1)
+    return self._AssignManagedIndexes(size, jvm_args, deadline)
+
+  def _DeleteManagedGroup(self):
+    """Deletes managed instance group with its instances, and its template.
+
+    Returns:
+      Number of instances of the group.
+    """
+    api = self._GetGceApi()
+    deleted = 0
+    if api.GetInstanceGroupManager(self.params.prefix):
+      deleted = len(api.ListManagedInstances(self.params.prefix))
+      logging.info('Delete managed instance group: %s', self.params.prefix)
+      self.phase = 'deleting managed instance group'
+      api.DeleteInstanceGroupManager(self.params.prefix)
+      # The template can't be deleted while the group uses it.
+      while api.GetInstanceGroupManager(self.params.prefix):
+        time.sleep(GCE_STATUS_CHECK_INTERVAL)
+    if api.GetInstanceTemplate(self._GetTemplateName()):
+      logging.info('Delete instance template: %s', self._GetTemplateName())
+      api.DeleteInstanceTemplate(self._GetTemplateName())
+    self._managed = {}
+    return deleted
+
+  def FillPool(self):
+    """Creates pool instances until --pool_target instances are idle.
 
+    Returns:
+      List of names of instances created.
+    """
+    startup_script = open(JMeterFiles.GetStartupScriptPath()).read() % (
+        CLOUD_STORAGE)
+    self._GetGceApi()
+    jvm_args = self._GetJvmArgs()
+    return self._GetWarmPool().Replenish(
+        self.params.pool_target, self.params.pool_max_size,
+        self.machine_type, self.image, startup_script,
+        lambda: self._MakeServerMetadata(0, jvm_args),
+        labels={OWNER_LABEL: GceApi.MakeLabelValue(
+            os.environ.get('USER', 'unknown'))})
+
+  def _ReplenishPool(self):
+    """Evicts and refills warm pool in background, logging errors."""
+    try:
+      # Start is in progress in the foreground, and owns the phases.
+      evicted = self.EvictPool(track_phase=False)
+      if evicted:
+        logging.info('%d idle instance(s) evicted from warm pool.',
+                     len(evicted))
+      self.FillPool()
+    # FillPool() exits by sys.exit() on invalid JVM options.
+    except (Exception, SystemExit):  # pylint: disable=broad-except
+      logging.exception('Failed to replenish warm pool')
+
+  def Start(self):
+    """Starts up JMeter server cluster.
+
+    Start is idempotent.  Instances that already exist are kept, and only
+    missing or stopped ones are created, so that failed start can be resumed
+    by running it again.
+
+    If warm pool is specified, idle pool instances are claimed first, and
+    new instances are created only for the rest.  The pool is replenished
+    in background while the cluster starts.
+
+    With --provisioning managed_group, instances are created by resizing
+    managed instance group instead.
+    """
+    size = self.params.size
+    self.operation_size = size
+    self._CheckServerIdRange(size)
+
+    startup_script = open(JMeterFiles.GetStartupScriptPath()).read() % (
+        CLOUD_STORAGE)
+    self._GetGceApi()
+    jvm_args = self._GetJvmArgs()
+
+    if self._IsManagedGroup():
+      self._StartManagedGroup(startup_script, jvm_args)
+      return
+
+    replenish_thread = None
+    warm_pool = self._GetWarmPool()
+    if warm_pool:
+      self.phase = 'claiming pool instances'
+      claimed = self._GetClaimedInstances()
+      claimed.update(warm_pool.Claim(
+          self.params.prefix,
+          [i for i in xrange(size) if i not in claimed],
+          self.machine_type.rsplit('/', 1)[-1],
+          lambda index: self._MakeServerMetadata(index, jvm_args)))
+      logging.info('%d instance(s) claimed from warm pool %s',
+                   len(claimed), warm_pool.pool_prefix)
+      if getattr(self.params, 'pool_target', 0):
+        replenish_thread = threading.Thread(target=self._ReplenishPool)
+        replenish_thread.start()
+
+    self.phase = 'creating instances'
+    self._CreateInstances(
+        [i for i in xrange(size) if i not in self._GetClaimedInstances()],
+        startup_script, jvm_args)
+
+    self.phase = 'waiting for instances RUNNING'
+    self._WaitForAllInstancesRunning(
+        lambda indexes: self._CreateInstances(indexes, startup_script,
+                                              jvm_args))
+    self.phase = 'waiting for SSH'
+    self._WaitForAllInstancesSshReady()
+    if self._GetClaimedInstances():
+      self.phase = 'restarting servers on pool instances'
+      self._RestartServers(self._GetClaimedInstances().values())
+    self.phase = 'setting up port forwarding'
+    self.SetPortForward()
+    self.phase = 'measuring clock offsets'
+    self.MeasureClockOffsets()
+    if replenish_thread:
+      self.phase = 'replenishing warm pool'
+      replenish_thread.join()
+    self.phase = 'started'
+
+  def _StartManagedGroup(self, startup_script, jvm_args):
+    """Starts up JMeter server cluster by managed instance group."""
+    if getattr(self.params, 'pool_prefix', None):
+      sys.stderr.write('\nWarm pool can\'t be used with managed instance '
+                       'group.\n\n')
+      sys.exit(1)
+    self.phase = 'resizing managed instance group'
+    assigned = self._ProvisionManagedGroup(self.params.size, startup_script,
+                                           jvm_args)
+    # Managed group recreates instances that fail by itself.
+    self.phase = 'waiting for instances RUNNING'
     self._WaitForAllInstancesRunning()
+    self.phase = 'waiting for SSH'
     self._WaitForAllInstancesSshReady()
+    if assigned:
+      self.phase = 'restarting servers on managed instances'
+      self._RestartServers(assigned)
+    self.phase = 'setting up port forwarding'
     self.SetPortForward()
+    self.phase = 'measuring clock offsets'
+    self.MeasureClockOffsets()
+    self.phase = 'started'
+
+  def GetLiveSize(self):
+    """Returns number of instances of the cluster, counted from index 0."""
+    if self._IsManagedGroup():
+      self._managed = None
+      size = 0
+      while size in self._GetManagedInstances():
+        size += 1
+      return size
+    names = set(i['name'] for i in self._GetGceApi().ListInstances(
+        self._MakeClusterFilter(), fields=['name']))
+    names.update(self._GetClaimedInstances().values())
+    size = 0
+    while self._MakeInstanceName(size) in names:
+      size += 1
+    return size
+
+  def Resize(self, size):
+    """Grows or shrinks the cluster, keeping the existing instances.
+
+    Port forwarding and client configuration are updated for the new size.
 
-  def SetPortForward(self):
-    """Sets up SSH port forwarding."""
+    Args:
+      size: New number of instances.
+    """
+    live_size = self.GetLiveSize()
+    self.operation_size = abs(size - live_size)
+    if size == live_size:
+      logging.info('Cluster %s already has %d instance(s).',
+                   self.params.prefix, size)
+      self.params.size = size
+      return
+
+    if size > live_size:
+      self._CheckServerIdRange(size)
+      logging.info('Growing cluster %s from %d to %d instance(s).',
+                   self.params.prefix, live_size, size)
+      startup_script = open(JMeterFiles.GetStartupScriptPath()).read() % (
+          CLOUD_STORAGE)
+      jvm_args = self._GetJvmArgs()
+      if self._IsManagedGroup():
+        self.phase = 'resizing managed instance group'
+        assigned = self._ProvisionManagedGroup(size, startup_script,
+                                               jvm_args)
+        self.params.size = size
+        self.phase = 'waiting for instances RUNNING'
+        self._WaitForAllInstancesRunning()
+        self.phase = 'waiting for SSH'
+        self._WaitForAllInstancesSshReady()
+        self._RestartServers(assigned)
+      else:
+        self.phase = 'creating instances'
+        self._CreateInstances(xrange(live_size, size), startup_script,
+                              jvm_args)
+        self.params.size = size
+        self.phase = 'waiting for instances RUNNING'
+        self._WaitForAllInstancesRunning(
+            lambda indexes: self._CreateInstances(indexes, startup_script,
+                                                  jvm_args))
+        self.phase = 'waiting for SSH'
+        self._WaitForAllInstancesSshReady()
+    else:
+      logging.info('Shrinking cluster %s from %d to %d instance(s).',
+                   self.params.prefix, live_size, size)
+      names = [self._MakeInstanceName(i) for i in xrange(size, live_size)]
+      if self._IsManagedGroup():
+        # The highest indexes are deleted, instead of instances the group
+        # would choose by resize.
+        self._GetGceApi().DeleteManagedInstances(self.params.prefix, names)
+        for index in xrange(size, live_size):
+          del self._managed[index]
+      else:
+        self._DeleteInstancesAndDisks(self._MakeNamesFilter(names))
+      self.params.size = size
+    self.phase = 'setting up port forwarding'
+    self.SetPortForward()
+    self.phase = 'measuring clock offsets'
+    self.MeasureClockOffsets()
+    self.phase = 'started'
+
+  def _GetServerPorts(self, index):
+    """Returns local ports of JMeter servers on the instance of the index."""
+    return [24000 + self._GetServerId(index, process)
+            for process in xrange(self.GetServersPerNode())]
+
+  def _ForwardPorts(self, index):
+    """Sets up SSH port forwarding to the instance of the cluster index.
+
+    Returns:
+      List of local addresses of JMeter servers on the instance.
+    """
     project = getattr(self.params, 'project', None) or DEFAULT_PROJECT
+    instance_name = self._MakeInstanceName(index)
+    logging.info('Setting up port forwarding for: %s', instance_name)
+    client_rmi_port = getattr(self.params, 'client_rmi_port', 25000)
+    # Run "gcutil ssh" command to activate SSH port forwarding.
+    command = [
+        'gcutil', '--project', project, 'ssh',
+        '--ssh_arg', '-oStrictHostKeyChecking=no']
+    server_list = []
+    for server_port in self._GetServerPorts(index):
+      server_rmi_port = server_port + 2000
+      command.extend([
+          '--ssh_arg', '-L%d:127.0.0.1:%d' % (server_port, server_port),
+          '--ssh_arg', '-L%d:127.0.0.1:%d' % (server_rmi_port,
+                                              server_rmi_port)])
+      server_list.append('127.0.0.1:%d' % server_port)
+    command.extend([
+        '--ssh_arg', '-R%d:127.0.0.1:%d' % (client_rmi_port,
+                                            client_rmi_port),
+        '--ssh_arg', '-N',
+        '--ssh_arg', '-f',
+        instance_name])
+    subprocess.call(' '.join(command), shell=True)
+    return server_list
+
+  def _StopPortForward(self, index):
+    """Kills SSH port forwarding to the instance of the cluster index."""
+    server_port = self._GetServerPorts(index)[0]
+    subprocess.call('pkill -f -- "-L%d:127.0.0.1:%d"' % (
+        server_port, server_port), shell=True)
 
+  def SetPortForward(self):
+    """Sets up SSH port forwarding."""
     server_list = []
     for index in xrange(self.params.size):
-      instance_name = self._MakeInstanceName(index)
-      logging.info('Setting up port forwarding for: %s', instance_name)
-      server_port = 24000 + index
-      server_rmi_port = 26000 + index
-      client_rmi_port = 25000
-      # Run "gcutil ssh" command to activate SSH port forwarding.
-      command = [
-          'gcutil', '--project', project, 'ssh',
-          '--ssh_arg', '-oStrictHostKeyChecking=no',
-          '--ssh_arg', '-L%(server_port)d:127.0.0.1:%(server_port)d',
-          '--ssh_arg', '-L%(server_rmi_port)d:127.0.0.1:%(server_rmi_port)d',
-          '--ssh_arg', '-R%(client_rmi_port)d:127.0.0.1:%(client_rmi_port)d',
-          '--ssh_arg', '-N',
-          '--ssh_arg', '-f',
-          '%(instance_name)s']
-      subprocess.call(
-          ' '.join(command) % {
-              'instance_name': instance_name,
-              'server_port': server_port,
-              'server_rmi_port': server_rmi_port,
-              'client_rmi_port': client_rmi_port,
-          },
-          shell=True)
-      server_list.append('127.0.0.1:%d' % server_port)
+      server_list.extend(self._ForwardPorts(index))
 
     # Update remote_hosts configuration in client configuration.
-    JMeterFiles.RewriteConfig('(?<=^remote_hosts=).*',
-                              ','.join(server_list))
+    JMeterFiles.WriteClientOverrides(
+        self.params.prefix,
+        {'remote_hosts': ','.join(server_list),
+         'client.rmi.localport': getattr(self.params, 'client_rmi_port',
+                                         25000)})
+
+  def ReplaceNode(self, index, timeout=None):
+    """Replaces instance of the cluster index with a new instance.
+
+    The instance and its boot disk are deleted, and new instance is created
+    at the same index, so that it gets the same server IDs and ports.  Port
+    forwarding to the index is set up again, test assets of the last 'sync'
+    are pulled, and clock offset of the new instance is measured.
+
+    Args:
+      index: Index of the instance in the cluster.
+      timeout: Seconds to wait for the new instance before giving up and
+          exiting.  None to wait indefinitely.
+    Returns:
+      Name of the new instance.
+    """
+    deadline = time.time() + timeout if timeout is not None else None
+    startup_script = open(JMeterFiles.GetStartupScriptPath()).read() % (
+        CLOUD_STORAGE)
+    api = self._GetGceApi()
+    jvm_args = self._GetJvmArgs()
+    instance_name = self._MakeInstanceName(index)
+    logging.info('Replacing instance %s at index %d', instance_name, index)
+    self._StopPortForward(index)
+    if self._IsManagedGroup():
+      api.DeleteManagedInstances(self.params.prefix, [instance_name])
+      del self._GetManagedInstances()[index]
+      # The new instance must not be counted before the old one is gone.
+      while instance_name in api.ListManagedInstances(self.params.prefix):
+        self._CheckDeadline(deadline, 'deletion of %s' % instance_name)
+        time.sleep(GCE_STATUS_CHECK_INTERVAL)
+      assigned = self._ProvisionManagedGroup(
+          self.params.size, startup_script, jvm_args, deadline)
+      self._WaitForAllInstancesRunning(indexes=[index], deadline=deadline)
+      self._WaitForAllInstancesSshReady(indexes=[index], deadline=deadline)
+      self._RestartServers(assigned)
+    else:
+      self._DeleteInstancesAndDisks(self._MakeNamesFilter([instance_name]))
+      # Claimed pool instance is replaced by instance of the cluster.
+      self._GetClaimedInstances().pop(index, None)
+      self._retries.pop(index, None)
+      self._CreateInstances([index], startup_script, jvm_args)
+      self._WaitForAllInstancesRunning(
+          lambda indexes: self._CreateInstances(indexes, startup_script,
+                                                jvm_args),
+          indexes=[index], deadline=deadline)
+      self._WaitForAllInstancesSshReady(indexes=[index], deadline=deadline)
+    self._ForwardPorts(index)
+    sync_script_path = JMeterFiles.GetSyncScriptPath(self.params.prefix)
+    if os.path.exists(sync_script_path):
+      self._PullAssets([index], open(sync_script_path).read())
+    self.MeasureClockOffsets(indexes=[index])
+    return self._MakeInstanceName(index)
+
+  def GetNodeStatus(self, probe_threads=jmeter_status.DEFAULT_PROBE_THREADS):
+    """Gets status of all nodes, by list requests and concurrent probes.
+
+    Returns:
+      List of status rows returned by jmeter_status.ProbeNodes().
+    """
+    nodes = [(index, self._MakeInstanceName(index),
+              self._GetServerPorts(index))
+             for index in xrange(self.params.size)]
+    instances = {}
+    if nodes:
+      # Label filters stay short regardless of the cluster size.  Instances
+      # claimed from warm pool keep the label of the pool.
+      label_filters = [self._MakeClusterFilter()]
+      warm_pool = self._GetWarmPool()
+      if warm_pool:
+        label_filters.append(GceApi.MakeLabelFilter(
+            jmeter_pool.POOL_LABEL, warm_pool.pool_prefix))
+      names = set(node[1] for node in nodes)
+      for label_filter in label_filters:
+        for instance in self._GetGceApi().ListInstances(
+            label_filter, fields=jmeter_status.INSTANCE_FIELDS):
+          if instance['name'] in names:
+            instances[instance['name']] = instance
+    return jmeter_status.ProbeNodes(nodes, instances, probe_threads)
+
+  def MakeWatchdog(self, interval, api_rate, failure_threshold,
+                   replace_timeout=jmeter_watchdog.DEFAULT_REPLACE_TIMEOUT):
+    """Creates watchdog of the nodes of the cluster.
+
+    Args:
+      interval: Seconds between checks of each node.
+      api_rate: Number of instance status requests per second.
+      failure_threshold: Number of consecutive failed checks before the node
+          is replaced.
+      replace_timeout: Seconds to wait for each replacement.
+
+    Returns:
+      jmeter_watchdog.Watchdog object, which replaces failed nodes by
+      ReplaceNode().
+    """
+    api = self._GetGceApi()
+    nodes = dict((index, (self._MakeInstanceName(index),
+                          self._GetServerPorts(index)))
+                 for index in xrange(self.params.size))
+    return jmeter_watchdog.Watchdog(
+        nodes, api.GetInstance,
+        lambda index: self.ReplaceNode(index, timeout=replace_timeout),
+        api_rate=api_rate, interval=interval,
+        failure_threshold=failure_threshold)
+
+  def _PullAssets(self, indexes, script):
+    """Runs pull script of test assets on instances in parallel.
+
+    Args:
+      indexes: Cluster indexes of instances to pull assets on.
+      script: Shell script returned by jmeter_sync.AssetSync.MakePullScript().
+    Returns:
+      List of names of instances that failed to pull assets.
+    """
+    project = getattr(self.params, 'project', None) or DEFAULT_PROJECT
+    zone = getattr(self.params, 'zone', None) or DEFAULT_ZONE
+    processes = []
+    for index in indexes:
+      instance_name = self._MakeInstanceName(index)
+      logging.info('Pulling test assets on %s', instance_name)
+      command = ('gcutil --project=%s --zone=%s ssh '
+                 '--ssh_arg "-o StrictHostKeyChecking=no" '
+                 '%s "bash -s"') % (project, zone, instance_name)
+      process = subprocess.Popen(command, shell=True, stdin=subprocess.PIPE)
+      process.stdin.write(script)
+      process.stdin.close()
+      processes.append((instance_name, process))
+
+    failed = []
+    for instance_name, process in processes:
+      if process.wait():
+        logging.error('Failed to pull test assets on %s', instance_name)
+        failed.append(instance_name)
+    return failed
+
+  def Sync(self, paths, split_paths=(), base_dir='.', csv_header=True,
+           cache_dir=None):
+    """Distributes test assets to all JMeter servers.
+
+    Only blobs missing in Cloud Storage are uploaded, and each server
+    downloads only blobs it doesn't have.  Servers pull in parallel.  The
+    pull script is kept, so that replacement instances pull the same assets.
+
+    Args:
+      paths: List of files or directories to distribute.
+      split_paths: CSV files among paths to split across servers.
+      base_dir: Local directory that corresponds to JMeter directory on
+          servers.
+      csv_header: Whether split CSV files have header line.
+      cache_dir: Local directory to stage blobs in.
+    Returns:
+      List of names of instances that failed to pull assets.
+    """
+    asset_sync = jmeter_sync.AssetSync(
+        CLOUD_STORAGE, cache_dir or os.path.join(
+            os.environ['HOME'], '.jmeter_cluster.sync'))
+
+    manifest = asset_sync.BuildManifest(
+        paths, base_dir, split_paths, self.params.size, csv_header)
+    asset_sync.UploadMissing(manifest)
+    script = asset_sync.MakePullScript(
+        manifest, getattr(self.params, 'index_offset', 0),
+        self.GetServersPerNode())
+    with open(JMeterFiles.GetSyncScriptPath(self.params.prefix), 'w') as f:
+      f.write(script)
+    return self._PullAssets(xrange(self.params.size), script)
+
+  def MeasureClockOffsets(self, indexes=None):
+    """Measures clock offsets of JMeter servers in parallel.
+
+    The offsets are written to the clock offsets file of the cluster, which
+    'report' and 'telemetry' subcommands use to correct timestamps.
+
+    Args:
+      indexes: Cluster indexes of instances to measure, whose offsets are
+          updated in the file.  Defaults to all instances of the cluster,
+          which replace the file.
+    Returns:
+      Dictionary of instance name to offset returned by
+      jmeter_clock.EstimateOffset().  Instances that couldn't be reached are
+      omitted.
+    """
+    project = getattr(self.params, 'project', None) or DEFAULT_PROJECT
+    zone = getattr(self.params, 'zone', None) or DEFAULT_ZONE
+    offsets_path = JMeterFiles.GetClockOffsetsPath(self.params.prefix)
+    if indexes is None:
+      indexes = xrange(self.params.size)
+      all_offsets = {}
+    else:
+      all_offsets = jmeter_clock.ReadOffsets(offsets_path)
+    offsets = {}
+
+    def Measure(instance_name):
+      command = ('gcutil --project=%s --zone=%s ssh '
+                 '--ssh_arg "-o StrictHostKeyChecking=no" '
+                 '%s "%s"') % (project, zone, instance_name,
+                               jmeter_clock.REMOTE_CLOCK_COMMAND)
+      offset = jmeter_clock.MeasureOffset(command)
+      if offset:
+        offsets[instance_name] = offset
+      else:
+        logging.warning('Failed to measure clock offset of %s',
+                        instance_name)
+
+    threads = [threading.Thread(target=Measure,
+                                args=(self._MakeInstanceName(index),))
+               for index in indexes]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    for instance_name, offset in sorted(offsets.items()):
+      logging.info('Clock offset of %s: %+.1f ms (round trip %.1f ms)',
+                   instance_name, offset['offset_ms'],
+                   offset['round_trip_ms'])
+    all_offsets.update(offsets)
+    jmeter_clock.WriteOffsets(all_offsets, offsets_path)
+    return offsets
+
+  def CollectTelemetry(self):
+    """Collects resource telemetry from all JMeter servers in parallel.
+
+    Returns:
+      Dictionary of instance name to list of telemetry samples.  Instances
+      that couldn't be reached are omitted.
+    """
+    project = getattr(self.params, 'project', None) or DEFAULT_PROJECT
+    zone = getattr(self.params, 'zone', None) or DEFAULT_ZONE
+    processes = []
+    for index in xrange(self.params.size):
+      instance_name = self._MakeInstanceName(index)
+      command = ('gcutil --project=%s --zone=%s ssh '
+                 '--ssh_arg "-o StrictHostKeyChecking=no" '
+                 '%s "cat %s"') % (project, zone, instance_name,
+                                   TELEMETRY_FILE)
+      processes.append((instance_name, subprocess.Popen(
+          command, shell=True, stdout=subprocess.PIPE)))
+
+    samples_by_server = {}
+    for instance_name, process in processes:
+      output = process.communicate()[0]
+      if process.returncode:
+        logging.warning('Failed to collect telemetry from %s', instance_name)
+        continue
+      samples_by_server[instance_name] = jmeter_telemetry.ParseTelemetry(
+          output)
+    return samples_by_server
 
   @staticmethod
   def _DeleteResource(filter_string, list_method, delete_method, get_method):
@@ -234,12 +1267,16 @@ class JMeterCluster(object):
       list_method: Method to list the resources.
       delete_method: Method to delete the single resource.
       get_method: Method to get the status of the single resource.
+    Returns:
+      Number of resources deleted.
     """
+    deleted = 0
     while True:
-      list_of_resources = list_method(filter_string)
+      list_of_resources = list_method(filter_string, fields=['name'])
       resource_names = [i['name'] for i in list_of_resources]
       if not resource_names:
-        break
+        return deleted
+      deleted += len(resource_names)
       for name in resource_names:
         logging.info('  %s', name)
         delete_method(name)
@@ -256,29 +1293,191 @@ class JMeterCluster(object):
         resource_names = still_alive
         time.sleep(GCE_STATUS_CHECK_INTERVAL)
 
-  def ShutDown(self):
-    """Shuts down JMeter server cluster."""
-    name_filter = 'name eq ^%s-.*' % self.params.prefix
+  def _DeleteInstancesAndDisks(self, name_filter, api=None,
+                               track_phase=True):
+    """Deletes instances and their boot disks that match the filter.
+
+    Args:
+      name_filter: Filter string of the resources to delete.
+      api: GceApi object of the zone to delete resources in.  Defaults to
+          the zone of the cluster.
+      track_phase: Whether to record the deletion in phases of the
+          operation.  False when deleting in background of other operation.
+    Returns:
+      Number of instances deleted.
+    """
+    api = api or self._GetGceApi()
     logging.info('Delete instances:')
-    self._DeleteResource(
-        name_filter, self._GetGceApi().ListInstances,
-        self._GetGceApi().DeleteInstance, self._GetGceApi().GetInstance)
+    if track_phase:
+      self.phase = 'deleting instances'
+    deleted = self._DeleteResource(
+        name_filter, api.ListInstances, api.DeleteInstance, api.GetInstance)
     logging.info('Delete disks:')
+    if track_phase:
+      self.phase = 'deleting disks'
     self._DeleteResource(
-        name_filter, self._GetGceApi().ListDisks,
-        self._GetGceApi().DeleteDisk, self._GetGceApi().GetDisk)
+        name_filter, api.ListDisks, api.DeleteDisk, api.GetDisk)
+    return deleted
+
+  def _DeleteInAllZones(self, label_filter):
+    """Deletes instances and disks that match the filter in all zones.
+
+    Returns:
+      Number of instances deleted.
+    """
+    api = self._GetGceApi()
+    zones = set(i['zone'] for i in api.ListInstancesInAllZones(
+        label_filter, fields=['name']))
+    zones.update(d['zone'] for d in api.ListDisksInAllZones(
+        label_filter, fields=['name']))
+    deleted = 0
+    for zone in sorted(zones):
+      logging.info('Deleting resources of cluster %s in zone %s',
+                   self.params.prefix, zone)
+      deleted += self._DeleteInstancesAndDisks(label_filter,
+                                               self._GetZoneApi(zone))
+    return deleted
+
+  @staticmethod
+  def _MakeNamesFilter(names):
+    return 'name eq ^(%s)$' % '|'.join(sorted(names))
+
+  def ShutDown(self):
+    """Shuts down JMeter server cluster.
+
+    Resources are found by the cluster label.  With --all_zones, resources
+    of the cluster in all zones are deleted, and with --by_name, resources
+    are found by name prefix, for clusters started without labels.
+    Instances claimed from warm pool are deleted as well.  With
+    --provisioning managed_group, managed instance group and its instance
+    template are deleted first, so that the group doesn't recreate
+    instances.
+    """
+    claimed = self._GetClaimedInstances()
+    self.operation_size = 0
+    if self._IsManagedGroup():
+      self.operation_size += self._DeleteManagedGroup()
+    if getattr(self.params, 'by_name', False):
+      self.operation_size += self._DeleteInstancesAndDisks(
+          'name eq ^%s-.*' % self.params.prefix)
+    elif getattr(self.params, 'all_zones', False):
+      self.operation_size += self._DeleteInAllZones(self._MakeClusterFilter())
+    else:
+      self.operation_size += self._DeleteInstancesAndDisks(
+          self._MakeClusterFilter())
+    if claimed:
+      self.operation_size += self._DeleteInstancesAndDisks(
+          self._MakeNamesFilter(claimed.values()))
+    self.phase = 'shut down'
+
+  def ListPool(self):
+    """Returns list of all instance resources of warm pool."""
+    return self._GetWarmPool().ListInstances()
+
+  def EvictPool(self, track_phase=True):
+    """Deletes idle pool instances by --pool_max_size and --idle_ttl.
+
+    Args:
+      track_phase: Whether to record the deletion in phases of the
+          operation.
+    Returns:
+      List of names of instances deleted.
+    """
+    evictions = self._GetWarmPool().SelectEvictions(
+        getattr(self.params, 'pool_max_size', None),
+        getattr(self.params, 'idle_ttl', None))
+    if evictions:
+      self._DeleteInstancesAndDisks(self._MakeNamesFilter(evictions),
+                                    track_phase=track_phase)
+    return evictions
+
+
+def _GetMachineType(params):
+  return getattr(params, 'machinetype', None) or DEFAULT_MACHINE_TYPE
+
+
+def _RecordTimings(params, operation, jmeter_cluster):
+  """Appends phase timings of the finished operation to timings history."""
+  phase_seconds = dict(jmeter_cluster.phase_seconds)
+  if not phase_seconds:
+    return
+  try:
+    jmeter_estimate.RecordTimings(
+        params.timings, operation, jmeter_cluster.operation_size,
+        _GetMachineType(params), phase_seconds)
+  except IOError as e:
+    logging.warning('Failed to record timings: %s', e)
+
+
+def _DryRun(params, operation, method_name, *args):
+  """Runs cluster operation against resources simulated in memory.
+
+  Shows the sequence of API calls and commands the operation would make,
+  and the estimate of its wall time and cost.  --assume_size instances of
+  the cluster are assumed to exist.
+
+  Args:
+    params: argparse.Namespace of command line options.
+    operation: Operation name in timings history, e.g. 'start'.
+    method_name: Name of JMeterCluster method of the operation.
+    *args: Parameters of the method.
+  """
+  recorder = jmeter_dry_run.Recorder()
+  api_pool = jmeter_dry_run.DryRunApiPool(recorder)
+  api = api_pool.Get(getattr(params, 'project', None) or DEFAULT_PROJECT,
+                     getattr(params, 'zone', None) or DEFAULT_ZONE)
+  for index in xrange(params.assume_size):
+    api.AddInstance('%s-%03d' % (params.prefix, index), labels={
+        CLUSTER_LABEL: GceApi.MakeLabelValue(params.prefix)})
+
+  jmeter_cluster = JMeterCluster(params, api_pool=api_pool)
+  with jmeter_dry_run.Intercept(recorder, [
+      (jmeter_clock, 'MeasureOffset',
+       {'offset_ms': 0.0, 'round_trip_ms': 0.0}),
+      (jmeter_clock, 'WriteOffsets', None),
+      (JMeterFiles, 'WriteClientOverrides', None)]):
+    getattr(jmeter_cluster, method_name)(*args)
+
+  logging.info('Dry run of %s, %d step(s):\n%s', operation,
+               len(recorder.steps), recorder.Format())
+  estimate = jmeter_estimate.EstimateOperation(
+      jmeter_estimate.LoadTimings(params.timings), operation,
+      jmeter_cluster.phases, jmeter_cluster.operation_size,
+      _GetMachineType(params), recorder.CountApiRequests(),
+      getattr(params, 'size', None) or 0)
+  logging.info('Estimate of %s of %d instance(s):\n%s', operation,
+               jmeter_cluster.operation_size,
+               jmeter_estimate.FormatEstimate(estimate))
 
 
 def Start(params):
   """Sub-command handler for 'start'."""
+  if params.dry_run:
+    _DryRun(params, 'start', 'Start')
+    return
   jmeter_cluster = JMeterCluster(params)
   jmeter_cluster.Start()
+  _RecordTimings(params, 'start', jmeter_cluster)
+
+
+def Resize(params):
+  """Sub-command handler for 'resize'."""
+  if params.dry_run:
+    _DryRun(params, 'resize', 'Resize', params.size)
+    return
+  jmeter_cluster = JMeterCluster(params)
+  jmeter_cluster.Resize(params.size)
+  _RecordTimings(params, 'resize', jmeter_cluster)
 
 
 def ShutDown(params):
   """Sub-command handler for 'shutdown'."""
+  if params.dry_run:
+    _DryRun(params, 'shutdown', 'ShutDown')
+    return
   jmeter_cluster = JMeterCluster(params)
   jmeter_cluster.ShutDown()
+  _RecordTimings(params, 'shutdown', jmeter_cluster)
 
 
 def PortForward(params):
@@ -287,11 +1486,485 @@ def PortForward(params):
   jmeter_cluster.SetPortForward()
 
 
-def Client(unused_params, *additional_args):
+def Client(params, *additional_args):
   """Sub-command handler for 'client'."""
+  override = JMeterFiles.GetClientOverridePath(params.prefix)
+  if os.path.exists(override):
+    additional_args = ('-q', override) + additional_args
   JMeterFiles.RunJmeterClient(*additional_args)
 
 
+def _LogClientEvent(event):
+  """Shows progress of headless JMeter client run."""
+  if event['type'] == 'progress':
+    logging.info('%d samples in %.0fs = %.1f/s, avg %d ms, %d error(s)',
+                 event['samples'], event['seconds'], event['throughput'],
+                 event['mean'], event['errors'])
+  elif event['type'] in ('server_starting', 'server_finished'):
+    logging.info('Test %s on %s', event['type'].split('_')[1],
+                 event['server'])
+  elif event['type'] == 'error':
+    logging.warning('%s', event['message'])
+  else:
+    logging.debug('%s', event.get('message', event['type']))
+
+
+def Run(params, *jmeter_args):
+  """Sub-command handler for 'run'."""
+  command = JMeterFiles.GetClientCommand()
+  override = JMeterFiles.GetClientOverridePath(params.prefix)
+  if os.path.exists(override):
+    command += ['-q', override]
+  results_dir = jmeter_client_runner.MakeRunDirectory(params.results_dir,
+                                                      params.prefix)
+  if bool(params.plan) == bool(params.workloads):
+    sys.stderr.write('\nSpecify either test plan or --workloads.\n\n')
+    sys.exit(1)
+  plan = params.plan
+  if params.workloads:
+    try:
+      plan, workload_args = _PrepareWorkloads(params.workloads, override,
+                                              results_dir)
+    except jmeter_workloads.WorkloadSpecError as e:
+      sys.stderr.write('\nInvalid workloads: %s\n\n' % e)
+      sys.exit(1)
+    jmeter_args = workload_args + list(jmeter_args)
+  start_ms = None
+  if params.sync_start:
+    if not os.path.isdir(results_dir):
+      os.makedirs(results_dir)
+    # The combined plan of workloads is already in the run directory, and
+    # is rewritten in place.
+    barrier_plan = os.path.join(results_dir, os.path.basename(plan))
+    try:
+      jmeter_start_barrier.AddStartBarrier(plan, barrier_plan)
+    except (ValueError, SyntaxError) as e:
+      sys.stderr.write('\nFailed to add start barrier: %s\n\n' % e)
+      sys.exit(1)
+    plan = barrier_plan
+    server_count = 0
+    if os.path.exists(override):
+      server_count = len(jmeter_properties.PropertiesFile.Load(
+          override).Get('remote_hosts', '').split(','))
+    start_ms = jmeter_start_barrier.ComputeStartTime(server_count,
+                                                     params.start_lead)
+    jmeter_args = jmeter_start_barrier.MakeJMeterArgs(
+        start_ms, jmeter_clock.ReadOffsets(
+            JMeterFiles.GetClockOffsetsPath(params.prefix))) + list(
+                jmeter_args)
+    logging.info('Test starts on all servers at %s',
+                 time.strftime('%H:%M:%S', time.localtime(start_ms / 1000)))
+  # Segmenter starts its uploader thread, so it's made only after the
+  # command line has been validated.
+  segmenter = None
+  if params.stream_results:
+    segmenter = jmeter_segments.Segmenter(
+        jmeter_segments.MakeStore('%s/%s' % (
+            params.stream_results.rstrip('/'),
+            os.path.basename(results_dir))),
+        os.path.join(results_dir, jmeter_client_runner.SEGMENTS_DIR),
+        segment_bytes=params.segment_mb << 20,
+        segment_seconds=params.segment_seconds)
+  watchdog = None
+  if params.watchdog:
+    jmeter_cluster = JMeterCluster(params)
+    params.size = jmeter_cluster.GetLiveSize()
+    watchdog = jmeter_cluster.MakeWatchdog(
+        params.watchdog_interval, params.watchdog_api_rate,
+        params.failure_threshold, params.replace_timeout)
+    logging.info('Watching %d node(s) of cluster %s', params.size,
+                 params.prefix)
+    watchdog.Start()
+  runner = jmeter_client_runner.ClientRunner(
+      command, results_dir, timeout=params.timeout, on_event=_LogClientEvent,
+      segmenter=segmenter)
+  run_start_ms = int(time.time() * 1000)
+  summary = runner.Run(plan, jmeter_args)
+  if watchdog:
+    _ReportCapacityGaps(
+        watchdog.Stop(), params.size * jmeter_cluster.GetServersPerNode(),
+        run_start_ms, int(time.time() * 1000), results_dir)
+
+  stats = summary['stats']
+  if stats:
+    logging.info('%d samples in %.0fs = %.1f/s, avg %d ms, min %d ms, '
+                 'max %d ms, %d error(s) (%.2f%%)', stats['samples'],
+                 stats['seconds'], stats['throughput'], stats['mean'],
+                 stats['min'], stats['max'], stats['errors'],
+                 stats['error_rate'] * 100)
+  logging.info('JMeter client exited with status %d.  Results in %s',
+               summary['exit_status'], runner.results_dir)
+  if segmenter:
+    logging.info('%d result segment(s) uploaded to %s',
+                 summary['segments'], summary['results'])
+    if not summary['results_complete']:
+      logging.error('Some result segments failed to upload.  They are '
+                    'left in %s', os.path.join(
+                        results_dir, jmeter_client_runner.SEGMENTS_DIR))
+      sys.exit(1)
+  _ReportStartSkew(summary, params.prefix, results_dir, start_ms)
+  if summary['exit_status'] or summary['timed_out'] or summary['interrupted']:
+    sys.exit(1)
+
+
+def _PrepareWorkloads(spec_file, override, results_dir):
+  """Combines plans of workloads, and assigns servers to them.
+
+  The combined plan and the assignment are written to the run directory.
+
+  Args:
+    spec_file: Path to workload spec file.
+    override: Path to client properties file with 'remote_hosts'.
+    results_dir: Directory of the run.
+  Returns:
+    Tuple of path to the combined plan and list of JMeter parameters to
+    pass the assignment to the servers.
+  Raises:
+    jmeter_workloads.WorkloadSpecError: The spec or a plan is invalid, or
+        the cluster has too few servers.
+  """
+  workloads = jmeter_workloads.LoadWorkloadSpec(spec_file)
+  remote_hosts = ''
+  if os.path.exists(override):
+    remote_hosts = jmeter_properties.PropertiesFile.Load(override).Get(
+        'remote_hosts', '')
+  server_ports = [int(host.rsplit(':', 1)[1])
+                  for host in remote_hosts.split(',') if host]
+  assignment = jmeter_workloads.AssignServers(workloads, len(server_ports))
+  if not os.path.isdir(results_dir):
+    os.makedirs(results_dir)
+  plan = os.path.join(results_dir, 'workloads.jmx')
+  scales = jmeter_workloads.BuildPlan(workloads, plan)
+
+  for workload in workloads:
+    workload['servers'] = assignment.count(workload['name'])
+    workload['scale'] = scales[workload['name']]
+    logging.info('Workload %s: weight %s, %d server(s)', workload['name'],
+                 workload['weight'], workload['servers'])
+  with open(os.path.join(results_dir, jmeter_workloads.WORKLOADS_FILE),
+            'w') as f:
+    json.dump({'workloads': workloads,
+               'servers': [{'port': port, 'workload': name}
+                           for port, name in zip(server_ports, assignment)]},
+              f, indent=2, sort_keys=True)
+  return plan, jmeter_workloads.MakeJMeterArgs(assignment, server_ports,
+                                               scales)
+
+
+def _ReportCapacityGaps(gaps, total_servers, start_ms, end_ms, results_dir):
+  """Logs capacity gaps of the run and writes them to the run directory.
+
+  Args:
+    gaps: List of capacity gaps returned by jmeter_watchdog.Watchdog.Stop().
+    total_servers: Number of JMeter servers of the cluster.
+    start_ms: Start time of the run in epoch milliseconds.
+    end_ms: End time of the run in epoch milliseconds.
+    results_dir: Directory of the run.
+  """
+  gap_summary = jmeter_watchdog.SummarizeGaps(gaps, total_servers, start_ms,
+                                              end_ms)
+  if gaps:
+    logging.warning('%s', jmeter_watchdog.FormatGaps(gap_summary))
+  if not os.path.isdir(results_dir):
+    os.makedirs(results_dir)
+  with open(os.path.join(results_dir, jmeter_watchdog.GAPS_FILE), 'w') as f:
+    json.dump(gap_summary, f, indent=2, sort_keys=True)
+
+
+def _ReportStartSkew(summary, prefix, results_dir, start_ms):
+  """Logs start skew across nodes and writes it to the run directory.
+
+  Args:
+    summary: Summary of the run returned by ClientRunner.Run().
+    prefix: Name prefix of the cluster, to read clock offsets of.
+    results_dir: Directory of the run.
+    start_ms: Start time of the start barrier.  None if not used.
+  """
+  results = summary.get('results')
+  if not results:
+    return
+  offsets = jmeter_clock.ReadOffsets(JMeterFiles.GetClockOffsetsPath(prefix))
+  try:
+    if 'segments' in summary:
+      # Only the first segments are downloaded.
+      skew = jmeter_start_barrier.MeasureStartSkew(
+          jmeter_clock.CorrectSamples(jmeter_report.ReadJtlSamples(
+              jmeter_segments.ReadSegmentLines(
+                  jmeter_segments.MakeStore(results))), offsets))
+    elif os.path.exists(results):
+      with open(results) as f:
+        skew = jmeter_start_barrier.MeasureStartSkew(
+            jmeter_clock.CorrectSamples(jmeter_report.ReadJtlSamples(f),
+                                        offsets))
+    else:
+      return
+  except IOError as e:
+    logging.warning('Failed to measure start skew: %s', e)
+    return
+  if not skew:
+    return
+  skew['start_ms'] = start_ms
+  logging.info('%s', jmeter_start_barrier.FormatStartSkew(skew, start_ms))
+  skew_path = os.path.join(results_dir, jmeter_start_barrier.SKEW_FILE)
+  with open(skew_path, 'w') as f:
+    json.dump(skew, f, indent=2, sort_keys=True)
+
+
+def Status(params):
+  """Sub-command handler for 'status'."""
+  jmeter_cluster = JMeterCluster(params)
+  if params.size is None:
+    params.size = jmeter_cluster.GetLiveSize()
+  view = jmeter_status.StatusView(sys.stdout)
+  try:
+    while True:
+      rows = jmeter_cluster.GetNodeStatus(params.probe_threads)
+      view.Update(rows)
+      if not params.watch:
+        break
+      time.sleep(params.interval)
+  except KeyboardInterrupt:
+    return
+  if not all(jmeter_status.IsHealthy(row) for row in rows):
+    sys.exit(1)
+
+
+def Sync(params):
+  """Sub-command handler for 'sync'."""
+  jmeter_cluster = JMeterCluster(params)
+  failed = jmeter_cluster.Sync(params.paths, split_paths=params.split or [],
+                               base_dir=params.base_dir,
+                               csv_header=not params.no_csv_header)
+  if failed:
+    sys.exit(1)
+
+
+def Telemetry(params):
+  """Sub-command handler for 'telemetry'."""
+  jmeter_cluster = JMeterCluster(params)
+  samples_by_server = jmeter_clock.CorrectTelemetry(
+      jmeter_cluster.CollectTelemetry(),
+      jmeter_clock.ReadOffsets(
+          JMeterFiles.GetClockOffsetsPath(params.prefix)))
+
+  start_ms = end_ms = None
+  report = None
+  if params.report:
+    with open(params.report) as f:
+      report = json.load(f)
+    start_ms = report['summary']['start_ms']
+    end_ms = report['summary']['end_ms']
+
+  findings = jmeter_telemetry.DetectSaturation(
+      samples_by_server,
+      thresholds={'cpu': params.cpu_threshold,
+                  'gc_percent': params.gc_threshold},
+      start_ms=start_ms, end_ms=end_ms)
+  for finding in findings:
+    logging.warning('%s is saturated on %s: %.0f%% of samples at or above '
+                    '%s (peak %s)', finding['server'], finding['metric'],
+                    finding['fraction'] * 100, finding['threshold'],
+                    finding['peak'])
+  if findings:
+    logging.warning('Latency may be skewed by saturated load generators.  '
+                    'Consider adding servers or a larger --machinetype.')
+
+  telemetry = {'samples': samples_by_server, 'saturation': findings}
+  with open(params.output, 'w') as f:
+    json.dump(telemetry, f, indent=2, sort_keys=True)
+  logging.info('Telemetry written to %s', params.output)
+
+  if report:
+    timeline = report['timeline']
+    report['telemetry'] = {
+        'servers': dict(
+            (server, jmeter_telemetry.AlignToTimeline(
+                samples, timeline['start_ms'], len(timeline['counts']),
+                timeline['bucket_seconds']))
+            for server, samples in samples_by_server.items()),
+        'saturation': findings,
+    }
+    with open(params.report, 'w') as f:
+      jmeter_report.WriteJson(report, f)
+    logging.info('Telemetry aligned with timeline added to %s', params.report)
+
+
+def Pool(params):
+  """Sub-command handler for 'pool'."""
+  if not params.pool_prefix:
+    sys.stderr.write('\nPlease specify warm pool using --pool_prefix.\n\n')
+    sys.exit(1)
+  jmeter_cluster = JMeterCluster(params)
+  if params.action == 'fill':
+    created = jmeter_cluster.FillPool()
+    logging.info('%d instance(s) added to warm pool.', len(created))
+  elif params.action == 'evict':
+    evicted = jmeter_cluster.EvictPool()
+    logging.info('%d idle instance(s) evicted from warm pool.', len(evicted))
+  elif params.action == 'drain':
+    params.pool_max_size = 0
+    evicted = jmeter_cluster.EvictPool()
+    logging.info('%d idle instance(s) deleted from warm pool.', len(evicted))
+  else:
+    instances = jmeter_cluster.ListPool()
+    logging.info('Warm pool %s: %d instance(s)', params.pool_prefix,
+                 len(instances))
+    for instance in instances:
+      metadata = jmeter_pool.GetMetadata(instance)
+      if metadata.get(jmeter_pool.CLAIMED_BY_KEY):
+        state = 'claimed by %s' % metadata[jmeter_pool.CLAIMED_BY_KEY]
+      elif jmeter_pool.IsIdle(instance):
+        state = 'idle for %ds' % (
+            time.time() - jmeter_pool.GetIdleSince(instance))
+      else:
+        state = instance.get('status', 'UNKNOWN')
+      logging.info('  %s: %s', instance['name'], state)
+
+
+def Queue(params, *jmeter_args):
+  """Sub-command handler for 'queue'."""
+  job_queue = jmeter_queue.JobQueue(params.queue_file)
+  if params.action == 'add':
+    if not params.plan:
+      sys.stderr.write('\nPlease specify test plan to add.\n\n')
+      sys.exit(1)
+    job_id = job_queue.Add(params.plan, params.size, jmeter_args)
+    logging.info('Job %d added: %s on %d server(s)', job_id, params.plan,
+                 params.size)
+  elif params.action == 'list':
+    for job in job_queue.List():
+      logging.info('  %d: %s (%d server(s)) %s', job['id'], job['plan'],
+                   job['size'], job['status'])
+  else:
+    jmeter_cluster = JMeterCluster(params)
+    override = JMeterFiles.GetClientOverridePath(params.prefix)
+    jobs = jmeter_queue.RunJobs(
+        job_queue, jmeter_cluster,
+        lambda args: JMeterFiles.RunJmeterClient('-q', override, *args),
+        params.results_dir, shutdown=not params.keep_cluster)
+    logging.info('%d job(s) run.  Results index: %s', len(jobs),
+                 os.path.join(params.results_dir, jmeter_queue.RESULTS_INDEX))
+    if [j for j in jobs if j['status'] != jmeter_queue.SUCCEEDED]:
+      sys.exit(1)
+
+
+def Multi(params):
+  """Sub-command handler for 'multi'."""
+  try:
+    params_list = jmeter_multi_cluster.LoadClusterSpec(params.spec)
+  except jmeter_multi_cluster.ClusterSpecError as e:
+    sys.stderr.write('\n%s\n\n' % e)
+    sys.exit(1)
+
+  api_pool = GceApiPool('jmeter_cluster', CLIENT_ID, CLIENT_SECRET,
+                        rate_limiter=RateLimiter(params.api_rate),
+                        credentials=_GetCredentials(params))
+  clusters = dict((p.prefix, JMeterCluster(p, api_pool=api_pool))
+                  for p in params_list)
+  method_name = {
+      'start': 'Start',
+      'shutdown': 'ShutDown',
+      'portforward': 'SetPortForward',
+  }[params.action]
+  results = jmeter_multi_cluster.RunConcurrently(clusters, method_name)
+  # Cluster without result didn't finish.
+  if not all(results.get(name) for name in clusters):
+    sys.exit(1)
+
+
+def Report(params):
+  """Sub-command handler for 'report'."""
+  if params.compare:
+    with open(params.compare[0]) as f:
+      base = json.load(f)
+    with open(params.compare[1]) as f:
+      new = json.load(f)
+    findings = jmeter_report.CompareReports(
+        base, new, z_threshold=params.z_threshold,
+        min_change=params.min_change)
+    regressions = 0
+    for finding in findings:
+      if finding['regression']:
+        regressions += 1
+        log = logging.error
+      else:
+        log = logging.info
+      log('%s %s: %.2f -> %.2f (%+.1f%%, z=%.2f)',
+          finding['kind'], finding['label'] or '(all)', finding['base'],
+          finding['new'], finding['change'] * 100, finding['z'])
+    if regressions:
+      logging.error('%d regression(s) found.', regressions)
+      sys.exit(1)
+    return
+
+  if not params.results and not params.segments:
+    sys.stderr.write('\nPlease specify JMeter result file to report on.\n\n')
+    sys.exit(1)
+
+  metadata = {
+      'prefix': params.prefix,
+      'size': params.size,
+      'project': params.project or DEFAULT_PROJECT,
+      'zone': params.zone or DEFAULT_ZONE,
+      'image': params.image or DEFAULT_IMAGE,
+      'machine_type': params.machinetype or DEFAULT_MACHINE_TYPE,
+  }
+  # Samples are timestamped by server clocks, which may be skewed.
+  offsets = jmeter_clock.ReadOffsets(
+      params.clock_offsets or JMeterFiles.GetClockOffsetsPath(params.prefix))
+  if offsets:
+    metadata['clock_offsets'] = offsets
+  if params.segments:
+    # Segments are downloaded one by one as the report reads them.
+    report = jmeter_report.BuildReport(
+        jmeter_clock.CorrectSamples(jmeter_report.ReadJtlSamples(
+            jmeter_segments.ReadSegmentLines(
+                jmeter_segments.MakeStore(params.segments))), offsets),
+        metadata, params.bucket)
+  elif jmeter_binary.IsBinaryResults(params.results):
+    with jmeter_binary.BinaryResultsReader(params.results) as reader:
+      report = jmeter_report.BuildReport(
+          jmeter_clock.CorrectSamples(reader, offsets), metadata,
+          params.bucket)
+  else:
+    with open(params.results) as f:
+      report = jmeter_report.BuildReport(
+          jmeter_clock.CorrectSamples(jmeter_report.ReadJtlSamples(f),
+                                      offsets),
+          metadata, params.bucket)
+  capacity_gaps = params.capacity_gaps
+  if not capacity_gaps and params.results:
+    # Written by "run --watchdog" next to the results.
+    capacity_gaps = os.path.join(os.path.dirname(params.results),
+                                 jmeter_watchdog.GAPS_FILE)
+    if not os.path.exists(capacity_gaps):
+      capacity_gaps = None
+  if capacity_gaps:
+    with open(capacity_gaps) as f:
+      report['capacity_gaps'] = json.load(f)
+  with open(params.output, 'w') as f:
+    jmeter_report.WriteJson(report, f)
+  logging.info('Report written to %s', params.output)
+  if params.html:
+    with open(params.html, 'w') as f:
+      jmeter_report.WriteHtml(report, f)
+    logging.info('HTML report written to %s', params.html)
+
+
+def Convert(params):
+  """Sub-command handler for 'convert'."""
+  output = params.output or os.path.splitext(params.results)[0] + '.jtlb'
+  with open(params.results) as jtl_file:
+    with open(output, 'wb') as f:
+      count = jmeter_binary.ConvertJtl(jtl_file, f, params.block_size)
+  logging.info('%d samples converted to %s (%d bytes, %d bytes in CSV)',
+               count, output, os.path.getsize(output),
+               os.path.getsize(params.results))
+  if params.benchmark:
+    logging.info('%s', jmeter_binary.FormatBenchmark(
+        jmeter_binary.Benchmark(params.results, params.block_size)))
+
+
 class JMeterExecuter(object):
   """Class to parse command line arguments and execute sub-commands."""
 
@@ -309,6 +1982,35 @@ class JMeterExecuter(object):
         action=SetNoAuthLocalWebserverAction,
         help='Do not attempt to open browser on local machine.')
 
+    # Non-interactive authorization, e.g. for CI runners.
+    self.parser.add_argument(
+        '--credentials', default='oauth2',
+        choices=['oauth2', 'service_account', 'metadata'],
+        help='How to authorize Compute Engine API access.  "oauth2" does '
+        'interactive OAuth2 authorization.  "service_account" uses the key '
+        'given by --service_account_key.  "metadata" gets token from '
+        'metadata server. (default "oauth2")')
+    self.parser.add_argument(
+        '--service_account_key',
+        help='Service account key file in JSON.')
+    self.parser.add_argument(
+        '--metadata_token_url', default=gce_credentials.METADATA_TOKEN_URL,
+        help='URL of metadata server to get access token from.')
+    self.parser.add_argument(
+        '--token_cache',
+        default=os.path.join(os.environ['HOME'],
+                             '.jmeter_cluster.token_cache'),
+        help='Access token cache file shared by concurrent processes. '
+        '(default "~/.jmeter_cluster.token_cache")')
+
+    self.parser.add_argument(
+        '--profile', action='store_true',
+        help='Profile API calls, HTTP requests, sleeps and subprocesses, and '
+        'write folded stacks and Chrome trace.')
+    self.parser.add_argument(
+        '--profile_output', default='jmeter_profile',
+        help='File name prefix of profile output. (default "jmeter_profile")')
+
     self.subparsers = self.parser.add_subparsers(
         title='Sub-commands', dest='subcommand')
 
@@ -323,6 +2025,41 @@ class JMeterExecuter(object):
     subparser.add_argument(
         '--zone',
         help='Zone name where JMeter server cluster is located.')
+    subparser.add_argument(
+        '--pool_prefix',
+        help='Name prefix of warm pool instances.  Instances of the cluster '
+        'claimed from the pool are found by it.')
+    subparser.add_argument(
+        '--provisioning', default='instances',
+        choices=['instances', MANAGED_GROUP],
+        help='How instances are created.  "instances" creates each instance '
+        'by its own request.  "managed_group" creates instance template and '
+        'managed instance group named after --prefix, and resizes the group. '
+        'Specify the same value to all subcommands. (default "instances")')
+
+  def _AddServersPerNodeParam(self, subparser):
+    """Add --servers-per-node parameter to subcommand parser."""
+    subparser.add_argument(
+        '--servers-per-node', dest='servers_per_node', type=int,
+        help='Number of JMeter servers on each instance, on distinct ports.  '
+        '(default: the value of live instances of the cluster, or 1)')
+
+  def _AddDryRunParams(self, subparser):
+    """Add dry run and timings history parameters to subcommand parser."""
+    subparser.add_argument(
+        '--dry-run', dest='dry_run', action='store_true',
+        help='Show API calls and commands the operation would make, and '
+        'estimate its time and cost, without making them.')
+    subparser.add_argument(
+        '--assume_size', default=0, type=int,
+        help='Number of instances of the cluster assumed to exist in dry '
+        'run. (default 0)')
+    subparser.add_argument(
+        '--timings',
+        default=os.path.join(os.environ['HOME'], '.jmeter_cluster.timings'),
+        help='Timings history file, which operations append phase timings '
+        'to, and dry run estimates time from. '
+        '(default "~/.jmeter_cluster.timings")')
 
   def _AddStartSubcommand(self):
     """Add 'start' subcommand to argument parser."""
@@ -339,14 +2076,67 @@ class JMeterExecuter(object):
     parser_start.add_argument(
         '--machinetype',
         help='Machine type of Google Compute Engine instance.')
+    self._AddServersPerNodeParam(parser_start)
+    parser_start.add_argument(
+        '--pool_target', default=0, type=int,
+        help='Number of idle instances to keep in warm pool.  The pool is '
+        'replenished after instances are claimed. (default 0)')
+    parser_start.add_argument(
+        '--pool_max_size', default=10, type=int,
+        help='Maximum number of warm pool instances. (default 10)')
+    parser_start.add_argument(
+        '--idle_ttl', type=int,
+        help='Seconds after which idle pool instance is evicted when the '
+        'pool is replenished.')
+    parser_start.add_argument(
+        '--jvm_args',
+        help='JVM options of JMeter servers.  (default: heap size and GC '
+        'settings computed from --machinetype)')
+    parser_start.add_argument(
+        '--max_retries', default=DEFAULT_MAX_RETRIES, type=int,
+        help='Number of times to retry each instance whose creation fails. '
+        '(default %d)' % DEFAULT_MAX_RETRIES)
+    self._AddDryRunParams(parser_start)
     parser_start.set_defaults(handler=Start)
 
+  def _AddResizeSubcommand(self):
+    """Add 'resize' subcommand to argument parser."""
+    parser_resize = self.subparsers.add_parser(
+        'resize',
+        help='Grow or shrink JMeter server cluster, keeping the existing '
+        'instances.  Also updates port forwarding.')
+    parser_resize.add_argument(
+        'size', type=int,
+        help='New JMeter server cluster size.')
+    self._AddGceWideParams(parser_resize)
+    parser_resize.add_argument(
+        '--image',
+        help='Machine image of Google Compute Engine instance.')
+    parser_resize.add_argument(
+        '--machinetype',
+        help='Machine type of Google Compute Engine instance.')
+    self._AddServersPerNodeParam(parser_resize)
+    parser_resize.add_argument(
+        '--jvm_args',
+        help='JVM options of JMeter servers.  (default: heap size and GC '
+        'settings computed from --machinetype)')
+    self._AddDryRunParams(parser_resize)
+    parser_resize.set_defaults(handler=Resize)
+
   def _AddShutdownSubcommand(self):
     """Add 'shutdown' subcommand to argument parser."""
     parser_shutdown = self.subparsers.add_parser(
         'shutdown',
         help='Tear down JMeter server cluster.')
     self._AddGceWideParams(parser_shutdown)
+    parser_shutdown.add_argument(
+        '--all_zones', action='store_true',
+        help='Delete resources of the cluster in all zones.')
+    parser_shutdown.add_argument(
+        '--by_name', action='store_true',
+        help='Find resources by name prefix instead of the cluster label, '
+        'for clusters started by earlier versions.')
+    self._AddDryRunParams(parser_shutdown)
     parser_shutdown.set_defaults(handler=ShutDown)
 
   def _AddPortforwardSubcommand(self):
@@ -358,6 +2148,7 @@ class JMeterExecuter(object):
         'size', default=3, type=int, nargs='?',
         help='JMeter server cluster size. (default 3)')
     self._AddGceWideParams(parser_portforward)
+    self._AddServersPerNodeParam(parser_portforward)
     parser_portforward.set_defaults(handler=PortForward)
 
   def _AddClientSubcommand(self):
@@ -366,8 +2157,334 @@ class JMeterExecuter(object):
         'client',
         help='Start JMeter client.  Can take additional parameters passed to '
         'JMeter.')
+    parser_client.add_argument(
+        '--prefix', default='%s-jmeter' % os.environ['USER'],
+        help='Name prefix of JMeter server cluster to connect to. '
+        '(default "$USER-jmeter")')
     parser_client.set_defaults(handler=Client)
 
+  def _AddRunSubcommand(self):
+    """Add 'run' subcommand to argument parser."""
+    parser_run = self.subparsers.add_parser(
+        'run',
+        help='Run test plan with headless JMeter client on the cluster.  '
+        'Can take additional parameters passed to JMeter.')
+    parser_run.add_argument(
+        'plan', nargs='?',
+        help='JMeter test plan to run.')
+    parser_run.add_argument(
+        '--workloads', metavar='SPEC',
+        help='Workload spec file in JSON format, to run weighted mix of test '
+        'plans instead of single plan.  Servers are assigned to workloads '
+        'by weight.')
+    self._AddGceWideParams(parser_run)
+    parser_run.add_argument(
+        '--results_dir', default='results',
+        help='Directory to create per-run results directory in. '
+        '(default "results")')
+    parser_run.add_argument(
+        '--timeout', type=int,
+        help='Seconds after which the test is stopped on remote servers.')
+    parser_run.add_argument(
+        '--stream_results', nargs='?', const=CLOUD_STORAGE + '/results',
+        metavar='URL',
+        help='Upload results in compressed segments during the run, instead '
+        'of writing them to local file.  Segments are uploaded under '
+        'per-run directory of the URL.  (default URL "%s/results")' %
+        CLOUD_STORAGE)
+    parser_run.add_argument(
+        '--segment_mb', default=64, type=int,
+        help='Uncompressed size of result segment in MB. (default 64)')
+    parser_run.add_argument(
+        '--segment_seconds', default=300, type=int,
+        help='Seconds after which result segment is closed and uploaded, '
+        'even if it is smaller than --segment_mb. (default 300)')
+    parser_run.add_argument(
+        '--sync_start', action='store_true',
+        help='Start the test at the same time on all JMeter servers, '
+        'instead of one after another.')
+    parser_run.add_argument(
+        '--start_lead', type=float,
+        help='Seconds from launching JMeter client until the synchronized '
+        'start. (default: %d plus %.1f per server)' % (
+            jmeter_start_barrier.DEFAULT_LEAD_SECONDS,
+            jmeter_start_barrier.LEAD_SECONDS_PER_SERVER))
+    parser_run.add_argument(
+        '--watchdog', action='store_true',
+        help='Check health of JMeter servers during the run, and replace '
+        'failed instances at the same index.  Capacity gaps are written to '
+        'the run directory.')
+    parser_run.add_argument(
+        '--watchdog_interval', default=jmeter_watchdog.DEFAULT_INTERVAL,
+        type=float,
+        help='Seconds between health checks of each instance. (default %d)'
+        % jmeter_watchdog.DEFAULT_INTERVAL)
+    parser_run.add_argument(
+        '--watchdog_api_rate', default=jmeter_watchdog.DEFAULT_API_RATE,
+        type=float,
+        help='Maximum instance status API requests per second of the '
+        'watchdog. (default %.0f)' % jmeter_watchdog.DEFAULT_API_RATE)
+    parser_run.add_argument(
+        '--failure_threshold',
+        default=jmeter_watchdog.DEFAULT_FAILURE_THRESHOLD, type=int,
+        help='Number of consecutive health checks in which JMeter server '
+        'doesn\'t respond before the instance is replaced. (default %d)'
+        % jmeter_watchdog.DEFAULT_FAILURE_THRESHOLD)
+    parser_run.add_argument(
+        '--replace_timeout',
+        default=jmeter_watchdog.DEFAULT_REPLACE_TIMEOUT, type=float,
+        help='Seconds to wait for replacement of failed instance before '
+        'giving up.  Replacement still in progress at the end of the run is '
+        'reported as not replaced. (default %d)'
+        % jmeter_watchdog.DEFAULT_REPLACE_TIMEOUT)
+    self._AddServersPerNodeParam(parser_run)
+    parser_run.add_argument(
+        '--image',
+        help='Machine image of replacement instances.')
+    parser_run.add_argument(
+        '--machinetype',
+        help='Machine type of replacement instances.')
+    parser_run.set_defaults(handler=Run)
+
+  def _AddStatusSubcommand(self):
+    """Add 'status' subcommand to argument parser."""
+    parser_status = self.subparsers.add_parser(
+        'status',
+        help='Show instance status, SSH readiness, tunnel liveness and '
+        'server reachability of each node of the cluster.')
+    parser_status.add_argument(
+        'size', type=int, nargs='?',
+        help='JMeter server cluster size.  (default: number of live '
+        'instances)')
+    self._AddGceWideParams(parser_status)
+    self._AddServersPerNodeParam(parser_status)
+    parser_status.add_argument(
+        '--watch', action='store_true',
+        help='Refresh the status until interrupted, redrawing only the nodes '
+        'whose status changed.')
+    parser_status.add_argument(
+        '--interval', default=5, type=float,
+        help='Seconds between refreshes with --watch. (default 5)')
+    parser_status.add_argument(
+        '--probe_threads', default=jmeter_status.DEFAULT_PROBE_THREADS,
+        type=int,
+        help='Maximum number of concurrent SSH and port probes. (default %d)'
+        % jmeter_status.DEFAULT_PROBE_THREADS)
+    parser_status.set_defaults(handler=Status)
+
+  def _AddSyncSubcommand(self):
+    """Add 'sync' subcommand to argument parser."""
+    parser_sync = self.subparsers.add_parser(
+        'sync',
+        help='Distribute test plans, data files and plugins to JMeter '
+        'servers through Cloud Storage.')
+    parser_sync.add_argument(
+        'paths', nargs='+',
+        help='Files or directories to distribute.')
+    parser_sync.add_argument(
+        '--size', default=3, type=int,
+        help='JMeter server cluster size. (default 3)')
+    self._AddGceWideParams(parser_sync)
+    self._AddServersPerNodeParam(parser_sync)
+    parser_sync.add_argument(
+        '--base_dir', default='.',
+        help='Local directory that corresponds to JMeter directory on '
+        'servers. (default current directory)')
+    parser_sync.add_argument(
+        '--split', action='append',
+        help='CSV file to split across servers by server index.  '
+        'Can be specified multiple times.')
+    parser_sync.add_argument(
+        '--no_csv_header', action='store_true',
+        help='Split CSV files have no header line.')
+    parser_sync.set_defaults(handler=Sync)
+
+  def _AddTelemetrySubcommand(self):
+    """Add 'telemetry' subcommand to argument parser."""
+    parser_telemetry = self.subparsers.add_parser(
+        'telemetry',
+        help='Collect resource telemetry from JMeter servers and detect '
+        'saturated servers.')
+    parser_telemetry.add_argument(
+        'size', default=3, type=int, nargs='?',
+        help='JMeter server cluster size. (default 3)')
+    self._AddGceWideParams(parser_telemetry)
+    parser_telemetry.add_argument(
+        '--output', default='telemetry.json',
+        help='Output file of telemetry samples. (default "telemetry.json")')
+    parser_telemetry.add_argument(
+        '--report',
+        help='JSON run report created by "report" subcommand.  Telemetry is '
+        'aligned with its throughput timeline and added to the report.')
+    parser_telemetry.add_argument(
+        '--cpu_threshold', default=90, type=int,
+        help='CPU usage in percent regarded as saturated. (default 90)')
+    parser_telemetry.add_argument(
+        '--gc_threshold', default=10, type=int,
+        help='Percentage of time in GC pause regarded as saturated. '
+        '(default 10)')
+    parser_telemetry.set_defaults(handler=Telemetry)
+
+  def _AddPoolSubcommand(self):
+    """Add 'pool' subcommand to argument parser."""
+    parser_pool = self.subparsers.add_parser(
+        'pool',
+        help='Manage warm pool of JMeter servers that start can claim.')
+    parser_pool.add_argument(
+        'action', choices=['fill', 'evict', 'drain', 'status'],
+        help='"fill" creates instances up to --pool_target idle ones.  '
+        '"evict" deletes idle instances by --pool_max_size and --idle_ttl.  '
+        '"drain" deletes all idle instances.')
+    self._AddGceWideParams(parser_pool)
+    self._AddServersPerNodeParam(parser_pool)
+    parser_pool.add_argument(
+        '--pool_target', default=3, type=int,
+        help='Number of idle instances to keep. (default 3)')
+    parser_pool.add_argument(
+        '--pool_max_size', default=10, type=int,
+        help='Maximum number of pool instances. (default 10)')
+    parser_pool.add_argument(
+        '--idle_ttl', type=int,
+        help='Seconds after which idle instance is evicted.')
+    parser_pool.add_argument(
+        '--image',
+        help='Machine image of Google Compute Engine instance.')
+    parser_pool.add_argument(
+        '--machinetype',
+        help='Machine type of Google Compute Engine instance.')
+    parser_pool.set_defaults(handler=Pool)
+
+  def _AddQueueSubcommand(self):
+    """Add 'queue' subcommand to argument parser."""
+    parser_queue = self.subparsers.add_parser(
+        'queue',
+        help='Queue test runs, and run them in order on one cluster.  '
+        '"add" can take additional parameters passed to JMeter client.')
+    parser_queue.add_argument(
+        'action', choices=['add', 'list', 'run'],
+        help='"add" adds test plan to the queue.  "run" runs pending jobs, '
+        'resizing the cluster between jobs, and shuts it down at the end.')
+    parser_queue.add_argument(
+        'plan', nargs='?',
+        help='JMeter test plan to add.')
+    parser_queue.add_argument(
+        '--size', default=3, type=int,
+        help='JMeter server cluster size the test plan needs. (default 3)')
+    parser_queue.add_argument(
+        '--queue_file', default='jmeter_queue.db',
+        help='Job queue file. (default "jmeter_queue.db")')
+    parser_queue.add_argument(
+        '--results_dir', default='results',
+        help='Directory to write results and results index to. '
+        '(default "results")')
+    parser_queue.add_argument(
+        '--keep_cluster', action='store_true',
+        help='Keep the cluster running after the last job.')
+    self._AddGceWideParams(parser_queue)
+    self._AddServersPerNodeParam(parser_queue)
+    parser_queue.add_argument(
+        '--image',
+        help='Machine image of Google Compute Engine instance.')
+    parser_queue.add_argument(
+        '--machinetype',
+        help='Machine type of Google Compute Engine instance.')
+    parser_queue.set_defaults(handler=Queue)
+
+  def _AddMultiSubcommand(self):
+    """Add 'multi' subcommand to argument parser."""
+    parser_multi = self.subparsers.add_parser(
+        'multi',
+        help='Start, shut down or set port forwarding of all JMeter server '
+        'clusters in cluster spec file concurrently.')
+    parser_multi.add_argument(
+        'spec',
+        help='Cluster spec file in JSON.')
+    parser_multi.add_argument(
+        'action', choices=['start', 'shutdown', 'portforward'],
+        help='Operation to apply to all clusters.')
+    parser_multi.add_argument(
+        '--api_rate', default=10, type=float,
+        help='Maximum rate of Compute Engine API calls per second shared by '
+        'all clusters. (default 10)')
+    parser_multi.set_defaults(handler=Multi)
+
+  def _AddReportSubcommand(self):
+    """Add 'report' subcommand to argument parser."""
+    parser_report = self.subparsers.add_parser(
+        'report',
+        help='Summarize JMeter result file into JSON/HTML run report, or '
+        'compare 2 run reports.')
+    parser_report.add_argument(
+        'results', nargs='?',
+        help='JMeter result file (JTL) in CSV format, or in binary format '
+        'converted by "convert".')
+    parser_report.add_argument(
+        '--segments', metavar='URL',
+        help='URL of results uploaded in segments by "run --stream_results", '
+        'to report on instead of result file.')
+    self._AddGceWideParams(parser_report)
+    parser_report.add_argument(
+        '--size', type=int,
+        help='JMeter server cluster size to record in the report.')
+    parser_report.add_argument(
+        '--image',
+        help='Machine image to record in the report.')
+    parser_report.add_argument(
+        '--machinetype',
+        help='Machine type to record in the report.')
+    parser_report.add_argument(
+        '--output', default='report.json',
+        help='Output file of JSON run report. (default "report.json")')
+    parser_report.add_argument(
+        '--html',
+        help='Output file of HTML run report.')
+    parser_report.add_argument(
+        '--clock_offsets',
+        help='Clock offsets file of JMeter servers to correct sample '
+        'timestamps with.  (default: the file written by "start" for '
+        '--prefix)')
+    parser_report.add_argument(
+        '--capacity_gaps',
+        help='Capacity gaps file written by "run --watchdog" to add to the '
+        'report.  (default: "%s" next to the result file, if it exists)'
+        % jmeter_watchdog.GAPS_FILE)
+    parser_report.add_argument(
+        '--bucket', default=1, type=int,
+        help='Width of throughput timeline bucket in seconds. (default 1)')
+    parser_report.add_argument(
+        '--compare', nargs=2, metavar=('BASE', 'NEW'),
+        help='Compare 2 JSON run reports.  Exits with non-zero status if '
+        'regression is found.')
+    parser_report.add_argument(
+        '--z_threshold', default=2.58, type=float,
+        help='Z score above which difference is significant. (default 2.58)')
+    parser_report.add_argument(
+        '--min_change', default=0.05, type=float,
+        help='Minimum relative change to be regression. (default 0.05)')
+    parser_report.set_defaults(handler=Report)
+
+  def _AddConvertSubcommand(self):
+    """Add 'convert' subcommand to argument parser."""
+    parser_convert = self.subparsers.add_parser(
+        'convert',
+        help='Convert JMeter result file in CSV format into compact binary '
+        'format that "report" reads faster.')
+    parser_convert.add_argument(
+        'results',
+        help='JMeter result file (JTL) in CSV format.')
+    parser_convert.add_argument(
+        '--output',
+        help='Output file. (default: the result file with ".jtlb" '
+        'extension)')
+    parser_convert.add_argument(
+        '--block_size', default=jmeter_binary.DEFAULT_BLOCK_SIZE, type=int,
+        help='Number of samples per block. (default %d)' %
+        jmeter_binary.DEFAULT_BLOCK_SIZE)
+    parser_convert.add_argument(
+        '--benchmark', action='store_true',
+        help='Compare size and parse speed of CSV and binary format.')
+    parser_convert.set_defaults(handler=Convert)
+
   def ParseArgumentsAndExecute(self, argv):
     """Parses command arguments and starts sub-command handler.
 
@@ -375,14 +2492,41 @@ class JMeterExecuter(object):
       argv: Parameters in list of strings.
     """
     self._AddStartSubcommand()
+    self._AddResizeSubcommand()
     self._AddShutdownSubcommand()
     self._AddPortforwardSubcommand()
+    self._AddStatusSubcommand()
     self._AddClientSubcommand()
+    self._AddRunSubcommand()
+    self._AddSyncSubcommand()
+    self._AddTelemetrySubcommand()
+    self._AddPoolSubcommand()
+    self._AddQueueSubcommand()
+    self._AddMultiSubcommand()
+    self._AddReportSubcommand()
+    self._AddConvertSubcommand()
 
     # Parse command-line arguments and execute corresponding handler function.
     params, additional_args = self.parser.parse_known_args(argv)
-    # Execute handler function given by "handler" parameter.
-    params.handler(params, *additional_args)
+    if not params.profile:
+      # Execute handler function given by "handler" parameter.
+      params.handler(params, *additional_args)
+      return
+
+    jmeter_profile.Enable(classes=[
+        (GceApi, 'api', False),
+        (JMeterCluster, 'cluster', True),
+        (RateLimiter, 'throttle', False),
+        (gce_credentials.TokenCache, 'token', False),
+    ])
+    try:
+      params.handler(params, *additional_args)
+    finally:
+      profiler = jmeter_profile.Disable()
+      logging.info('Profile:\n%s', profiler.FormatSummary())
+      folded_path, trace_path = profiler.Write(params.profile_output)
+      logging.info('Folded stacks written to %s, and Chrome trace to %s',
+                   folded_path, trace_path)
 
 
 def main():
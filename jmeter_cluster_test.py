@@ -18,12 +18,21 @@
 
 
 import argparse
+import json
 import os
+import shutil
+import tempfile
 import unittest
 
 
+import apiclient.errors
 import mock
 
+import gce_api
+import gce_credentials
+import jmeter_cluster
+import jmeter_jvm
+import jmeter_segments
 from jmeter_cluster import JMeterCluster
 from jmeter_cluster import JMeterExecuter
 
@@ -35,13 +44,26 @@ class JMeterClusterTest(unittest.TestCase):
     self.mock_gce_api_constructor = mock.patch(
         'jmeter_cluster.GceApi').start()
     self.mock_gce_api = self.mock_gce_api_constructor.return_value
+    self.mock_gce_api_constructor.MakeLabelValue.side_effect = (
+        gce_api.GceApi.MakeLabelValue)
+    self.mock_gce_api_constructor.MakeLabelFilter.side_effect = (
+        gce_api.GceApi.MakeLabelFilter)
     self.mock_set_port_forward = mock.patch(
         'jmeter_cluster.JMeterCluster.SetPortForward').start()
     self.mock_subprocess_call = mock.patch(
         'subprocess.call', return_value=0).start()
+    self.mock_measure_offset = mock.patch(
+        'jmeter_clock.MeasureOffset',
+        return_value={'offset_ms': 1.0, 'round_trip_ms': 2.0}).start()
+    self.mock_write_offsets = mock.patch('jmeter_clock.WriteOffsets').start()
+    self.tmp_dir = tempfile.mkdtemp()
+    self.sync_script_path = os.path.join(self.tmp_dir, 'foo.sync.sh')
+    mock.patch('jmeter_cluster.JMeterFiles.GetSyncScriptPath',
+               return_value=self.sync_script_path).start()
 
   def tearDown(self):
     mock.patch.stopall()
+    shutil.rmtree(self.tmp_dir)
 
   def testStart(self):
     self.mock_gce_api.GetInstance.return_value = {'status': 'RUNNING'}
@@ -64,6 +86,775 @@ class JMeterClusterTest(unittest.TestCase):
         self.mock_gce_api.CreateInstanceWithNewBootDisk.call_args_list[2][0][0])
     self.assertEqual(3, self.mock_gce_api.GetInstance.call_count)
     self.assertEqual(3, self.mock_subprocess_call.call_count)
+    self.assertEqual(3, self.mock_measure_offset.call_count)
+    self.assertEqual('started', cluster.phase)
+
+  def testStart_IndexOffset(self):
+    mock_api_pool = mock.MagicMock()
+    mock_api_pool.Get.return_value.GetInstance.return_value = {
+        'status': 'RUNNING'}
+
+    param = argparse.Namespace(size=2, prefix='foo', index_offset=5,
+                               client_rmi_port=25001)
+    cluster = JMeterCluster(param, api_pool=mock_api_pool)
+    cluster.Start()
+
+    # GceApi is taken from the pool.
+    self.assertEqual(0, self.mock_gce_api_constructor.call_count)
+    mock_api = mock_api_pool.Get.return_value
+    self.assertEqual(
+        [5, 6],
+        [c[1]['metadata']['id'] for c in
+         mock_api.CreateInstanceWithNewBootDisk.call_args_list])
+
+  def testStart_JvmArgs(self):
+    self.mock_gce_api.GetInstance.return_value = {'status': 'RUNNING'}
+
+    param = argparse.Namespace(size=1, prefix='foo',
+                               machinetype='n1-highcpu-4')
+    JMeterCluster(param).Start()
+
+    metadata = (self.mock_gce_api.CreateInstanceWithNewBootDisk
+                .call_args[1]['metadata'])
+    self.assertEqual(jmeter_jvm.GetJvmArgs('n1-highcpu-4'),
+                     metadata['jvm_args'])
+
+  def testStart_JvmArgsOverride(self):
+    self.mock_gce_api.GetInstance.return_value = {'status': 'RUNNING'}
+
+    param = argparse.Namespace(size=1, prefix='foo', jvm_args='-Xmx1g')
+    JMeterCluster(param).Start()
+
+    metadata = (self.mock_gce_api.CreateInstanceWithNewBootDisk
+                .call_args[1]['metadata'])
+    self.assertEqual('-Xmx1g', metadata['jvm_args'])
+
+  def testStart_UnknownMachineType(self):
+    self.mock_gce_api.GetInstance.return_value = {'status': 'RUNNING'}
+
+    param = argparse.Namespace(size=1, prefix='foo', machinetype='x1-huge')
+    JMeterCluster(param).Start()
+
+    metadata = (self.mock_gce_api.CreateInstanceWithNewBootDisk
+                .call_args[1]['metadata'])
+    self.assertNotIn('jvm_args', metadata)
+
+  def testStart_TooManyServersPerNode(self):
+    param = argparse.Namespace(size=1, prefix='foo', servers_per_node=8,
+                               machinetype='g1-small')
+
+    self.assertRaises(SystemExit, JMeterCluster(param).Start)
+    self.assertFalse(self.mock_gce_api.CreateInstanceWithNewBootDisk.called)
+
+  def testStart_TooManyServerIds(self):
+    param = argparse.Namespace(size=250, prefix='foo', servers_per_node=4,
+                               index_offset=1)
+
+    self.assertRaises(SystemExit, JMeterCluster(param).Start)
+    self.assertFalse(self.mock_gce_api.CreateInstanceWithNewBootDisk.called)
+
+  def testStart_TooSmallForJvmProfile(self):
+    self.mock_gce_api.GetInstance.return_value = {'status': 'RUNNING'}
+
+    param = argparse.Namespace(size=1, prefix='foo', machinetype='f1-micro')
+    JMeterCluster(param).Start()
+
+    metadata = (self.mock_gce_api.CreateInstanceWithNewBootDisk
+                .call_args[1]['metadata'])
+    self.assertNotIn('jvm_args', metadata)
+
+  def testGetServersPerNode_FromMetadata(self):
+    self.mock_gce_api.ListInstances.return_value = [
+        {'name': 'foo-000', 'metadata': {'items': [
+            {'key': 'id', 'value': '0'},
+            {'key': 'servers_per_node', 'value': '4'}]}}]
+    cluster = JMeterCluster(argparse.Namespace(size=2, prefix='foo'))
+
+    self.assertEqual(4, cluster.GetServersPerNode())
+    self.assertEqual(4, cluster.GetServersPerNode())
+    self.mock_gce_api.ListInstances.assert_called_once_with(
+        'labels.jmeter_cluster eq foo', fields=['name', 'metadata'])
+    # The parameter takes precedence.
+    self.assertEqual(2, JMeterCluster(argparse.Namespace(
+        size=2, prefix='foo', servers_per_node=2)).GetServersPerNode())
+
+  def testGetServersPerNode_NoInstance(self):
+    self.mock_gce_api.ListInstances.return_value = []
+
+    self.assertEqual(1, JMeterCluster(argparse.Namespace(
+        size=2, prefix='foo')).GetServersPerNode())
+
+  def testStart_ServersPerNode(self):
+    self.mock_gce_api.GetInstance.return_value = {'status': 'RUNNING'}
+    mock.patch.dict(os.environ, {'USER': 'Tester'}).start()
+
+    param = argparse.Namespace(size=2, prefix='foo', index_offset=4,
+                               servers_per_node=3,
+                               machinetype='n1-standard-8')
+    JMeterCluster(param).Start()
+
+    metadata_list = [
+        c[1]['metadata'] for c in
+        self.mock_gce_api.CreateInstanceWithNewBootDisk.call_args_list]
+    self.assertEqual([4, 7], [m['id'] for m in metadata_list])
+    labels = self.mock_gce_api.CreateInstanceWithNewBootDisk.call_args[1][
+        'labels']
+    self.assertEqual('foo', labels['jmeter_cluster'])
+    self.assertEqual('tester', labels['jmeter_owner'])
+    self.assertEqual([3, 3], [m['servers_per_node'] for m in metadata_list])
+    self.assertEqual(jmeter_jvm.GetJvmArgs('n1-standard-8', 3),
+                     metadata_list[0]['jvm_args'])
+
+  def testStart_Resume(self):
+    self.mock_gce_api.ListInstances.side_effect = [
+        # Inventory.
+        [{'name': 'foo-000', 'status': 'RUNNING'},
+         {'name': 'foo-001', 'status': 'TERMINATED'}],
+        # Deletion of the terminated instance.
+        [{'name': 'foo-001', 'status': 'TERMINATED'}], []]
+    self.mock_gce_api.ListDisks.side_effect = [
+        [{'name': 'foo-001', 'status': 'READY'},
+         {'name': 'foo-002', 'status': 'FAILED'}],
+        [{'name': 'foo-002', 'status': 'FAILED'}], []]
+    # The terminated instance is gone, and then all instances are running.
+    self.mock_gce_api.GetInstance.side_effect = (
+        [None] + [{'status': 'RUNNING'}] * 3)
+    self.mock_gce_api.GetDisk.return_value = None
+
+    param = argparse.Namespace(size=3, prefix='foo', servers_per_node=1)
+    JMeterCluster(param).Start()
+
+    self.mock_gce_api.ListInstances.assert_any_call(
+        'name eq ^(foo-000|foo-001|foo-002)$', fields=['name', 'status'])
+    self.mock_gce_api.DeleteInstance.assert_called_once_with('foo-001')
+    self.mock_gce_api.DeleteDisk.assert_called_once_with('foo-002')
+    self.assertEqual(
+        ['foo-001', 'foo-002'],
+        [c[0][0] for c in
+         self.mock_gce_api.CreateInstanceWithNewBootDisk.call_args_list])
+
+  def testStart_RetryFailedInstance(self):
+    mock.patch('time.sleep').start()
+    self.mock_gce_api.ListInstances.return_value = []
+    self.mock_gce_api.ListDisks.return_value = []
+    self.mock_gce_api.GetInstance.return_value = {'status': 'RUNNING'}
+    self.mock_gce_api.CreateInstanceWithNewBootDisk.side_effect = [
+        True,
+        apiclient.errors.HttpError(mock.MagicMock(status=503), 'error'),
+        True]
+
+    param = argparse.Namespace(size=2, prefix='foo')
+    JMeterCluster(param).Start()
+
+    self.assertEqual(
+        ['foo-000', 'foo-001', 'foo-001'],
+        [c[0][0] for c in
+         self.mock_gce_api.CreateInstanceWithNewBootDisk.call_args_list])
+    self.mock_gce_api.ListInstances.assert_called_with(
+        'name eq ^(foo-001)$', fields=['name', 'status'])
+
+  def testStart_RetriesExhausted(self):
+    mock.patch('time.sleep').start()
+    self.mock_gce_api.ListInstances.return_value = []
+    self.mock_gce_api.ListDisks.return_value = []
+    self.mock_gce_api.CreateInstanceWithNewBootDisk.return_value = False
+
+    param = argparse.Namespace(size=1, prefix='foo', max_retries=2)
+    self.assertRaises(SystemExit, JMeterCluster(param).Start)
+
+    self.assertEqual(
+        3, self.mock_gce_api.CreateInstanceWithNewBootDisk.call_count)
+
+  def testStart_RepairStoppedInstance(self):
+    mock.patch('time.sleep').start()
+    self.mock_gce_api.ListInstances.side_effect = [
+        [], [{'name': 'foo-000', 'status': 'TERMINATED'}],
+        [{'name': 'foo-000', 'status': 'TERMINATED'}], []]
+    self.mock_gce_api.ListDisks.return_value = []
+    self.mock_gce_api.GetInstance.side_effect = [
+        {'status': 'TERMINATED'}, None, {'status': 'RUNNING'}]
+
+    param = argparse.Namespace(size=1, prefix='foo', servers_per_node=1)
+    JMeterCluster(param).Start()
+
+    self.mock_gce_api.DeleteInstance.assert_called_once_with('foo-000')
+    self.assertEqual(
+        2, self.mock_gce_api.CreateInstanceWithNewBootDisk.call_count)
+
+  def testSetPortForward_ServersPerNode(self):
+    mock.patch.stopall()
+    mock_call = mock.patch('subprocess.call', return_value=0).start()
+    mock_write = mock.patch(
+        'jmeter_cluster.JMeterFiles.WriteClientOverrides').start()
+
+    param = argparse.Namespace(size=2, prefix='foo', index_offset=10,
+                               servers_per_node=2, client_rmi_port=25003)
+    JMeterCluster(param).SetPortForward()
+
+    self.assertEqual(2, mock_call.call_count)
+    command = mock_call.call_args_list[1][0][0]
+    for port in (24012, 24013, 26012, 26013):
+      self.assertIn('-L%d:127.0.0.1:%d' % (port, port), command)
+    self.assertIn('-R25003:127.0.0.1:25003', command)
+    self.assertTrue(command.endswith(' foo-001'))
+    mock_write.assert_called_once_with('foo', {
+        'remote_hosts': '127.0.0.1:24010,127.0.0.1:24011,'
+                        '127.0.0.1:24012,127.0.0.1:24013',
+        'client.rmi.localport': 25003})
+
+  def testStart_WarmPool(self):
+    self.mock_gce_api.GetInstance.return_value = {'status': 'RUNNING'}
+    mock_warm_pool = mock.patch('jmeter_pool.WarmPool').start().return_value
+    mock_warm_pool.ListClaimed.return_value = {}
+    mock_warm_pool.Claim.return_value = {0: 'pool-004', 1: 'pool-007'}
+
+    mock_warm_pool.SelectEvictions.return_value = ['pool-001']
+    evicted = [{'name': 'pool-001'}]
+
+    def ListInstances(filter_string, fields=None):
+      if filter_string != 'name eq ^(pool-001)$':
+        return []
+      # The instance is gone after the first listing.
+      listed = list(evicted)
+      del evicted[:]
+      return listed
+
+    self.mock_gce_api.ListInstances.side_effect = ListInstances
+    self.mock_gce_api.GetInstance.side_effect = (
+        lambda name: None if name == 'pool-001' else {'status': 'RUNNING'})
+    param = argparse.Namespace(size=3, prefix='foo', pool_prefix='pool',
+                               pool_target=2, pool_max_size=10,
+                               idle_ttl=3600)
+    cluster = JMeterCluster(param)
+    cluster.Start()
+
+    self.assertEqual('pool-007', cluster._MakeInstanceName(1))
+    self.assertEqual('foo-002', cluster._MakeInstanceName(2))
+    self.assertEqual(('foo', [0, 1, 2], 'n1-standard-2'),
+                     mock_warm_pool.Claim.call_args[0][:3])
+    self.assertEqual(
+        ['foo-002'],
+        [c[0][0] for c in
+         self.mock_gce_api.CreateInstanceWithNewBootDisk.call_args_list])
+    self.assertEqual(
+        {'id': 1, 'servers_per_node': 1},
+        dict((k, v) for k, v in
+             mock_warm_pool.Claim.call_args[0][3](1).items()
+             if k != 'jvm_args'))
+    restart_commands = [c[0][0] for c in
+                        self.mock_subprocess_call.call_args_list
+                        if 'pkill' in c[0][0]]
+    self.assertEqual(2, len(restart_commands))
+    self.assertEqual(1, mock_warm_pool.Replenish.call_count)
+    self.assertEqual(2, mock_warm_pool.Replenish.call_args[0][0])
+    # Idle instances are evicted before the pool is replenished.
+    mock_warm_pool.SelectEvictions.assert_called_once_with(10, 3600)
+    self.mock_gce_api.DeleteInstance.assert_called_once_with('pool-001')
+    self.assertNotIn('deleting instances', cluster.phases)
+
+  def testReplenishPool_FillExits(self):
+    mock.patch('jmeter_cluster.JMeterCluster.EvictPool',
+               return_value=[]).start()
+    mock.patch('jmeter_cluster.JMeterCluster.FillPool',
+               side_effect=SystemExit(1)).start()
+    mock_log = mock.patch('logging.exception').start()
+
+    param = argparse.Namespace(size=3, prefix='foo', pool_prefix='pool')
+    JMeterCluster(param)._ReplenishPool()
+
+    mock_log.assert_called_once_with('Failed to replenish warm pool')
+
+  def testStart_ManagedGroup(self):
+    self.mock_gce_api.GetInstance.return_value = {'status': 'RUNNING'}
+    self.mock_gce_api.GetInstanceTemplate.return_value = None
+    self.mock_gce_api.GetInstanceGroupManager.return_value = None
+    self.mock_gce_api.ListManagedInstances.return_value = [
+        'foo-bbbb', 'foo-aaaa', 'foo-cccc']
+    self.mock_gce_api.ListInstances.return_value = [
+        {'name': 'foo-bbbb',
+         'metadata': {'fingerprint': 'fp-b', 'items': []}},
+        {'name': 'foo-aaaa',
+         'metadata': {'fingerprint': 'fp-a',
+                      'items': [{'key': 'cluster_index', 'value': '1'}]}},
+        {'name': 'foo-cccc',
+         'metadata': {'fingerprint': 'fp-c', 'items': []}}]
+    self.mock_gce_api.SetInstanceMetadata.return_value = True
+
+    param = argparse.Namespace(size=3, prefix='foo',
+                               provisioning='managed_group')
+    cluster = JMeterCluster(param)
+    cluster.Start()
+
+    self.assertEqual('foo-template',
+                     self.mock_gce_api.CreateInstanceTemplate.call_args[0][0])
+    self.assertEqual(
+        'foo', self.mock_gce_api.CreateInstanceTemplate.call_args[1][
+            'labels']['jmeter_cluster'])
+    self.mock_gce_api.CreateInstanceGroupManager.assert_called_once_with(
+        'foo', 'foo-template', 'foo')
+    self.mock_gce_api.ResizeInstanceGroupManager.assert_called_once_with(
+        'foo', 3)
+    self.assertFalse(self.mock_gce_api.CreateInstanceWithNewBootDisk.called)
+    self.assertEqual(
+        ['foo-bbbb', 'foo-aaaa', 'foo-cccc'],
+        [cluster._MakeInstanceName(i) for i in xrange(3)])
+    set_metadata = self.mock_gce_api.SetInstanceMetadata.call_args_list
+    self.assertEqual(['foo-bbbb', 'foo-cccc'], [c[0][0] for c in set_metadata])
+    self.assertEqual(2, set_metadata[1][0][1]['id'])
+    self.assertEqual(2, set_metadata[1][0][1]['cluster_index'])
+    self.assertEqual('fp-c', set_metadata[1][0][2])
+    restart_commands = [c[0][0] for c in
+                        self.mock_subprocess_call.call_args_list
+                        if 'pkill' in c[0][0]]
+    self.assertEqual(2, len(restart_commands))
+    self.assertEqual('started', cluster.phase)
+
+  def _MockManagedGroupCreating(self):
+    """Makes managed group that creates only one of 3 instances."""
+    mock.patch('time.sleep').start()
+    self.mock_gce_api.GetInstanceTemplate.return_value = {
+        'name': 'foo-template'}
+    self.mock_gce_api.GetInstanceGroupManager.return_value = {'name': 'foo'}
+    self.mock_gce_api.ListManagedInstances.return_value = [
+        'foo-aaaa', 'foo-bbbb', 'foo-cccc']
+    self.mock_gce_api.ListInstances.return_value = [
+        {'name': 'foo-aaaa',
+         'metadata': {'items': [{'key': 'cluster_index', 'value': '0'}]}}]
+
+  def testStart_ManagedGroupErrors(self):
+    self._MockManagedGroupCreating()
+    self.mock_gce_api.ListManagedInstanceErrors.return_value = [
+        'foo-bbbb: QUOTA_EXCEEDED: Quota exceeded']
+
+    param = argparse.Namespace(size=3, prefix='foo', servers_per_node=1,
+                               provisioning='managed_group', max_retries=2)
+    self.assertRaises(SystemExit, JMeterCluster(param).Start)
+
+    self.assertEqual(
+        3, self.mock_gce_api.ListManagedInstanceErrors.call_count)
+
+  def testStart_ManagedGroupTimeout(self):
+    self._MockManagedGroupCreating()
+    self.mock_gce_api.ListManagedInstanceErrors.return_value = []
+    clock = [0]
+
+    def Time():
+      clock[0] += 100
+      return clock[0]
+
+    mock.patch('time.time', side_effect=Time).start()
+
+    param = argparse.Namespace(size=3, prefix='foo', servers_per_node=1,
+                               provisioning='managed_group')
+    self.assertRaises(SystemExit, JMeterCluster(param).Start)
+
+  def testResize_ManagedGroupShrink(self):
+    self.mock_gce_api.GetInstanceGroupManager.return_value = {'name': 'foo'}
+    self.mock_gce_api.ListManagedInstances.return_value = [
+        'foo-aaaa', 'foo-bbbb', 'foo-cccc']
+    self.mock_gce_api.ListInstances.return_value = [
+        {'name': name,
+         'metadata': {'items': [{'key': 'cluster_index', 'value': index}]}}
+        for name, index in (('foo-aaaa', 2), ('foo-bbbb', 0),
+                            ('foo-cccc', 1))]
+
+    param = argparse.Namespace(size=3, prefix='foo',
+                               provisioning='managed_group')
+    JMeterCluster(param).Resize(1)
+
+    self.mock_gce_api.DeleteManagedInstances.assert_called_once_with(
+        'foo', ['foo-cccc', 'foo-aaaa'])
+    self.assertFalse(self.mock_gce_api.ResizeInstanceGroupManager.called)
+    self.assertEqual(1, param.size)
+
+  def testShutDown_ManagedGroup(self):
+    self.mock_gce_api.GetInstanceGroupManager.side_effect = [
+        {'name': 'foo'}, None]
+    self.mock_gce_api.GetInstanceTemplate.return_value = {
+        'name': 'foo-template'}
+    self.mock_gce_api.ListInstances.return_value = []
+    self.mock_gce_api.ListDisks.return_value = []
+
+    param = argparse.Namespace(prefix='foo', provisioning='managed_group')
+    JMeterCluster(param).ShutDown()
+
+    self.mock_gce_api.DeleteInstanceGroupManager.assert_called_once_with(
+        'foo')
+    self.mock_gce_api.DeleteInstanceTemplate.assert_called_once_with(
+        'foo-template')
+    self.mock_gce_api.ListInstances.assert_called_once_with(
+        'labels.jmeter_cluster eq foo', fields=['name'])
+
+  def testStart_PhaseTimings(self):
+    self.mock_gce_api.GetInstance.return_value = {'status': 'RUNNING'}
+
+    cluster = JMeterCluster(argparse.Namespace(size=2, prefix='foo'))
+    cluster.Start()
+
+    self.assertEqual(
+        ['creating instances', 'waiting for instances RUNNING',
+         'waiting for SSH', 'setting up port forwarding',
+         'measuring clock offsets'], cluster.phases)
+    self.assertEqual(set(cluster.phases), set(cluster.phase_seconds))
+    self.assertEqual(2, cluster.operation_size)
+
+  def testStart_DryRun(self):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      timings = os.path.join(tmp_dir, 'timings')
+      param = argparse.Namespace(size=2, prefix='foo', dry_run=True,
+                                 assume_size=1, timings=timings)
+      with mock.patch('logging.info') as mock_info:
+        jmeter_cluster.Start(param)
+
+      # Nothing is called for real, and no timings are recorded.
+      self.assertFalse(self.mock_gce_api_constructor.called)
+      self.assertFalse(self.mock_subprocess_call.called)
+      self.assertFalse(self.mock_measure_offset.called)
+      self.assertFalse(self.mock_write_offsets.called)
+      self.assertFalse(os.path.exists(timings))
+      messages = [c[0][0] % c[0][1:] for c in mock_info.call_args_list]
+      plan = [m for m in messages if m.startswith('Dry run of start')][0]
+      # foo-000 exists, so only foo-001 is created.
+      self.assertIn("CreateInstanceWithNewBootDisk('foo-001'", plan)
+      self.assertNotIn("CreateInstanceWithNewBootDisk('foo-000'", plan)
+      self.assertIn('$ gcutil ssh', plan)
+      estimate = [m for m in messages if m.startswith('Estimate of start')][0]
+      self.assertIn('creating instances', estimate)
+      self.assertIn('Cluster cost: $0.28 per hour', estimate)
+    finally:
+      shutil.rmtree(tmp_dir)
+
+  def testShutDown_ByName(self):
+    self.mock_gce_api.ListInstances.return_value = []
+    self.mock_gce_api.ListDisks.return_value = []
+
+    param = argparse.Namespace(prefix='foo', by_name=True)
+    JMeterCluster(param).ShutDown()
+
+    self.mock_gce_api.ListInstances.assert_called_once_with(
+        'name eq ^foo-.*', fields=['name'])
+
+  def testShutDown_AllZones(self):
+    mock_api_pool = mock.MagicMock()
+    apis = {}
+    mock_api_pool.Get.side_effect = (
+        lambda project, zone: apis.setdefault(zone, mock.MagicMock()))
+    main_api = mock_api_pool.Get('project', 'us-central1-a')
+    main_api.ListInstancesInAllZones.return_value = [
+        {'name': 'foo-000', 'zone': 'us-central1-a'},
+        {'name': 'foo-001', 'zone': 'europe-west1-b'}]
+    main_api.ListDisksInAllZones.return_value = [
+        {'name': 'foo-002', 'zone': 'asia-east1-a'}]
+    for zone in ('us-central1-a', 'europe-west1-b', 'asia-east1-a'):
+      api = mock_api_pool.Get('project', zone)
+      api.ListInstances.return_value = []
+      api.ListDisks.return_value = []
+
+    param = argparse.Namespace(prefix='Foo', all_zones=True,
+                               project='project', zone='us-central1-a')
+    JMeterCluster(param, api_pool=mock_api_pool).ShutDown()
+
+    main_api.ListInstancesInAllZones.assert_called_once_with(
+        'labels.jmeter_cluster eq foo', fields=['name'])
+    for zone in ('us-central1-a', 'europe-west1-b', 'asia-east1-a'):
+      apis[zone].ListDisks.assert_called_once_with(
+          'labels.jmeter_cluster eq foo', fields=['name'])
+
+  def testShutDown_WarmPool(self):
+    mock_warm_pool = mock.patch('jmeter_pool.WarmPool').start().return_value
+    mock_warm_pool.ListClaimed.return_value = {0: 'pool-004', 1: 'pool-007'}
+    self.mock_gce_api.ListInstances.return_value = []
+    self.mock_gce_api.ListDisks.return_value = []
+
+    param = argparse.Namespace(prefix='foo', pool_prefix='pool')
+    JMeterCluster(param).ShutDown()
+
+    self.mock_gce_api.ListInstances.assert_any_call(
+        'name eq ^(pool-004|pool-007)$', fields=['name'])
+    self.mock_gce_api.ListDisks.assert_any_call(
+        'name eq ^(pool-004|pool-007)$', fields=['name'])
+
+  def testResize_Grow(self):
+    self.mock_gce_api.ListInstances.return_value = [
+        {'name': 'foo-000'}, {'name': 'foo-001'}]
+    self.mock_gce_api.GetInstance.return_value = {'status': 'RUNNING'}
+
+    param = argparse.Namespace(size=2, prefix='foo')
+    cluster = JMeterCluster(param)
+    cluster.Resize(4)
+
+    self.assertEqual(
+        ['foo-002', 'foo-003'],
+        [c[0][0] for c in
+         self.mock_gce_api.CreateInstanceWithNewBootDisk.call_args_list])
+    self.assertEqual(4, param.size)
+    self.mock_set_port_forward.assert_called_once_with()
+
+  def testResize_GrowTooManyServerIds(self):
+    self.mock_gce_api.ListInstances.return_value = [{'name': 'foo-000'}]
+
+    param = argparse.Namespace(size=1, prefix='foo', servers_per_node=4)
+    self.assertRaises(SystemExit, JMeterCluster(param).Resize, 251)
+    self.assertFalse(self.mock_gce_api.CreateInstanceWithNewBootDisk.called)
+
+  def testResize_Shrink(self):
+    self.mock_gce_api.ListInstances.side_effect = [
+        [{'name': 'foo-000'}, {'name': 'foo-001'}, {'name': 'foo-002'}],
+        [], []]
+    self.mock_gce_api.ListDisks.return_value = []
+
+    param = argparse.Namespace(size=3, prefix='foo')
+    JMeterCluster(param).Resize(1)
+
+    self.assertFalse(self.mock_gce_api.CreateInstanceWithNewBootDisk.called)
+    self.mock_gce_api.ListInstances.assert_called_with(
+        'name eq ^(foo-001|foo-002)$', fields=['name'])
+    self.assertEqual(1, param.size)
+    self.mock_set_port_forward.assert_called_once_with()
+
+  def testResize_SameSize(self):
+    self.mock_gce_api.ListInstances.return_value = [{'name': 'foo-000'}]
+
+    JMeterCluster(argparse.Namespace(size=3, prefix='foo')).Resize(1)
+
+    self.assertFalse(self.mock_gce_api.CreateInstanceWithNewBootDisk.called)
+    self.assertFalse(self.mock_set_port_forward.called)
+
+  def testGetNodeStatus(self):
+    self.mock_gce_api.ListInstances.return_value = [
+        {'name': 'foo-000', 'status': 'RUNNING'},
+        {'name': 'foo-001', 'status': 'STOPPING'}]
+    mock_probe = mock.patch('jmeter_status.ProbeNodes').start()
+
+    param = argparse.Namespace(size=2, prefix='foo', servers_per_node=2)
+    rows = JMeterCluster(param).GetNodeStatus(probe_threads=8)
+
+    self.assertEqual(mock_probe.return_value, rows)
+    self.mock_gce_api.ListInstances.assert_called_once_with(
+        'labels.jmeter_cluster eq foo',
+        fields=['name', 'status', 'networkInterfaces/accessConfigs/natIP'])
+    nodes, instances, probe_threads = mock_probe.call_args[0]
+    self.assertEqual([(0, 'foo-000', [24000, 24001]),
+                      (1, 'foo-001', [24002, 24003])], nodes)
+    self.assertEqual('STOPPING', instances['foo-001']['status'])
+    self.assertEqual(8, probe_threads)
+
+  def testGetNodeStatus_WarmPool(self):
+    self.mock_gce_api.ListInstances.side_effect = [
+        [{'name': 'foo-000', 'status': 'RUNNING'},
+         {'name': 'foo-005', 'status': 'TERMINATED'}],
+        [{'name': 'pool-0001', 'status': 'RUNNING'},
+         {'name': 'pool-0002', 'status': 'RUNNING'}]]
+    mock.patch('jmeter_pool.WarmPool.ListClaimed',
+               return_value={1: 'pool-0001'}).start()
+    mock_probe = mock.patch('jmeter_status.ProbeNodes').start()
+
+    param = argparse.Namespace(size=2, prefix='foo', servers_per_node=1,
+                               pool_prefix='pool')
+    JMeterCluster(param).GetNodeStatus()
+
+    self.assertEqual(
+        ['labels.jmeter_cluster eq foo', 'labels.jmeter_pool eq pool'],
+        [c[0][0] for c in self.mock_gce_api.ListInstances.call_args_list])
+    # Instances not of the cluster are left out.
+    self.assertEqual(['foo-000', 'pool-0001'],
+                     sorted(mock_probe.call_args[0][1]))
+
+  def testReplaceNode(self):
+    self.mock_gce_api.ListInstances.side_effect = [
+        [{'name': 'foo-001'}], [], []]
+    self.mock_gce_api.ListDisks.side_effect = [[{'name': 'foo-001'}], [], []]
+    self.mock_gce_api.GetInstance.side_effect = [None, {'status': 'RUNNING'}]
+    self.mock_gce_api.GetDisk.return_value = None
+    mock.patch('jmeter_clock.ReadOffsets', return_value={
+        'foo-000': {'offset_ms': 5.0, 'round_trip_ms': 1.0},
+        'foo-001': {'offset_ms': 9.0, 'round_trip_ms': 1.0}}).start()
+    mock_popen = mock.patch('subprocess.Popen').start()
+    mock_popen.return_value.wait.return_value = 0
+    with open(self.sync_script_path, 'w') as f:
+      f.write('pull script')
+
+    param = argparse.Namespace(size=3, prefix='foo', servers_per_node=2)
+    self.assertEqual('foo-001', JMeterCluster(param).ReplaceNode(1))
+
+    self.mock_gce_api.DeleteInstance.assert_called_once_with('foo-001')
+    self.mock_gce_api.DeleteDisk.assert_called_once_with('foo-001')
+    create = self.mock_gce_api.CreateInstanceWithNewBootDisk.call_args
+    self.assertEqual('foo-001', create[0][0])
+    self.assertEqual(2, create[1]['metadata']['id'])
+    commands = [c[0][0] for c in self.mock_subprocess_call.call_args_list]
+    self.assertEqual('pkill -f -- "-L24002:127.0.0.1:24002"', commands[0])
+    self.assertIn('-L24003:127.0.0.1:24003', commands[-1])
+    self.assertTrue(commands[-1].endswith(' foo-001'))
+    # Only the replaced instance is forwarded again.
+    self.assertFalse(self.mock_set_port_forward.called)
+    # Assets of the last sync are pulled, and the clock offset is updated.
+    mock_popen.assert_called_once_with(mock.ANY, shell=True,
+                                       stdin=mock.ANY)
+    self.assertIn(' foo-001 ', mock_popen.call_args[0][0])
+    mock_popen.return_value.stdin.write.assert_called_once_with(
+        'pull script')
+    self.assertEqual({'foo-000': {'offset_ms': 5.0, 'round_trip_ms': 1.0},
+                      'foo-001': {'offset_ms': 1.0, 'round_trip_ms': 2.0}},
+                     self.mock_write_offsets.call_args[0][0])
+
+  def testReplaceNode_Timeout(self):
+    self.mock_gce_api.ListInstances.return_value = []
+    self.mock_gce_api.ListDisks.return_value = []
+    self.mock_gce_api.GetInstance.return_value = {'status': 'PROVISIONING'}
+    now = [1000.0]
+    mock.patch('time.time', side_effect=lambda: now[0]).start()
+    mock.patch('time.sleep',
+               side_effect=lambda seconds: now.append(now.pop() + 60)).start()
+
+    param = argparse.Namespace(size=3, prefix='foo', servers_per_node=1)
+    self.assertRaises(SystemExit, JMeterCluster(param).ReplaceNode, 1,
+                      timeout=150)
+
+    # Checked every 60 seconds until past the deadline of 1150 seconds.
+    self.assertEqual(4, self.mock_gce_api.GetInstance.call_count)
+
+  def testReplaceNode_ManagedGroupSlowProgress(self):
+    now = [1000.0]
+    mock.patch('time.time', side_effect=lambda: now[0]).start()
+    mock.patch('time.sleep',
+               side_effect=lambda seconds: now.append(now.pop() + 60)).start()
+    self.mock_gce_api.GetInstanceTemplate.return_value = {
+        'name': 'foo-template'}
+    self.mock_gce_api.GetInstanceGroupManager.return_value = {'name': 'foo'}
+    self.mock_gce_api.ListManagedInstanceErrors.return_value = []
+    names = ['foo-%d' % i for i in xrange(6)]
+
+    def ListManagedInstances(unused_group):
+      if not self.mock_gce_api.DeleteManagedInstances.called:
+        return names
+      # The group recreates one instance per check after the deletion.
+      return names[:1 + int(now[0] - 1000) // 60]
+
+    def ListInstances(unused_filter, fields=None):
+      return [{'name': name, 'metadata': {'items': [
+          {'key': 'cluster_index', 'value': str(index)}]}}
+              for index, name in enumerate(ListManagedInstances('foo'))]
+
+    self.mock_gce_api.ListManagedInstances.side_effect = ListManagedInstances
+    self.mock_gce_api.ListInstances.side_effect = ListInstances
+
+    param = argparse.Namespace(size=6, prefix='foo', servers_per_node=1,
+                               provisioning='managed_group')
+    self.assertRaises(SystemExit, JMeterCluster(param).ReplaceNode, 5,
+                      timeout=150)
+
+    # Progress of the group doesn't extend the replacement deadline.
+    self.assertEqual(1180, now[0])
+
+  def testReplaceNode_ManagedGroup(self):
+    self.mock_gce_api.GetInstance.return_value = {'status': 'RUNNING'}
+    self.mock_gce_api.GetInstanceTemplate.return_value = {
+        'name': 'foo-template'}
+    self.mock_gce_api.GetInstanceGroupManager.return_value = {'name': 'foo'}
+    self.mock_gce_api.ListManagedInstances.side_effect = [
+        ['foo-aaaa', 'foo-bbbb'], ['foo-aaaa', 'foo-bbbb'], ['foo-aaaa'],
+        ['foo-aaaa', 'foo-cccc']]
+    self.mock_gce_api.ListInstances.side_effect = [
+        [{'name': 'foo-aaaa',
+          'metadata': {'items': [{'key': 'cluster_index', 'value': '0'}]}},
+         {'name': 'foo-bbbb',
+          'metadata': {'items': [{'key': 'cluster_index', 'value': '1'}]}}],
+        [{'name': 'foo-aaaa',
+          'metadata': {'fingerprint': 'fp-a',
+                       'items': [{'key': 'cluster_index', 'value': '0'}]}},
+         {'name': 'foo-cccc', 'metadata': {'fingerprint': 'fp-c',
+                                           'items': []}}]]
+    self.mock_gce_api.SetInstanceMetadata.return_value = True
+    mock.patch('time.sleep').start()
+
+    param = argparse.Namespace(size=2, prefix='foo', servers_per_node=1,
+                               provisioning='managed_group')
+    self.assertEqual('foo-cccc', JMeterCluster(param).ReplaceNode(1))
+
+    self.mock_gce_api.DeleteManagedInstances.assert_called_once_with(
+        'foo', ['foo-bbbb'])
+    self.mock_gce_api.ResizeInstanceGroupManager.assert_called_once_with(
+        'foo', 2)
+    self.assertEqual(1, self.mock_gce_api.SetInstanceMetadata.call_args[0][1][
+        'cluster_index'])
+    commands = [c[0][0] for c in self.mock_subprocess_call.call_args_list]
+    self.assertIn('foo-cccc "sudo pkill -f ApacheJMeter.jar"', commands[-2])
+    self.assertTrue(commands[-1].endswith(' foo-cccc'))
+
+  def testStart_MetadataCredentials(self):
+    self.mock_gce_api.GetInstance.return_value = {'status': 'RUNNING'}
+    mock_provider_class = mock.patch(
+        'gce_credentials.MetadataServerProvider').start()
+
+    param = argparse.Namespace(
+        size=1, prefix='foo', credentials='metadata',
+        metadata_token_url='http://127.0.0.1/token',
+        token_cache='/tmp/token_cache')
+    cluster = JMeterCluster(param)
+    cluster.Start()
+
+    mock_provider_class.assert_called_once_with('http://127.0.0.1/token')
+    credentials = self.mock_gce_api_constructor.call_args[1]['credentials']
+    self.assertIsInstance(credentials, gce_credentials.CachedCredentials)
+
+  def testSync(self):
+    mock_asset_sync = mock.patch('jmeter_sync.AssetSync').start().return_value
+    mock_asset_sync.MakePullScript.return_value = 'pull script'
+    mock_popen = mock.patch('subprocess.Popen').start()
+    mock_popen.return_value.wait.side_effect = [0, 1]
+
+    param = argparse.Namespace(size=2, prefix='foo', index_offset=3)
+    cluster = JMeterCluster(param)
+    failed = cluster.Sync(['plan.jmx', 'users.csv'], ['users.csv'])
+
+    self.assertEqual(['foo-001'], failed)
+    mock_asset_sync.BuildManifest.assert_called_once_with(
+        ['plan.jmx', 'users.csv'], '.', ['users.csv'], 2, True)
+    mock_asset_sync.UploadMissing.assert_called_once_with(
+        mock_asset_sync.BuildManifest.return_value)
+    mock_asset_sync.MakePullScript.assert_called_once_with(
+        mock_asset_sync.BuildManifest.return_value, 3, 1)
+    self.assertEqual(2, mock_popen.call_count)
+    self.assertIn(' foo-000 ', mock_popen.call_args_list[0][0][0])
+    mock_popen.return_value.stdin.write.assert_called_with('pull script')
+    # Kept for replacement instances.
+    self.assertEqual('pull script', open(self.sync_script_path).read())
+
+  def testMeasureClockOffsets(self):
+    self.mock_measure_offset.side_effect = [
+        {'offset_ms': 1.0, 'round_trip_ms': 2.0}, None]
+
+    param = argparse.Namespace(size=2, prefix='foo')
+    offsets = JMeterCluster(param).MeasureClockOffsets()
+
+    commands = sorted(c[0][0] for c in
+                      self.mock_measure_offset.call_args_list)
+    self.assertIn('foo-000 "while read line; do date +%s%N; done"',
+                  commands[0])
+    self.assertIn('foo-001', commands[1])
+    self.assertEqual(1, len(offsets))
+    self.mock_write_offsets.assert_called_once_with(offsets, mock.ANY)
+    self.assertTrue(
+        self.mock_write_offsets.call_args[0][1].endswith('foo.clock.json'))
+
+  def testCollectTelemetry(self):
+    mock_popen = mock.patch('subprocess.Popen').start()
+    mock_popen.return_value.communicate.side_effect = [
+        ('1000000,10,20,0,100,200\n1005000,30,20,0,100,200\n', None),
+        ('', None)]
+    type(mock_popen.return_value).returncode = mock.PropertyMock(
+        side_effect=[0, 255])
+
+    param = argparse.Namespace(size=2, prefix='foo')
+    cluster = JMeterCluster(param)
+    samples_by_server = cluster.CollectTelemetry()
+
+    self.assertEqual(['foo-000'], samples_by_server.keys())
+    self.assertEqual([10, 30], [s['cpu'] for s in samples_by_server['foo-000']])
+    self.assertIn('cat /var/log/jmeter-telemetry.csv',
+                  mock_popen.call_args_list[1][0][0])
 
   def testShutdown(self):
     instance_list = [
@@ -89,7 +880,8 @@ class JMeterClusterTest(unittest.TestCase):
 
     self.assertEqual(1, self.mock_gce_api_constructor.call_count)
     self.assertEqual(2, self.mock_gce_api.ListInstances.call_count)
-    self.mock_gce_api.ListInstances.assert_called_with('name eq ^bar-.*')
+    self.mock_gce_api.ListInstances.assert_called_with(
+        'labels.jmeter_cluster eq bar', fields=['name'])
     self.assertEqual(5, self.mock_gce_api.DeleteInstance.call_count)
     self.assertEqual('bar-000',
                      self.mock_gce_api.DeleteInstance.call_args_list[0][0][0])
@@ -166,12 +958,335 @@ class JMeterClusterExecuterTest(unittest.TestCase):
 
     self.mock_run_client.assert_called_once_with('--additional', 'parameters')
 
+  def testRun(self):
+    mock_runner_class = mock.patch(
+        'jmeter_client_runner.ClientRunner').start()
+    mock_runner_class.return_value.Run.return_value = {
+        'exit_status': 0, 'timed_out': False, 'interrupted': False,
+        'stats': None}
+
+    JMeterExecuter().ParseArgumentsAndExecute([
+        'run', 'plan.jmx', '--prefix', 'foo', '--timeout', '60', '-Jx=1'])
+
+    self.assertEqual(60, mock_runner_class.call_args[1]['timeout'])
+    self.assertRegexpMatches(mock_runner_class.call_args[0][1],
+                             '^results/foo-')
+    mock_runner_class.return_value.Run.assert_called_once_with(
+        'plan.jmx', ('-Jx=1',))
+
+  def testRun_StreamResults(self):
+    mock_runner_class = mock.patch(
+        'jmeter_client_runner.ClientRunner').start()
+    mock_runner_class.return_value.Run.return_value = {
+        'exit_status': 0, 'timed_out': False, 'interrupted': False,
+        'stats': None, 'results': 'gs://bucket/results/foo-1', 'segments': 3,
+        'results_complete': True}
+    mock_segmenter_class = mock.patch('jmeter_segments.Segmenter').start()
+    mock_read_segments = mock.patch('jmeter_segments.ReadSegmentLines',
+                                    return_value=[]).start()
+
+    JMeterExecuter().ParseArgumentsAndExecute([
+        'run', 'plan.jmx', '--prefix', 'foo',
+        '--stream_results', 'gs://bucket/results/', '--segment_mb', '8'])
+
+    store = mock_segmenter_class.call_args[0][0]
+    self.assertRegexpMatches(store.url, '^gs://bucket/results/foo-')
+    self.assertRegexpMatches(mock_segmenter_class.call_args[0][1],
+                             '^results/foo-.*/segments$')
+    self.assertEqual(8 << 20,
+                     mock_segmenter_class.call_args[1]['segment_bytes'])
+    self.assertEqual(mock_segmenter_class.return_value,
+                     mock_runner_class.call_args[1]['segmenter'])
+    # Start skew is measured from the uploaded segments.
+    self.assertEqual('gs://bucket/results/foo-1',
+                     mock_read_segments.call_args[0][0].url)
+
+  def testRun_StreamResults_UploadFailed(self):
+    mock_runner_class = mock.patch(
+        'jmeter_client_runner.ClientRunner').start()
+    mock_runner_class.return_value.Run.return_value = {
+        'exit_status': 0, 'timed_out': False, 'interrupted': False,
+        'stats': None, 'results': 'gs://bucket/results/foo-1', 'segments': 2,
+        'results_complete': False}
+    mock.patch('jmeter_segments.Segmenter').start()
+
+    self.assertRaises(SystemExit, JMeterExecuter().ParseArgumentsAndExecute,
+                      ['run', 'plan.jmx', '--stream_results'])
+
+  def testRun_SyncStart(self):
+    mock_runner_class = mock.patch(
+        'jmeter_client_runner.ClientRunner').start()
+    mock_runner_class.return_value.Run.return_value = {
+        'exit_status': 0, 'timed_out': False, 'interrupted': False,
+        'stats': None}
+    mock_add_barrier = mock.patch(
+        'jmeter_start_barrier.AddStartBarrier').start()
+    mock.patch('jmeter_clock.ReadOffsets',
+               return_value={'foo-000': {'offset_ms': 5.0}}).start()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      JMeterExecuter().ParseArgumentsAndExecute([
+          'run', 'dir/plan.jmx', '--prefix', 'foo', '--results_dir', tmp_dir,
+          '--sync_start', '--start_lead', '30', '-Jx=1'])
+
+      plan = mock_add_barrier.call_args[0][1]
+      self.assertEqual('dir/plan.jmx', mock_add_barrier.call_args[0][0])
+      self.assertRegexpMatches(plan, '^%s/foo-.*/plan.jmx$' % tmp_dir)
+      run_args = mock_runner_class.return_value.Run.call_args[0]
+      self.assertEqual(plan, run_args[0])
+      self.assertRegexpMatches(run_args[1][0],
+                               r'^-Gjmeter_cluster.start_at=\d+$')
+      self.assertEqual(['-Gjmeter_cluster.clock_offset.foo-000=5', '-Jx=1'],
+                       run_args[1][1:])
+    finally:
+      shutil.rmtree(tmp_dir)
+
+  def testRun_StartSkew(self):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      results = os.path.join(tmp_dir, 'results.jtl')
+      with open(results, 'w') as f:
+        f.write('timeStamp,elapsed,label,success,Hostname\n'
+                '1000,10,a,true,foo-000\n'
+                '1040,10,a,true,foo-001\n')
+      mock_runner_class = mock.patch(
+          'jmeter_client_runner.ClientRunner').start()
+      mock_runner_class.return_value.Run.return_value = {
+          'exit_status': 0, 'timed_out': False, 'interrupted': False,
+          'stats': None, 'results': results}
+      mock.patch('jmeter_client_runner.MakeRunDirectory',
+                 return_value=tmp_dir).start()
+
+      JMeterExecuter().ParseArgumentsAndExecute(['run', 'plan.jmx'])
+
+      with open(os.path.join(tmp_dir, 'start_skew.json')) as f:
+        self.assertEqual(40, json.load(f)['spread_ms'])
+    finally:
+      shutil.rmtree(tmp_dir)
+
+  def testRun_TimedOut(self):
+    mock_runner_class = mock.patch(
+        'jmeter_client_runner.ClientRunner').start()
+    mock_runner_class.return_value.Run.return_value = {
+        'exit_status': 0, 'timed_out': True, 'interrupted': False,
+        'stats': None}
+
+    self.assertRaises(SystemExit, JMeterExecuter().ParseArgumentsAndExecute,
+                      ['run', 'plan.jmx'])
+
+  def testRun_Watchdog(self):
+    mock_runner_class = mock.patch(
+        'jmeter_client_runner.ClientRunner').start()
+    mock_runner_class.return_value.Run.return_value = {
+        'exit_status': 0, 'timed_out': False, 'interrupted': False,
+        'stats': None}
+    self.mock_cluster.GetLiveSize.return_value = 4
+    self.mock_cluster.GetServersPerNode.return_value = 2
+    mock_watchdog = self.mock_cluster.MakeWatchdog.return_value
+    mock_watchdog.Stop.return_value = [
+        {'index': 1, 'instance': 'foo-001', 'servers': 2,
+         'reason': 'instance TERMINATED', 'down_ms': 0, 'recovered_ms': None,
+         'replacement': 'foo-001'}]
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      JMeterExecuter().ParseArgumentsAndExecute([
+          'run', 'plan.jmx', '--prefix', 'foo', '--results_dir', tmp_dir,
+          '--watchdog', '--watchdog_interval', '10', '--servers-per-node',
+          '2'])
+
+      self.assertEqual('foo',
+                       self.mock_cluster_constructor.call_args[0][0].prefix)
+      self.mock_cluster.MakeWatchdog.assert_called_once_with(10, 1.0, 2, 600.0)
+      mock_watchdog.Start.assert_called_once_with()
+      mock_watchdog.Stop.assert_called_once_with()
+      gaps_path = os.path.join(mock_runner_class.call_args[0][1],
+                               'capacity_gaps.json')
+      with open(gaps_path) as f:
+        gaps = json.load(f)
+      self.assertEqual(1, gaps['failed_nodes'])
+      self.assertEqual('foo-001', gaps['gaps'][0]['replacement'])
+    finally:
+      shutil.rmtree(tmp_dir)
+
+  def testRun_NoWatchdog(self):
+    mock_runner_class = mock.patch(
+        'jmeter_client_runner.ClientRunner').start()
+    mock_runner_class.return_value.Run.return_value = {
+        'exit_status': 0, 'timed_out': False, 'interrupted': False,
+        'stats': None}
+
+    JMeterExecuter().ParseArgumentsAndExecute(['run', 'plan.jmx'])
+
+    self.assertFalse(self.mock_cluster_constructor.called)
+
+  def testRun_Workloads(self):
+    mock_runner_class = mock.patch(
+        'jmeter_client_runner.ClientRunner').start()
+    mock_runner_class.return_value.Run.return_value = {
+        'exit_status': 0, 'timed_out': False, 'interrupted': False,
+        'stats': None}
+    mock_load = mock.patch('jmeter_workloads.LoadWorkloadSpec').start()
+    mock_load.return_value = [
+        {'name': 'browse', 'plan': 'browse.jmx', 'weight': 2,
+         'threads': None},
+        {'name': 'search', 'plan': 'search.jmx', 'weight': 1,
+         'threads': None}]
+    mock_build = mock.patch('jmeter_workloads.BuildPlan',
+                            return_value={'browse': 1.0,
+                                          'search': 0.5}).start()
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      override = os.path.join(tmp_dir, 'override.properties')
+      with open(override, 'w') as f:
+        f.write('remote_hosts=127.0.0.1:24000,127.0.0.1:24001,'
+                '127.0.0.1:24002\n')
+      mock.patch('jmeter_cluster.JMeterFiles.GetClientOverridePath',
+                 return_value=override).start()
+
+      JMeterExecuter().ParseArgumentsAndExecute([
+          'run', '--workloads', 'mix.json', '--prefix', 'foo',
+          '--results_dir', tmp_dir, '-Jx=1'])
+
+      mock_load.assert_called_once_with('mix.json')
+      plan = mock_build.call_args[0][1]
+      run_args = mock_runner_class.return_value.Run.call_args[0]
+      self.assertEqual(plan, run_args[0])
+      self.assertEqual(
+          ['-Gjmeter_cluster.scale.browse.24000=1.0',
+           '-Gjmeter_cluster.scale.browse.24001=1.0',
+           '-Gjmeter_cluster.scale.search.24002=0.5', '-Jx=1'], run_args[1])
+      with open(os.path.join(os.path.dirname(plan), 'workloads.json')) as f:
+        workloads = json.load(f)
+      self.assertEqual([2, 1], [w['servers'] for w in workloads['workloads']])
+      self.assertEqual({'port': 24002, 'workload': 'search'},
+                       workloads['servers'][2])
+    finally:
+      shutil.rmtree(tmp_dir)
+
+  def testRun_WorkloadsAndPlan(self):
+    mock_segmenter = mock.patch('jmeter_segments.Segmenter').start()
+
+    self.assertRaises(SystemExit, JMeterExecuter().ParseArgumentsAndExecute,
+                      ['run', 'plan.jmx', '--workloads', 'mix.json'])
+    self.assertRaises(SystemExit, JMeterExecuter().ParseArgumentsAndExecute,
+                      ['run', '--stream_results'])
+    # Uploader of segments is not started by invalid command line.
+    self.assertFalse(mock_segmenter.called)
+
+  def testRun_TooFewServers(self):
+    mock.patch('jmeter_workloads.LoadWorkloadSpec', return_value=[
+        {'name': 'browse', 'plan': 'browse.jmx', 'weight': 1,
+         'threads': None}]).start()
+    mock.patch('os.path.exists', return_value=False).start()
+    mock_runner_class = mock.patch(
+        'jmeter_client_runner.ClientRunner').start()
+
+    self.assertRaises(SystemExit, JMeterExecuter().ParseArgumentsAndExecute,
+                      ['run', '--workloads', 'mix.json'])
+    self.assertFalse(mock_runner_class.return_value.Run.called)
+
+  def testStatus(self):
+    self.mock_cluster.GetLiveSize.return_value = 3
+    self.mock_cluster.GetNodeStatus.return_value = [
+        {'index': 0, 'instance': 'foo-000', 'status': 'RUNNING', 'ssh': True,
+         'tunnels': 1, 'servers': 1, 'ports': 1}]
+    mock_view = mock.patch('jmeter_status.StatusView').start().return_value
+
+    JMeterExecuter().ParseArgumentsAndExecute(['status', '--prefix', 'foo'])
+
+    self.assertEqual(3, self.mock_cluster_constructor.call_args[0][0].size)
+    self.mock_cluster.GetNodeStatus.assert_called_once_with(32)
+    mock_view.Update.assert_called_once_with(
+        self.mock_cluster.GetNodeStatus.return_value)
+
+  def testStatus_Unhealthy(self):
+    self.mock_cluster.GetNodeStatus.return_value = [
+        {'index': 0, 'instance': 'foo-000', 'status': 'TERMINATED',
+         'ssh': None, 'tunnels': 0, 'servers': 0, 'ports': 1}]
+    mock.patch('jmeter_status.StatusView').start()
+
+    self.assertRaises(SystemExit, JMeterExecuter().ParseArgumentsAndExecute,
+                      ['status', '2'])
+    self.assertFalse(self.mock_cluster.GetLiveSize.called)
+
+  def testStatus_Watch(self):
+    self.mock_cluster.GetNodeStatus.return_value = []
+    mock_view = mock.patch('jmeter_status.StatusView').start().return_value
+    mock_sleep = mock.patch(
+        'time.sleep', side_effect=[None, KeyboardInterrupt]).start()
+
+    JMeterExecuter().ParseArgumentsAndExecute([
+        'status', '--watch', '--interval', '2'])
+
+    self.assertEqual(2, mock_view.Update.call_count)
+    mock_sleep.assert_called_with(2)
+
+  def testQueueAdd(self):
+    mock_job_queue = mock.patch('jmeter_queue.JobQueue').start().return_value
+
+    JMeterExecuter().ParseArgumentsAndExecute([
+        'queue', 'add', 'plan.jmx', '--size', '5', '-Jusers=100'])
+
+    mock_job_queue.Add.assert_called_once_with(
+        'plan.jmx', 5, ('-Jusers=100',))
+
+  def testQueueRun(self):
+    mock.patch('jmeter_queue.JobQueue').start()
+    mock_run_jobs = mock.patch('jmeter_queue.RunJobs',
+                               return_value=[{'status': 'failed'}]).start()
+
+    self.assertRaises(SystemExit, JMeterExecuter().ParseArgumentsAndExecute,
+                      ['queue', 'run', '--prefix', 'foo'])
+
+    run_client = mock_run_jobs.call_args[0][2]
+    run_client(['-n'])
+    self.mock_run_client.assert_called_once_with(
+        '-q', mock.ANY, '-n')
+    self.assertTrue(mock_run_jobs.call_args[1]['shutdown'])
+
+  def testClientWithOverride(self):
+    mock.patch('os.path.exists', return_value=True).start()
+
+    JMeterExecuter().ParseArgumentsAndExecute([
+        'client', '--prefix', 'abc', '-t', 'plan.jmx'])
+
+    self.mock_run_client.assert_called_once_with(
+        '-q', mock.ANY, '-t', 'plan.jmx')
+    self.assertTrue(
+        self.mock_run_client.call_args[0][1].endswith('abc.properties'))
+
   def testShutDown(self):
     JMeterExecuter().ParseArgumentsAndExecute(['shutdown'])
 
     self.assertEqual(1, self.mock_cluster_constructor.call_count)
     self.mock_cluster.ShutDown.assert_called_once_with()
 
+  def testProfile(self):
+    mock_enable = mock.patch('jmeter_profile.Enable').start()
+    mock_profiler = mock.MagicMock()
+    mock_profiler.Write.return_value = ('p.folded', 'p.trace.json')
+    mock.patch('jmeter_profile.Disable', return_value=mock_profiler).start()
+
+    JMeterExecuter().ParseArgumentsAndExecute([
+        '--profile', '--profile_output', 'p', 'shutdown'])
+
+    self.assertEqual(1, mock_enable.call_count)
+    self.mock_cluster.ShutDown.assert_called_once_with()
+    mock_profiler.Write.assert_called_once_with('p')
+
+  def testResize(self):
+    mock_record = mock.patch('jmeter_estimate.RecordTimings').start()
+    self.mock_cluster.phase_seconds = {'creating instances': 10.0}
+    self.mock_cluster.operation_size = 2
+
+    JMeterExecuter().ParseArgumentsAndExecute([
+        'resize', '5', '--prefix', 'abc', '--timings', 'timings'])
+
+    self.mock_cluster.Resize.assert_called_once_with(5)
+    mock_record.assert_called_once_with(
+        'timings', 'resize', 2, 'n1-standard-2',
+        {'creating instances': 10.0})
+
   def testShutDownWithParams(self):
     JMeterExecuter().ParseArgumentsAndExecute([
         'shutdown', '--prefix', 'abc', '--project', 'xyz'])
@@ -182,6 +1297,159 @@ class JMeterClusterExecuterTest(unittest.TestCase):
     self.assertEqual('abc', param.prefix)
     self.assertEqual('xyz', param.project)
 
+  def testMulti(self):
+    mock_run = mock.patch('jmeter_multi_cluster.RunConcurrently',
+                          return_value={'a': True, 'b': True}).start()
+    mock.patch('jmeter_multi_cluster.LoadClusterSpec', return_value=[
+        argparse.Namespace(prefix='a'),
+        argparse.Namespace(prefix='b')]).start()
+
+    JMeterExecuter().ParseArgumentsAndExecute(['multi', 'spec.json', 'start'])
+
+    self.assertEqual(2, self.mock_cluster_constructor.call_count)
+    clusters, method_name = mock_run.call_args[0]
+    self.assertEqual(['a', 'b'], sorted(clusters))
+    self.assertEqual('Start', method_name)
+    # All clusters share the same GceApi pool.
+    pools = [c[1]['api_pool']
+             for c in self.mock_cluster_constructor.call_args_list]
+    self.assertIs(pools[0], pools[1])
+
+  def testMulti_Failure(self):
+    mock.patch('jmeter_multi_cluster.RunConcurrently',
+               return_value={'a': True, 'b': False}).start()
+    mock.patch('jmeter_multi_cluster.LoadClusterSpec', return_value=[
+        argparse.Namespace(prefix='a'),
+        argparse.Namespace(prefix='b')]).start()
+
+    with self.assertRaises(SystemExit):
+      JMeterExecuter().ParseArgumentsAndExecute([
+          'multi', 'spec.json', 'shutdown'])
+
+  def testMulti_MissingResult(self):
+    mock.patch('jmeter_multi_cluster.RunConcurrently',
+               return_value={'a': True}).start()
+    mock.patch('jmeter_multi_cluster.LoadClusterSpec', return_value=[
+        argparse.Namespace(prefix='a'),
+        argparse.Namespace(prefix='b')]).start()
+
+    with self.assertRaises(SystemExit):
+      JMeterExecuter().ParseArgumentsAndExecute([
+          'multi', 'spec.json', 'start'])
+
+  def testReport_ClockOffsets(self):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      results = os.path.join(tmp_dir, 'results.jtl')
+      with open(results, 'w') as f:
+        f.write('timeStamp,elapsed,label,success,Hostname\n'
+                '1000,10,a,true,foo-000\n'
+                '3000,10,a,true,foo-001\n')
+      offsets = os.path.join(tmp_dir, 'foo.clock.json')
+      with open(offsets, 'w') as f:
+        f.write('{"foo-001": {"offset_ms": 2000.0, "round_trip_ms": 1.0}}')
+      output = os.path.join(tmp_dir, 'report.json')
+
+      JMeterExecuter().ParseArgumentsAndExecute([
+          'report', results, '--clock_offsets', offsets, '--output', output])
+
+      with open(output) as f:
+        report = json.load(f)
+      self.assertEqual([2], report['timeline']['counts'])
+      self.assertEqual(2000.0, report['metadata']['clock_offsets'][
+          'foo-001']['offset_ms'])
+    finally:
+      shutil.rmtree(tmp_dir)
+
+  def testReport_Segments(self):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      bucket = os.path.join(tmp_dir, 'bucket')
+      segmenter = jmeter_segments.Segmenter(
+          jmeter_segments.LocalStore(bucket), os.path.join(tmp_dir, 'spool'),
+          segment_bytes=1)
+      for line in ['timeStamp,elapsed,label,success\n', '1000,10,a,true\n',
+                   '1500,10,a,true\n', '2000,10,a,true\n']:
+        segmenter.Write(line)
+      segmenter.Close()
+      output = os.path.join(tmp_dir, 'report.json')
+
+      JMeterExecuter().ParseArgumentsAndExecute([
+          'report', '--segments', bucket, '--output', output])
+
+      with open(output) as f:
+        self.assertEqual([2, 1], json.load(f)['timeline']['counts'])
+    finally:
+      shutil.rmtree(tmp_dir)
+
+  def testConvertAndReport_Binary(self):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      results = os.path.join(tmp_dir, 'results.jtl')
+      with open(results, 'w') as f:
+        f.write('timeStamp,elapsed,label,success,Hostname\n'
+                '1000,10,a,true,foo-000\n'
+                '2000,10,a,false,foo-001\n')
+      output = os.path.join(tmp_dir, 'report.json')
+
+      JMeterExecuter().ParseArgumentsAndExecute(['convert', results])
+      JMeterExecuter().ParseArgumentsAndExecute([
+          'report', os.path.join(tmp_dir, 'results.jtlb'),
+          '--output', output])
+
+      with open(output) as f:
+        report = json.load(f)
+      self.assertEqual([1, 1], report['timeline']['counts'])
+      self.assertEqual(1, report['summary']['errors'])
+    finally:
+      shutil.rmtree(tmp_dir)
+
+  def testReport_CapacityGaps(self):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      results = os.path.join(tmp_dir, 'results.jtl')
+      with open(results, 'w') as f:
+        f.write('timeStamp,elapsed,label,success\n1000,10,a,true\n')
+      with open(os.path.join(tmp_dir, 'capacity_gaps.json'), 'w') as f:
+        json.dump({'failed_nodes': 1, 'gaps': []}, f)
+      output = os.path.join(tmp_dir, 'report.json')
+
+      JMeterExecuter().ParseArgumentsAndExecute([
+          'report', results, '--output', output])
+
+      with open(output) as f:
+        self.assertEqual(1, json.load(f)['capacity_gaps']['failed_nodes'])
+    finally:
+      shutil.rmtree(tmp_dir)
+
+  def testReportCompare_NoRegression(self):
+    mock.patch('jmeter_cluster.json.load', return_value={}).start()
+    mock.patch('jmeter_cluster.open', mock.mock_open(), create=True).start()
+    mock_compare = mock.patch(
+        'jmeter_report.CompareReports',
+        return_value=[{'kind': 'latency', 'label': 'home', 'base': 1.0,
+                       'new': 1.0, 'change': 0.0, 'z': 0.0,
+                       'regression': False}]).start()
+
+    JMeterExecuter().ParseArgumentsAndExecute([
+        'report', '--compare', 'base.json', 'new.json'])
+
+    self.assertEqual(1, mock_compare.call_count)
+
+  def testReportCompare_Regression(self):
+    mock.patch('jmeter_cluster.json.load', return_value={}).start()
+    mock.patch('jmeter_cluster.open', mock.mock_open(), create=True).start()
+    mock.patch(
+        'jmeter_report.CompareReports',
+        return_value=[{'kind': 'throughput', 'label': None, 'base': 10.0,
+                       'new': 5.0, 'change': -0.5, 'z': -9.0,
+                       'regression': True}]).start()
+
+    with self.assertRaises(SystemExit) as context:
+      JMeterExecuter().ParseArgumentsAndExecute([
+          'report', '--compare', 'base.json', 'new.json'])
+    self.assertEqual(1, context.exception.code)
+
 
 if __name__ == '__main__':
   unittest.main()
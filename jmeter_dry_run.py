@@ -0,0 +1,328 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to run cluster operations without touching Compute Engine.
+
+In dry run, GceApi objects are replaced with DryRunApi, which records each
+call and keeps resources in memory, so that the operation sees the effects
+of its own calls, e.g. instances it created are RUNNING when it checks
+them.  Subprocesses and sleeps are recorded instead of run.
+"""
+
+
+
+import re
+import subprocess
+import threading
+import time
+
+
+# Number of HTTP requests each GceApi method makes, when more than one.
+# Waits are counted once.
+REQUESTS_PER_CALL = {
+    'CreateInstanceWithNewBootDisk': 4,
+    'CreateInstanceTemplate': 2,
+}
+
+
+class Recorder(object):
+  """Records API calls, commands and sleeps of dry run in order."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    # List of (kind, name, arguments) where kind is 'api', 'command',
+    # 'function' or 'sleep'.
+    self.steps = []
+
+  def Record(self, kind, name, *args):
+    with self._lock:
+      self.steps.append((kind, name, args))
+
+  def CountApiRequests(self):
+    """Returns estimated number of HTTP requests of the recorded calls."""
+    return sum(REQUESTS_PER_CALL.get(name, 1)
+               for kind, name, _ in self.steps if kind == 'api')
+
+  def GetSleepSeconds(self):
+    return sum(args[0] for kind, _, args in self.steps if kind == 'sleep')
+
+  def Format(self):
+    """Returns recorded steps, one per line."""
+    lines = []
+    for number, (kind, name, args) in enumerate(self.steps, 1):
+      if kind == 'command':
+        lines.append('%4d  $ %s' % (number, args[0]))
+      else:
+        lines.append('%4d  %s(%s)' % (
+            number, name, ', '.join(_FormatArg(a) for a in args)))
+    return '\n'.join(lines)
+
+
+def _FormatArg(value):
+  value = repr(value)
+  # Startup script and the like are too long to show.
+  return value if len(value) <= 60 else value[:57] + '...'
+
+
+def _Matches(resource, filter_string):
+  """Evaluates list filter, e.g. 'labels.jmeter_cluster eq foo'."""
+  if not filter_string:
+    return True
+  match = re.match(r'^(\S+) eq (.*)$', filter_string)
+  if not match:
+    raise ValueError('Unsupported filter: %s' % filter_string)
+  value = resource
+  for key in match.group(1).split('.'):
+    value = value.get(key) if isinstance(value, dict) else None
+  return (value is not None and
+          re.match('(?:%s)\\Z' % match.group(2), str(value)) is not None)
+
+
+class DryRunApi(object):
+  """Stand-in for GceApi that records calls and simulates resources.
+
+  Methods take the same parameters as those of GceApi.  Instances become
+  RUNNING as soon as they're created, and resources are gone as soon as
+  they're deleted.
+  """
+
+  def __init__(self, recorder, project, zone):
+    self._recorder = recorder
+    self._project = project
+    self._zone = zone
+    self._lock = threading.Lock()
+    self._instances = {}
+    self._disks = {}
+    self._templates = {}
+    self._groups = {}
+    self._next_suffix = 0
+
+  def _Record(self, name, *args):
+    self._recorder.Record('api', name, *args)
+
+  def AddInstance(self, instance_name, labels=None, metadata=None):
+    """Adds existing instance and its boot disk, without recording."""
+    with self._lock:
+      self._instances[instance_name] = {
+          'name': instance_name, 'status': 'RUNNING', 'zone': self._zone,
+          'labels': dict(labels or {}),
+          'metadata': {'fingerprint': '0', 'items': [
+              {'key': key, 'value': value}
+              for key, value in (metadata or {}).items()]},
+      }
+      self._disks[instance_name] = {
+          'name': instance_name, 'status': 'READY', 'zone': self._zone,
+          'labels': dict(labels or {}),
+      }
+
+  @staticmethod
+  def _List(resources, filter_string):
+    return [dict(r) for _, r in sorted(resources.items())
+            if _Matches(r, filter_string)]
+
+  def GetInstance(self, instance_name):
+    self._Record('GetInstance', instance_name)
+    return self._instances.get(instance_name)
+
+  def ListInstances(self, filter_string=None, fields=None):
+    self._Record('ListInstances', filter_string)
+    return self._List(self._instances, filter_string)
+
+  def ListInstancesInAllZones(self, filter_string=None, fields=None):
+    self._Record('ListInstancesInAllZones', filter_string)
+    return self._List(self._instances, filter_string)
+
+  def CreateInstanceWithNewBootDisk(
+      self, instance_name, machine_type, image,
+      startup_script='', service_accounts=None, metadata=None, labels=None):
+    self._Record('CreateInstanceWithNewBootDisk', instance_name,
+                 machine_type, image)
+    self.AddInstance(instance_name, labels, metadata)
+    return True
+
+  def SetInstanceMetadata(self, instance_name, metadata, fingerprint):
+    self._Record('SetInstanceMetadata', instance_name, metadata)
+    with self._lock:
+      self._instances[instance_name]['metadata'] = {
+          'fingerprint': str(int(fingerprint) + 1),
+          'items': [{'key': key, 'value': value}
+                    for key, value in metadata.items()]}
+    return True
+
+  def DeleteInstance(self, instance_name):
+    self._Record('DeleteInstance', instance_name)
+    with self._lock:
+      self._instances.pop(instance_name, None)
+    return True
+
+  def GetDisk(self, disk_name):
+    self._Record('GetDisk', disk_name)
+    return self._disks.get(disk_name)
+
+  def ListDisks(self, filter_string=None, fields=None):
+    self._Record('ListDisks', filter_string)
+    return self._List(self._disks, filter_string)
+
+  def ListDisksInAllZones(self, filter_string=None, fields=None):
+    self._Record('ListDisksInAllZones', filter_string)
+    return self._List(self._disks, filter_string)
+
+  def DeleteDisk(self, disk_name):
+    self._Record('DeleteDisk', disk_name)
+    with self._lock:
+      self._disks.pop(disk_name, None)
+    return True
+
+  def GetInstanceTemplate(self, template_name):
+    self._Record('GetInstanceTemplate', template_name)
+    return self._templates.get(template_name)
+
+  def CreateInstanceTemplate(
+      self, template_name, machine_type, image,
+      startup_script='', service_accounts=None, metadata=None, labels=None):
+    self._Record('CreateInstanceTemplate', template_name, machine_type, image)
+    self._templates[template_name] = {
+        'name': template_name, 'labels': labels, 'metadata': metadata}
+    return True
+
+  def DeleteInstanceTemplate(self, template_name):
+    self._Record('DeleteInstanceTemplate', template_name)
+    self._templates.pop(template_name, None)
+    return True
+
+  def GetInstanceGroupManager(self, group_name):
+    self._Record('GetInstanceGroupManager', group_name)
+    return self._groups.get(group_name)
+
+  def CreateInstanceGroupManager(self, group_name, template_name,
+                                 base_instance_name, size=0):
+    self._Record('CreateInstanceGroupManager', group_name, template_name,
+                 base_instance_name, size)
+    self._groups[group_name] = {
+        'name': group_name, 'template': template_name,
+        'base': base_instance_name, 'instances': []}
+    self._ResizeGroup(group_name, size)
+    return True
+
+  def _ResizeGroup(self, group_name, size):
+    group = self._groups[group_name]
+    template = self._templates[group['template']]
+    while len(group['instances']) < size:
+      instance_name = '%s-%04x' % (group['base'], self._next_suffix)
+      self._next_suffix += 1
+      self.AddInstance(instance_name, template['labels'],
+                       template['metadata'])
+      group['instances'].append(instance_name)
+    while len(group['instances']) > size:
+      instance_name = group['instances'].pop()
+      self._instances.pop(instance_name, None)
+      self._disks.pop(instance_name, None)
+
+  def ResizeInstanceGroupManager(self, group_name, size):
+    self._Record('ResizeInstanceGroupManager', group_name, size)
+    self._ResizeGroup(group_name, size)
+    return True
+
+  def ListManagedInstances(self, group_name):
+    self._Record('ListManagedInstances', group_name)
+    return list(self._groups[group_name]['instances'])
+
+  def ListManagedInstanceErrors(self, group_name):
+    self._Record('ListManagedInstanceErrors', group_name)
+    return []
+
+  def DeleteManagedInstances(self, group_name, instance_names):
+    self._Record('DeleteManagedInstances', group_name, instance_names)
+    group = self._groups[group_name]
+    for instance_name in instance_names:
+      group['instances'].remove(instance_name)
+      self._instances.pop(instance_name, None)
+      self._disks.pop(instance_name, None)
+    return True
+
+  def DeleteInstanceGroupManager(self, group_name):
+    self._Record('DeleteInstanceGroupManager', group_name)
+    self._ResizeGroup(group_name, 0)
+    del self._groups[group_name]
+    return True
+
+
+class DryRunApiPool(object):
+  """Stand-in for GceApiPool that gives DryRunApi per project and zone."""
+
+  def __init__(self, recorder):
+    self._recorder = recorder
+    self._apis = {}
+    self._lock = threading.Lock()
+
+  def Get(self, project, zone):
+    with self._lock:
+      if (project, zone) not in self._apis:
+        self._apis[(project, zone)] = DryRunApi(self._recorder, project, zone)
+      return self._apis[(project, zone)]
+
+
+class Intercept(object):
+  """Context manager that records subprocesses and sleeps instead of them.
+
+  subprocess.call() returns 0 and time.sleep() returns immediately.
+  """
+
+  def __init__(self, recorder, functions=()):
+    """Constructor.
+
+    Args:
+      recorder: Recorder object.
+      functions: List of (owner, function name, return value) of additional
+          functions to record instead of calling, e.g. ones writing local
+          files.
+    """
+    self._recorder = recorder
+    self._functions = list(functions)
+    self._originals = []
+
+  def _Replace(self, owner, name, value):
+    self._originals.append((owner, name, owner.__dict__[name]))
+    if isinstance(owner, type):
+      value = staticmethod(value)
+    setattr(owner, name, value)
+
+  def _MakeRecorded(self, name, return_value):
+    def Recorded(*args, **unused_kwargs):
+      self._recorder.Record('function', name, *args)
+      return return_value
+    return Recorded
+
+  def __enter__(self):
+    def Call(command, *unused_args, **unused_kwargs):
+      if not isinstance(command, basestring):
+        command = ' '.join(command)
+      self._recorder.Record('command', 'subprocess.call', command)
+      return 0
+
+    def Sleep(seconds):
+      self._recorder.Record('sleep', 'time.sleep', seconds)
+
+    self._Replace(subprocess, 'call', Call)
+    self._Replace(time, 'sleep', Sleep)
+    for owner, name, return_value in self._functions:
+      self._Replace(owner, name, self._MakeRecorded(
+          '%s.%s' % (getattr(owner, '__name__', owner), name), return_value))
+    return self._recorder
+
+  def __exit__(self, *unused_exc_info):
+    while self._originals:
+      owner, name, value = self._originals.pop()
+      setattr(owner, name, value)
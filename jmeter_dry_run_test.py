@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of jmeter_dry_run.py."""
+
+
+
+import subprocess
+import time
+import unittest
+
+import jmeter_dry_run
+
+
+class DryRunApiTest(unittest.TestCase):
+  """Unit test class of DryRunApi."""
+
+  def setUp(self):
+    self.recorder = jmeter_dry_run.Recorder()
+    self.api = jmeter_dry_run.DryRunApi(self.recorder, 'project', 'zone')
+
+  def testCreateListDelete(self):
+    self.api.AddInstance('foo-000', labels={'jmeter_cluster': 'foo'})
+    self.assertTrue(self.api.CreateInstanceWithNewBootDisk(
+        'foo-001', 'n1-standard-2', 'image',
+        labels={'jmeter_cluster': 'foo'}))
+    self.api.AddInstance('bar-000', labels={'jmeter_cluster': 'bar'})
+
+    self.assertEqual(['foo-000', 'foo-001'], [
+        i['name'] for i in self.api.ListInstances(
+            'labels.jmeter_cluster eq foo')])
+    self.assertEqual(['foo-001'], [
+        d['name'] for d in self.api.ListDisks('name eq ^(foo-001|x)$')])
+    self.assertEqual('RUNNING', self.api.GetInstance('foo-001')['status'])
+
+    self.api.DeleteInstance('foo-001')
+    self.assertIsNone(self.api.GetInstance('foo-001'))
+    self.assertIsNotNone(self.api.GetDisk('foo-001'))
+
+    # AddInstance() is not recorded.
+    self.assertEqual(
+        ['CreateInstanceWithNewBootDisk', 'ListInstances', 'ListDisks',
+         'GetInstance', 'DeleteInstance', 'GetInstance', 'GetDisk'],
+        [name for _, name, _ in self.recorder.steps])
+    self.assertEqual(10, self.recorder.CountApiRequests())
+
+  def testManagedGroup(self):
+    self.api.CreateInstanceTemplate('foo-template', 'n1-standard-2', 'image',
+                                    metadata={'id': 0},
+                                    labels={'jmeter_cluster': 'foo'})
+    self.api.CreateInstanceGroupManager('foo', 'foo-template', 'foo')
+    self.api.ResizeInstanceGroupManager('foo', 3)
+
+    names = self.api.ListManagedInstances('foo')
+    self.assertEqual(['foo-0000', 'foo-0001', 'foo-0002'], names)
+    self.assertEqual(3, len(self.api.ListInstances(
+        'labels.jmeter_cluster eq foo')))
+
+    self.api.DeleteManagedInstances('foo', ['foo-0001'])
+    self.assertEqual(['foo-0000', 'foo-0002'],
+                     self.api.ListManagedInstances('foo'))
+
+    self.api.DeleteInstanceGroupManager('foo')
+    self.assertIsNone(self.api.GetInstanceGroupManager('foo'))
+    self.assertEqual([], self.api.ListInstances())
+
+
+class InterceptTest(unittest.TestCase):
+  """Unit test class of Intercept."""
+
+  def testIntercept(self):
+    original_call = subprocess.call
+    original_sleep = time.sleep
+    recorder = jmeter_dry_run.Recorder()
+    functions = [(jmeter_dry_run, '_FormatArg', 'x')]
+
+    with jmeter_dry_run.Intercept(recorder, functions):
+      self.assertEqual(0, subprocess.call('rm -rf /nonexistent', shell=True))
+      self.assertEqual(0, subprocess.call(['ssh', 'host']))
+      time.sleep(3600)
+      self.assertEqual('x', jmeter_dry_run._FormatArg(1))
+
+    self.assertIs(original_call, subprocess.call)
+    self.assertIs(original_sleep, time.sleep)
+    self.assertEqual('1', jmeter_dry_run._FormatArg(1))
+    self.assertEqual(3600, recorder.GetSleepSeconds())
+    self.assertEqual(
+        '   1  $ rm -rf /nonexistent\n'
+        '   2  $ ssh host\n'
+        '   3  time.sleep(3600)\n'
+        '   4  jmeter_dry_run._FormatArg(1)',
+        recorder.Format())
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to estimate wall time and cost of cluster operations.
+
+Each 'start', 'resize' and 'shutdown' appends the time spent in each phase
+to a timings history file.  Time of a phase is modeled as fixed seconds plus
+seconds per instance, fitted to the history of the phase, and the estimate
+of an operation is the sum over the phases it goes through.
+"""
+
+
+
+import json
+import os.path
+import time
+
+import jmeter_jvm
+
+
+# Hourly on-demand price of machine types in USD, in US regions.
+PRICES_PER_HOUR = {
+    'f1-micro': 0.013,
+    'g1-small': 0.035,
+    'n1-standard-1': 0.070,
+    'n1-standard-2': 0.140,
+    'n1-standard-4': 0.280,
+    'n1-standard-8': 0.560,
+    'n1-standard-16': 1.120,
+    'n1-highmem-2': 0.164,
+    'n1-highmem-4': 0.328,
+    'n1-highmem-8': 0.656,
+    'n1-highmem-16': 1.312,
+    'n1-highcpu-2': 0.088,
+    'n1-highcpu-4': 0.176,
+    'n1-highcpu-8': 0.352,
+    'n1-highcpu-16': 0.704,
+}
+# Prices of custom machine types per vCPU and per GB of memory.
+CUSTOM_VCPU_PRICE_PER_HOUR = 0.033174
+CUSTOM_MEMORY_GB_PRICE_PER_HOUR = 0.004446
+
+# Phase time models used when the phase has no history:
+# phase -> (fixed seconds, seconds per instance).
+DEFAULT_PHASE_MODELS = {
+    'claiming pool instances': (2.0, 0.5),
+    'creating instances': (5.0, 4.0),
+    'resizing managed instance group': (10.0, 0.2),
+    'waiting for instances RUNNING': (30.0, 0.5),
+    'waiting for SSH': (60.0, 1.0),
+    'restarting servers on pool instances': (0.0, 1.5),
+    'restarting servers on managed instances': (0.0, 1.5),
+    'setting up port forwarding': (0.0, 1.5),
+    'measuring clock offsets': (3.0, 0.05),
+    'replenishing warm pool': (0.0, 0.0),
+    'deleting managed instance group': (30.0, 0.2),
+    'deleting instances': (10.0, 0.5),
+    'deleting disks': (5.0, 0.3),
+}
+
+
+def GetPricePerHour(machine_type):
+  """Returns hourly price of the machine type in USD.
+
+  Raises:
+    ValueError: The machine type is unknown.
+  """
+  name = machine_type.rstrip('/').rsplit('/', 1)[-1]
+  if name in PRICES_PER_HOUR:
+    return PRICES_PER_HOUR[name]
+  vcpus, memory_mb = jmeter_jvm.GetMachineSpec(name)
+  return (vcpus * CUSTOM_VCPU_PRICE_PER_HOUR +
+          memory_mb / 1024.0 * CUSTOM_MEMORY_GB_PRICE_PER_HOUR)
+
+
+def RecordTimings(path, operation, size, machine_type, phase_seconds):
+  """Appends phase timings of finished operation to the history file.
+
+  Args:
+    path: Path to the history file, with a JSON record per line.
+    operation: Operation name, e.g. 'start'.
+    size: Number of instances the operation handled.
+    machine_type: Machine type of the instances.
+    phase_seconds: Dictionary of phase name to seconds spent in the phase.
+  """
+  record = {'operation': operation, 'size': size,
+            'machine_type': machine_type, 'time': time.time(),
+            'phases': phase_seconds}
+  with open(path, 'a') as f:
+    f.write(json.dumps(record, sort_keys=True) + '\n')
+
+
+def LoadTimings(path):
+  """Loads records of the history file.  Empty if the file doesn't exist."""
+  if not os.path.exists(path):
+    return []
+  with open(path) as f:
+    return [json.loads(line) for line in f if line.strip()]
+
+
+def FitPhase(points, default_model=None):
+  """Fits time model of a phase to history.
+
+  With two or more distinct sizes, the model is fitted by least squares.
+  With one size, the default per-instance seconds is kept and the fixed
+  seconds is adjusted to the history.
+
+  Args:
+    points: List of (size, seconds) in history.
+    default_model: Tuple of (fixed seconds, seconds per instance), used
+        without history.
+  Returns:
+    Tuple of (fixed seconds, seconds per instance), or default_model if
+    there are no points.
+  """
+  if not points:
+    return default_model
+  count = float(len(points))
+  mean_size = sum(s for s, _ in points) / count
+  mean_seconds = sum(t for _, t in points) / count
+  variance = sum((s - mean_size) ** 2 for s, _ in points)
+  if variance:
+    per_instance = max(0.0, sum((s - mean_size) * (t - mean_seconds)
+                                for s, t in points) / variance)
+  else:
+    per_instance = (default_model or (0.0, 0.0))[1]
+  return max(0.0, mean_seconds - per_instance * mean_size), per_instance
+
+
+def EstimateOperation(history, operation, phases, size, machine_type,
+                      api_requests, cluster_size=None):
+  """Estimates wall time and cost of cluster operation.
+
+  Args:
+    history: List of records loaded by LoadTimings().
+    operation: Operation name, e.g. 'start'.
+    phases: List of phase names the operation goes through, in order, as
+        recorded by dry run.
+    size: Number of instances the operation handles.
+    machine_type: Machine type of the instances.
+    api_requests: Number of API requests of the operation.
+    cluster_size: Number of instances of the cluster after the operation,
+        for hourly cost.  Defaults to size.
+  Returns:
+    Dictionary with 'phases' (list of (phase, seconds, basis) where basis
+    is 'history', 'default' or 'unknown'), 'seconds', 'api_requests' and
+    'cost_per_hour' of the cluster.
+  """
+  estimates = []
+  for phase in phases:
+    points = [(r['size'], r['phases'][phase]) for r in history
+              if r['operation'] == operation and phase in r['phases']]
+    model = FitPhase(points, DEFAULT_PHASE_MODELS.get(phase))
+    if model:
+      basis = 'history' if points else 'default'
+      estimates.append((phase, model[0] + model[1] * size, basis))
+    else:
+      estimates.append((phase, 0.0, 'unknown'))
+  try:
+    if cluster_size is None:
+      cluster_size = size
+    cost_per_hour = cluster_size * GetPricePerHour(machine_type)
+  except ValueError:
+    cost_per_hour = None
+  return {
+      'phases': estimates,
+      'seconds': sum(seconds for _, seconds, _ in estimates),
+      'api_requests': api_requests,
+      'cost_per_hour': cost_per_hour,
+  }
+
+
+def FormatEstimate(estimate):
+  """Returns human readable estimate in string."""
+  lines = []
+  for phase, seconds, basis in estimate['phases']:
+    lines.append('  %-45s %8.0fs  (%s)' % (phase, seconds, basis))
+  lines.append('  %-45s %8.0fs' % ('total', estimate['seconds']))
+  lines.append('  API requests: %d' % estimate['api_requests'])
+  if estimate['cost_per_hour'] is None:
+    lines.append('  Cluster cost: unknown machine type')
+  else:
+    lines.append('  Cluster cost: $%.2f per hour' % estimate['cost_per_hour'])
+  return '\n'.join(lines)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of jmeter_estimate.py."""
+
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import jmeter_estimate
+
+
+class JMeterEstimateTest(unittest.TestCase):
+  """Unit test class of time and cost estimation."""
+
+  def testGetPricePerHour(self):
+    self.assertEqual(0.14, jmeter_estimate.GetPricePerHour('n1-standard-2'))
+    self.assertAlmostEqual(
+        2 * 0.033174 + 4 * 0.004446,
+        jmeter_estimate.GetPricePerHour('zones/z/machineTypes/custom-2-4096'))
+    self.assertRaises(ValueError, jmeter_estimate.GetPricePerHour, 'x1-huge')
+
+  def testFitPhase(self):
+    # seconds = 10 + 2 * size
+    fixed, per_instance = jmeter_estimate.FitPhase(
+        [(5, 20.0), (10, 30.0), (20, 50.0)])
+    self.assertAlmostEqual(10.0, fixed)
+    self.assertAlmostEqual(2.0, per_instance)
+    # One size keeps the default slope.
+    self.assertEqual((20.0, 1.0), jmeter_estimate.FitPhase(
+        [(10, 28.0), (10, 32.0)], (0.0, 1.0)))
+    self.assertEqual((1.0, 2.0), jmeter_estimate.FitPhase([], (1.0, 2.0)))
+    self.assertIsNone(jmeter_estimate.FitPhase([]))
+
+  def testEstimateOperation(self):
+    history = [
+        {'operation': 'start', 'size': 10,
+         'phases': {'creating instances': 30.0}},
+        {'operation': 'start', 'size': 20,
+         'phases': {'creating instances': 50.0}},
+        {'operation': 'shutdown', 'size': 100,
+         'phases': {'creating instances': 1000.0}},
+    ]
+    estimate = jmeter_estimate.EstimateOperation(
+        history, 'start',
+        ['creating instances', 'waiting for SSH', 'new phase'],
+        500, 'n1-standard-1', 1500)
+
+    self.assertEqual(
+        [('creating instances', 1010.0, 'history'),
+         ('waiting for SSH', 560.0, 'default'),
+         ('new phase', 0.0, 'unknown')],
+        estimate['phases'])
+    self.assertEqual(1570.0, estimate['seconds'])
+    self.assertEqual(1500, estimate['api_requests'])
+    self.assertAlmostEqual(35.0, estimate['cost_per_hour'])
+    self.assertIn('Cluster cost: $35.00 per hour',
+                  jmeter_estimate.FormatEstimate(estimate))
+
+  def testEstimateOperation_UnknownMachineType(self):
+    estimate = jmeter_estimate.EstimateOperation(
+        [], 'shutdown', [], 3, 'x1-huge', 10, cluster_size=0)
+    self.assertIsNone(estimate['cost_per_hour'])
+
+  def testRecordAndLoadTimings(self):
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      path = os.path.join(tmp_dir, 'timings')
+      self.assertEqual([], jmeter_estimate.LoadTimings(path))
+      jmeter_estimate.RecordTimings(path, 'start', 3, 'n1-standard-2',
+                                    {'creating instances': 12.5})
+      jmeter_estimate.RecordTimings(path, 'shutdown', 3, 'n1-standard-2',
+                                    {'deleting instances': 20.0})
+
+      history = jmeter_estimate.LoadTimings(path)
+      self.assertEqual(['start', 'shutdown'],
+                       [r['operation'] for r in history])
+      self.assertEqual({'creating instances': 12.5}, history[0]['phases'])
+      self.assertEqual(3, history[0]['size'])
+    finally:
+      shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to generate JVM options of JMeter server per machine type.
+
+The options are passed to startup.sh through 'jvm_args' instance metadata,
+so that JMeter server uses the resources of the machine type without
+running into long GC pauses.
+"""
+
+
+
+import re
+
+
+# Known machine types: name -> (number of vCPUs, memory in MB).
+MACHINE_TYPES = {
+    'f1-micro': (1, 614),
+    'g1-small': (1, 1740),
+    'n1-standard-1': (1, 3840),
+    'n1-standard-2': (2, 7680),
+    'n1-standard-4': (4, 15360),
+    'n1-standard-8': (8, 30720),
+    'n1-standard-16': (16, 61440),
+    'n1-highmem-2': (2, 13312),
+    'n1-highmem-4': (4, 26624),
+    'n1-highmem-8': (8, 53248),
+    'n1-highmem-16': (16, 106496),
+    'n1-highcpu-2': (2, 1843),
+    'n1-highcpu-4': (4, 3686),
+    'n1-highcpu-8': (8, 7373),
+    'n1-highcpu-16': (16, 14746),
+}
+
+# Memory left for OS and telemetry sampler, in MB.
+NODE_RESERVED_MEMORY_MB = 256
+# Memory left for non-heap memory of each JVM, such as thread stacks and
+# class metadata, in MB.
+JVM_RESERVED_MEMORY_MB = 128
+# Minimum memory left for the node with single JMeter server.
+MIN_RESERVED_MEMORY_MB = NODE_RESERVED_MEMORY_MB + JVM_RESERVED_MEMORY_MB
+RESERVED_MEMORY_RATIO = 0.25
+MIN_HEAP_MB = 256
+# Heap size above which the concurrent collector is used to keep pause short.
+CONCURRENT_GC_MIN_HEAP_MB = 4096
+
+METADATA_KEY = 'jvm_args'
+
+
+def GetMachineSpec(machine_type):
+  """Gets number of vCPUs and memory size of the machine type.
+
+  Args:
+    machine_type: Machine type name or URL, e.g. 'n1-standard-2' or
+        '.../zones/us-central1-a/machineTypes/n1-standard-2'.
+  Returns:
+    Tuple of (number of vCPUs, memory in MB).
+  Raises:
+    ValueError: The machine type is unknown.
+  """
+  name = machine_type.rstrip('/').rsplit('/', 1)[-1]
+  if name in MACHINE_TYPES:
+    return MACHINE_TYPES[name]
+  # Custom machine type, e.g. 'custom-4-8192'.
+  match = re.match(r'^custom-(\d+)-(\d+)$', name)
+  if match:
+    return int(match.group(1)), int(match.group(2))
+  raise ValueError('Unknown machine type: %s' % machine_type)
+
+
+def _GetHeapPerServer(memory_mb, servers_per_node):
+  """Returns heap size of each JVM that fits in memory with reserves."""
+  reserved = max(
+      NODE_RESERVED_MEMORY_MB + JVM_RESERVED_MEMORY_MB * servers_per_node,
+      int(memory_mb * RESERVED_MEMORY_RATIO))
+  return (memory_mb - reserved) / servers_per_node
+
+
+def GetMaxServersPerNode(memory_mb):
+  """Returns number of JMeter servers with MIN_HEAP_MB that fit in memory.
+
+  0 if even single server doesn't fit.
+  """
+  servers = 0
+  while _GetHeapPerServer(memory_mb, servers + 1) >= MIN_HEAP_MB:
+    servers += 1
+  return servers
+
+
+def MakeJvmProfile(vcpus, memory_mb, servers_per_node=1):
+  """Computes JVM settings for JMeter server from machine resources.
+
+  Memory of the machine is shared by the heaps of all servers, after
+  reserving memory for the OS and non-heap memory of each JVM.
+
+  Args:
+    vcpus: Number of vCPUs.
+    memory_mb: Memory size in MB.
+    servers_per_node: Number of JMeter servers sharing the machine.
+  Returns:
+    Dictionary with 'heap_mb', 'young_mb', 'gc' (collector name of
+    'serial', 'parallel' or 'concurrent'), 'gc_threads' and
+    'thread_stack_kb'.
+  Raises:
+    ValueError: Heap of MIN_HEAP_MB of each server doesn't fit in memory.
+  """
+  heap_mb = _GetHeapPerServer(memory_mb, servers_per_node)
+  if heap_mb < MIN_HEAP_MB:
+    raise ValueError(
+        '%d JMeter server(s) with %dMB heap each don\'t fit in %dMB memory. '
+        'At most %d fit.' % (servers_per_node, MIN_HEAP_MB, memory_mb,
+                             GetMaxServersPerNode(memory_mb)))
+  gc_threads = max(1, vcpus / servers_per_node)
+
+  if gc_threads < 2:
+    gc = 'serial'
+  elif heap_mb < CONCURRENT_GC_MIN_HEAP_MB:
+    gc = 'parallel'
+  else:
+    gc = 'concurrent'
+
+  # JMeter creates short-lived objects per sample, so the young generation
+  # is made larger than JVM default.
+  young_mb = heap_mb / 3
+
+  # Thousands of JMeter threads may run on a machine with little memory
+  # per vCPU, where native stack memory runs out before heap does.
+  if memory_mb / vcpus < 2048:
+    thread_stack_kb = 256
+  else:
+    thread_stack_kb = 512
+
+  return {
+      'heap_mb': heap_mb,
+      'young_mb': young_mb,
+      'gc': gc,
+      'gc_threads': gc_threads,
+      'thread_stack_kb': thread_stack_kb,
+  }
+
+
+def MakeJvmArgs(profile):
+  """Converts JVM profile to JVM command line options.
+
+  Args:
+    profile: Dictionary returned by MakeJvmProfile().
+  Returns:
+    JVM options in string.
+  """
+  args = [
+      '-Xms%dm' % profile['heap_mb'],
+      '-Xmx%dm' % profile['heap_mb'],
+      '-Xmn%dm' % profile['young_mb'],
+      '-Xss%dk' % profile['thread_stack_kb'],
+  ]
+  if profile['gc'] == 'serial':
+    args.append('-XX:+UseSerialGC')
+  elif profile['gc'] == 'parallel':
+    args.extend(['-XX:+UseParallelGC',
+                 '-XX:ParallelGCThreads=%d' % profile['gc_threads']])
+  else:
+    args.extend(['-XX:+UseConcMarkSweepGC', '-XX:+UseParNewGC',
+                 '-XX:ParallelGCThreads=%d' % profile['gc_threads'],
+                 '-XX:CMSInitiatingOccupancyFraction=75',
+                 '-XX:+UseCMSInitiatingOccupancyOnly'])
+  return ' '.join(args)
+
+
+def GetJvmArgs(machine_type, servers_per_node=1):
+  """Returns JVM options of JMeter server for the machine type.
+
+  Raises:
+    ValueError: The machine type is unknown, or the servers don't fit in
+        its memory.
+  """
+  vcpus, memory_mb = GetMachineSpec(machine_type)
+  return MakeJvmArgs(MakeJvmProfile(vcpus, memory_mb, servers_per_node))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of jmeter_jvm.py."""
+
+
+
+import unittest
+
+import jmeter_jvm
+
+
+class JMeterJvmTest(unittest.TestCase):
+  """Unit test class of JVM profile generation."""
+
+  def testGetMachineSpec(self):
+    self.assertEqual((2, 7680), jmeter_jvm.GetMachineSpec('n1-standard-2'))
+    self.assertEqual((4, 3686), jmeter_jvm.GetMachineSpec(
+        'https://www.googleapis.com/compute/v1/projects/p/zones/z/'
+        'machineTypes/n1-highcpu-4'))
+    self.assertEqual((6, 12288), jmeter_jvm.GetMachineSpec('custom-6-12288'))
+    self.assertRaises(ValueError, jmeter_jvm.GetMachineSpec, 'x1-huge')
+
+  def testMakeJvmProfile_KnownMachineTypes(self):
+    for machine_type, (vcpus, memory_mb) in jmeter_jvm.MACHINE_TYPES.items():
+      if memory_mb < 1024:
+        # Too small to run JMeter comfortably at all.
+        self.assertRaises(ValueError, jmeter_jvm.MakeJvmProfile, vcpus,
+                          memory_mb)
+        continue
+      profile = jmeter_jvm.MakeJvmProfile(vcpus, memory_mb)
+      # Heap leaves room for OS and JVM non-heap memory.
+      self.assertLessEqual(profile['heap_mb'],
+                           memory_mb - jmeter_jvm.MIN_RESERVED_MEMORY_MB,
+                           machine_type)
+      self.assertGreaterEqual(profile['heap_mb'], jmeter_jvm.MIN_HEAP_MB)
+      self.assertLess(profile['young_mb'], profile['heap_mb'])
+      self.assertEqual(vcpus, profile['gc_threads'])
+
+  def testMakeJvmProfile_FitsInMemory(self):
+    for machine_type, (vcpus, memory_mb) in jmeter_jvm.MACHINE_TYPES.items():
+      for servers in xrange(1, jmeter_jvm.GetMaxServersPerNode(memory_mb) + 1):
+        profile = jmeter_jvm.MakeJvmProfile(vcpus, memory_mb, servers)
+        # Every JVM has its own reserve of non-heap memory.
+        self.assertLessEqual(
+            (profile['heap_mb'] + jmeter_jvm.JVM_RESERVED_MEMORY_MB) *
+            servers + jmeter_jvm.NODE_RESERVED_MEMORY_MB, memory_mb,
+            machine_type)
+
+  def testMakeJvmProfile_TooManyServers(self):
+    self.assertEqual(3, jmeter_jvm.GetMaxServersPerNode(1740))
+    self.assertRaises(ValueError, jmeter_jvm.MakeJvmProfile, 1, 1740, 8)
+    self.assertRaises(ValueError, jmeter_jvm.MakeJvmProfile, 1, 1740, 4)
+
+  def testMakeJvmProfile_Collector(self):
+    self.assertEqual('serial', jmeter_jvm.MakeJvmProfile(1, 3840)['gc'])
+    self.assertEqual('parallel', jmeter_jvm.MakeJvmProfile(4, 3686)['gc'])
+    self.assertEqual('concurrent', jmeter_jvm.MakeJvmProfile(4, 15360)['gc'])
+
+  def testMakeJvmProfile_ServersPerNode(self):
+    single = jmeter_jvm.MakeJvmProfile(8, 30720)
+    profile = jmeter_jvm.MakeJvmProfile(8, 30720, servers_per_node=4)
+
+    self.assertEqual(single['heap_mb'] / 4, profile['heap_mb'])
+    self.assertEqual(2, profile['gc_threads'])
+    self.assertEqual('concurrent', profile['gc'])
+    self.assertEqual('serial',
+                     jmeter_jvm.MakeJvmProfile(2, 7680, 2)['gc'])
+
+  def testMakeJvmProfile_ThreadStack(self):
+    self.assertEqual(256,
+                     jmeter_jvm.MakeJvmProfile(8, 7373)['thread_stack_kb'])
+    self.assertEqual(512,
+                     jmeter_jvm.MakeJvmProfile(8, 30720)['thread_stack_kb'])
+
+  def testGetJvmArgs(self):
+    self.assertEqual(
+        '-Xms2765m -Xmx2765m -Xmn921m -Xss256k '
+        '-XX:+UseParallelGC -XX:ParallelGCThreads=4',
+        jmeter_jvm.GetJvmArgs('n1-highcpu-4'))
+    self.assertRaises(ValueError, jmeter_jvm.GetJvmArgs, 'f1-micro')
+    self.assertIn('-XX:+UseConcMarkSweepGC',
+                  jmeter_jvm.GetJvmArgs('n1-standard-2'))
+
+
+if __name__ == '__main__':
+  unittest.main()
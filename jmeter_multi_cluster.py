@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to operate multiple JMeter server clusters concurrently.
+
+Clusters are declared in a cluster spec file in JSON format.
+
+  {
+    "clusters": [
+      {"prefix": "web-jmeter", "size": 5, "zone": "us-central1-a"},
+      {"prefix": "api-jmeter", "size": 3, "zone": "europe-west1-b",
+       "machinetype": "n1-standard-4", "image": "..."}
+    ]
+  }
+
+Each cluster gets distinct server ID range and client RMI port, so that
+port forwarding of all clusters can coexist on the same client machine.
+"""
+
+
+
+import argparse
+import json
+import logging
+import threading
+import time
+
+
+# Keys allowed in each cluster entry of the spec, and their default values.
+CLUSTER_SPEC_KEYS = {
+    'prefix': None,
+    'size': 3,
+    'project': None,
+    'zone': None,
+    'machinetype': None,
+    'image': None,
+    'jvm_args': None,
+    'servers_per_node': 1,
+    'pool_prefix': None,
+    'provisioning': None,
+    'max_retries': None,
+}
+
+SERVER_PORT_BASE = 24000
+CLIENT_RMI_PORT_BASE = 25000
+# Server ports are allocated in [24000, 25000), so indexes must be below this.
+MAX_TOTAL_SERVERS = 1000
+
+
+class ClusterSpecError(Exception):
+  """Error in cluster spec file."""
+
+
+def ParseClusterSpec(spec):
+  """Parses cluster spec into list of parameters for JMeterCluster.
+
+  Args:
+    spec: Cluster spec in dictionary.
+  Returns:
+    List of argparse.Namespace, one per cluster.  In addition to the keys of
+    CLUSTER_SPEC_KEYS, each has 'index_offset' and 'client_rmi_port'.
+  Raises:
+    ClusterSpecError: The spec is malformed.
+  """
+  clusters = spec.get('clusters')
+  if not clusters:
+    raise ClusterSpecError('Cluster spec has no clusters.')
+
+  params_list = []
+  prefixes = set()
+  index_offset = 0
+  for ordinal, cluster in enumerate(clusters):
+    unknown = set(cluster) - set(CLUSTER_SPEC_KEYS)
+    if unknown:
+      raise ClusterSpecError('Unknown key(s) in cluster spec: %s' %
+                             ', '.join(sorted(unknown)))
+    if not cluster.get('prefix'):
+      raise ClusterSpecError('Cluster #%d has no prefix.' % ordinal)
+    if cluster['prefix'] in prefixes:
+      raise ClusterSpecError('Duplicate prefix: %s' % cluster['prefix'])
+    prefixes.add(cluster['prefix'])
+
+    values = dict(CLUSTER_SPEC_KEYS)
+    values.update(cluster)
+    values['index_offset'] = index_offset
+    values['client_rmi_port'] = CLIENT_RMI_PORT_BASE + ordinal
+    index_offset += values['size'] * values['servers_per_node']
+    params_list.append(argparse.Namespace(**values))
+
+  if index_offset > MAX_TOTAL_SERVERS:
+    raise ClusterSpecError('Too many servers in total: %d (max %d)' %
+                           (index_offset, MAX_TOTAL_SERVERS))
+  return params_list
+
+
+def LoadClusterSpec(spec_file):
+  """Loads cluster spec from JSON file.
+
+  Args:
+    spec_file: Path to cluster spec file.
+  Returns:
+    List of argparse.Namespace as ParseClusterSpec() returns.
+  Raises:
+    ClusterSpecError: The spec is malformed.
+  """
+  with open(spec_file) as f:
+    try:
+      spec = json.load(f)
+    except ValueError as e:
+      raise ClusterSpecError('Invalid JSON in %s: %s' % (spec_file, e))
+  return ParseClusterSpec(spec)
+
+
+def RunConcurrently(clusters, method_name, progress_interval=10):
+  """Calls the method of all clusters concurrently.
+
+  Each cluster runs in its own thread.  Aggregated progress is logged
+  periodically, using 'phase' attribute of the cluster objects.
+
+  Args:
+    clusters: Dictionary of cluster name and cluster object.
+    method_name: Name of the method to call, e.g. 'Start'.
+    progress_interval: Interval of progress report in seconds.
+  Returns:
+    Dictionary of cluster name and boolean to indicate success.
+  """
+  results = {}
+
+  def Run(name, cluster):
+    try:
+      getattr(cluster, method_name)()
+      results[name] = True
+    # JMeterCluster reports most failures by sys.exit().
+    except (Exception, SystemExit):  # pylint: disable=broad-except
+      logging.exception('%s failed on cluster %s', method_name, name)
+      results[name] = False
+
+  threads = []
+  for name, cluster in sorted(clusters.items()):
+    thread = threading.Thread(target=Run, name=name, args=(name, cluster))
+    thread.daemon = True
+    thread.start()
+    threads.append(thread)
+
+  start_time = time.time()
+  while True:
+    for thread in threads:
+      thread.join(progress_interval / float(len(threads)))
+    alive = [t for t in threads if t.is_alive()]
+    logging.info('%s: %d of %d clusters finished (%d seconds)',
+                 method_name, len(threads) - len(alive), len(threads),
+                 time.time() - start_time)
+    for name, cluster in sorted(clusters.items()):
+      status = 'running'
+      if name in results:
+        status = 'done' if results[name] else 'FAILED'
+      logging.info('  %-24s %-8s %s', name, status,
+                   getattr(cluster, 'phase', ''))
+    if not alive:
+      break
+
+  return results
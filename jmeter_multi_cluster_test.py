@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of jmeter_multi_cluster.py."""
+
+
+
+import threading
+import unittest
+
+from mock import MagicMock
+
+import jmeter_multi_cluster
+from jmeter_multi_cluster import ClusterSpecError
+
+
+class ClusterSpecTest(unittest.TestCase):
+  """Unit test class of cluster spec parsing."""
+
+  def testParseClusterSpec(self):
+    params_list = jmeter_multi_cluster.ParseClusterSpec({'clusters': [
+        {'prefix': 'web', 'size': 5, 'zone': 'us-central1-a'},
+        {'prefix': 'api', 'machinetype': 'n1-standard-4'},
+        {'prefix': 'db', 'size': 2},
+    ]})
+
+    self.assertEqual(['web', 'api', 'db'], [p.prefix for p in params_list])
+    self.assertEqual([5, 3, 2], [p.size for p in params_list])
+    self.assertEqual([0, 5, 8], [p.index_offset for p in params_list])
+    self.assertEqual([25000, 25001, 25002],
+                     [p.client_rmi_port for p in params_list])
+    self.assertEqual('us-central1-a', params_list[0].zone)
+    self.assertIsNone(params_list[1].zone)
+    self.assertEqual('n1-standard-4', params_list[1].machinetype)
+
+  def testParseClusterSpec_ServersPerNode(self):
+    params_list = jmeter_multi_cluster.ParseClusterSpec({'clusters': [
+        {'prefix': 'web', 'size': 5, 'servers_per_node': 4},
+        {'prefix': 'api', 'size': 2},
+    ]})
+
+    self.assertEqual([0, 20], [p.index_offset for p in params_list])
+    self.assertEqual([4, 1], [p.servers_per_node for p in params_list])
+    self.assertRaises(ClusterSpecError,
+                      jmeter_multi_cluster.ParseClusterSpec,
+                      {'clusters': [{'prefix': 'a', 'size': 300,
+                                     'servers_per_node': 4}]})
+
+  def testParseClusterSpec_Errors(self):
+    self.assertRaises(ClusterSpecError,
+                      jmeter_multi_cluster.ParseClusterSpec, {})
+    self.assertRaises(ClusterSpecError,
+                      jmeter_multi_cluster.ParseClusterSpec,
+                      {'clusters': [{'size': 3}]})
+    self.assertRaises(ClusterSpecError,
+                      jmeter_multi_cluster.ParseClusterSpec,
+                      {'clusters': [{'prefix': 'a'}, {'prefix': 'a'}]})
+    self.assertRaises(ClusterSpecError,
+                      jmeter_multi_cluster.ParseClusterSpec,
+                      {'clusters': [{'prefix': 'a', 'sise': 3}]})
+    self.assertRaises(ClusterSpecError,
+                      jmeter_multi_cluster.ParseClusterSpec,
+                      {'clusters': [{'prefix': 'a', 'size': 600},
+                                    {'prefix': 'b', 'size': 600}]})
+
+
+class RunConcurrentlyTest(unittest.TestCase):
+  """Unit test class of RunConcurrently()."""
+
+  def testRunConcurrently(self):
+    barrier = threading.Event()
+    threads_seen = set()
+
+    def Start():
+      threads_seen.add(threading.current_thread().name)
+      if len(threads_seen) == 2:
+        barrier.set()
+      # Both clusters must be running at the same time to pass the barrier.
+      self.assertTrue(barrier.wait(5))
+
+    cluster_a = MagicMock(phase='')
+    cluster_a.Start.side_effect = Start
+    cluster_b = MagicMock(phase='')
+    cluster_b.Start.side_effect = Start
+    cluster_c = MagicMock(phase='')
+    cluster_c.Start.side_effect = RuntimeError('failure')
+
+    results = jmeter_multi_cluster.RunConcurrently(
+        {'a': cluster_a, 'b': cluster_b, 'c': cluster_c}, 'Start',
+        progress_interval=0.1)
+
+    self.assertEqual({'a': True, 'b': True, 'c': False}, results)
+    self.assertEqual(set(['a', 'b']), threads_seen)
+
+  def testRunConcurrently_Exit(self):
+    cluster_a = MagicMock(phase='')
+    cluster_b = MagicMock(phase='')
+    cluster_b.Start.side_effect = SystemExit(1)
+
+    results = jmeter_multi_cluster.RunConcurrently(
+        {'a': cluster_a, 'b': cluster_b}, 'Start', progress_interval=0.1)
+
+    self.assertEqual({'a': True, 'b': False}, results)
+
+
+if __name__ == '__main__':
+  unittest.main()
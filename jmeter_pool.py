@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to manage warm pool of pre-bootstrapped JMeter servers.
+
+Pool instances are named '<pool prefix>-NNN', are labeled with the pool
+prefix, and run startup.sh as usual, so that JMeter is installed and JMeter
+server is running while they are idle.  A cluster claims idle pool
+instances by writing its prefix and the cluster index into instance
+metadata.  The update is made with the metadata fingerprint, so that two
+clusters never claim the same instance.
+
+Claimed instances keep their names, and the cluster finds them by the
+metadata.  JMeter servers on claimed instances are restarted to pick up
+server ID and JVM options of the cluster.
+"""
+
+
+
+import logging
+import time
+
+from gce_api import GceApi
+
+
+CLAIMED_BY_KEY = 'cluster'
+CLUSTER_INDEX_KEY = 'cluster_index'
+IDLE_SINCE_KEY = 'pool_idle_since'
+# Label attached to pool instances, whose value is the pool prefix.
+POOL_LABEL = 'jmeter_pool'
+# Fields of instance resources the pool needs.
+INSTANCE_FIELDS = ['name', 'status', 'machineType', 'metadata']
+
+
+def GetMetadata(instance):
+  """Returns metadata of the instance resource in dictionary."""
+  return dict((item['key'], item['value'])
+              for item in instance.get('metadata', {}).get('items', []))
+
+
+def IsIdle(instance):
+  """Returns whether the pool instance is running and not claimed."""
+  return (instance.get('status') == 'RUNNING' and
+          not GetMetadata(instance).get(CLAIMED_BY_KEY))
+
+
+def GetIdleSince(instance):
+  """Returns time when the pool instance became idle, in epoch seconds."""
+  return float(GetMetadata(instance).get(IDLE_SINCE_KEY) or 0)
+
+
+def SelectEvictions(instances, max_size=None, idle_ttl=None, now=None):
+  """Selects idle pool instances to delete.
+
+  Args:
+    instances: List of pool instance resources.
+    max_size: Maximum number of idle instances to keep.  None for no limit.
+    idle_ttl: Seconds after which idle instance is deleted.  None for no
+        limit.
+    now: Current time in epoch seconds.  Defaults to time.time().
+  Returns:
+    List of names of instances to delete.
+  """
+  now = now or time.time()
+  # Most recently idle instances are kept.
+  idle = sorted((i for i in instances if IsIdle(i)),
+                key=GetIdleSince, reverse=True)
+  evictions = []
+  for position, instance in enumerate(idle):
+    if max_size is not None and position >= max_size:
+      evictions.append(instance['name'])
+    elif idle_ttl is not None and now - GetIdleSince(instance) > idle_ttl:
+      evictions.append(instance['name'])
+  return evictions
+
+
+class WarmPool(object):
+  """Warm pool of pre-bootstrapped JMeter servers."""
+
+  def __init__(self, api, pool_prefix):
+    """Constructor.
+
+    Args:
+      api: GceApi object of the zone of the pool.
+      pool_prefix: Name prefix of pool instances.
+    """
+    self._api = api
+    self.pool_prefix = pool_prefix
+
+  def MakeInstanceName(self, index):
+    return '%s-%03d' % (self.pool_prefix, index)
+
+  def ListInstances(self):
+    """Returns list of all instance resources of the pool."""
+    return self._api.ListInstances(
+        GceApi.MakeLabelFilter(POOL_LABEL, self.pool_prefix),
+        fields=INSTANCE_FIELDS)
+
+  def ListIdle(self, machine_type=None):
+    """Lists idle pool instances, longest idle first.
+
+    Args:
+      machine_type: Machine type name to match.  None to list all.
+    Returns:
+      List of instance resources.
+    """
+    idle = [i for i in self.ListInstances() if IsIdle(i) and (
+        not machine_type or
+        i.get('machineType', '').rsplit('/', 1)[-1] == machine_type)]
+    return sorted(idle, key=GetIdleSince)
+
+  def ListClaimed(self, cluster_prefix):
+    """Returns dictionary of cluster index to name of claimed instances."""
+    claimed = {}
+    for instance in self.ListInstances():
+      metadata = GetMetadata(instance)
+      if metadata.get(CLAIMED_BY_KEY) == cluster_prefix:
+        claimed[int(metadata[CLUSTER_INDEX_KEY])] = instance['name']
+    return claimed
+
+  def Claim(self, cluster_prefix, indexes, machine_type, make_metadata):
+    """Claims idle pool instances for cluster.
+
+    Args:
+      cluster_prefix: Name prefix of the cluster claiming instances.
+      indexes: List of cluster indexes to fill with pool instances.
+      machine_type: Machine type name of instances to claim.
+      make_metadata: Function that takes cluster index and returns
+          dictionary of metadata to set for the index, e.g. server ID.
+    Returns:
+      Dictionary of cluster index to name of claimed instance.  Indexes not
+      in the dictionary couldn't be filled.
+    """
+    claimed = {}
+    indexes = list(indexes)
+    for instance in self.ListIdle(machine_type):
+      if not indexes:
+        break
+      index = indexes[0]
+      metadata = GetMetadata(instance)
+      metadata.update(make_metadata(index))
+      metadata[CLAIMED_BY_KEY] = cluster_prefix
+      metadata[CLUSTER_INDEX_KEY] = index
+      if self._api.SetInstanceMetadata(
+          instance['name'], metadata, instance['metadata']['fingerprint']):
+        logging.info('Claimed pool instance %s as index %d',
+                     instance['name'], index)
+        claimed[index] = instance['name']
+        indexes.pop(0)
+    return claimed
+
+  def Replenish(self, target, max_size, machine_type, image,
+                startup_script, make_metadata, labels=None):
+    """Creates pool instances until target number of them are idle.
+
+    Args:
+      target: Number of idle instances to have.
+      max_size: Maximum number of pool instances including claimed ones.
+      machine_type: Machine type of new instances.
+      image: Machine image of new instances.
+      startup_script: Startup script of new instances.
+      make_metadata: Function that returns dictionary of metadata for new
+          instances.
+      labels: Dictionary of labels to attach to new instances, in addition
+          to POOL_LABEL.
+    Returns:
+      List of names of instances created.
+    """
+    labels = dict(labels or {})
+    labels[POOL_LABEL] = GceApi.MakeLabelValue(self.pool_prefix)
+    instances = self.ListInstances()
+    existing = set(i['name'] for i in instances)
+    idle_count = len([i for i in instances if IsIdle(i)])
+    count = max(0, min(target - idle_count, max_size - len(instances)))
+
+    created = []
+    index = 0
+    while len(created) < count:
+      instance_name = self.MakeInstanceName(index)
+      index += 1
+      if instance_name in existing:
+        continue
+      metadata = make_metadata()
+      metadata[IDLE_SINCE_KEY] = int(time.time())
+      logging.info('Adding pool instance: %s', instance_name)
+      if self._api.CreateInstanceWithNewBootDisk(
+          instance_name, machine_type, image,
+          startup_script=startup_script,
+          service_accounts=[
+              'https://www.googleapis.com/auth/devstorage.read_only'],
+          metadata=metadata, labels=labels):
+        created.append(instance_name)
+      else:
+        logging.error('Failed to add pool instance %s', instance_name)
+        break
+    return created
+
+  def SelectEvictions(self, max_size=None, idle_ttl=None):
+    """Selects idle instances to delete by the pool policies."""
+    return SelectEvictions(self.ListInstances(), max_size, idle_ttl)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of jmeter_pool.py."""
+
+
+
+import unittest
+
+import mock
+
+import jmeter_pool
+from jmeter_pool import WarmPool
+
+
+def _MakeInstance(name, status='RUNNING', idle_since=1000, claimed_by=None,
+                  cluster_index=None, machine_type='n1-standard-2'):
+  items = [{'key': 'id', 'value': 0},
+           {'key': 'pool_idle_since', 'value': idle_since}]
+  if claimed_by:
+    items.append({'key': 'cluster', 'value': claimed_by})
+    items.append({'key': 'cluster_index', 'value': cluster_index})
+  return {'name': name, 'status': status,
+          'machineType': 'zones/z/machineTypes/%s' % machine_type,
+          'metadata': {'fingerprint': 'fp-%s' % name, 'items': items}}
+
+
+class SelectEvictionsTest(unittest.TestCase):
+  """Unit test class of eviction policies."""
+
+  def setUp(self):
+    self.instances = [
+        _MakeInstance('pool-000', idle_since=1000),
+        _MakeInstance('pool-001', idle_since=3000),
+        _MakeInstance('pool-002', idle_since=2000),
+        _MakeInstance('pool-003', claimed_by='foo', cluster_index=0),
+        _MakeInstance('pool-004', status='PROVISIONING'),
+    ]
+
+  def testNoPolicy(self):
+    self.assertEqual([], jmeter_pool.SelectEvictions(self.instances,
+                                                     now=4000))
+
+  def testMaxSize(self):
+    # Longest idle instances are evicted first.
+    self.assertEqual(['pool-002', 'pool-000'], jmeter_pool.SelectEvictions(
+        self.instances, max_size=1, now=4000))
+    self.assertEqual(3, len(jmeter_pool.SelectEvictions(
+        self.instances, max_size=0, now=4000)))
+
+  def testIdleTtl(self):
+    self.assertEqual(['pool-000'], jmeter_pool.SelectEvictions(
+        self.instances, idle_ttl=2500, now=4000))
+
+
+class WarmPoolTest(unittest.TestCase):
+  """Unit test class of WarmPool."""
+
+  def setUp(self):
+    self.mock_api = mock.MagicMock()
+    self.warm_pool = WarmPool(self.mock_api, 'pool')
+
+  def testListClaimed(self):
+    self.mock_api.ListInstances.return_value = [
+        _MakeInstance('pool-000'),
+        _MakeInstance('pool-001', claimed_by='foo', cluster_index='2'),
+        _MakeInstance('pool-002', claimed_by='bar', cluster_index='0'),
+    ]
+
+    self.assertEqual({2: 'pool-001'}, self.warm_pool.ListClaimed('foo'))
+    self.mock_api.ListInstances.assert_called_once_with(
+        'labels.jmeter_pool eq pool', fields=jmeter_pool.INSTANCE_FIELDS)
+
+  def testClaim(self):
+    self.mock_api.ListInstances.return_value = [
+        _MakeInstance('pool-000', idle_since=3000),
+        _MakeInstance('pool-001', idle_since=1000),
+        _MakeInstance('pool-002', idle_since=2000),
+        _MakeInstance('pool-003', machine_type='n1-standard-8'),
+    ]
+    # pool-001 is claimed by someone else concurrently.
+    self.mock_api.SetInstanceMetadata.side_effect = [False, True, True]
+
+    claimed = self.warm_pool.Claim('foo', [1, 2, 3], 'n1-standard-2',
+                                   lambda index: {'id': 10 + index})
+
+    self.assertEqual({1: 'pool-002', 2: 'pool-000'}, claimed)
+    name, metadata, fingerprint = (
+        self.mock_api.SetInstanceMetadata.call_args_list[1][0])
+    self.assertEqual('pool-002', name)
+    self.assertEqual('fp-pool-002', fingerprint)
+    self.assertEqual(11, metadata['id'])
+    self.assertEqual('foo', metadata['cluster'])
+    self.assertEqual(1, metadata['cluster_index'])
+    self.assertEqual(2000, metadata['pool_idle_since'])
+
+  def testReplenish(self):
+    self.mock_api.ListInstances.return_value = [
+        _MakeInstance('pool-000'),
+        _MakeInstance('pool-002', claimed_by='foo', cluster_index=0),
+    ]
+    self.mock_api.CreateInstanceWithNewBootDisk.return_value = True
+
+    created = self.warm_pool.Replenish(
+        3, 10, 'n1-standard-2', 'image', 'script', lambda: {'id': 0},
+        labels={'jmeter_owner': 'tester'})
+
+    self.assertEqual(['pool-001', 'pool-003'], created)
+    metadata = (self.mock_api.CreateInstanceWithNewBootDisk
+                .call_args[1]['metadata'])
+    self.assertEqual(0, metadata['id'])
+    self.assertIn('pool_idle_since', metadata)
+    self.assertEqual(
+        {'jmeter_owner': 'tester', 'jmeter_pool': 'pool'},
+        self.mock_api.CreateInstanceWithNewBootDisk.call_args[1]['labels'])
+
+  def testReplenish_MaxSize(self):
+    self.mock_api.ListInstances.return_value = [
+        _MakeInstance('pool-000', claimed_by='foo', cluster_index=0),
+        _MakeInstance('pool-001', claimed_by='foo', cluster_index=1),
+    ]
+    self.mock_api.CreateInstanceWithNewBootDisk.return_value = True
+
+    created = self.warm_pool.Replenish(
+        3, 3, 'n1-standard-2', 'image', 'script', dict)
+
+    self.assertEqual(['pool-002'], created)
+
+
+if __name__ == '__main__':
+  unittest.main()
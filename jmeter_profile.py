@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to profile where time goes in cluster operations.
+
+When profiling is enabled, methods and functions are replaced with wrappers
+that record a span per call: API calls, HTTP requests, token refreshes,
+sleeps and subprocesses.  Nothing is replaced while profiling is disabled,
+so there is no overhead then.
+
+The recorded spans are summarized per call site with latency histograms,
+and written as folded stacks for flame graph tools and as Chrome trace
+events, which chrome://tracing can load.
+"""
+
+
+
+import functools
+import inspect
+import json
+import os
+import subprocess
+import threading
+import time
+
+
+# Upper bounds of latency histogram buckets in milliseconds.
+HISTOGRAM_BUCKETS_MS = [1, 10, 100, 1000, 10000, 100000, float('inf')]
+
+
+class Span(object):
+  """A call recorded by profiler."""
+
+  def __init__(self, name, category, stack, start, thread_id):
+    self.name = name
+    self.category = category
+    # Names of the enclosing spans and this span, outermost first.
+    self.stack = stack
+    self.start = start
+    self.duration = 0.0
+    self.thread_id = thread_id
+    self.bytes = None
+
+
+class Profiler(object):
+  """Records spans of calls, with nesting per thread."""
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self._local = threading.local()
+    self.spans = []
+    self.start = time.time()
+
+  def _GetStack(self):
+    if not hasattr(self._local, 'stack'):
+      self._local.stack = []
+    return self._local.stack
+
+  def Begin(self, name, category):
+    """Starts span of the call.  Must be followed by End()."""
+    stack = self._GetStack()
+    span = Span(name, category, [s.name for s in stack] + [name],
+                time.time(), threading.current_thread().ident)
+    stack.append(span)
+    return span
+
+  def End(self, span, num_bytes=None):
+    """Finishes span of the call."""
+    span.duration = time.time() - span.start
+    span.bytes = num_bytes
+    stack = self._GetStack()
+    if stack and stack[-1] is span:
+      stack.pop()
+    with self._lock:
+      self.spans.append(span)
+
+  def Record(self, name, category, function, *args, **kwargs):
+    """Calls the function in a span."""
+    span = self.Begin(name, category)
+    try:
+      return function(*args, **kwargs)
+    finally:
+      self.End(span)
+
+  def Summarize(self):
+    """Summarizes spans per call name.
+
+    Returns:
+      List of dictionaries with 'name', 'category', 'count', 'total',
+      'mean', 'max' (in seconds), 'bytes' and 'histogram', which is list of
+      counts per HISTOGRAM_BUCKETS_MS.  Sorted by total time, longest first.
+    """
+    stats = {}
+    for span in self.spans:
+      entry = stats.setdefault(span.name, {
+          'name': span.name, 'category': span.category, 'count': 0,
+          'total': 0.0, 'max': 0.0, 'bytes': 0,
+          'histogram': [0] * len(HISTOGRAM_BUCKETS_MS)})
+      entry['count'] += 1
+      entry['total'] += span.duration
+      entry['max'] = max(entry['max'], span.duration)
+      entry['bytes'] += span.bytes or 0
+      milliseconds = span.duration * 1000
+      for bucket, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+        if milliseconds <= bound:
+          entry['histogram'][bucket] += 1
+          break
+    for entry in stats.values():
+      entry['mean'] = entry['total'] / entry['count']
+    return sorted(stats.values(), key=lambda e: e['total'], reverse=True)
+
+  def FoldedStacks(self):
+    """Returns self time per call stack in folded format of flame graphs.
+
+    Each line is 'outer;inner;innermost <microseconds>'.
+    """
+    self_time = {}
+    for span in self.spans:
+      key = ';'.join(span.stack)
+      self_time[key] = self_time.get(key, 0.0) + span.duration
+      if len(span.stack) > 1:
+        parent = ';'.join(span.stack[:-1])
+        self_time[parent] = self_time.get(parent, 0.0) - span.duration
+    return ''.join('%s %d\n' % (stack, max(0, int(seconds * 1e6)))
+                   for stack, seconds in sorted(self_time.items()))
+
+  def ChromeTrace(self):
+    """Returns spans as Chrome trace events in dictionary."""
+    pid = os.getpid()
+    events = []
+    for span in sorted(self.spans, key=lambda s: s.start):
+      event = {
+          'name': span.name, 'cat': span.category, 'ph': 'X',
+          'ts': int((span.start - self.start) * 1e6),
+          'dur': int(span.duration * 1e6),
+          'pid': pid, 'tid': span.thread_id,
+      }
+      if span.bytes is not None:
+        event['args'] = {'bytes': span.bytes}
+      events.append(event)
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+  def FormatSummary(self, limit=20):
+    """Returns human readable summary in string."""
+    lines = ['%-50s %6s %9s %9s %9s %10s  %s' % (
+        'call', 'count', 'total(s)', 'mean(ms)', 'max(ms)', 'bytes',
+        'histogram (<=1ms,10ms,100ms,1s,10s,100s,more)')]
+    for entry in self.Summarize()[:limit]:
+      lines.append('%-50s %6d %9.2f %9.1f %9.1f %10d  %s' % (
+          entry['name'][:50], entry['count'], entry['total'],
+          entry['mean'] * 1000, entry['max'] * 1000, entry['bytes'],
+          ' '.join(str(c) for c in entry['histogram'])))
+    return '\n'.join(lines)
+
+  def Write(self, output_prefix):
+    """Writes folded stacks and Chrome trace files.
+
+    Args:
+      output_prefix: Prefix of the file names.
+    Returns:
+      Tuple of paths of folded stacks file and Chrome trace file.
+    """
+    folded_path = output_prefix + '.folded'
+    with open(folded_path, 'w') as f:
+      f.write(self.FoldedStacks())
+    trace_path = output_prefix + '.trace.json'
+    with open(trace_path, 'w') as f:
+      json.dump(self.ChromeTrace(), f)
+    return folded_path, trace_path
+
+
+class _ProfiledPopen(subprocess.Popen):
+  """Popen that records span from start until the process is reaped."""
+
+  def __init__(self, args, *popen_args, **kwargs):
+    command = args if isinstance(args, basestring) else ' '.join(args)
+    self._span = _profiler.Begin('subprocess: %s' % _Abbreviate(command),
+                                 'subprocess')
+    # The span is not on the stack while the process runs in background.
+    _profiler._GetStack().pop()
+    super(_ProfiledPopen, self).__init__(args, *popen_args, **kwargs)
+
+  def communicate(self, *args, **kwargs):
+    span = self._span
+    output = super(_ProfiledPopen, self).communicate(*args, **kwargs)
+    # communicate() has ended the span by waiting for the process.
+    if span:
+      span.bytes = sum(len(o) for o in output if o)
+    return output
+
+  def _EndSpan(self):
+    if self._span:
+      _profiler.End(self._span)
+      self._span = None
+
+  def wait(self, *args, **kwargs):
+    return_code = super(_ProfiledPopen, self).wait(*args, **kwargs)
+    self._EndSpan()
+    return return_code
+
+  def poll(self, *args, **kwargs):
+    return_code = super(_ProfiledPopen, self).poll(*args, **kwargs)
+    if return_code is not None:
+      self._EndSpan()
+    return return_code
+
+
+def _Abbreviate(command, length=60):
+  """Shortens command line for span name."""
+  command = ' '.join(command.split())
+  return command if len(command) <= length else command[:length - 3] + '...'
+
+
+_profiler = None
+# (owner, attribute name, original value) of replaced attributes.
+_originals = []
+
+
+def IsEnabled():
+  return _profiler is not None
+
+
+def GetProfiler():
+  return _profiler
+
+
+def _Replace(owner, name, value):
+  _originals.append((owner, name, owner.__dict__[name]))
+  setattr(owner, name, value)
+
+
+def _WrapFunction(function, name, category):
+  @functools.wraps(function)
+  def Wrapper(*args, **kwargs):
+    return _profiler.Record(name, category, function, *args, **kwargs)
+  return Wrapper
+
+
+def InstrumentClass(cls, category, include_private=False):
+  """Records calls of methods defined in the class.
+
+  Args:
+    cls: Class to instrument.
+    category: Category of the spans.
+    include_private: Whether to instrument methods starting with '_'.
+  """
+  for name, value in cls.__dict__.items():
+    if name.startswith('__') or (name.startswith('_') and
+                                 not include_private):
+      continue
+    span_name = '%s.%s' % (cls.__name__, name)
+    if isinstance(value, staticmethod):
+      _Replace(cls, name, staticmethod(
+          _WrapFunction(value.__func__, span_name, category)))
+    elif isinstance(value, classmethod):
+      _Replace(cls, name, classmethod(
+          _WrapFunction(value.__func__, span_name, category)))
+    elif inspect.isfunction(value):
+      _Replace(cls, name, _WrapFunction(value, span_name, category))
+
+
+def InstrumentFunction(module, name, category, span_name=None):
+  """Records calls of the module-level function."""
+  _Replace(module, name, _WrapFunction(
+      module.__dict__[name], span_name or '%s.%s' % (module.__name__, name),
+      category))
+
+
+def _RecordHttpRequest(original):
+  @functools.wraps(original)
+  def Request(self, uri, method='GET', *args, **kwargs):
+    span = _profiler.Begin('http %s %s' % (method, uri.split('?')[0]),
+                           'http')
+    response = content = None
+    try:
+      response, content = original(self, uri, method, *args, **kwargs)
+      return response, content
+    finally:
+      _profiler.End(span, len(content) if content is not None else None)
+  return Request
+
+
+def Enable(classes=(), functions=()):
+  """Enables profiling.
+
+  Sleeps, subprocesses and HTTP requests are always recorded, in addition to
+  the given classes and functions.
+
+  Args:
+    classes: List of (class, category, include_private) to record calls of
+        methods of.  See InstrumentClass().
+    functions: List of (module, function name, category).
+  Returns:
+    Profiler object.
+  """
+  global _profiler
+  if _profiler:
+    return _profiler
+  _profiler = Profiler()
+
+  import httplib2  # pylint: disable=g-import-not-at-top
+  _Replace(httplib2.Http, 'request',
+           _RecordHttpRequest(httplib2.Http.__dict__['request']))
+  _Replace(time, 'sleep', _WrapFunction(time.sleep, 'time.sleep', 'sleep'))
+  # subprocess.call() also goes through Popen.
+  _Replace(subprocess, 'Popen', _ProfiledPopen)
+  for cls, category, include_private in classes:
+    InstrumentClass(cls, category, include_private)
+  for module, name, category in functions:
+    InstrumentFunction(module, name, category)
+  return _profiler
+
+
+def Disable():
+  """Disables profiling and restores the original methods and functions.
+
+  Returns:
+    Profiler object that has the recorded spans, or None if profiling was
+    not enabled.
+  """
+  global _profiler
+  profiler = _profiler
+  while _originals:
+    owner, name, value = _originals.pop()
+    setattr(owner, name, value)
+  _profiler = None
+  return profiler
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of jmeter_profile.py."""
+
+
+
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import unittest
+
+import jmeter_profile
+
+
+class Sample(object):
+  """Class to instrument in tests."""
+
+  def Outer(self):
+    return self.Inner() + Sample.Static()
+
+  def Inner(self):
+    return 1
+
+  @staticmethod
+  def Static():
+    return 2
+
+  def _Private(self):
+    return 3
+
+
+class ProfilerTest(unittest.TestCase):
+  """Unit tests of Profiler class."""
+
+  def setUp(self):
+    self.profiler = jmeter_profile.Profiler()
+
+  def _AddSpan(self, stack, duration, num_bytes=None):
+    span = jmeter_profile.Span(stack[-1], 'test', stack,
+                               self.profiler.start + 1, 123)
+    span.duration = duration
+    span.bytes = num_bytes
+    self.profiler.spans.append(span)
+
+  def testBeginEnd_Nesting(self):
+    outer = self.profiler.Begin('outer', 'test')
+    inner = self.profiler.Begin('inner', 'test')
+    self.profiler.End(inner)
+    self.profiler.End(outer)
+
+    self.assertEqual([inner, outer], self.profiler.spans)
+    self.assertEqual(['outer', 'inner'], inner.stack)
+    self.assertEqual(['outer'], outer.stack)
+
+  def testSummarize(self):
+    self._AddSpan(['a'], 0.0005, 10)
+    self._AddSpan(['a'], 0.05, 20)
+    self._AddSpan(['b'], 2.0)
+
+    summary = self.profiler.Summarize()
+
+    self.assertEqual(['b', 'a'], [e['name'] for e in summary])
+    a = summary[1]
+    self.assertEqual(2, a['count'])
+    self.assertAlmostEqual(0.0505, a['total'])
+    self.assertAlmostEqual(0.02525, a['mean'])
+    self.assertAlmostEqual(0.05, a['max'])
+    self.assertEqual(30, a['bytes'])
+    self.assertEqual([1, 0, 1, 0, 0, 0, 0], a['histogram'])
+    self.assertEqual([0, 0, 0, 0, 1, 0, 0], summary[0]['histogram'])
+
+  def testFoldedStacks(self):
+    self._AddSpan(['a', 'b'], 0.25)
+    self._AddSpan(['a', 'c'], 0.5)
+    self._AddSpan(['a'], 1.0)
+
+    self.assertEqual('a 250000\na;b 250000\na;c 500000\n',
+                     self.profiler.FoldedStacks())
+
+  def testChromeTrace(self):
+    self._AddSpan(['a'], 0.5, 100)
+
+    trace = self.profiler.ChromeTrace()
+
+    self.assertEqual([{
+        'name': 'a', 'cat': 'test', 'ph': 'X', 'ts': 1000000,
+        'dur': 500000, 'pid': os.getpid(), 'tid': 123,
+        'args': {'bytes': 100}}], trace['traceEvents'])
+
+  def testWrite(self):
+    self._AddSpan(['a'], 0.5)
+    tmp_dir = tempfile.mkdtemp()
+    try:
+      folded_path, trace_path = self.profiler.Write(
+          os.path.join(tmp_dir, 'profile'))
+
+      self.assertEqual('a 500000\n', open(folded_path).read())
+      self.assertEqual(1, len(json.load(open(trace_path))['traceEvents']))
+    finally:
+      shutil.rmtree(tmp_dir)
+
+
+class EnableTest(unittest.TestCase):
+  """Unit tests of instrumentation."""
+
+  def tearDown(self):
+    jmeter_profile.Disable()
+
+  def testEnableDisable_RestoresOriginals(self):
+    originals = (time.sleep, subprocess.Popen, Sample.__dict__['Outer'],
+                 Sample.__dict__['Static'], Sample.__dict__['_Private'])
+
+    jmeter_profile.Enable(classes=[(Sample, 'sample', False)])
+
+    self.assertTrue(jmeter_profile.IsEnabled())
+    self.assertNotEqual(originals[0], time.sleep)
+    self.assertNotEqual(originals[1], subprocess.Popen)
+    self.assertNotEqual(originals[2], Sample.__dict__['Outer'])
+    self.assertNotEqual(originals[3], Sample.__dict__['Static'])
+    self.assertEqual(originals[4], Sample.__dict__['_Private'])
+
+    profiler = jmeter_profile.Disable()
+
+    self.assertFalse(jmeter_profile.IsEnabled())
+    self.assertTrue(profiler)
+    self.assertEqual(originals, (
+        time.sleep, subprocess.Popen, Sample.__dict__['Outer'],
+        Sample.__dict__['Static'], Sample.__dict__['_Private']))
+
+  def testInstrumentClass(self):
+    jmeter_profile.Enable(classes=[(Sample, 'sample', True)])
+
+    self.assertEqual(3, Sample().Outer())
+    self.assertEqual(3, Sample()._Private())  # pylint: disable=protected-access
+
+    profiler = jmeter_profile.Disable()
+    self.assertEqual(
+        [['Sample.Outer', 'Sample.Inner'], ['Sample.Outer', 'Sample.Static'],
+         ['Sample.Outer'], ['Sample._Private']],
+        [span.stack for span in profiler.spans])
+    self.assertEqual('sample', profiler.spans[0].category)
+
+  def testSleepAndSubprocess(self):
+    jmeter_profile.Enable()
+
+    time.sleep(0.01)
+    process = subprocess.Popen(['echo', 'hello'], stdout=subprocess.PIPE)
+    process.communicate()
+    subprocess.call(['true'])
+
+    profiler = jmeter_profile.Disable()
+    spans = dict((span.name, span) for span in profiler.spans)
+    self.assertEqual(['subprocess: echo hello', 'subprocess: true',
+                      'time.sleep'], sorted(spans))
+    self.assertGreaterEqual(spans['time.sleep'].duration, 0.01)
+    self.assertEqual(6, spans['subprocess: echo hello'].bytes)
+    self.assertEqual('subprocess', spans['subprocess: true'].category)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to read and write Java properties files such as jmeter.properties.
+
+The file is parsed once into ordered entries that keep comments and
+formatting, so that many keys can be updated and written back in a single
+atomic write.
+"""
+
+
+
+import os
+import os.path
+import re
+import tempfile
+
+
+# Separator between key and value: first unescaped '=', ':' or white space.
+_KEY_PATTERN = re.compile(r'^\s*((?:\\.|[^=:\s\\])*)\s*[=:]?\s*')
+# Escape sequences as java.util.Properties.load() reads them.
+_ESCAPE_PATTERN = re.compile(r'\\(u[0-9a-fA-F]{4}|.)', re.DOTALL)
+_CONTROL_ESCAPES = {'t': '\t', 'n': '\n', 'r': '\r', 'f': '\f'}
+_CONTROL_CHARS = dict((char, letter)
+                      for letter, char in _CONTROL_ESCAPES.items())
+
+
+def _Escape(text, is_key):
+  """Escapes key or value as java.util.Properties.store() does.
+
+  Args:
+    text: Key or value in string.
+    is_key: Whether the text is key, in which all spaces are escaped.
+        Only leading space is escaped in value.
+  Returns:
+    Escaped string.
+  """
+  escaped = []
+  for position, char in enumerate(text):
+    if char == ' ':
+      escaped.append('\\ ' if is_key or position == 0 else ' ')
+    elif char in '\\=:#!':
+      escaped.append('\\' + char)
+    elif char in _CONTROL_CHARS:
+      escaped.append('\\' + _CONTROL_CHARS[char])
+    elif ord(char) < 0x20 or (isinstance(text, unicode) and
+                              ord(char) > 0x7e):
+      escaped.append('\\u%04x' % ord(char))
+    else:
+      escaped.append(char)
+  return ''.join(escaped)
+
+
+def _Unescape(text):
+  """Resolves escape sequences of key or value read from the file."""
+  def Replace(match):
+    sequence = match.group(1)
+    if len(sequence) == 5:
+      return unichr(int(sequence[1:], 16))
+    return _CONTROL_ESCAPES.get(sequence, sequence)
+  return _ESCAPE_PATTERN.sub(Replace, text)
+
+
+def _IsContinued(line):
+  """Checks if the logical line continues to the next physical line."""
+  stripped = line.rstrip('\r\n')
+  trailing = len(stripped) - len(stripped.rstrip('\\'))
+  return trailing % 2 == 1
+
+
+class PropertiesFile(object):
+  """Ordered, comment-preserving representation of Java properties file."""
+
+  # Cache of parsed files keyed by path.  Value is tuple of
+  # ((modification time, size), entries).
+  _cache = {}
+
+  def __init__(self, entries=None):
+    """Constructor.
+
+    Args:
+      entries: List of [key, lines] pairs.  key is None for comments and
+          blank lines.  lines holds the physical lines of the entry.
+    """
+    self._entries = entries or []
+    self._index = {}
+    for position, (key, _) in enumerate(self._entries):
+      if key is not None:
+        self._index[key] = position
+
+  @classmethod
+  def Parse(cls, contents):
+    """Parses contents of properties file.
+
+    Args:
+      contents: Contents of properties file in string.
+    Returns:
+      PropertiesFile object.
+    """
+    entries = []
+    lines = contents.splitlines(True)
+    i = 0
+    while i < len(lines):
+      line = lines[i]
+      stripped = line.lstrip()
+      if not stripped.strip() or stripped[0] in '#!':
+        entries.append([None, [line]])
+        i += 1
+        continue
+      logical = [line]
+      while _IsContinued(logical[-1]) and i + 1 < len(lines):
+        i += 1
+        logical.append(lines[i])
+      key = _Unescape(_KEY_PATTERN.match(line).group(1))
+      entries.append([key, logical])
+      i += 1
+    return cls(entries)
+
+  @classmethod
+  def Load(cls, path):
+    """Loads properties file, reusing the parsed result if not modified.
+
+    Args:
+      path: Path to properties file.
+    Returns:
+      PropertiesFile object.  Modifying the object doesn't affect the cache.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    signature = (stat.st_mtime, stat.st_size)
+    cached = cls._cache.get(path)
+    if not cached or cached[0] != signature:
+      with open(path) as f:
+        cached = (signature, cls.Parse(f.read())._entries)
+      cls._cache[path] = cached
+    return cls([[key, list(lines)] for key, lines in cached[1]])
+
+  def Keys(self):
+    """Returns list of keys in the order of appearance."""
+    return [key for key, _ in self._entries if key is not None]
+
+  def Get(self, key, default=None):
+    """Gets value of the key.
+
+    Args:
+      key: Property key.
+      default: Value to return if the key doesn't exist.
+    Returns:
+      Value of the property in string.
+    """
+    position = self._index.get(key)
+    if position is None:
+      return default
+    lines = self._entries[position][1]
+    first = lines[0].rstrip('\r\n')
+    value = first[_KEY_PATTERN.match(first).end():]
+    for line in lines[1:]:
+      value = value[:-1] + line.strip()
+    return _Unescape(value)
+
+  def Update(self, updates):
+    """Sets values of multiple properties.
+
+    Existing keys are updated in place.  New keys are appended at the end.
+    Keys and values are escaped as java.util.Properties.store() does.
+
+    Args:
+      updates: Dictionary of key and value to set.
+    """
+    for key in sorted(updates):
+      line = '%s=%s\n' % (_Escape(key, True),
+                           _Escape('%s' % (updates[key],), False))
+      position = self._index.get(key)
+      if position is None:
+        self._index[key] = len(self._entries)
+        self._entries.append([key, [line]])
+      else:
+        self._entries[position][1] = [line]
+
+  def ToString(self):
+    """Returns contents of properties file in string."""
+    return ''.join(''.join(lines) for _, lines in self._entries)
+
+  def Save(self, path):
+    """Writes properties file atomically.
+
+    The contents are written to a temporary file in the same directory,
+    which then replaces the destination, so that readers never see partially
+    written file.
+
+    Args:
+      path: Path to properties file to write.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    f = tempfile.NamedTemporaryFile(
+        'w', dir=directory, prefix='.properties-', delete=False)
+    try:
+      f.write(self.ToString())
+      f.flush()
+      os.fsync(f.fileno())
+      f.close()
+      os.rename(f.name, path)
+    except:
+      f.close()
+      os.remove(f.name)
+      raise
+
+
+def WriteOverrideFile(path, properties, comment=None):
+  """Writes properties file that overrides the main configuration.
+
+  JMeter reads the file with '-q' option in addition to jmeter.properties,
+  so that per-run values don't require to modify the shipped configuration.
+
+  Args:
+    path: Path to override file.
+    properties: Dictionary of properties to write.
+    comment: Comment to put at the top of the file.
+  """
+  entries = []
+  if comment:
+    entries.append([None, ['# %s\n' % comment]])
+  override = PropertiesFile(entries)
+  override.Update(properties)
+  override.Save(path)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of jmeter_properties.py."""
+
+
+
+import os
+import os.path
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from jmeter_properties import PropertiesFile
+from jmeter_properties import WriteOverrideFile
+
+
+CONTENTS = """# Remote Hosts - comma delimited
+remote_hosts=127.0.0.1:24000
+#remote_hosts=localhost:1099,localhost:2010
+
+client.rmi.localport = 25000
+search_paths:a.jar;\\
+    b.jar
+mode Statistical
+"""
+
+
+class PropertiesFileTest(unittest.TestCase):
+  """Unit test class of PropertiesFile."""
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.path = os.path.join(self.temp_dir, 'jmeter.properties')
+    with open(self.path, 'w') as f:
+      f.write(CONTENTS)
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+    mock.patch.stopall()
+
+  def testParse(self):
+    properties = PropertiesFile.Parse(CONTENTS)
+
+    self.assertEqual(
+        ['remote_hosts', 'client.rmi.localport', 'search_paths', 'mode'],
+        properties.Keys())
+    self.assertEqual('127.0.0.1:24000', properties.Get('remote_hosts'))
+    self.assertEqual('25000', properties.Get('client.rmi.localport'))
+    self.assertEqual('a.jar;b.jar', properties.Get('search_paths'))
+    self.assertEqual('Statistical', properties.Get('mode'))
+    self.assertEqual('none', properties.Get('no_such_key', 'none'))
+    # Round trip keeps comments and formatting.
+    self.assertEqual(CONTENTS, properties.ToString())
+
+  def testUpdate(self):
+    properties = PropertiesFile.Parse(CONTENTS)
+
+    properties.Update({'remote_hosts': '127.0.0.1:24000,127.0.0.1:24001',
+                       'search_paths': 'c.jar',
+                       'new_key': 'new value'})
+
+    self.assertEqual('127.0.0.1:24000,127.0.0.1:24001',
+                     properties.Get('remote_hosts'))
+    self.assertEqual('c.jar', properties.Get('search_paths'))
+    self.assertEqual('new value', properties.Get('new_key'))
+    contents = properties.ToString()
+    self.assertIn('#remote_hosts=localhost:1099,localhost:2010\n', contents)
+    self.assertNotIn('b.jar', contents)
+    self.assertTrue(contents.endswith('new_key=new value\n'))
+
+  def testUpdate_Escaped(self):
+    updates = {'a b': 'x', 'k=1:2': ' leading space', 'lines': 'a\nb\tc',
+               'path': 'C:\\jmeter #1!', 'unicode': u'caf\xe9'}
+    properties = PropertiesFile()
+
+    properties.Update(updates)
+
+    contents = properties.ToString()
+    self.assertIn('a\\ b=x\n', contents)
+    self.assertIn('k\\=1\\:2=\\ leading space\n', contents)
+    self.assertIn('lines=a\\nb\\tc\n', contents)
+    self.assertIn('unicode=caf\\u00e9\n', contents)
+    # Escaped keys and values are read back as they were.
+    parsed = PropertiesFile.Parse(contents)
+    self.assertEqual(sorted(updates), sorted(parsed.Keys()))
+    for key, value in updates.items():
+      self.assertEqual(value, parsed.Get(key))
+
+  def testLoad_Cached(self):
+    mock_parse = mock.patch.object(
+        PropertiesFile, 'Parse', wraps=PropertiesFile.Parse).start()
+
+    first = PropertiesFile.Load(self.path)
+    first.Update({'mode': 'Batch'})
+    second = PropertiesFile.Load(self.path)
+
+    self.assertEqual(1, mock_parse.call_count)
+    # Modification of loaded object doesn't leak into the cache.
+    self.assertEqual('Statistical', second.Get('mode'))
+
+  def testLoad_Modified(self):
+    PropertiesFile.Load(self.path)
+    with open(self.path, 'a') as f:
+      f.write('extra=1\n')
+
+    self.assertEqual('1', PropertiesFile.Load(self.path).Get('extra'))
+
+  def testSave(self):
+    properties = PropertiesFile.Load(self.path)
+    properties.Update({'mode': 'Batch', 'remote_hosts': 'host:1'})
+
+    properties.Save(self.path)
+
+    loaded = PropertiesFile.Load(self.path)
+    self.assertEqual('Batch', loaded.Get('mode'))
+    self.assertEqual('host:1', loaded.Get('remote_hosts'))
+    # No temporary file is left.
+    self.assertEqual(['jmeter.properties'], os.listdir(self.temp_dir))
+
+  def testWriteOverrideFile(self):
+    path = os.path.join(self.temp_dir, 'override.properties')
+
+    WriteOverrideFile(path, {'remote_hosts': 'a:1,b:2'}, comment='Test')
+
+    with open(path) as f:
+      self.assertEqual('# Test\nremote_hosts=a\\:1,b\\:2\n', f.read())
+    # Original file is not modified.
+    with open(self.path) as f:
+      self.assertEqual(CONTENTS, f.read())
+
+
+if __name__ == '__main__':
+  unittest.main()
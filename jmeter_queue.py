@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to queue JMeter test runs and run them on one cluster.
+
+Jobs are stored in a SQLite database file, so that jobs can be added while
+the runner is working on earlier ones.  The runner executes pending jobs in
+the order they were added, resizing the live cluster between jobs instead
+of tearing it down, and shuts the cluster down once at the end.
+"""
+
+
+
+import json
+import logging
+import os
+import os.path
+import sqlite3
+import time
+
+
+PENDING = 'pending'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+RESULTS_INDEX = 'index.json'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  plan TEXT NOT NULL,
+  size INTEGER NOT NULL,
+  jmeter_args TEXT NOT NULL,
+  status TEXT NOT NULL,
+  submitted REAL NOT NULL,
+  started REAL,
+  finished REAL,
+  return_code INTEGER,
+  results TEXT
+)
+"""
+
+_COLUMNS = ['id', 'plan', 'size', 'jmeter_args', 'status', 'submitted',
+            'started', 'finished', 'return_code', 'results']
+
+
+class JobQueue(object):
+  """Queue of JMeter test runs backed by SQLite database file."""
+
+  def __init__(self, path):
+    """Constructor.
+
+    Args:
+      path: Path to the database file.  Created if it doesn't exist.
+    """
+    # Autocommit, with SQLite locking the file for each statement.
+    self._db = sqlite3.connect(path, timeout=30, isolation_level=None)
+    self._db.execute(_SCHEMA)
+
+  def Close(self):
+    self._db.close()
+
+  @staticmethod
+  def _ToJob(row):
+    job = dict(zip(_COLUMNS, row))
+    job['jmeter_args'] = json.loads(job['jmeter_args'])
+    return job
+
+  def Add(self, plan, size, jmeter_args=()):
+    """Adds job to the end of the queue.
+
+    Args:
+      plan: Path to JMeter test plan.
+      size: Number of JMeter server instances the plan needs.
+      jmeter_args: List of additional parameters passed to JMeter client.
+    Returns:
+      ID of the job.
+    """
+    cursor = self._db.execute(
+        'INSERT INTO jobs (plan, size, jmeter_args, status, submitted) '
+        'VALUES (?, ?, ?, ?, ?)',
+        (plan, size, json.dumps(list(jmeter_args)), PENDING, time.time()))
+    return cursor.lastrowid
+
+  def List(self, status=None):
+    """Lists jobs in the order they were added.
+
+    Args:
+      status: Status of jobs to list.  None to list all.
+    Returns:
+      List of jobs in dictionary.
+    """
+    query = 'SELECT %s FROM jobs' % ', '.join(_COLUMNS)
+    args = ()
+    if status:
+      query += ' WHERE status = ?'
+      args = (status,)
+    return [self._ToJob(row)
+            for row in self._db.execute(query + ' ORDER BY id', args)]
+
+  def Get(self, job_id):
+    rows = self._db.execute('SELECT %s FROM jobs WHERE id = ?' %
+                            ', '.join(_COLUMNS), (job_id,)).fetchall()
+    return self._ToJob(rows[0]) if rows else None
+
+  def ClaimNext(self):
+    """Marks the oldest pending job as running and returns it.
+
+    Returns:
+      Job in dictionary, or None if there is no pending job.
+    """
+    while True:
+      pending = self.List(PENDING)
+      if not pending:
+        return None
+      job = pending[0]
+      # Another runner may have taken the job in the meantime.
+      cursor = self._db.execute(
+          'UPDATE jobs SET status = ?, started = ? '
+          'WHERE id = ? AND status = ?',
+          (RUNNING, time.time(), job['id'], PENDING))
+      if cursor.rowcount == 1:
+        return self.Get(job['id'])
+
+  def Finish(self, job_id, return_code, results):
+    """Records the result of the job.
+
+    Args:
+      job_id: ID of the job.
+      return_code: Exit code of JMeter client.
+      results: Path to the results file.
+    """
+    self._db.execute(
+        'UPDATE jobs SET status = ?, finished = ?, return_code = ?, '
+        'results = ? WHERE id = ?',
+        (FAILED if return_code else SUCCEEDED, time.time(), return_code,
+         results, job_id))
+
+
+def WriteResultsIndex(jobs, results_dir):
+  """Writes index of job results in JSON to the results directory."""
+  path = os.path.join(results_dir, RESULTS_INDEX)
+  with open(path, 'w') as f:
+    json.dump({'jobs': jobs}, f, indent=2, sort_keys=True)
+  return path
+
+
+def RunJobs(job_queue, cluster, run_client, results_dir, shutdown=True):
+  """Runs pending jobs in order on the cluster.
+
+  Args:
+    job_queue: JobQueue object.
+    cluster: Object with Resize(size) and ShutDown() methods, such as
+        JMeterCluster.
+    run_client: Function that takes list of JMeter client parameters and
+        returns exit code.
+    results_dir: Directory to write results and results index to.
+    shutdown: Whether to shut down the cluster after the last job.
+  Returns:
+    List of jobs run, in dictionary.
+  """
+  if not os.path.isdir(results_dir):
+    os.makedirs(results_dir)
+
+  jobs = []
+  try:
+    while True:
+      job = job_queue.ClaimNext()
+      if not job:
+        break
+      logging.info('Job %d: %s on %d server(s)', job['id'], job['plan'],
+                   job['size'])
+      results = os.path.join(results_dir, 'job-%d.jtl' % job['id'])
+      try:
+        cluster.Resize(job['size'])
+        return_code = run_client(
+            ['-n', '-r', '-t', job['plan'], '-l', results,
+             '-j', os.path.join(results_dir, 'job-%d.log' % job['id'])] +
+            job['jmeter_args'])
+      # JMeterCluster reports most failures by sys.exit().
+      except (Exception, SystemExit):  # pylint: disable=broad-except
+        logging.exception('Job %d failed', job['id'])
+        return_code = -1
+      except KeyboardInterrupt:
+        # Running job is never claimed again, so it must not be left so.
+        job_queue.Finish(job['id'], -1, results)
+        raise
+      job_queue.Finish(job['id'], return_code, results)
+      jobs.append(job_queue.Get(job['id']))
+      WriteResultsIndex(jobs, results_dir)
+  finally:
+    if shutdown:
+      logging.info('All jobs done.  Shutting down the cluster.')
+      cluster.ShutDown()
+  return jobs
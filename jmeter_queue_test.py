@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of jmeter_queue.py."""
+
+
+
+import json
+import os.path
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+import jmeter_queue
+from jmeter_queue import JobQueue
+
+
+class JobQueueTest(unittest.TestCase):
+  """Unit test class of JobQueue."""
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.queue_file = os.path.join(self.temp_dir, 'queue.db')
+    self.job_queue = JobQueue(self.queue_file)
+
+  def tearDown(self):
+    self.job_queue.Close()
+    shutil.rmtree(self.temp_dir)
+
+  def testAddAndList(self):
+    first = self.job_queue.Add('a.jmx', 3)
+    second = self.job_queue.Add('b.jmx', 5, ['-Jusers=100'])
+
+    jobs = self.job_queue.List()
+    self.assertEqual([first, second], [j['id'] for j in jobs])
+    self.assertEqual(['-Jusers=100'], jobs[1]['jmeter_args'])
+    self.assertEqual([jmeter_queue.PENDING] * 2, [j['status'] for j in jobs])
+
+  def testClaimNext(self):
+    first = self.job_queue.Add('a.jmx', 3)
+    second = self.job_queue.Add('b.jmx', 5)
+    # Another runner sharing the queue file.
+    other_queue = JobQueue(self.queue_file)
+
+    self.assertEqual(first, self.job_queue.ClaimNext()['id'])
+    job = other_queue.ClaimNext()
+    self.assertEqual(second, job['id'])
+    self.assertEqual(jmeter_queue.RUNNING, job['status'])
+    self.assertIsNone(self.job_queue.ClaimNext())
+    other_queue.Close()
+
+  def testFinish(self):
+    job_id = self.job_queue.Add('a.jmx', 3)
+    self.job_queue.ClaimNext()
+
+    self.job_queue.Finish(job_id, 1, 'job-1.jtl')
+
+    job = self.job_queue.Get(job_id)
+    self.assertEqual(jmeter_queue.FAILED, job['status'])
+    self.assertEqual(1, job['return_code'])
+    self.assertEqual('job-1.jtl', job['results'])
+
+
+class RunJobsTest(unittest.TestCase):
+  """Unit test class of RunJobs()."""
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.results_dir = os.path.join(self.temp_dir, 'results')
+    self.job_queue = JobQueue(os.path.join(self.temp_dir, 'queue.db'))
+    self.mock_cluster = mock.MagicMock()
+
+  def tearDown(self):
+    self.job_queue.Close()
+    shutil.rmtree(self.temp_dir)
+
+  def testRunJobs(self):
+    self.job_queue.Add('a.jmx', 3)
+    self.job_queue.Add('b.jmx', 5, ['-Jusers=100'])
+    self.job_queue.Add('c.jmx', 2)
+    run_client = mock.MagicMock(side_effect=[0, 1, 0])
+
+    jobs = jmeter_queue.RunJobs(self.job_queue, self.mock_cluster,
+                                run_client, self.results_dir)
+
+    self.assertEqual([mock.call(3), mock.call(5), mock.call(2)],
+                     self.mock_cluster.Resize.call_args_list)
+    self.mock_cluster.ShutDown.assert_called_once_with()
+    args = run_client.call_args_list[1][0][0]
+    self.assertEqual(['-n', '-r', '-t', 'b.jmx', '-l',
+                      os.path.join(self.results_dir, 'job-2.jtl')], args[:6])
+    self.assertEqual('-Jusers=100', args[-1])
+    self.assertEqual(['succeeded', 'failed', 'succeeded'],
+                     [j['status'] for j in jobs])
+
+    with open(os.path.join(self.results_dir, 'index.json')) as f:
+      index = json.load(f)
+    self.assertEqual(['a.jmx', 'b.jmx', 'c.jmx'],
+                     [j['plan'] for j in index['jobs']])
+    self.assertEqual(os.path.join(self.results_dir, 'job-3.jtl'),
+                     index['jobs'][2]['results'])
+
+  def testRunJobs_ResizeFailure(self):
+    self.job_queue.Add('a.jmx', 3)
+    self.job_queue.Add('b.jmx', 3)
+    self.mock_cluster.Resize.side_effect = [IOError('quota'), None]
+    run_client = mock.MagicMock(return_value=0)
+
+    jobs = jmeter_queue.RunJobs(self.job_queue, self.mock_cluster,
+                                run_client, self.results_dir, shutdown=False)
+
+    self.assertEqual(['failed', 'succeeded'], [j['status'] for j in jobs])
+    self.assertEqual(1, run_client.call_count)
+    self.assertFalse(self.mock_cluster.ShutDown.called)
+
+  def testRunJobs_ResizeExits(self):
+    self.job_queue.Add('a.jmx', 3)
+    self.job_queue.Add('b.jmx', 3)
+    self.mock_cluster.Resize.side_effect = [SystemExit(1), None]
+    run_client = mock.MagicMock(return_value=0)
+
+    jobs = jmeter_queue.RunJobs(self.job_queue, self.mock_cluster,
+                                run_client, self.results_dir)
+
+    self.assertEqual(['failed', 'succeeded'], [j['status'] for j in jobs])
+
+  def testRunJobs_Interrupted(self):
+    self.job_queue.Add('a.jmx', 3)
+    self.job_queue.Add('b.jmx', 3)
+    run_client = mock.MagicMock(side_effect=KeyboardInterrupt)
+
+    self.assertRaises(KeyboardInterrupt, jmeter_queue.RunJobs,
+                      self.job_queue, self.mock_cluster, run_client,
+                      self.results_dir)
+
+    self.assertEqual(['failed', 'pending'],
+                     [j['status'] for j in self.job_queue.List()])
+    self.mock_cluster.ShutDown.assert_called_once_with()
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to summarize JMeter results into machine-readable run reports.
+
+A run report is a compact JSON document built from JMeter CSV result files
+(JTL).  It holds throughput timeline, percentile table per label, error
+breakdown, per-server balance and cluster metadata.  Two reports can be
+compared to detect statistically significant regressions.
+"""
+
+
+
+import cgi
+import csv
+import json
+import math
+
+import jmeter_workloads
+
+
+REPORT_VERSION = 1
+
+# Column order JMeter uses for CSV results when field names are not printed.
+DEFAULT_JTL_FIELDS = [
+    'timeStamp', 'elapsed', 'label', 'responseCode', 'responseMessage',
+    'threadName', 'dataType', 'success', 'bytes', 'grpThreads',
+    'allThreads', 'Latency', 'Hostname',
+]
+
+PERCENTILES = [50, 90, 95, 99]
+# Throughput is compared only with at least one bucket between the first
+# and last buckets, which are usually partial.
+MIN_THROUGHPUT_BUCKETS = 3
+
+
+def ReadJtlSamples(jtl_file):
+  """Reads samples from JMeter CSV result file.
+
+  If the first row is a header row (jmeter.save.saveservice.print_field_names),
+  the header determines the columns.  Otherwise DEFAULT_JTL_FIELDS is used.
+
+  Args:
+    jtl_file: File object of JMeter CSV result.
+  Yields:
+    Dictionary of a sample with keys 'timestamp' (ms), 'elapsed' (ms),
+    'label', 'response_code', 'success' (boolean), 'bytes' and 'hostname'.
+  """
+  fields = None
+  for row in csv.reader(jtl_file):
+    if not row:
+      continue
+    if fields is None:
+      if row[0] == 'timeStamp':
+        fields = row
+        continue
+      fields = DEFAULT_JTL_FIELDS
+    values = dict(zip(fields, row))
+    try:
+      timestamp = int(values['timeStamp'])
+      elapsed = int(values['elapsed'])
+    except (KeyError, ValueError):
+      # Skip malformed or truncated lines, e.g. the last line of a file
+      # that is still being written.
+      continue
+    yield {
+        'timestamp': timestamp,
+        'elapsed': elapsed,
+        'label': values.get('label', ''),
+        'response_code': values.get('responseCode', ''),
+        'success': values.get('success', 'true') == 'true',
+        'bytes': int(values.get('bytes') or 0),
+        'hostname': values.get('Hostname') or 'unknown',
+    }
+
+
+def _Percentile(sorted_values, percent):
+  """Returns percentile of sorted list by nearest-rank method."""
+  if not sorted_values:
+    return 0
+  rank = int(math.ceil(percent / 100.0 * len(sorted_values)))
+  return sorted_values[max(rank, 1) - 1]
+
+
+class _LabelStats(object):
+  """Accumulates statistics of samples of a single label."""
+
+  def __init__(self):
+    self.count = 0
+    self.errors = 0
+    self.total = 0
+    self.total_squares = 0
+    self.elapsed = []
+
+  def Add(self, sample):
+    self.count += 1
+    if not sample['success']:
+      self.errors += 1
+    elapsed = sample['elapsed']
+    self.total += elapsed
+    self.total_squares += elapsed * elapsed
+    self.elapsed.append(elapsed)
+
+  def Summary(self):
+    """Returns dictionary of the statistics."""
+    mean = float(self.total) / self.count
+    variance = max(float(self.total_squares) / self.count - mean * mean, 0.0)
+    self.elapsed.sort()
+    summary = {
+        'count': self.count,
+        'errors': self.errors,
+        'mean': mean,
+        'stddev': math.sqrt(variance),
+        'min': self.elapsed[0],
+        'max': self.elapsed[-1],
+    }
+    for percent in PERCENTILES:
+      summary['p%d' % percent] = _Percentile(self.elapsed, percent)
+    return summary
+
+
+def BuildReport(samples, metadata=None, bucket_seconds=1):
+  """Builds run report from samples.
+
+  Args:
+    samples: Iterable of sample dictionaries as returned by ReadJtlSamples().
+    metadata: Dictionary of cluster metadata, such as size, machine type,
+        zone and image.
+    bucket_seconds: Width of throughput timeline bucket in seconds.
+  Returns:
+    Run report in dictionary, which can be serialized to JSON.
+  """
+  bucket_ms = bucket_seconds * 1000
+  labels = {}
+  workloads = {}
+  errors = {}
+  servers = {}
+  buckets = {}
+  start_ms = None
+  end_ms = None
+  total = 0
+  total_errors = 0
+
+  for sample in samples:
+    total += 1
+    labels.setdefault(sample['label'], _LabelStats()).Add(sample)
+    workload = jmeter_workloads.GetWorkload(sample['label'])
+    if workload:
+      workloads.setdefault(workload, _LabelStats()).Add(sample)
+
+    server = servers.setdefault(sample['hostname'], {'count': 0, 'errors': 0})
+    server['count'] += 1
+
+    bucket = buckets.setdefault(sample['timestamp'] // bucket_ms, [0, 0])
+    bucket[0] += 1
+
+    if not sample['success']:
+      total_errors += 1
+      server['errors'] += 1
+      bucket[1] += 1
+      errors[sample['response_code']] = (
+          errors.get(sample['response_code'], 0) + 1)
+
+    if start_ms is None or sample['timestamp'] < start_ms:
+      start_ms = sample['timestamp']
+    finish = sample['timestamp'] + sample['elapsed']
+    if end_ms is None or finish > end_ms:
+      end_ms = finish
+
+  timeline = {'bucket_seconds': bucket_seconds, 'start_ms': None,
+              'counts': [], 'errors': []}
+  if buckets:
+    first = min(buckets)
+    timeline['start_ms'] = first * bucket_ms
+    for key in xrange(first, max(buckets) + 1):
+      count, error_count = buckets.get(key, (0, 0))
+      timeline['counts'].append(count)
+      timeline['errors'].append(error_count)
+
+  for server in servers.values():
+    server['share'] = float(server['count']) / total
+
+  duration = (end_ms - start_ms) / 1000.0 if total else 0.0
+  report = {
+      'version': REPORT_VERSION,
+      'metadata': metadata or {},
+      'summary': {
+          'samples': total,
+          'errors': total_errors,
+          'error_rate': float(total_errors) / total if total else 0.0,
+          'start_ms': start_ms,
+          'end_ms': end_ms,
+          'duration_seconds': duration,
+          'throughput': total / duration if duration else 0.0,
+      },
+      'timeline': timeline,
+      'labels': dict((label, stats.Summary())
+                     for label, stats in labels.items()),
+      'errors': errors,
+      'servers': servers,
+  }
+  if workloads:
+    # Samples of workloads run by "run --workloads" have labels prefixed
+    # with the workload name.
+    report['workloads'] = {}
+    for workload, stats in workloads.items():
+      summary = stats.Summary()
+      summary['throughput'] = stats.count / duration if duration else 0.0
+      summary['share'] = float(stats.count) / total
+      report['workloads'][workload] = summary
+  return report
+
+
+def _MeanAndStddev(values):
+  """Returns mean and standard deviation of list of numbers."""
+  if not values:
+    return 0.0, 0.0
+  mean = float(sum(values)) / len(values)
+  variance = sum((v - mean) ** 2 for v in values) / len(values)
+  return mean, math.sqrt(variance)
+
+
+def _ZScore(mean1, stddev1, count1, mean2, stddev2, count2):
+  """Computes Welch's z score of difference from sample 1 to sample 2."""
+  standard_error = math.sqrt(
+      stddev1 ** 2 / max(count1, 1) + stddev2 ** 2 / max(count2, 1))
+  if not standard_error:
+    return 0.0 if mean1 == mean2 else float('inf') * cmp(mean2, mean1)
+  return (mean2 - mean1) / standard_error
+
+
+def CompareReports(base, new, z_threshold=2.58, min_change=0.05):
+  """Compares two run reports and finds statistically significant regressions.
+
+  Latency is compared per label by mean elapsed time.  Throughput is compared
+  by samples per timeline bucket, excluding the first and last buckets that
+  are usually partial, and is skipped as inconclusive when either report
+  has no full bucket in between.  A difference is a regression only when it
+  is both statistically significant and larger than the minimum relative
+  change.
+
+  Args:
+    base: Baseline run report.
+    new: New run report to be compared with the baseline.
+    z_threshold: Z score above which a difference is significant.
+        The default corresponds to 99% confidence.
+    min_change: Minimum relative change to be reported as regression.
+  Returns:
+    List of dictionaries of findings.  Each has 'kind' ('latency' or
+    'throughput'), 'label', 'base', 'new', 'change', 'z' and 'regression'.
+  """
+  findings = []
+
+  for label in sorted(set(base['labels']) & set(new['labels'])):
+    b = base['labels'][label]
+    n = new['labels'][label]
+    z = _ZScore(b['mean'], b['stddev'], b['count'],
+                n['mean'], n['stddev'], n['count'])
+    change = (n['mean'] - b['mean']) / b['mean'] if b['mean'] else 0.0
+    findings.append({
+        'kind': 'latency', 'label': label,
+        'base': b['mean'], 'new': n['mean'], 'change': change, 'z': z,
+        'regression': z > z_threshold and change > min_change,
+    })
+
+  if (len(base['timeline']['counts']) < MIN_THROUGHPUT_BUCKETS or
+      len(new['timeline']['counts']) < MIN_THROUGHPUT_BUCKETS):
+    return findings
+  base_mean, base_stddev = _MeanAndStddev(base['timeline']['counts'][1:-1])
+  new_mean, new_stddev = _MeanAndStddev(new['timeline']['counts'][1:-1])
+  if base_mean:
+    base_rate = base_mean / base['timeline']['bucket_seconds']
+    new_rate = new_mean / new['timeline']['bucket_seconds']
+    z = _ZScore(base_rate, base_stddev / base['timeline']['bucket_seconds'],
+                len(base['timeline']['counts']) - 2,
+                new_rate, new_stddev / new['timeline']['bucket_seconds'],
+                len(new['timeline']['counts']) - 2)
+    change = (new_rate - base_rate) / base_rate
+    findings.append({
+        'kind': 'throughput', 'label': None,
+        'base': base_rate, 'new': new_rate, 'change': change, 'z': z,
+        'regression': z < -z_threshold and change < -min_change,
+    })
+
+  return findings
+
+
+def WriteJson(report, output_file):
+  """Writes run report to file object in JSON."""
+  json.dump(report, output_file, indent=2, sort_keys=True)
+  output_file.write('\n')
+
+
+def WriteHtml(report, output_file):
+  """Writes run report to file object as human-readable HTML page."""
+  def Row(cells, tag='td'):
+    return '<tr>%s</tr>\n' % ''.join(
+        '<%s>%s</%s>' % (tag, cgi.escape(str(c)), tag) for c in cells)
+
+  html = ['<html><head><title>JMeter run report</title></head><body>\n',
+          '<h1>JMeter run report</h1>\n', '<h2>Cluster</h2>\n<table>\n']
+  for key, value in sorted(report['metadata'].items()):
+    html.append(Row([key, value]))
+  html.append('</table>\n<h2>Summary</h2>\n<table>\n')
+  for key, value in sorted(report['summary'].items()):
+    html.append(Row([key, value]))
+
+  html.append('</table>\n<h2>Labels</h2>\n<table>\n')
+  columns = ['count', 'errors', 'mean', 'min', 'max'] + [
+      'p%d' % p for p in PERCENTILES]
+  html.append(Row(['label'] + columns, tag='th'))
+  for label, stats in sorted(report['labels'].items()):
+    html.append(Row([label] + [
+        '%.1f' % stats[c] if isinstance(stats[c], float) else stats[c]
+        for c in columns]))
+
+  if report.get('workloads'):
+    html.append('</table>\n<h2>Workloads</h2>\n<table>\n')
+    html.append(Row(['workload', 'share', 'throughput'] + columns, tag='th'))
+    for workload, stats in sorted(report['workloads'].items()):
+      html.append(Row([workload, '%.1f%%' % (stats['share'] * 100),
+                       '%.1f' % stats['throughput']] + [
+                           '%.1f' % stats[c] if isinstance(stats[c], float)
+                           else stats[c] for c in columns]))
+
+  html.append('</table>\n<h2>Errors</h2>\n<table>\n')
+  html.append(Row(['response code', 'count'], tag='th'))
+  for code, count in sorted(report['errors'].items()):
+    html.append(Row([code, count]))
+
+  html.append('</table>\n<h2>Servers</h2>\n<table>\n')
+  html.append(Row(['server', 'count', 'errors', 'share'], tag='th'))
+  for name, server in sorted(report['servers'].items()):
+    html.append(Row([name, server['count'], server['errors'],
+                     '%.1f%%' % (server['share'] * 100)]))
+
+  html.append('</table>\n<h2>Throughput timeline</h2>\n<table>\n')
+  html.append(Row(['second', 'samples', 'errors'], tag='th'))
+  timeline = report['timeline']
+  for i, (count, errors) in enumerate(zip(timeline['counts'],
+                                          timeline['errors'])):
+    html.append(Row([i * timeline['bucket_seconds'], count, errors]))
+
+  if report.get('capacity_gaps'):
+    gaps = report['capacity_gaps']
+    html.append('</table>\n<h2>Capacity gaps</h2>\n<p>%s</p>\n<table>\n' % (
+        cgi.escape('%.0f server-seconds lost (%.1f%% of capacity)' % (
+            gaps['lost_server_seconds'], gaps['capacity_lost'] * 100))))
+    html.append(Row(['node', 'instance', 'servers', 'reason', 'down at',
+                     'replacement'], tag='th'))
+    for gap in gaps['gaps']:
+      html.append(Row([gap['index'], gap['instance'], gap['servers'],
+                       gap['reason'], '%+.0fs' % (
+                           (gap['down_ms'] - gaps['start_ms']) / 1000.0),
+                       gap['replacement'] or '-']))
+  html.append('</table>\n</body></html>\n')
+
+  output_file.write(''.join(html))
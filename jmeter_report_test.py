@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of jmeter_report.py."""
+
+
+
+import json
+import StringIO
+import unittest
+
+import jmeter_report
+
+
+def _MakeSamples(count, elapsed, label='home', hostname='foo-000',
+                 start_ms=1000000, interval_ms=10, success=True):
+  """Generates list of synthetic samples."""
+  return [{'timestamp': start_ms + i * interval_ms,
+           'elapsed': elapsed + i % 7,
+           'label': label,
+           'response_code': '200' if success else '500',
+           'success': success,
+           'bytes': 100,
+           'hostname': hostname}
+          for i in xrange(count)]
+
+
+class JMeterReportTest(unittest.TestCase):
+  """Unit test class of JMeter run report."""
+
+  def testReadJtlSamples_Header(self):
+    jtl = StringIO.StringIO(
+        'timeStamp,elapsed,label,responseCode,success,bytes,Hostname\n'
+        '1000,15,home,200,true,512,foo-000\n'
+        '1500,25,login,500,false,10,foo-001\n'
+        '1700,')
+
+    samples = list(jmeter_report.ReadJtlSamples(jtl))
+
+    self.assertEqual(2, len(samples))
+    self.assertEqual(1000, samples[0]['timestamp'])
+    self.assertEqual(15, samples[0]['elapsed'])
+    self.assertTrue(samples[0]['success'])
+    self.assertEqual('foo-001', samples[1]['hostname'])
+    self.assertEqual('500', samples[1]['response_code'])
+    self.assertFalse(samples[1]['success'])
+
+  def testReadJtlSamples_NoHeader(self):
+    jtl = StringIO.StringIO(
+        '1000,15,home,200,OK,Thread 1-1,text,true,512,1,1,10\n')
+
+    samples = list(jmeter_report.ReadJtlSamples(jtl))
+
+    self.assertEqual(1, len(samples))
+    self.assertEqual('home', samples[0]['label'])
+    self.assertEqual(512, samples[0]['bytes'])
+    self.assertEqual('unknown', samples[0]['hostname'])
+
+  def testBuildReport(self):
+    samples = (_MakeSamples(300, 100) +
+               _MakeSamples(100, 50, label='login', hostname='foo-001') +
+               _MakeSamples(10, 5, label='login', hostname='foo-001',
+                            success=False))
+
+    report = jmeter_report.BuildReport(samples, {'size': 2})
+
+    self.assertEqual({'size': 2}, report['metadata'])
+    self.assertEqual(410, report['summary']['samples'])
+    self.assertEqual(10, report['summary']['errors'])
+    self.assertEqual({'500': 10}, report['errors'])
+    self.assertEqual(300, report['labels']['home']['count'])
+    self.assertEqual(100, report['labels']['home']['min'])
+    self.assertEqual(106, report['labels']['home']['max'])
+    self.assertEqual(103, report['labels']['home']['p50'])
+    self.assertEqual(106, report['labels']['home']['p99'])
+    self.assertEqual(10, report['labels']['login']['errors'])
+    self.assertEqual(300, report['servers']['foo-000']['count'])
+    self.assertAlmostEqual(110.0 / 410,
+                           report['servers']['foo-001']['share'])
+    self.assertEqual(3, len(report['timeline']['counts']))
+    self.assertEqual(410, sum(report['timeline']['counts']))
+    self.assertEqual(10, sum(report['timeline']['errors']))
+    self.assertNotIn('workloads', report)
+    # Report must be serializable to JSON.
+    json.dumps(report)
+
+  def testBuildReport_Workloads(self):
+    samples = (_MakeSamples(300, 100, label='[browse] home') +
+               _MakeSamples(90, 200, label='[search] query') +
+               _MakeSamples(10, 200, label='[search] query', success=False))
+
+    report = jmeter_report.BuildReport(samples)
+
+    workloads = report['workloads']
+    self.assertEqual(['browse', 'search'], sorted(workloads))
+    self.assertEqual(300, workloads['browse']['count'])
+    self.assertAlmostEqual(0.75, workloads['browse']['share'])
+    self.assertEqual(10, workloads['search']['errors'])
+    self.assertEqual(200, workloads['search']['min'])
+    self.assertAlmostEqual(
+        report['summary']['throughput'] / 4, workloads['search']['throughput'])
+
+  def testBuildReport_NoSamples(self):
+    report = jmeter_report.BuildReport([])
+
+    self.assertEqual(0, report['summary']['samples'])
+    self.assertEqual([], report['timeline']['counts'])
+
+  def testCompareReports_NoRegression(self):
+    base = jmeter_report.BuildReport(_MakeSamples(1000, 100))
+    new = jmeter_report.BuildReport(_MakeSamples(1000, 100))
+
+    findings = jmeter_report.CompareReports(base, new)
+
+    self.assertEqual(2, len(findings))
+    self.assertFalse([f for f in findings if f['regression']])
+
+  def testCompareReports_LatencyRegression(self):
+    base = jmeter_report.BuildReport(_MakeSamples(1000, 100))
+    new = jmeter_report.BuildReport(_MakeSamples(1000, 150))
+
+    findings = jmeter_report.CompareReports(base, new)
+
+    regressions = [f for f in findings if f['regression']]
+    self.assertEqual(1, len(regressions))
+    self.assertEqual('latency', regressions[0]['kind'])
+    self.assertEqual('home', regressions[0]['label'])
+    self.assertAlmostEqual(0.5, regressions[0]['change'], places=1)
+
+  def testCompareReports_ThroughputRegression(self):
+    base = jmeter_report.BuildReport(_MakeSamples(2000, 100, interval_ms=10))
+    new = jmeter_report.BuildReport(_MakeSamples(1000, 100, interval_ms=20))
+
+    findings = jmeter_report.CompareReports(base, new)
+
+    regressions = [f for f in findings if f['regression']]
+    self.assertEqual(1, len(regressions))
+    self.assertEqual('throughput', regressions[0]['kind'])
+    self.assertAlmostEqual(-0.5, regressions[0]['change'], places=1)
+
+  def testCompareReports_TooShortForThroughput(self):
+    base = jmeter_report.BuildReport(_MakeSamples(6000, 100, interval_ms=1))
+    # Two partial buckets only.
+    new = jmeter_report.BuildReport(_MakeSamples(110, 100, start_ms=1000500,
+                                                 interval_ms=10))
+
+    findings = jmeter_report.CompareReports(base, new)
+
+    self.assertEqual(['latency'], [f['kind'] for f in findings])
+    self.assertFalse([f for f in findings if f['regression']])
+
+  def testWriteHtml(self):
+    report = jmeter_report.BuildReport(
+        _MakeSamples(10, 100, label='<script>'), {'zone': 'zone-a'})
+    output = StringIO.StringIO()
+
+    jmeter_report.WriteHtml(report, output)
+
+    self.assertIn('zone-a', output.getvalue())
+    self.assertIn('&lt;script&gt;', output.getvalue())
+    self.assertNotIn('<script>', output.getvalue())
+
+  def testWriteHtml_Workloads(self):
+    report = jmeter_report.BuildReport(
+        _MakeSamples(10, 100, label='[browse] home'))
+    output = StringIO.StringIO()
+
+    jmeter_report.WriteHtml(report, output)
+
+    self.assertIn('<h2>Workloads</h2>', output.getvalue())
+    self.assertIn('<td>browse</td><td>100.0%</td>', output.getvalue())
+
+  def testWriteHtml_CapacityGaps(self):
+    report = jmeter_report.BuildReport(_MakeSamples(10, 100))
+    report['capacity_gaps'] = {
+        'lost_server_seconds': 120.0, 'capacity_lost': 0.25,
+        'start_ms': 1000, 'gaps': [
+            {'index': 1, 'instance': 'foo-001', 'servers': 2,
+             'reason': 'instance TERMINATED', 'down_ms': 61000,
+             'replacement': 'foo-001'}]}
+    output = StringIO.StringIO()
+
+    jmeter_report.WriteHtml(report, output)
+
+    self.assertIn('120 server-seconds lost (25.0% of capacity)',
+                  output.getvalue())
+    self.assertIn('<td>instance TERMINATED</td><td>+60s</td>',
+                  output.getvalue())
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to upload JMeter results to Cloud Storage in segments during run.
+
+Result lines are rolled into gzip-compressed segments of fixed size or
+fixed time, and the segments are uploaded in background.  Segments waiting
+for upload are kept in a bounded queue, so that no more than a few segments
+are on local disk at once; when the queue is full, writing result lines
+blocks until a segment is uploaded.  Uploaded segments are deleted locally.
+
+The manifest, which lists uploaded segments with their time ranges, is
+uploaded after each segment, so that results up to the last segment survive
+crash of the client.  ReadSegmentLines() streams segments back one at a
+time for analysis.
+"""
+
+
+
+import gzip
+import json
+import logging
+import os
+import os.path
+import pipes
+import Queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+DEFAULT_SEGMENT_BYTES = 64 << 20
+DEFAULT_SEGMENT_SECONDS = 300
+# Number of closed segments waiting for upload.
+DEFAULT_QUEUE_SIZE = 2
+UPLOAD_RETRIES = 3
+UPLOAD_RETRY_INTERVAL = 5
+
+
+class LocalStore(object):
+  """Directory on local filesystem in place of Cloud Storage bucket."""
+
+  def __init__(self, root):
+    self.url = root
+
+  def Put(self, local_path, name):
+    """Copies local file to the store under the name."""
+    path = os.path.join(self.url, name)
+    if not os.path.isdir(os.path.dirname(path)):
+      os.makedirs(os.path.dirname(path))
+    # Written under temporary name and renamed, so that readers never see
+    # partial file.
+    shutil.copyfile(local_path, path + '.tmp')
+    os.rename(path + '.tmp', path)
+
+  def Get(self, name, local_path):
+    """Copies file of the name in the store to local file."""
+    path = os.path.join(self.url, name)
+    if not os.path.exists(path):
+      raise IOError('%s not found' % path)
+    shutil.copyfile(path, local_path)
+
+
+class GsutilStore(object):
+  """Cloud Storage location accessed by gsutil."""
+
+  def __init__(self, url):
+    """Constructor.
+
+    Args:
+      url: Cloud Storage URL, e.g. 'gs://bucket/results/run'.
+    """
+    self.url = url.rstrip('/')
+
+  def Put(self, local_path, name):
+    command = 'gsutil -q cp %s %s' % (
+        pipes.quote(local_path), pipes.quote('%s/%s' % (self.url, name)))
+    if subprocess.call(command, shell=True):
+      raise IOError('Failed to upload %s to %s/%s' % (local_path, self.url,
+                                                      name))
+
+  def Get(self, name, local_path):
+    command = 'gsutil -q cp %s %s' % (
+        pipes.quote('%s/%s' % (self.url, name)), pipes.quote(local_path))
+    if subprocess.call(command, shell=True):
+      raise IOError('Failed to download %s/%s' % (self.url, name))
+
+
+def MakeStore(url):
+  """Returns store of the URL, GsutilStore for 'gs://' URL or LocalStore."""
+  if url.startswith('gs://'):
+    return GsutilStore(url)
+  return LocalStore(url)
+
+
+def _GetTimestamp(line):
+  """Returns timestamp of JTL line in ms, or None for header or bad line."""
+  try:
+    return int(line.split(',', 1)[0])
+  except ValueError:
+    return None
+
+
+class Segmenter(object):
+  """Rolls result lines into compressed segments and uploads them."""
+
+  def __init__(self, store, spool_dir, segment_bytes=DEFAULT_SEGMENT_BYTES,
+               segment_seconds=DEFAULT_SEGMENT_SECONDS,
+               queue_size=DEFAULT_QUEUE_SIZE):
+    """Constructor.
+
+    Args:
+      store: Store to upload segments and manifest to, such as GsutilStore.
+      spool_dir: Local directory to write segments in until uploaded.
+      segment_bytes: Uncompressed bytes after which segment is closed.
+      segment_seconds: Seconds after which segment is closed.
+      queue_size: Number of closed segments that may wait for upload.
+    """
+    self._store = store
+    self.url = store.url
+    self._spool_dir = spool_dir
+    self._segment_bytes = segment_bytes
+    self._segment_seconds = segment_seconds
+    self._queue = Queue.Queue(maxsize=queue_size)
+    self._header = None
+    self._segment = None
+    self._file = None
+    self._count = 0
+    self.manifest = {'version': MANIFEST_VERSION, 'complete': False,
+                     'header': None, 'segments': []}
+    self.failed = []
+    if not os.path.isdir(spool_dir):
+      os.makedirs(spool_dir)
+    self._uploader = threading.Thread(target=self._Upload)
+    self._uploader.daemon = True
+    self._uploader.start()
+
+  def _Open(self):
+    name = 'segment-%05d.csv.gz' % self._count
+    self._count += 1
+    self._segment = {'name': name, 'lines': 0, 'bytes': 0,
+                     'first_timestamp': None, 'last_timestamp': None,
+                     'opened': time.time()}
+    self._file = gzip.open(os.path.join(self._spool_dir, name), 'wb')
+    if self._header:
+      self._file.write(self._header)
+
+  def _Roll(self):
+    """Closes the current segment and queues it for upload."""
+    self._file.close()
+    segment = self._segment
+    del segment['opened']
+    path = os.path.join(self._spool_dir, segment['name'])
+    segment['compressed_bytes'] = os.path.getsize(path)
+    if self._queue.full():
+      logging.warning('Results upload is behind.  Waiting for upload of '
+                      'earlier segments.')
+    self._queue.put((path, segment))
+    self._file = self._segment = None
+
+  def Write(self, line):
+    """Writes result line, including newline, to the current segment."""
+    timestamp = _GetTimestamp(line)
+    if timestamp is None and self._header is None and not self._segment:
+      # CSV header is repeated in each segment, so that each segment can be
+      # read by itself.
+      self._header = line
+      self.manifest['header'] = line
+      return
+    if not self._segment:
+      self._Open()
+    self._file.write(line)
+    segment = self._segment
+    segment['lines'] += 1
+    segment['bytes'] += len(line)
+    if timestamp is not None:
+      segment['first_timestamp'] = min(
+          segment['first_timestamp'] or timestamp, timestamp)
+      segment['last_timestamp'] = max(segment['last_timestamp'], timestamp)
+    if (segment['bytes'] >= self._segment_bytes or
+        time.time() - segment['opened'] >= self._segment_seconds):
+      self._Roll()
+
+  def _PutWithRetries(self, path, name):
+    for attempt in xrange(UPLOAD_RETRIES):
+      try:
+        self._store.Put(path, name)
+        return True
+      except (IOError, OSError) as e:
+        logging.warning('Upload of %s failed (attempt %d): %s', name,
+                        attempt + 1, e)
+        time.sleep(UPLOAD_RETRY_INTERVAL)
+    return False
+
+  def _WriteManifest(self):
+    fd, path = tempfile.mkstemp(dir=self._spool_dir, suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+      json.dump(self.manifest, f, indent=2, sort_keys=True)
+    try:
+      self._PutWithRetries(path, MANIFEST_NAME)
+    finally:
+      os.remove(path)
+
+  def _Upload(self):
+    """Uploads queued segments in order, until None is queued."""
+    while True:
+      item = self._queue.get()
+      if item is None:
+        return
+      path, segment = item
+      if self._PutWithRetries(path, segment['name']):
+        os.remove(path)
+        self.manifest['segments'].append(segment)
+        self._WriteManifest()
+        logging.debug('Uploaded %s: %d lines', segment['name'],
+                      segment['lines'])
+      else:
+        # Kept in spool directory to upload by hand.
+        logging.error('Failed to upload %s.  Left in %s', segment['name'],
+                      path)
+        self.failed.append(path)
+
+  def Close(self):
+    """Uploads the last segment and the complete manifest.
+
+    Returns:
+      The manifest in dictionary.
+    """
+    if self._segment:
+      self._Roll()
+    self._queue.put(None)
+    self._uploader.join()
+    self.manifest['complete'] = not self.failed
+    self._WriteManifest()
+    return self.manifest
+
+
+def ReadStream(stream, segmenter):
+  """Writes lines of the stream, e.g. named pipe, to the segmenter."""
+  for line in iter(stream.readline, ''):
+    segmenter.Write(line)
+
+
+def ReadManifest(store):
+  """Downloads manifest of the store."""
+  fd, path = tempfile.mkstemp(suffix='.json')
+  os.close(fd)
+  try:
+    store.Get(MANIFEST_NAME, path)
+    with open(path) as f:
+      return json.load(f)
+  finally:
+    os.remove(path)
+
+
+def ReadSegmentLines(store, start_ms=None, end_ms=None):
+  """Streams result lines back from uploaded segments.
+
+  Segments are downloaded one at a time, and deleted after being read, so
+  that local disk holds one segment at most.
+
+  Args:
+    store: Store the segments were uploaded to.
+    start_ms: Segments ending before the time are skipped.  None for all.
+    end_ms: Segments starting after the time are skipped.  None for all.
+  Yields:
+    Result lines including newline, beginning with the CSV header if the
+    results have it.
+  """
+  manifest = ReadManifest(store)
+  if not manifest.get('complete'):
+    logging.warning('Results are incomplete.  Reading %d uploaded '
+                    'segment(s).', len(manifest['segments']))
+  header = manifest.get('header')
+  if header:
+    yield header
+  for segment in manifest['segments']:
+    if (start_ms is not None and segment['last_timestamp'] is not None and
+        segment['last_timestamp'] < start_ms):
+      continue
+    if (end_ms is not None and segment['first_timestamp'] is not None and
+        segment['first_timestamp'] > end_ms):
+      continue
+    fd, path = tempfile.mkstemp(suffix='.csv.gz')
+    os.close(fd)
+    try:
+      store.Get(segment['name'], path)
+      with gzip.open(path, 'rb') as f:
+        for number, line in enumerate(f):
+          if number == 0 and header and line == header:
+            continue
+          yield line
+    finally:
+      os.remove(path)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of jmeter_segments.py."""
+
+
+
+import gzip
+import json
+import os
+import os.path
+import shutil
+import StringIO
+import tempfile
+import threading
+import unittest
+
+import mock
+
+import jmeter_report
+import jmeter_segments
+from jmeter_segments import LocalStore
+from jmeter_segments import Segmenter
+
+
+HEADER = 'timeStamp,elapsed,label,responseCode,success,bytes\n'
+
+
+def _MakeLine(timestamp):
+  return '%d,100,home,200,true,1000\n' % timestamp
+
+
+class BlockingStore(LocalStore):
+  """LocalStore whose uploads of segments wait until released."""
+
+  def __init__(self, root):
+    super(BlockingStore, self).__init__(root)
+    self.release = threading.Event()
+
+  def Put(self, local_path, name):
+    if name != jmeter_segments.MANIFEST_NAME:
+      self.release.wait()
+    super(BlockingStore, self).Put(local_path, name)
+
+
+class SegmenterTest(unittest.TestCase):
+  """Unit test class of Segmenter and reading segments back."""
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.bucket = os.path.join(self.temp_dir, 'bucket')
+    self.spool_dir = os.path.join(self.temp_dir, 'spool')
+    self.store = LocalStore(self.bucket)
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+    mock.patch.stopall()
+
+  def _ReadManifest(self):
+    with open(os.path.join(self.bucket, 'manifest.json')) as f:
+      return json.load(f)
+
+  def testWrite_RollsBySize(self):
+    segmenter = Segmenter(self.store, self.spool_dir,
+                          segment_bytes=len(_MakeLine(0)) * 4)
+    segmenter.Write(HEADER)
+    for timestamp in xrange(1000, 1010):
+      segmenter.Write(_MakeLine(timestamp))
+    manifest = segmenter.Close()
+
+    self.assertTrue(manifest['complete'])
+    self.assertEqual(HEADER, manifest['header'])
+    self.assertEqual([4, 4, 2], [s['lines'] for s in manifest['segments']])
+    self.assertEqual([(1000, 1003), (1004, 1007), (1008, 1009)],
+                     [(s['first_timestamp'], s['last_timestamp'])
+                      for s in manifest['segments']])
+    self.assertEqual(manifest, self._ReadManifest())
+    # Each segment is compressed and starts with the header.
+    with gzip.open(os.path.join(self.bucket, 'segment-00001.csv.gz')) as f:
+      self.assertEqual(
+          [HEADER] + [_MakeLine(t) for t in xrange(1004, 1008)],
+          f.readlines())
+    # Uploaded segments are deleted locally.
+    self.assertEqual([], os.listdir(self.spool_dir))
+
+  def testWrite_RollsByTime(self):
+    mock_time = mock.patch('time.time', return_value=100.0).start()
+    segmenter = Segmenter(self.store, self.spool_dir, segment_seconds=60)
+    segmenter.Write(_MakeLine(1000))
+    segmenter.Write(_MakeLine(1001))
+    mock_time.return_value = 160.0
+    segmenter.Write(_MakeLine(1002))
+    segmenter.Write(_MakeLine(1003))
+    manifest = segmenter.Close()
+
+    self.assertEqual(None, manifest['header'])
+    self.assertEqual([3, 1], [s['lines'] for s in manifest['segments']])
+
+  def testWrite_BoundedQueue(self):
+    store = BlockingStore(self.bucket)
+    segmenter = Segmenter(store, self.spool_dir, segment_bytes=1,
+                          queue_size=1)
+    writer = threading.Thread(
+        target=lambda: [segmenter.Write(_MakeLine(t)) for t in xrange(10)])
+    writer.daemon = True
+    writer.start()
+    writer.join(0.5)
+
+    # Writer is blocked with a segment in upload, one in the queue and one
+    # waiting to be queued.
+    self.assertTrue(writer.is_alive())
+    self.assertEqual(3, len(os.listdir(self.spool_dir)))
+
+    store.release.set()
+    writer.join()
+    manifest = segmenter.Close()
+    self.assertEqual(10, len(manifest['segments']))
+    self.assertEqual([], os.listdir(self.spool_dir))
+
+  def testClose_UploadFailure(self):
+    mock.patch('time.sleep').start()
+    store = mock.Mock(url='gs://bucket/run')
+    store.Put.side_effect = IOError('Network error')
+    segmenter = Segmenter(store, self.spool_dir)
+    segmenter.Write(_MakeLine(1000))
+    manifest = segmenter.Close()
+
+    self.assertFalse(manifest['complete'])
+    self.assertEqual([], manifest['segments'])
+    # Failed segment is kept for manual upload.
+    self.assertEqual([os.path.join(self.spool_dir, 'segment-00000.csv.gz')],
+                     segmenter.failed)
+    self.assertTrue(os.path.exists(segmenter.failed[0]))
+
+  def testReadSegmentLines(self):
+    segmenter = Segmenter(self.store, self.spool_dir,
+                          segment_bytes=len(_MakeLine(0)) * 2)
+    jmeter_segments.ReadStream(
+        StringIO.StringIO(HEADER + ''.join(_MakeLine(t)
+                                           for t in xrange(1000, 1005))),
+        segmenter)
+    segmenter.Close()
+
+    lines = list(jmeter_segments.ReadSegmentLines(self.store))
+    self.assertEqual([HEADER] + [_MakeLine(t) for t in xrange(1000, 1005)],
+                     lines)
+    samples = list(jmeter_report.ReadJtlSamples(lines))
+    self.assertEqual(5, len(samples))
+    self.assertEqual(1004, samples[-1]['timestamp'])
+
+  def testReadSegmentLines_TimeRange(self):
+    segmenter = Segmenter(self.store, self.spool_dir,
+                          segment_bytes=len(_MakeLine(0)) * 2)
+    for timestamp in xrange(1000, 1006):
+      segmenter.Write(_MakeLine(timestamp))
+    segmenter.Close()
+
+    lines = list(jmeter_segments.ReadSegmentLines(
+        self.store, start_ms=1002, end_ms=1003))
+    self.assertEqual([_MakeLine(1002), _MakeLine(1003)], lines)
+
+  def testReadSegmentLines_Incomplete(self):
+    store = BlockingStore(self.bucket)
+    store.release.set()
+    segmenter = Segmenter(store, self.spool_dir, segment_bytes=1)
+    segmenter.Write(_MakeLine(1000))
+    # Wait until the first segment is listed in the manifest.
+    for _ in xrange(100):
+      if os.path.exists(os.path.join(self.bucket, 'manifest.json')):
+        break
+      threading.Event().wait(0.05)
+    # Client crashed while uploading the second segment.
+    store.release.clear()
+    segmenter.Write(_MakeLine(1001))
+
+    self.assertFalse(self._ReadManifest()['complete'])
+    self.assertEqual([_MakeLine(1000)],
+                     list(jmeter_segments.ReadSegmentLines(store)))
+    store.release.set()
+    segmenter.Close()
+
+
+class GsutilStoreTest(unittest.TestCase):
+  """Unit test class of GsutilStore."""
+
+  def testPut(self):
+    mock_call = mock.patch('subprocess.call', return_value=0).start()
+    jmeter_segments.GsutilStore('gs://bucket/run/').Put('/tmp/s', 'segment')
+
+    mock_call.assert_called_once_with(
+        'gsutil -q cp /tmp/s gs://bucket/run/segment', shell=True)
+    mock.patch.stopall()
+
+  def testGet_Failure(self):
+    mock.patch('subprocess.call', return_value=1).start()
+
+    self.assertRaises(IOError, jmeter_segments.GsutilStore('gs://b').Get,
+                      'manifest.json', '/tmp/m')
+    mock.patch.stopall()
+
+  def testMakeStore(self):
+    self.assertIsInstance(jmeter_segments.MakeStore('gs://b/r'),
+                          jmeter_segments.GsutilStore)
+    self.assertIsInstance(jmeter_segments.MakeStore('/tmp/r'), LocalStore)
+
+
+if __name__ == '__main__':
+  unittest.main()
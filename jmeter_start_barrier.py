@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to start test plan at the same time on all JMeter servers.
+
+JMeter client starts remote servers one after another, so that the first
+servers are at full load before the last ones begin.  To start them
+together, a setUp Thread Group is added to a copy of the test plan.  JMeter
+runs setUp Thread Groups before the other thread groups, and the added one
+pauses until the start time, which the client passes to all servers as
+JMeter global property.
+
+The start time is in the client's clock.  Clock offsets of the servers are
+passed as global properties too, keyed by host name, and each server pauses
+until the start time in its own clock.
+
+Start skew is measured from the first sample of each node in the results.
+"""
+
+
+
+import time
+import xml.etree.ElementTree as ElementTree
+
+
+START_AT_PROPERTY = 'jmeter_cluster.start_at'
+CLOCK_OFFSET_PROPERTY = 'jmeter_cluster.clock_offset.%s'
+BARRIER_NAME = 'jmeter_cluster start barrier'
+# File in run directory to write measured start skew to.
+SKEW_FILE = 'start_skew.json'
+# Seconds from launching JMeter client until the start time, in addition to
+# the time remote start takes per server.
+DEFAULT_LEAD_SECONDS = 15.0
+LEAD_SECONDS_PER_SERVER = 0.5
+# Samples this long after the first sample are not looked at for the first
+# sample of each node.
+DEFAULT_SKEW_WINDOW_MS = 60000
+
+# Milliseconds to pause, in the server's clock.  Commas in arguments of
+# __javaScript() are escaped.
+PAUSE_EXPRESSION = (
+    '${__javaScript(Math.max(0\\, Math.round('
+    '${__P(%s,0)} + ${__P(%s,0)} - new Date().getTime())))}' % (
+        START_AT_PROPERTY, CLOCK_OFFSET_PROPERTY % '${__machineName()}'))
+
+
+def ComputeStartTime(server_count, lead_seconds=None, now=None):
+  """Returns start time in epoch milliseconds.
+
+  Args:
+    server_count: Number of JMeter servers to start.
+    lead_seconds: Seconds from now until the start.  None to derive from
+        the number of servers.
+    now: Current time in epoch seconds.  Defaults to time.time().
+  """
+  if lead_seconds is None:
+    lead_seconds = (DEFAULT_LEAD_SECONDS +
+                    LEAD_SECONDS_PER_SERVER * server_count)
+  return int(((now or time.time()) + lead_seconds) * 1000)
+
+
+def MakeJMeterArgs(start_ms, offsets):
+  """Returns JMeter client parameters to pass start time to servers.
+
+  Args:
+    start_ms: Start time in epoch milliseconds of the client's clock.
+    offsets: Dictionary of instance name to clock offset, as read by
+        jmeter_clock.ReadOffsets().
+  Returns:
+    List of '-G' parameters.
+  """
+  args = ['-G%s=%d' % (START_AT_PROPERTY, start_ms)]
+  for name, offset in sorted(offsets.items()):
+    args.append('-G%s=%d' % (CLOCK_OFFSET_PROPERTY % name.split('.')[0],
+                             int(round(offset['offset_ms']))))
+  return args
+
+
+def _AddProp(parent, tag, name, value):
+  prop = ElementTree.SubElement(parent, tag, {'name': name})
+  prop.text = value
+  return prop
+
+
+def _MakeBarrier():
+  """Returns elements of setUp Thread Group and its tree, pausing once."""
+  group = ElementTree.Element('SetupThreadGroup', {
+      'guiclass': 'SetupThreadGroupGui', 'testclass': 'SetupThreadGroup',
+      'testname': BARRIER_NAME, 'enabled': 'true'})
+  _AddProp(group, 'stringProp', 'ThreadGroup.on_sample_error', 'continue')
+  controller = ElementTree.SubElement(group, 'elementProp', {
+      'name': 'ThreadGroup.main_controller', 'elementType': 'LoopController',
+      'guiclass': 'LoopControlPanel', 'testclass': 'LoopController',
+      'testname': 'Loop Controller', 'enabled': 'true'})
+  _AddProp(controller, 'boolProp', 'LoopController.continue_forever', 'false')
+  _AddProp(controller, 'stringProp', 'LoopController.loops', '1')
+  _AddProp(group, 'stringProp', 'ThreadGroup.num_threads', '1')
+  _AddProp(group, 'stringProp', 'ThreadGroup.ramp_time', '0')
+  _AddProp(group, 'boolProp', 'ThreadGroup.scheduler', 'false')
+  _AddProp(group, 'stringProp', 'ThreadGroup.duration', '')
+  _AddProp(group, 'stringProp', 'ThreadGroup.delay', '')
+
+  # Test Action (Flow Control Action) pauses without recording a sample.
+  tree = ElementTree.Element('hashTree')
+  action = ElementTree.SubElement(tree, 'TestAction', {
+      'guiclass': 'TestActionGui', 'testclass': 'TestAction',
+      'testname': 'Wait for start time', 'enabled': 'true'})
+  _AddProp(action, 'intProp', 'ActionProcessor.action', '1')
+  _AddProp(action, 'intProp', 'ActionProcessor.target', '0')
+  _AddProp(action, 'stringProp', 'ActionProcessor.duration', PAUSE_EXPRESSION)
+  ElementTree.SubElement(tree, 'hashTree')
+  return group, tree
+
+
+def AddStartBarrier(plan_path, output_path):
+  """Writes copy of the test plan with the start barrier added.
+
+  Args:
+    plan_path: Path to JMeter test plan (JMX).
+    output_path: Path to write the test plan with the barrier to.
+  Raises:
+    ValueError: The file is not a JMeter test plan.
+  """
+  document = ElementTree.parse(plan_path)
+  root_tree = document.getroot().find('hashTree')
+  if root_tree is None or root_tree.find('TestPlan') is None:
+    raise ValueError('%s is not a JMeter test plan' % plan_path)
+  plan_tree = root_tree.find('hashTree')
+  if plan_tree is None:
+    plan_tree = ElementTree.SubElement(root_tree, 'hashTree')
+  for element in plan_tree.findall('SetupThreadGroup'):
+    if element.get('testname') == BARRIER_NAME:
+      raise ValueError('%s already has start barrier' % plan_path)
+  group, tree = _MakeBarrier()
+  plan_tree.insert(0, tree)
+  plan_tree.insert(0, group)
+  document.write(output_path, encoding='UTF-8')
+
+
+def MeasureStartSkew(samples, window_ms=DEFAULT_SKEW_WINDOW_MS):
+  """Measures start skew across nodes from the first sample of each.
+
+  Results are written roughly in time order, so samples are read only until
+  window_ms after the first sample.
+
+  Args:
+    samples: Iterable of samples returned by jmeter_report.ReadJtlSamples(),
+        with timestamps in the same clock, e.g. by jmeter_clock.
+    window_ms: Milliseconds after the first sample to stop reading at.
+  Returns:
+    Dictionary with 'first_ms' (time of the first sample), 'nodes'
+    (dictionary of host name to milliseconds from 'first_ms' until the
+    first sample of the node) and 'spread_ms', or None without samples.
+  """
+  first = {}
+  earliest = None
+  for sample in samples:
+    timestamp = sample['timestamp']
+    if earliest is not None and timestamp > earliest + window_ms:
+      break
+    hostname = sample['hostname'].split('.')[0]
+    if hostname not in first or timestamp < first[hostname]:
+      first[hostname] = timestamp
+    if earliest is None or timestamp < earliest:
+      earliest = timestamp
+  if not first:
+    return None
+  nodes = dict((host, t - earliest) for host, t in first.items())
+  return {'first_ms': earliest, 'nodes': nodes,
+          'spread_ms': max(nodes.values())}
+
+
+def FormatStartSkew(skew, start_ms=None):
+  """Returns human readable start skew in string.
+
+  Args:
+    skew: Dictionary returned by MeasureStartSkew().
+    start_ms: Start time of the barrier, to show how late the first sample
+        was.  None if the barrier was not used.
+  """
+  lines = ['Start skew across %d node(s): %d ms' % (
+      len(skew['nodes']), skew['spread_ms'])]
+  if start_ms is not None:
+    lines.append('  First sample %+d ms from start time' % (
+        skew['first_ms'] - start_ms))
+  for host, delay in sorted(skew['nodes'].items(), key=lambda n: n[1]):
+    lines.append('  %-30s %+8d ms' % (host, delay))
+  return '\n'.join(lines)
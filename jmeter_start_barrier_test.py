@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of jmeter_start_barrier.py."""
+
+
+
+import os
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ElementTree
+
+import jmeter_start_barrier
+
+
+PLAN = '''<?xml version="1.0" encoding="UTF-8"?>
+<jmeterTestPlan version="1.2" properties="2.4" jmeter="2.9 r1437961">
+  <hashTree>
+    <TestPlan guiclass="TestPlanGui" testclass="TestPlan" testname="Plan">
+      <boolProp name="TestPlan.serialize_threadgroups">false</boolProp>
+    </TestPlan>
+    <hashTree>
+      <ThreadGroup guiclass="ThreadGroupGui" testclass="ThreadGroup"
+          testname="Users" enabled="true">
+        <stringProp name="ThreadGroup.num_threads">100</stringProp>
+      </ThreadGroup>
+      <hashTree/>
+    </hashTree>
+  </hashTree>
+</jmeterTestPlan>
+'''
+
+
+def _Sample(timestamp, hostname):
+  return {'timestamp': timestamp, 'hostname': hostname}
+
+
+class JMeterStartBarrierTest(unittest.TestCase):
+  """Unit test class of start barrier."""
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.plan = os.path.join(self.temp_dir, 'plan.jmx')
+    self.output = os.path.join(self.temp_dir, 'barrier.jmx')
+    with open(self.plan, 'w') as f:
+      f.write(PLAN)
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+  def testComputeStartTime(self):
+    self.assertEqual(1000025000, jmeter_start_barrier.ComputeStartTime(
+        20, now=1000000.0))
+    self.assertEqual(1000003000, jmeter_start_barrier.ComputeStartTime(
+        20, lead_seconds=3, now=1000000.0))
+
+  def testMakeJMeterArgs(self):
+    self.assertEqual(
+        ['-Gjmeter_cluster.start_at=1400000000000',
+         '-Gjmeter_cluster.clock_offset.foo-000=-3',
+         '-Gjmeter_cluster.clock_offset.foo-001=120'],
+        jmeter_start_barrier.MakeJMeterArgs(1400000000000, {
+            'foo-001.c.project.internal': {'offset_ms': 119.6},
+            'foo-000': {'offset_ms': -2.8}}))
+
+  def testAddStartBarrier(self):
+    jmeter_start_barrier.AddStartBarrier(self.plan, self.output)
+
+    plan_tree = ElementTree.parse(self.output).getroot().find(
+        'hashTree').find('hashTree')
+    # The barrier comes first, followed by the original thread group.
+    self.assertEqual(['SetupThreadGroup', 'hashTree', 'ThreadGroup',
+                      'hashTree'], [e.tag for e in plan_tree])
+    self.assertEqual(jmeter_start_barrier.BARRIER_NAME,
+                     plan_tree[0].get('testname'))
+    duration = plan_tree[1].find(
+        "TestAction/stringProp[@name='ActionProcessor.duration']").text
+    self.assertIn('${__P(jmeter_cluster.start_at,0)}', duration)
+    self.assertIn(
+        '${__P(jmeter_cluster.clock_offset.${__machineName()},0)}', duration)
+
+  def testAddStartBarrier_Twice(self):
+    jmeter_start_barrier.AddStartBarrier(self.plan, self.output)
+
+    self.assertRaises(ValueError, jmeter_start_barrier.AddStartBarrier,
+                      self.output, self.plan)
+
+  def testAddStartBarrier_NotTestPlan(self):
+    with open(self.plan, 'w') as f:
+      f.write('<html><hashTree/></html>')
+
+    self.assertRaises(ValueError, jmeter_start_barrier.AddStartBarrier,
+                      self.plan, self.output)
+
+  def testMeasureStartSkew(self):
+    skew = jmeter_start_barrier.MeasureStartSkew([
+        _Sample(1050, 'foo-001.c.project.internal'),
+        _Sample(1000, 'foo-000'),
+        _Sample(1200, 'foo-002'),
+        _Sample(1100, 'foo-001.c.project.internal'),
+        _Sample(1030, 'foo-001.c.project.internal'),
+    ])
+
+    self.assertEqual(1000, skew['first_ms'])
+    self.assertEqual({'foo-000': 0, 'foo-001': 30, 'foo-002': 200},
+                     skew['nodes'])
+    self.assertEqual(200, skew['spread_ms'])
+    self.assertIn('Start skew across 3 node(s): 200 ms',
+                  jmeter_start_barrier.FormatStartSkew(skew, 990))
+
+  def testMeasureStartSkew_Window(self):
+    def Samples():
+      yield _Sample(1000, 'foo-000')
+      yield _Sample(70000, 'foo-001')
+      raise AssertionError('Read beyond the window')
+
+    skew = jmeter_start_barrier.MeasureStartSkew(Samples(), window_ms=60000)
+
+    self.assertEqual({'foo-000': 0}, skew['nodes'])
+
+  def testMeasureStartSkew_NoSamples(self):
+    self.assertEqual(None, jmeter_start_barrier.MeasureStartSkew([]))
+
+
+if __name__ == '__main__':
+  unittest.main()
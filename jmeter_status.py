@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to show status of nodes of JMeter server cluster.
+
+Status of each node is made of:
+  - Instance status, from list requests by label for all nodes.
+  - SSH readiness, by reading SSH banner from external IP of the instance.
+  - Tunnel liveness, by connecting to local port of SSH port forwarding of
+    each JMeter server.
+  - Server reachability, by RMI handshake through the tunnel.
+
+Probes are made concurrently by a bounded number of threads, and without
+gcutil, so that a refresh of hundreds of nodes takes about the probe
+timeout.  On terminal, the status table is drawn once, and only the rows
+that changed are redrawn on later refreshes.
+"""
+
+
+
+import Queue
+import socket
+import threading
+import time
+
+import jmeter_watchdog
+
+
+SSH_PORT = 22
+SSH_BANNER = 'SSH-'
+DEFAULT_PROBE_TIMEOUT = 2.0
+DEFAULT_PROBE_THREADS = 32
+# Fields of instance resources to list.
+INSTANCE_FIELDS = ['name', 'status', 'networkInterfaces/accessConfigs/natIP']
+
+ROW_FORMAT = '%5s  %-30s  %-12s  %-5s  %-6s  %-7s'
+HEADER = ROW_FORMAT % ('index', 'instance', 'status', 'ssh', 'tunnel',
+                       'servers')
+
+# ANSI escape sequences to move cursor up and down, and to clear line.
+CURSOR_UP = '\x1b[%dA'
+CURSOR_DOWN = '\x1b[%dB'
+CLEAR_LINE = '\r\x1b[K'
+
+
+def ProbeSsh(host, timeout=DEFAULT_PROBE_TIMEOUT):
+  """Returns whether SSH server on the host sends its banner."""
+  sock = None
+  try:
+    sock = socket.create_connection((host, SSH_PORT), timeout)
+    return sock.recv(len(SSH_BANNER)) == SSH_BANNER
+  except (socket.error, socket.timeout):
+    return False
+  finally:
+    if sock:
+      sock.close()
+
+
+def ProbeServerPort(port, host='127.0.0.1', timeout=DEFAULT_PROBE_TIMEOUT):
+  """Probes SSH tunnel to JMeter server and the server behind it.
+
+  Args:
+    port: Local port of SSH port forwarding to RMI registry of the server.
+    host: Host name of the local end of the tunnel.
+    timeout: Seconds to wait for connection and response.
+  Returns:
+    Tuple of booleans to indicate whether the tunnel accepts connection,
+    and whether the server responds to RMI handshake through it.
+  """
+  sock = None
+  try:
+    sock = socket.create_connection((host, port), timeout)
+  except (socket.error, socket.timeout):
+    return False, False
+  try:
+    sock.sendall(jmeter_watchdog.RMI_HANDSHAKE)
+    return True, sock.recv(1) == jmeter_watchdog.RMI_PROTOCOL_ACK
+  except (socket.error, socket.timeout):
+    return True, False
+  finally:
+    sock.close()
+
+
+def _RunConcurrently(functions, max_threads):
+  """Calls functions by up to max_threads threads.
+
+  Returns:
+    List of return values in the order of the functions.
+  """
+  results = [None] * len(functions)
+  tasks = Queue.Queue()
+  for task in enumerate(functions):
+    tasks.put(task)
+
+  def Work():
+    while True:
+      try:
+        i, function = tasks.get_nowait()
+      except Queue.Empty:
+        return
+      results[i] = function()
+
+  threads = [threading.Thread(target=Work)
+             for _ in xrange(min(max_threads, len(functions)))]
+  for thread in threads:
+    thread.start()
+  for thread in threads:
+    thread.join()
+  return results
+
+
+def _GetExternalIp(instance):
+  for interface in instance.get('networkInterfaces', []):
+    for access_config in interface.get('accessConfigs', []):
+      if access_config.get('natIP'):
+        return access_config['natIP']
+  return None
+
+
+def ProbeNodes(nodes, instances, max_threads=DEFAULT_PROBE_THREADS,
+               probe_ssh=ProbeSsh, probe_port=ProbeServerPort):
+  """Probes nodes concurrently, and makes their status rows.
+
+  SSH and ports are probed only on RUNNING instances.
+
+  Args:
+    nodes: List of tuples of cluster index, instance name and list of local
+        ports of JMeter servers on the instance.
+    instances: Dictionary of instance name to instance resource with
+        INSTANCE_FIELDS, listed by label.
+    max_threads: Maximum number of concurrent probes.
+    probe_ssh: Function that takes IP address and returns whether SSH is
+        ready.
+    probe_port: Function that takes port and returns tuple of tunnel and
+        server liveness, as ProbeServerPort().
+  Returns:
+    List of dictionaries with 'index', 'instance', 'status', 'ssh' (None if
+    not probed), 'tunnels' and 'servers' (number of live tunnels and
+    responding servers) and 'ports' (number of servers of the node).
+  """
+  rows = []
+  probes = []
+  for index, name, ports in nodes:
+    instance = instances.get(name)
+    row = {'index': index, 'instance': name,
+           'status': instance['status'] if instance else 'NOT FOUND',
+           'ssh': None, 'tunnels': 0, 'servers': 0, 'ports': len(ports)}
+    rows.append(row)
+    if row['status'] != 'RUNNING':
+      continue
+    ip = _GetExternalIp(instance)
+    if ip:
+      probes.append((row, 'ssh', lambda ip=ip: probe_ssh(ip)))
+    for port in ports:
+      probes.append((row, 'port', lambda port=port: probe_port(port)))
+
+  results = _RunConcurrently([probe[2] for probe in probes], max_threads)
+  for (row, kind, _), result in zip(probes, results):
+    if kind == 'ssh':
+      row['ssh'] = result
+    else:
+      tunnel, server = result
+      row['tunnels'] += int(tunnel)
+      row['servers'] += int(server)
+  return rows
+
+
+def IsHealthy(row):
+  """Returns whether all JMeter servers of the node are reachable."""
+  return row['status'] == 'RUNNING' and row['servers'] == row['ports']
+
+
+def FormatRow(row):
+  """Returns status row of a node in string."""
+  ssh = {None: '-', True: 'ready', False: 'no'}[row['ssh']]
+  if row['status'] == 'RUNNING':
+    tunnels = '%d/%d' % (row['tunnels'], row['ports'])
+    servers = '%d/%d' % (row['servers'], row['ports'])
+  else:
+    tunnels = servers = '-'
+  return ROW_FORMAT % (row['index'], row['instance'], row['status'], ssh,
+                       tunnels, servers)
+
+
+def FormatSummary(rows, now=None):
+  """Returns summary line of status rows in string."""
+  return '%s  %d/%d node(s) healthy, %d/%d server(s) reachable' % (
+      time.strftime('%H:%M:%S', time.localtime(now)),
+      len([r for r in rows if IsHealthy(r)]), len(rows),
+      sum(r['servers'] for r in rows), sum(r['ports'] for r in rows))
+
+
+class StatusView(object):
+  """Status table that redraws only changed rows."""
+
+  def __init__(self, output, ansi=None):
+    """Constructor.
+
+    Args:
+      output: File object to write the table to.
+      ansi: Whether to move cursor by ANSI escape sequences to redraw rows
+          in place.  Defaults to whether output is terminal.  Otherwise,
+          changed rows are appended.
+    """
+    self._output = output
+    self._ansi = output.isatty() if ansi is None else ansi
+    self._lines = []
+
+  def Update(self, rows, now=None):
+    """Draws status rows, and the summary line below them.
+
+    Args:
+      rows: List of status rows returned by ProbeNodes().
+      now: Time of the status in epoch seconds.  Defaults to current time.
+    Returns:
+      Number of lines drawn.
+    """
+    lines = ([HEADER] + [FormatRow(row) for row in rows] +
+             [FormatSummary(rows, now)])
+    if len(lines) != len(self._lines):
+      # The first draw, or the cluster was resized.
+      changed = range(len(lines))
+      self._output.write(''.join(line + '\n' for line in lines))
+    else:
+      changed = [i for i, line in enumerate(lines) if line != self._lines[i]]
+      for i in changed:
+        if self._ansi:
+          # Cursor stays below the last line between draws.
+          up = len(lines) - i
+          self._output.write(CURSOR_UP % up + CLEAR_LINE + lines[i] +
+                             '\r' + CURSOR_DOWN % up)
+        else:
+          self._output.write(lines[i] + '\n')
+    self._output.flush()
+    self._lines = lines
+    return len(changed)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of jmeter_status.py."""
+
+
+
+import socket
+import StringIO
+import threading
+import unittest
+
+import mock
+
+import jmeter_status
+from jmeter_status import StatusView
+
+
+def _Instance(name, status='RUNNING', ip='10.0.0.1'):
+  return {'name': name, 'status': status,
+          'networkInterfaces': [{'accessConfigs': [{'natIP': ip}]}]}
+
+
+def _Row(index, status='RUNNING', ssh=True, servers=1):
+  return {'index': index, 'instance': 'foo-%03d' % index, 'status': status,
+          'ssh': ssh, 'tunnels': 1, 'servers': servers, 'ports': 1}
+
+
+class JMeterStatusTest(unittest.TestCase):
+  """Unit test class of cluster status."""
+
+  def tearDown(self):
+    mock.patch.stopall()
+
+  def testProbeNodes(self):
+    probed = []
+
+    def ProbePort(port):
+      probed.append(port)
+      return {24000: (True, True), 24001: (True, True),
+              24002: (True, False)}[port]
+
+    rows = jmeter_status.ProbeNodes(
+        [(0, 'foo-000', [24000, 24001]), (1, 'foo-001', [24002]),
+         (2, 'foo-002', [24003]), (3, 'foo-003', [24004])],
+        {'foo-000': _Instance('foo-000', ip='10.0.0.1'),
+         'foo-001': _Instance('foo-001', ip='10.0.0.2'),
+         'foo-002': _Instance('foo-002', status='STAGING')},
+        probe_ssh=lambda ip: ip == '10.0.0.1', probe_port=ProbePort)
+
+    self.assertEqual(
+        [('RUNNING', True, 2, 2, 2), ('RUNNING', False, 1, 0, 1),
+         ('STAGING', None, 0, 0, 1), ('NOT FOUND', None, 0, 0, 1)],
+        [(r['status'], r['ssh'], r['tunnels'], r['servers'], r['ports'])
+         for r in rows])
+    # Ports of instances not RUNNING are not probed.
+    self.assertEqual([24000, 24001, 24002], sorted(probed))
+    self.assertEqual([True, False, False, False],
+                     [jmeter_status.IsHealthy(r) for r in rows])
+
+  def testProbeNodes_Concurrent(self):
+    # All probes block until 4 of them are running at once.
+    barrier = threading.Semaphore(0)
+    started = []
+    lock = threading.Lock()
+
+    def ProbePort(port):
+      with lock:
+        started.append(port)
+        if len(started) == 4:
+          for _ in xrange(4):
+            barrier.release()
+      self.assertTrue(barrier.acquire())
+      return True, True
+
+    rows = jmeter_status.ProbeNodes(
+        [(i, 'foo-%03d' % i, [24000 + i]) for i in xrange(4)],
+        dict(('foo-%03d' % i, _Instance('foo-%03d' % i, ip=None))
+             for i in xrange(4)),
+        max_threads=4, probe_port=ProbePort)
+
+    self.assertEqual([1, 1, 1, 1], [r['servers'] for r in rows])
+
+  def testProbeServerPort(self):
+    mock_socket = mock.patch(
+        'socket.create_connection').start().return_value
+    mock_socket.recv.return_value = 'N'
+
+    self.assertEqual((True, True), jmeter_status.ProbeServerPort(24000))
+    mock_socket.recv.return_value = ''
+    self.assertEqual((True, False), jmeter_status.ProbeServerPort(24000))
+
+  def testProbeServerPort_NoTunnel(self):
+    mock.patch('socket.create_connection',
+               side_effect=socket.error('refused')).start()
+
+    self.assertEqual((False, False), jmeter_status.ProbeServerPort(24000))
+
+  def testProbeSsh(self):
+    mock_create = mock.patch('socket.create_connection').start()
+    mock_create.return_value.recv.return_value = 'SSH-'
+
+    self.assertTrue(jmeter_status.ProbeSsh('10.0.0.1'))
+    mock_create.assert_called_once_with(('10.0.0.1', 22), 2.0)
+
+  def testFormatRow(self):
+    self.assertEqual(
+        '    1  foo-001                         RUNNING       ready  1/1     '
+        '1/1    ', jmeter_status.FormatRow(_Row(1)))
+    self.assertIn('STOPPING      -      -       -',
+                  jmeter_status.FormatRow(_Row(2, 'STOPPING', None, 0)))
+
+  def testStatusView_Ansi(self):
+    output = StringIO.StringIO()
+    view = StatusView(output, ansi=True)
+
+    # Header, 3 rows and summary.
+    self.assertEqual(5, view.Update([_Row(0), _Row(1), _Row(2)], now=0))
+    output.truncate(0)
+
+    rows = [_Row(0), _Row(1, servers=0), _Row(2)]
+    # The row and the summary line changed.
+    self.assertEqual(2, view.Update(rows, now=0))
+    # Row 1 is 3 lines above the cursor below the summary.
+    self.assertEqual(
+        '\x1b[3A\r\x1b[K' + jmeter_status.FormatRow(rows[1]) +
+        '\r\x1b[3B' + '\x1b[1A\r\x1b[K' +
+        jmeter_status.FormatSummary(rows, now=0) + '\r\x1b[1B',
+        output.getvalue())
+
+  def testStatusView_Unchanged(self):
+    output = StringIO.StringIO()
+    view = StatusView(output, ansi=True)
+    view.Update([_Row(0)], now=0)
+    output.truncate(0)
+
+    self.assertEqual(0, view.Update([_Row(0)], now=0))
+    self.assertEqual('', output.getvalue())
+
+  def testStatusView_Resized(self):
+    output = StringIO.StringIO()
+    view = StatusView(output, ansi=True)
+    view.Update([_Row(0)], now=0)
+
+    self.assertEqual(4, view.Update([_Row(0), _Row(1)], now=0))
+
+  def testStatusView_NotTerminal(self):
+    output = StringIO.StringIO()
+    view = StatusView(output)
+    view.Update([_Row(0), _Row(1)], now=0)
+    output.truncate(0)
+
+    view.Update([_Row(0), _Row(1, 'TERMINATED', None, 0)], now=0)
+
+    # Changed lines are appended.
+    self.assertEqual(
+        jmeter_status.FormatRow(_Row(1, 'TERMINATED', None, 0)) + '\n' +
+        jmeter_status.FormatSummary([_Row(0), _Row(1, 'TERMINATED', None, 0)],
+                                    now=0) + '\n',
+        output.getvalue())
+    self.assertNotIn('\x1b', output.getvalue())
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to distribute test assets to JMeter servers through Cloud Storage.
+
+Test plans, CSV data sets and plugins are uploaded to Cloud Storage as
+content-addressed blobs, named after SHA-1 hash of their contents.  A blob
+is uploaded only if the bucket doesn't have it yet, and each server
+downloads only the blobs missing in its local blob cache.
+
+Large CSV data sets can be split into shards, one per server.  Each server
+picks its shard by its 'id' instance metadata.
+"""
+
+
+
+import hashlib
+import logging
+import os
+import os.path
+import pipes
+import subprocess
+import tempfile
+
+
+BLOB_DIR = 'blobs'
+SERVER_CACHE_DIR = '/var/cache/jmeter-sync'
+SERVER_JMETER_DIR = '/apache-jmeter-*-server'
+METADATA_ID_URL = ('http://metadata/computeMetadata/v1/instance/'
+                   'attributes/id')
+
+
+def HashFile(path):
+  """Returns SHA-1 hash of the file contents in hex string."""
+  sha1 = hashlib.sha1()
+  with open(path, 'rb') as f:
+    for chunk in iter(lambda: f.read(1 << 20), ''):
+      sha1.update(chunk)
+  return sha1.hexdigest()
+
+
+class AssetSync(object):
+  """Uploads test assets to Cloud Storage and generates server pull script."""
+
+  def __init__(self, cloud_storage, cache_dir):
+    """Constructor.
+
+    Args:
+      cloud_storage: Cloud Storage URL of the bucket, e.g. 'gs://bucket'.
+      cache_dir: Local directory to stage blobs in.
+    """
+    self._blob_url = '%s/%s' % (cloud_storage.rstrip('/'), BLOB_DIR)
+    self._cache_dir = cache_dir
+
+  def _StageBlob(self, path):
+    """Places copy of file in local blob directory by its hash.
+
+    Blob is a copy rather than a link, so that editing the file later
+    doesn't change the content stored under the hash.  The hash of a new
+    blob is taken from the copy itself, in case the file changes while
+    being staged.
+
+    Args:
+      path: Path to the file.
+    Returns:
+      Hash of the blob.
+    """
+    blob_hash = HashFile(path)
+    if os.path.exists(os.path.join(self._cache_dir, blob_hash)):
+      return blob_hash
+
+    sha1 = hashlib.sha1()
+    fd, temp_path = tempfile.mkstemp(prefix='.staging-', dir=self._cache_dir)
+    with os.fdopen(fd, 'wb') as blob:
+      with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), ''):
+          sha1.update(chunk)
+          blob.write(chunk)
+    blob_hash = sha1.hexdigest()
+    blob_path = os.path.join(self._cache_dir, blob_hash)
+    if os.path.exists(blob_path):
+      os.remove(temp_path)
+    else:
+      os.rename(temp_path, blob_path)
+    return blob_hash
+
+  def _SplitCsv(self, path, shard_count, header):
+    """Splits CSV file into shards by line index and stages them as blobs.
+
+    Line i (excluding the header) goes to shard (i % shard_count).
+
+    Args:
+      path: Path to CSV file.
+      shard_count: Number of shards.
+      header: Whether the first line is header, which is copied to all shards.
+    Returns:
+      List of hashes of shards.
+    """
+    shard_paths = [os.path.join(self._cache_dir, '.shard-%d' % i)
+                   for i in xrange(shard_count)]
+    shards = [open(p, 'wb') for p in shard_paths]
+    try:
+      with open(path, 'rb') as f:
+        if header:
+          first = f.readline()
+          for shard in shards:
+            shard.write(first)
+        for i, line in enumerate(f):
+          shards[i % shard_count].write(line)
+    finally:
+      for shard in shards:
+        shard.close()
+
+    hashes = []
+    for shard_path in shard_paths:
+      hashes.append(self._StageBlob(shard_path))
+      os.remove(shard_path)
+    return hashes
+
+  def BuildManifest(self, paths, base_dir='.', split_paths=(),
+                    shard_count=1, csv_header=True):
+    """Hashes local assets and stages them as blobs.
+
+    Args:
+      paths: List of files or directories to distribute.
+      base_dir: Directory that server-side paths are relative to.
+      split_paths: Files among paths to split into shards per server.
+      shard_count: Number of shards of split files, i.e. cluster size.
+      csv_header: Whether split files have header line.
+    Returns:
+      Manifest in dictionary of server-side relative path to list of blob
+      hashes.  Files not split have single hash.
+    """
+    if not os.path.isdir(self._cache_dir):
+      os.makedirs(self._cache_dir)
+    split_paths = set(os.path.abspath(p) for p in split_paths)
+
+    files = []
+    for path in paths:
+      if os.path.isdir(path):
+        for directory, _, names in os.walk(path):
+          files.extend(os.path.join(directory, n) for n in sorted(names))
+      else:
+        files.append(path)
+
+    manifest = {}
+    for path in files:
+      relative_path = os.path.relpath(path, base_dir)
+      if relative_path.startswith('..'):
+        raise ValueError('%s is not under %s' % (path, base_dir))
+      if os.path.abspath(path) in split_paths:
+        manifest[relative_path] = self._SplitCsv(path, shard_count,
+                                                 csv_header)
+      else:
+        manifest[relative_path] = [self._StageBlob(path)]
+    return manifest
+
+  def ListUploadedBlobs(self):
+    """Returns set of hashes of blobs already in Cloud Storage."""
+    process = subprocess.Popen(
+        'gsutil ls %s/' % self._blob_url, shell=True,
+        stdout=subprocess.PIPE, stderr=open(os.devnull, 'w'))
+    output = process.communicate()[0]
+    return set(line.rstrip('/').rsplit('/', 1)[-1]
+               for line in output.splitlines() if line.strip())
+
+  def UploadMissing(self, manifest):
+    """Uploads blobs that are not in Cloud Storage yet, in parallel.
+
+    Args:
+      manifest: Manifest returned by BuildManifest().
+    Returns:
+      List of hashes uploaded.
+    """
+    needed = set(h for hashes in manifest.values() for h in hashes)
+    missing = sorted(needed - self.ListUploadedBlobs())
+    logging.info('%d blob(s) in manifest, %d to upload.',
+                 len(needed), len(missing))
+    if missing:
+      command = 'gsutil -m cp %s %s/' % (
+          ' '.join(pipes.quote(os.path.join(self._cache_dir, h))
+                   for h in missing), self._blob_url)
+      if subprocess.call(command, shell=True):
+        raise IOError('Failed to upload blobs to %s' % self._blob_url)
+    return missing
+
+  def MakePullScript(self, manifest, index_offset=0, servers_per_node=1):
+    """Generates shell script for servers to pull assets.
+
+    The script downloads only blobs missing in the server's blob cache, in
+    parallel, and then links them into JMeter directory.  For split files,
+    the shard is chosen by 'id' instance metadata of the server.
+
+    Args:
+      manifest: Manifest returned by BuildManifest().
+      index_offset: Server ID of the first server of the cluster.
+      servers_per_node: Number of JMeter servers per instance, which share
+          the same shard.
+    Returns:
+      Shell script in string.
+    """
+    q = pipes.quote
+    lines = [
+        'set -e',
+        'ID=$(curl -s -H "Metadata-Flavor: Google" %s)' % METADATA_ID_URL,
+        'INDEX=$(((ID - %d) / %d))' % (index_offset, servers_per_node),
+        'BLOBS=%s/blobs' % SERVER_CACHE_DIR,
+        'sudo mkdir -p $BLOBS',
+        'sudo chmod 777 $BLOBS',
+    ]
+    links = []
+    for number, (path, hashes) in enumerate(sorted(manifest.items())):
+      if len(hashes) == 1:
+        lines.append('H%d=%s' % (number, hashes[0]))
+      else:
+        lines.append('SHARDS=(%s)' % ' '.join(hashes))
+        lines.append('H%d=${SHARDS[$((INDEX %% %d))]}' % (number, len(hashes)))
+      links.append('sudo mkdir -p "$(dirname %s)"' % q(path))
+      links.append('sudo ln -f $BLOBS/$H%d %s' % (number, q(path)))
+
+    needed = ' '.join('$H%d' % i for i in xrange(len(manifest)))
+    lines.extend([
+        'for h in %s; do' % needed,
+        '  [ -f $BLOBS/$h ] || echo %s/$h' % self._blob_url,
+        'done | sort -u > $BLOBS/.missing',
+        'if [ -s $BLOBS/.missing ]; then',
+        '  gsutil -m cp -I $BLOBS/ < $BLOBS/.missing',
+        'fi',
+        'cd %s' % SERVER_JMETER_DIR,
+    ])
+    return '\n'.join(lines + links) + '\n'
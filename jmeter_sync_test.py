@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of jmeter_sync.py."""
+
+
+
+import os
+import os.path
+import shutil
+import subprocess
+import tempfile
+import unittest
+
+import mock
+
+import jmeter_sync
+from jmeter_sync import AssetSync
+
+
+# Stand-ins of commands used by pull script on server.  gsutil copies from
+# local directory that plays Cloud Storage bucket.
+FAKE_COMMANDS = {
+    'curl': '#!/bin/bash\necho $FAKE_ID\n',
+    'sudo': '#!/bin/bash\nexec "$@"\n',
+    'gsutil': ('#!/bin/bash\n'
+               '# Usage: gsutil -m cp -I <dir>\n'
+               'while read url; do\n'
+               '  echo $url >> $FAKE_BUCKET/.downloads\n'
+               '  cp $FAKE_BUCKET/${url#gs://bucket/} $4\n'
+               'done\n'),
+}
+
+
+class AssetSyncTest(unittest.TestCase):
+  """Unit test class of AssetSync."""
+
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.local_dir = os.path.join(self.temp_dir, 'local')
+    self.cache_dir = os.path.join(self.temp_dir, 'cache')
+    os.makedirs(os.path.join(self.local_dir, 'plans'))
+    self._Write('plans/a.jmx', '<jmeterTestPlan/>')
+    self._Write('plans/b.jmx', '<jmeterTestPlan/>')
+    self._Write('users.csv', 'name\nu0\nu1\nu2\nu3\nu4\n')
+    self.asset_sync = AssetSync('gs://bucket', self.cache_dir)
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+    mock.patch.stopall()
+
+  def _Write(self, path, contents):
+    with open(os.path.join(self.local_dir, path), 'w') as f:
+      f.write(contents)
+
+  def _Path(self, path):
+    return os.path.join(self.local_dir, path)
+
+  def _ReadBlob(self, blob_hash):
+    with open(os.path.join(self.cache_dir, blob_hash)) as f:
+      return f.read()
+
+  def testBuildManifest(self):
+    manifest = self.asset_sync.BuildManifest(
+        [self._Path('plans'), self._Path('users.csv')],
+        base_dir=self.local_dir, split_paths=[self._Path('users.csv')],
+        shard_count=2)
+
+    self.assertEqual(['plans/a.jmx', 'plans/b.jmx', 'users.csv'],
+                     sorted(manifest))
+    # Identical contents are stored once.
+    self.assertEqual(manifest['plans/a.jmx'], manifest['plans/b.jmx'])
+    self.assertEqual(jmeter_sync.HashFile(self._Path('plans/a.jmx')),
+                     manifest['plans/a.jmx'][0])
+    self.assertEqual(2, len(manifest['users.csv']))
+    self.assertEqual('name\nu0\nu2\nu4\n',
+                     self._ReadBlob(manifest['users.csv'][0]))
+    self.assertEqual('name\nu1\nu3\n',
+                     self._ReadBlob(manifest['users.csv'][1]))
+    self.assertEqual(3, len(os.listdir(self.cache_dir)))
+
+  def testBuildManifest_FileEditedLater(self):
+    manifest = self.asset_sync.BuildManifest(
+        [self._Path('users.csv')], base_dir=self.local_dir)
+    with open(self._Path('users.csv'), 'r+') as f:
+      f.write('edited')
+
+    # Blob keeps the contents it was hashed from.
+    blob_hash = manifest['users.csv'][0]
+    self.assertEqual(blob_hash, jmeter_sync.HashFile(
+        os.path.join(self.cache_dir, blob_hash)))
+
+  def testBuildManifest_OutsideBaseDir(self):
+    self.assertRaises(ValueError, self.asset_sync.BuildManifest,
+                      [self._Path('users.csv')],
+                      base_dir=os.path.join(self.local_dir, 'plans'))
+
+  def testUploadMissing(self):
+    manifest = {'a.jmx': ['hash-a'], 'b.jmx': ['hash-b'],
+                'users.csv': ['hash-c', 'hash-d']}
+    mock_popen = mock.patch('subprocess.Popen').start()
+    mock_popen.return_value.communicate.return_value = (
+        'gs://bucket/blobs/hash-a\ngs://bucket/blobs/hash-c\n', '')
+    mock_call = mock.patch('subprocess.call', return_value=0).start()
+
+    self.assertEqual(['hash-b', 'hash-d'],
+                     self.asset_sync.UploadMissing(manifest))
+
+    command = mock_call.call_args[0][0]
+    self.assertTrue(command.startswith('gsutil -m cp '))
+    self.assertIn('hash-b', command)
+    self.assertIn('hash-d', command)
+    self.assertNotIn('hash-a', command)
+    self.assertTrue(command.endswith(' gs://bucket/blobs/'))
+
+  def testUploadMissing_NothingToUpload(self):
+    mock_popen = mock.patch('subprocess.Popen').start()
+    mock_popen.return_value.communicate.return_value = (
+        'gs://bucket/blobs/hash-a\n', '')
+    mock_call = mock.patch('subprocess.call').start()
+
+    self.assertEqual([], self.asset_sync.UploadMissing({'a': ['hash-a']}))
+    self.assertFalse(mock_call.called)
+
+  def _RunPullScript(self, script, server_id, server_dir):
+    """Runs pull script with fake commands and returns downloaded URLs."""
+    bin_dir = os.path.join(self.temp_dir, 'bin')
+    if not os.path.isdir(bin_dir):
+      os.makedirs(bin_dir)
+      for name, contents in FAKE_COMMANDS.items():
+        with open(os.path.join(bin_dir, name), 'w') as f:
+          f.write(contents)
+        os.chmod(os.path.join(bin_dir, name), 0755)
+    bucket = os.path.join(self.temp_dir, 'bucket')
+    if not os.path.isdir(bucket):
+      shutil.copytree(self.cache_dir, os.path.join(bucket, 'blobs'))
+    downloads = os.path.join(bucket, '.downloads')
+    if os.path.exists(downloads):
+      os.remove(downloads)
+    os.makedirs(server_dir)
+
+    env = dict(os.environ, PATH='%s:%s' % (bin_dir, os.environ['PATH']),
+               FAKE_ID=str(server_id), FAKE_BUCKET=bucket)
+    process = subprocess.Popen(['bash', '-s'], stdin=subprocess.PIPE,
+                               env=env)
+    process.communicate(script)
+    self.assertEqual(0, process.returncode)
+    if not os.path.exists(downloads):
+      return []
+    with open(downloads) as f:
+      return f.read().split()
+
+  def testMakePullScript(self):
+    manifest = self.asset_sync.BuildManifest(
+        [self._Path('plans/a.jmx'), self._Path('users.csv')],
+        base_dir=self.local_dir, split_paths=[self._Path('users.csv')],
+        shard_count=2)
+    mock.patch('jmeter_sync.SERVER_CACHE_DIR',
+               os.path.join(self.temp_dir, 'server-cache')).start()
+    server_dir = os.path.join(self.temp_dir, 'server-1')
+    mock.patch('jmeter_sync.SERVER_JMETER_DIR', server_dir).start()
+
+    # Server ID 6 with index offset 5 is the second server of the cluster.
+    script = self.asset_sync.MakePullScript(manifest, index_offset=5)
+    downloads = self._RunPullScript(script, 6, server_dir)
+
+    self.assertEqual(2, len(downloads))
+    with open(os.path.join(server_dir, 'plans', 'a.jmx')) as f:
+      self.assertEqual('<jmeterTestPlan/>', f.read())
+    with open(os.path.join(server_dir, 'users.csv')) as f:
+      self.assertEqual('name\nu1\nu3\n', f.read())
+
+    # Another server on the same host reuses the blob cache for the plan,
+    # and downloads only its own shard.
+    server_dir = os.path.join(self.temp_dir, 'server-0')
+    mock.patch('jmeter_sync.SERVER_JMETER_DIR', server_dir).start()
+    script = self.asset_sync.MakePullScript(manifest, index_offset=5)
+    downloads = self._RunPullScript(script, 5, server_dir)
+
+    self.assertEqual(['gs://bucket/blobs/%s' % manifest['users.csv'][0]],
+                     downloads)
+    with open(os.path.join(server_dir, 'users.csv')) as f:
+      self.assertEqual('name\nu0\nu2\nu4\n', f.read())
+
+  def testMakePullScript_ServersPerNode(self):
+    manifest = self.asset_sync.BuildManifest(
+        [self._Path('users.csv')], base_dir=self.local_dir,
+        split_paths=[self._Path('users.csv')], shard_count=2)
+    mock.patch('jmeter_sync.SERVER_CACHE_DIR',
+               os.path.join(self.temp_dir, 'server-cache')).start()
+    server_dir = os.path.join(self.temp_dir, 'server-1')
+    mock.patch('jmeter_sync.SERVER_JMETER_DIR', server_dir).start()
+
+    # Node ID 7 with 2 servers per node and index offset 5 is the second
+    # instance of the cluster.
+    script = self.asset_sync.MakePullScript(manifest, index_offset=5,
+                                            servers_per_node=2)
+    self._RunPullScript(script, 7, server_dir)
+
+    with open(os.path.join(server_dir, 'users.csv')) as f:
+      self.assertEqual('name\nu1\nu3\n', f.read())
+
+
+if __name__ == '__main__':
+  unittest.main()
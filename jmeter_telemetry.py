@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to analyze resource telemetry of JMeter servers.
+
+startup.sh samples CPU, memory, JVM GC pause and network throughput of each
+server periodically.  The module parses the samples, aligns them with the
+throughput timeline of run report, and detects servers whose saturation
+would skew latency numbers.
+"""
+
+
+
+TELEMETRY_FIELDS = ['timestamp', 'cpu', 'memory', 'gc_pause_ms',
+                    'net_rx', 'net_tx']
+
+# Default thresholds above which a sample counts as saturated.
+DEFAULT_THRESHOLDS = {
+    'cpu': 90,
+    'memory': 95,
+    # Fraction of wall time spent in GC pauses, in percent.
+    'gc_percent': 10,
+    # Bytes per second.  Roughly 80% of 1 Gbps.
+    'net': 100 * 1000 * 1000,
+}
+
+
+def ParseTelemetry(contents):
+  """Parses telemetry file written by startup.sh.
+
+  Args:
+    contents: Contents of the telemetry file in string.
+  Returns:
+    List of samples in dictionary with keys of TELEMETRY_FIELDS, sorted by
+    timestamp.  'gc_percent' is added, which is the percentage of time spent
+    in GC pause since the previous sample.
+  """
+  samples = []
+  for line in contents.splitlines():
+    values = line.strip().split(',')
+    if len(values) != len(TELEMETRY_FIELDS):
+      continue
+    try:
+      samples.append(dict(zip(TELEMETRY_FIELDS, [int(v) for v in values])))
+    except ValueError:
+      continue
+  samples.sort(key=lambda s: s['timestamp'])
+
+  for i, sample in enumerate(samples):
+    interval = (sample['timestamp'] - samples[i - 1]['timestamp']
+                if i else 0)
+    sample['gc_percent'] = (100.0 * sample['gc_pause_ms'] / interval
+                            if interval > 0 else 0.0)
+  return samples
+
+
+def AlignToTimeline(samples, start_ms, bucket_count, bucket_seconds=1):
+  """Aligns samples of a server with throughput timeline of run report.
+
+  Each bucket gets the latest sample taken at or before the end of the
+  bucket, so that buckets between samples repeat the last known value.
+
+  Args:
+    samples: List of samples returned by ParseTelemetry().
+    start_ms: Start time of the timeline in milliseconds.
+    bucket_count: Number of buckets in the timeline.
+    bucket_seconds: Width of the bucket in seconds.
+  Returns:
+    Dictionary of metric name to list of values per bucket.  None for
+    buckets before the first sample.
+  """
+  metrics = ['cpu', 'memory', 'gc_percent', 'net_rx', 'net_tx']
+  series = dict((m, []) for m in metrics)
+  position = -1
+  for bucket in xrange(bucket_count):
+    bucket_end = start_ms + (bucket + 1) * bucket_seconds * 1000
+    while (position + 1 < len(samples) and
+           samples[position + 1]['timestamp'] < bucket_end):
+      position += 1
+    for metric in metrics:
+      series[metric].append(samples[position][metric]
+                            if position >= 0 else None)
+  return series
+
+
+def DetectSaturation(samples_by_server, thresholds=None,
+                     min_fraction=0.2, start_ms=None, end_ms=None):
+  """Detects servers whose resources are saturated.
+
+  A server is saturated on a metric when more than min_fraction of its
+  samples during the test are at or above the threshold.
+
+  Args:
+    samples_by_server: Dictionary of server name to list of samples.
+    thresholds: Dictionary of thresholds, as DEFAULT_THRESHOLDS.
+    min_fraction: Fraction of saturated samples to flag the server.
+    start_ms: Start time of the test.  None to use all samples.
+    end_ms: End time of the test.  None to use all samples.
+  Returns:
+    List of findings in dictionary, which has 'server', 'metric',
+    'fraction' (of saturated samples), 'peak' and 'threshold'.
+  """
+  limits = dict(DEFAULT_THRESHOLDS)
+  limits.update(thresholds or {})
+  findings = []
+  for server, samples in sorted(samples_by_server.items()):
+    samples = [s for s in samples
+               if (start_ms is None or s['timestamp'] >= start_ms) and
+               (end_ms is None or s['timestamp'] <= end_ms)]
+    if not samples:
+      continue
+    for metric, limit in sorted(limits.items()):
+      if metric == 'net':
+        values = [max(s['net_rx'], s['net_tx']) for s in samples]
+      else:
+        values = [s[metric] for s in samples]
+      saturated = len([v for v in values if v >= limit])
+      fraction = float(saturated) / len(values)
+      if fraction > min_fraction:
+        findings.append({'server': server, 'metric': metric,
+                         'fraction': fraction, 'peak': max(values),
+                         'threshold': limit})
+  return findings
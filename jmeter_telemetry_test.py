@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of jmeter_telemetry.py."""
+
+
+
+import unittest
+
+import jmeter_telemetry
+
+
+def _MakeSamples(cpu_values, start_ms=1000000, interval_ms=5000,
+                 gc_pause_ms=0):
+  return [{'timestamp': start_ms + i * interval_ms, 'cpu': cpu,
+           'memory': 50, 'gc_pause_ms': gc_pause_ms,
+           'gc_percent': 100.0 * gc_pause_ms / interval_ms,
+           'net_rx': 1000, 'net_tx': 2000}
+          for i, cpu in enumerate(cpu_values)]
+
+
+class JMeterTelemetryTest(unittest.TestCase):
+  """Unit test class of JMeter server telemetry."""
+
+  def testParseTelemetry(self):
+    samples = jmeter_telemetry.ParseTelemetry(
+        '1005000,80,40,500,1000,2000\n'
+        '1000000,20,40,0,1000,2000\n'
+        'garbage line\n'
+        '1010000,95,41,1000,3000,4000\n'
+        '1015000,9')
+
+    self.assertEqual([1000000, 1005000, 1010000],
+                     [s['timestamp'] for s in samples])
+    self.assertEqual([20, 80, 95], [s['cpu'] for s in samples])
+    self.assertEqual([0.0, 10.0, 20.0], [s['gc_percent'] for s in samples])
+    self.assertEqual(3000, samples[2]['net_rx'])
+
+  def testAlignToTimeline(self):
+    samples = _MakeSamples([10, 20, 30], start_ms=1002000)
+
+    series = jmeter_telemetry.AlignToTimeline(samples, 1000000, 12)
+
+    # Samples at 1002000, 1007000 and 1012000.
+    self.assertEqual([None, None, 10, 10, 10, 10, 10, 20, 20, 20, 20, 20],
+                     series['cpu'])
+    self.assertEqual(12, len(series['net_tx']))
+
+  def testDetectSaturation(self):
+    samples_by_server = {
+        'foo-000': _MakeSamples([50, 60, 55, 40, 50]),
+        'foo-001': _MakeSamples([95, 99, 97, 60, 92]),
+        'foo-002': _MakeSamples([50, 50, 50, 50, 50], gc_pause_ms=1000),
+    }
+
+    findings = jmeter_telemetry.DetectSaturation(samples_by_server)
+
+    self.assertEqual([('foo-001', 'cpu'), ('foo-002', 'gc_percent')],
+                     [(f['server'], f['metric']) for f in findings])
+    self.assertEqual(0.8, findings[0]['fraction'])
+    self.assertEqual(99, findings[0]['peak'])
+
+  def testDetectSaturation_TimeRange(self):
+    samples_by_server = {'foo-000': _MakeSamples([99, 99, 10, 10, 10])}
+
+    # Saturation before the test started doesn't count.
+    self.assertEqual([], jmeter_telemetry.DetectSaturation(
+        samples_by_server, start_ms=1010000))
+    self.assertEqual(1, len(jmeter_telemetry.DetectSaturation(
+        samples_by_server, thresholds={'cpu': 10}, start_ms=1010000)))
+
+
+if __name__ == '__main__':
+  unittest.main()
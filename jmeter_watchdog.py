@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to watch health of JMeter servers during a run.
+
+Each node of the cluster is checked periodically in 2 ways:
+  - Instance status by Compute Engine API, at a bounded rate shared by all
+    nodes.  Instance that is not RUNNING has failed.
+  - RMI registry of each JMeter server on the node, through its SSH tunnel.
+    Connecting to the local end of the tunnel always succeeds, so the RMI
+    handshake is made to check the server is really there.  Server that
+    doesn't respond in consecutive checks has failed.
+
+Failed node is replaced at the same cluster index, so that the replacement
+has the same server IDs and ports.  The JMeter client doesn't add servers to
+the test in progress, so capacity lost by failed node is lost until the end
+of the run, and the replacement serves the next runs.  Capacity gaps are
+recorded for the run report.
+"""
+
+
+
+import logging
+import socket
+import threading
+import time
+
+from gce_api import RateLimiter
+
+
+# File in run directory to write capacity gaps to.
+GAPS_FILE = 'capacity_gaps.json'
+DEFAULT_INTERVAL = 30.0
+DEFAULT_API_RATE = 1.0
+DEFAULT_FAILURE_THRESHOLD = 2
+DEFAULT_CONNECT_TIMEOUT = 5.0
+DEFAULT_REPLACE_TIMEOUT = 600.0
+DEFAULT_STOP_TIMEOUT = 30.0
+
+# Java RMI stream protocol header: magic, version 2 and StreamProtocol.
+# RMI registry answers with ProtocolAck.
+RMI_HANDSHAKE = 'JRMI\x00\x02K'
+RMI_PROTOCOL_ACK = 'N'
+
+
+def CheckRmiPort(port, host='127.0.0.1', timeout=DEFAULT_CONNECT_TIMEOUT):
+  """Checks whether RMI registry responds on the port.
+
+  Args:
+    port: Port number of RMI registry.
+    host: Host name to connect to.
+    timeout: Seconds to wait for connection and response.
+  Returns:
+    Boolean to indicate whether RMI registry responded.
+  """
+  sock = None
+  try:
+    sock = socket.create_connection((host, port), timeout)
+    sock.sendall(RMI_HANDSHAKE)
+    return sock.recv(1) == RMI_PROTOCOL_ACK
+  except (socket.error, socket.timeout):
+    return False
+  finally:
+    if sock:
+      sock.close()
+
+
+def _NowMs():
+  return int(time.time() * 1000)
+
+
+class Watchdog(object):
+  """Thread to check health of nodes and replace failed ones."""
+
+  def __init__(self, nodes, get_instance, replace_node,
+               api_rate=DEFAULT_API_RATE, interval=DEFAULT_INTERVAL,
+               failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+               check_port=CheckRmiPort, stop_timeout=DEFAULT_STOP_TIMEOUT):
+    """Constructor.
+
+    Args:
+      nodes: Dictionary of cluster index to tuple of instance name and list
+          of local ports of RMI registries of JMeter servers on the node.
+      get_instance: Function that takes instance name and returns instance
+          resource, or None if not found, as GceApi.GetInstance().
+      replace_node: Function that takes cluster index, replaces the node
+          and returns the name of the new instance.
+      api_rate: Number of instance status requests per second.
+      interval: Seconds between checks of each node.
+      failure_threshold: Number of consecutive checks in which JMeter server
+          doesn't respond, before the node is regarded as failed.
+      check_port: Function that takes port number and returns whether the
+          JMeter server responds on it.
+      stop_timeout: Seconds Stop() waits for replacement in progress.
+    """
+    self.nodes = dict(nodes)
+    self._get_instance = get_instance
+    self._replace_node = replace_node
+    self._rate_limiter = RateLimiter(api_rate)
+    self._interval = interval
+    self._failure_threshold = failure_threshold
+    self._check_port = check_port
+    self._stop_timeout = stop_timeout
+    # Cluster index to number of consecutive failed port checks.
+    self._failures = {}
+    # Cluster index to open capacity gap.
+    self._open_gaps = {}
+    # Indexes of replacements whose JMeter servers have not responded yet.
+    # They are still starting up, and are not checked for failure.
+    self._starting = set()
+    self.gaps = []
+    # Guards gaps, which Stop() copies while replacement may be in progress.
+    self._gaps_lock = threading.Lock()
+    self._stop = threading.Event()
+    self._thread = None
+
+  def _CheckNode(self, index):
+    """Checks the node of the cluster index.
+
+    Returns:
+      Reason of failure in string, or None if the node is healthy.  Unless
+      the instance has stopped, failure is reported only after
+      failure_threshold consecutive failed checks.
+    """
+    instance_name, ports = self.nodes[index]
+    self._rate_limiter.Acquire()
+    instance = self._get_instance(instance_name)
+    status = instance['status'] if instance else 'NOT FOUND'
+    if status != 'RUNNING':
+      return 'instance %s' % status
+    down = [port for port in ports if not self._check_port(port)]
+    if not down:
+      self._failures[index] = 0
+      self._starting.discard(index)
+      return None
+    if index in self._starting:
+      logging.info('Waiting for JMeter server on %s', instance_name)
+      return None
+    self._failures[index] = self._failures.get(index, 0) + 1
+    logging.warning('JMeter server on %s not responding on port(s) %s',
+                    instance_name, ', '.join(str(p) for p in down))
+    if self._failures[index] < self._failure_threshold:
+      return None
+    return 'server not responding on port(s) %s' % (
+        ', '.join(str(p) for p in down))
+
+  def CheckOnce(self):
+    """Checks all nodes once, and replaces failed nodes."""
+    for index in sorted(self.nodes):
+      if self._stop.is_set():
+        return
+      reason = self._CheckNode(index)
+      gap = self._open_gaps.get(index)
+      if reason is None:
+        if (gap and index not in self._starting and
+            self._failures.get(index, 0) == 0):
+          gap['recovered_ms'] = _NowMs()
+          logging.info('Node %d recovered on %s', index,
+                       self.nodes[index][0])
+          del self._open_gaps[index]
+        continue
+      if not gap:
+        instance_name, ports = self.nodes[index]
+        gap = {'index': index, 'instance': instance_name,
+               'servers': len(ports), 'reason': reason,
+               'down_ms': _NowMs(), 'recovered_ms': None,
+               'replacement': None}
+        self._open_gaps[index] = gap
+        with self._gaps_lock:
+          self.gaps.append(gap)
+      logging.error('Node %d (%s) failed: %s.  Replacing it.', index,
+                    self.nodes[index][0], reason)
+      try:
+        replacement = self._replace_node(index)
+      except (Exception, SystemExit):  # pylint: disable=broad-except
+        logging.exception('Failed to replace node %d', index)
+        continue
+      with self._gaps_lock:
+        gap['replacement'] = replacement
+      self.nodes[index] = (replacement, self.nodes[index][1])
+      self._failures[index] = 0
+      self._starting.add(index)
+
+  def _Loop(self):
+    while not self._stop.is_set():
+      try:
+        self.CheckOnce()
+      except Exception:  # pylint: disable=broad-except
+        logging.exception('Watchdog check failed')
+      self._stop.wait(self._interval)
+
+  def Start(self):
+    """Starts checking nodes in background."""
+    self._thread = threading.Thread(target=self._Loop)
+    self._thread.daemon = True
+    self._thread.start()
+
+  def Stop(self):
+    """Stops checking nodes.
+
+    Replacement in progress is waited for up to stop_timeout seconds.  If
+    it doesn't finish by then, its gap is reported as not replaced.
+
+    Returns:
+      List of capacity gaps.  Each gap is dictionary with 'index',
+      'instance', 'servers' (number of JMeter servers on the node),
+      'reason', 'down_ms', 'recovered_ms' (None if the node didn't recover)
+      and 'replacement' (name of the new instance, or None).
+    """
+    self._stop.set()
+    if self._thread:
+      self._thread.join(self._stop_timeout)
+      if self._thread.is_alive():
+        logging.warning('Stopped waiting for replacement in progress.')
+    with self._gaps_lock:
+      return [dict(gap) for gap in self.gaps]
+
+
+def SummarizeGaps(gaps, total_servers, start_ms, end_ms):
+  """Summarizes capacity lost by failed nodes during a run.
+
+  Servers of failed node count as lost until the end of the run, even if the
+  node was replaced, because the JMeter client doesn't add the replacement
+  to the test in progress.
+
+  Args:
+    gaps: List of capacity gaps returned by Watchdog.Stop().
+    total_servers: Number of JMeter servers of the cluster.
+    start_ms: Start time of the run in epoch milliseconds.
+    end_ms: End time of the run in epoch milliseconds.
+  Returns:
+    Dictionary with 'gaps', 'failed_nodes', 'lost_server_seconds' and
+    'capacity_lost' (fraction of server time of the run that was lost).
+  """
+  lost = 0.0
+  for gap in gaps:
+    lost += gap['servers'] * max(0, end_ms - gap['down_ms']) / 1000.0
+  total = total_servers * max(0, end_ms - start_ms) / 1000.0
+  return {
+      'gaps': gaps,
+      'failed_nodes': len(set(gap['index'] for gap in gaps)),
+      'lost_server_seconds': lost,
+      'capacity_lost': lost / total if total else 0.0,
+      'start_ms': start_ms,
+      'end_ms': end_ms,
+  }
+
+
+def FormatGaps(summary):
+  """Returns human readable capacity gaps in string.
+
+  Args:
+    summary: Dictionary returned by SummarizeGaps().
+  """
+  lines = ['%d node(s) failed during the run: %.0f server-seconds lost '
+           '(%.1f%% of capacity)' % (summary['failed_nodes'],
+                                     summary['lost_server_seconds'],
+                                     summary['capacity_lost'] * 100)]
+  for gap in summary['gaps']:
+    lines.append('  node %d %s at %+.0fs: %s -> %s' % (
+        gap['index'], gap['instance'],
+        (gap['down_ms'] - summary['start_ms']) / 1000.0, gap['reason'],
+        gap['replacement'] or 'not replaced'))
+  return '\n'.join(lines)
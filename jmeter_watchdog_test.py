@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of jmeter_watchdog.py."""
+
+
+
+import socket
+import threading
+import unittest
+
+import mock
+
+import jmeter_watchdog
+from jmeter_watchdog import Watchdog
+
+
+class JMeterWatchdogTest(unittest.TestCase):
+  """Unit test class of server watchdog."""
+
+  def setUp(self):
+    self.status = {'foo-000': 'RUNNING', 'foo-001': 'RUNNING'}
+    self.ports_up = set([24000, 24001, 24002, 24003])
+    self.replace_node = mock.Mock(side_effect=lambda index: 'new-%d' % index)
+    self.watchdog = Watchdog(
+        {0: ('foo-000', [24000, 24001]), 1: ('foo-001', [24002, 24003])},
+        self._GetInstance, self.replace_node, api_rate=1000,
+        failure_threshold=2, check_port=lambda port: port in self.ports_up)
+
+  def tearDown(self):
+    mock.patch.stopall()
+
+  def _GetInstance(self, name):
+    if name not in self.status:
+      return None
+    return {'name': name, 'status': self.status[name]}
+
+  def testCheckOnce_Healthy(self):
+    self.watchdog.CheckOnce()
+
+    self.assertFalse(self.replace_node.called)
+    self.assertEqual([], self.watchdog.gaps)
+
+  def testCheckOnce_InstanceStopped(self):
+    self.status['foo-001'] = 'TERMINATED'
+
+    self.watchdog.CheckOnce()
+
+    self.replace_node.assert_called_once_with(1)
+    self.assertEqual(1, len(self.watchdog.gaps))
+    gap = self.watchdog.gaps[0]
+    self.assertEqual(1, gap['index'])
+    self.assertEqual('foo-001', gap['instance'])
+    self.assertEqual(2, gap['servers'])
+    self.assertEqual('instance TERMINATED', gap['reason'])
+    self.assertEqual('new-1', gap['replacement'])
+    self.assertEqual(('new-1', [24002, 24003]), self.watchdog.nodes[1])
+
+  def testCheckOnce_ServerDown(self):
+    self.ports_up.remove(24001)
+
+    # The first failed check may be transient.
+    self.watchdog.CheckOnce()
+    self.assertFalse(self.replace_node.called)
+
+    self.watchdog.CheckOnce()
+    self.replace_node.assert_called_once_with(0)
+    self.assertEqual('server not responding on port(s) 24001',
+                     self.watchdog.gaps[0]['reason'])
+
+  def testCheckOnce_TransientFailure(self):
+    self.ports_up.remove(24001)
+    self.watchdog.CheckOnce()
+    self.ports_up.add(24001)
+    self.watchdog.CheckOnce()
+    self.ports_up.remove(24001)
+    self.watchdog.CheckOnce()
+
+    self.assertFalse(self.replace_node.called)
+
+  def testCheckOnce_ReplacementStartingAndRecovered(self):
+    self.status['foo-000'] = 'TERMINATED'
+    self.status['new-0'] = 'RUNNING'
+    self.ports_up.difference_update([24000, 24001])
+    self.watchdog.CheckOnce()
+
+    # JMeter servers on the replacement take time to start.
+    for _ in xrange(3):
+      self.watchdog.CheckOnce()
+    self.assertEqual(1, self.replace_node.call_count)
+    self.assertEqual(None, self.watchdog.gaps[0]['recovered_ms'])
+
+    self.ports_up.update([24000, 24001])
+    self.watchdog.CheckOnce()
+    self.assertTrue(self.watchdog.gaps[0]['recovered_ms'])
+
+  def testCheckOnce_ReplacementFails(self):
+    self.status['foo-000'] = 'TERMINATED'
+    self.replace_node.side_effect = SystemExit(1)
+
+    self.watchdog.CheckOnce()
+    self.watchdog.CheckOnce()
+
+    # One gap is kept open while replacement is retried.
+    self.assertEqual(2, self.replace_node.call_count)
+    self.assertEqual(1, len(self.watchdog.gaps))
+    self.assertEqual(None, self.watchdog.gaps[0]['replacement'])
+
+  def testStartStop(self):
+    checked = threading.Event()
+    self.status['foo-001'] = 'TERMINATED'
+    self.replace_node.side_effect = lambda index: checked.set() or 'new-1'
+
+    self.watchdog.Start()
+    checked.wait(5)
+    gaps = self.watchdog.Stop()
+
+    self.assertEqual(['new-1'], [g['replacement'] for g in gaps])
+
+  def testStop_ReplacementInProgress(self):
+    replacing = threading.Event()
+    release = threading.Event()
+    self.status['foo-001'] = 'TERMINATED'
+    self.replace_node.side_effect = (
+        lambda index: replacing.set() or release.wait(5) and 'new-1')
+    watchdog = Watchdog(
+        self.watchdog.nodes, self._GetInstance, self.replace_node,
+        api_rate=1000, check_port=lambda port: port in self.ports_up,
+        stop_timeout=0.1)
+
+    watchdog.Start()
+    replacing.wait(5)
+    gaps = watchdog.Stop()
+    release.set()
+
+    # Stop() doesn't wait for the replacement to finish.
+    self.assertEqual([None], [g['replacement'] for g in gaps])
+
+  def testCheckRmiPort(self):
+    mock_socket = mock.patch(
+        'socket.create_connection').start().return_value
+    mock_socket.recv.return_value = 'N'
+
+    self.assertTrue(jmeter_watchdog.CheckRmiPort(24000))
+    mock_socket.sendall.assert_called_once_with('JRMI\x00\x02K')
+    mock_socket.close.assert_called_once_with()
+
+  def testCheckRmiPort_TunnelWithoutServer(self):
+    # SSH tunnel accepts connection and closes it if nothing listens.
+    mock_socket = mock.patch(
+        'socket.create_connection').start().return_value
+    mock_socket.recv.return_value = ''
+
+    self.assertFalse(jmeter_watchdog.CheckRmiPort(24000))
+
+  def testCheckRmiPort_Refused(self):
+    mock.patch('socket.create_connection',
+               side_effect=socket.error('refused')).start()
+
+    self.assertFalse(jmeter_watchdog.CheckRmiPort(24000))
+
+  def testSummarizeGaps(self):
+    summary = jmeter_watchdog.SummarizeGaps(
+        [{'index': 1, 'instance': 'foo-001', 'servers': 2,
+          'reason': 'instance TERMINATED', 'down_ms': 61000,
+          'recovered_ms': 200000, 'replacement': 'foo-001'}],
+        4, 1000, 121000)
+
+    self.assertEqual(1, summary['failed_nodes'])
+    # Lost until the end of the run, though the node recovered.
+    self.assertEqual(120.0, summary['lost_server_seconds'])
+    self.assertEqual(0.25, summary['capacity_lost'])
+    self.assertIn('node 1 foo-001 at +60s: instance TERMINATED -> foo-001',
+                  jmeter_watchdog.FormatGaps(summary))
+
+  def testSummarizeGaps_NoGaps(self):
+    summary = jmeter_watchdog.SummarizeGaps([], 4, 1000, 1000)
+
+    self.assertEqual(0, summary['failed_nodes'])
+    self.assertEqual(0.0, summary['capacity_lost'])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Module to run a weighted mix of test plans on one cluster.
+
+Workloads are declared in a workload spec file in JSON format.  Paths of
+plans are relative to the spec file.
+
+  {
+    "workloads": [
+      {"name": "browse", "plan": "browse.jmx", "weight": 70},
+      {"name": "search", "plan": "search.jmx", "weight": 20, "threads": 50},
+      {"name": "checkout", "plan": "checkout.jmx", "weight": 10}
+    ]
+  }
+
+JMeter servers are assigned to workloads by weight.  The client sends the
+same test plan to all servers, so the plans are combined into one plan, in
+which thread count of each thread group is read from JMeter property keyed
+by workload and server port.  The client passes the properties to all
+servers, so that each server runs only the thread groups of its workload.
+"threads" sets number of threads per server of the workload, spread over
+its thread groups in proportion.  Without it, the plan's own thread counts
+are used.
+
+Sampler labels are prefixed with the workload name, so that results are
+aggregated per workload.
+"""
+
+
+
+import copy
+import json
+import os
+import re
+import xml.etree.ElementTree as ElementTree
+
+
+# File in run directory to write assignment of servers to.
+WORKLOADS_FILE = 'workloads.json'
+# JMeter property of thread count multiplier, by workload and server port.
+SCALE_PROPERTY = 'jmeter_cluster.scale.%s.%d'
+# Server port is in the properties file of each server.
+SCALE_EXPRESSION = '${__P(jmeter_cluster.scale.%s.${__P(server_port,0)},0)}'
+LABEL_FORMAT = '[%s] %s'
+LABEL_PATTERN = re.compile(r'^\[([A-Za-z0-9_-]+)\] ')
+NAME_PATTERN = re.compile(r'^[A-Za-z0-9_-]+$')
+NUM_THREADS = 'ThreadGroup.num_threads'
+USER_DEFINED_VARIABLES = 'TestPlan.user_defined_variables'
+
+
+class WorkloadSpecError(Exception):
+  """Error in workload spec file or its test plans."""
+
+
+def ParseWorkloadSpec(spec, base_dir='.'):
+  """Parses workload spec.
+
+  Args:
+    spec: Workload spec in dictionary.
+    base_dir: Directory that paths of plans are relative to.
+  Returns:
+    List of dictionaries with 'name', 'plan', 'weight' and 'threads' (None
+    to use thread counts of the plan).
+  Raises:
+    WorkloadSpecError: The spec is malformed.
+  """
+  entries = spec.get('workloads')
+  if not entries:
+    raise WorkloadSpecError('Workload spec has no workloads.')
+  workloads = []
+  names = set()
+  for ordinal, entry in enumerate(entries):
+    unknown = set(entry) - set(['name', 'plan', 'weight', 'threads'])
+    if unknown:
+      raise WorkloadSpecError('Unknown key(s) in workload spec: %s' %
+                              ', '.join(sorted(unknown)))
+    name = entry.get('name')
+    if not name or not NAME_PATTERN.match(name):
+      raise WorkloadSpecError(
+          'Workload #%d needs name of letters, digits, "_" and "-".' %
+          ordinal)
+    if name in names:
+      raise WorkloadSpecError('Duplicate workload: %s' % name)
+    names.add(name)
+    if not entry.get('plan'):
+      raise WorkloadSpecError('Workload %s has no plan.' % name)
+    weight = entry.get('weight', 1)
+    threads = entry.get('threads')
+    if (not isinstance(weight, (int, float)) or weight <= 0 or
+        threads is not None and (not isinstance(threads, int) or
+                                 threads <= 0)):
+      raise WorkloadSpecError('Workload %s needs positive weight and '
+                              'threads.' % name)
+    workloads.append({'name': name,
+                      'plan': os.path.join(base_dir, entry['plan']),
+                      'weight': weight, 'threads': threads})
+  return workloads
+
+
+def LoadWorkloadSpec(spec_file):
+  """Loads workload spec from JSON file.
+
+  Returns:
+    List of workloads as ParseWorkloadSpec() returns.
+  Raises:
+    WorkloadSpecError: The spec is malformed.
+  """
+  with open(spec_file) as f:
+    try:
+      spec = json.load(f)
+    except ValueError as e:
+      raise WorkloadSpecError('Invalid JSON in %s: %s' % (spec_file, e))
+  return ParseWorkloadSpec(spec, os.path.dirname(spec_file))
+
+
+def AssignServers(workloads, server_count):
+  """Assigns servers to workloads in proportion to their weights.
+
+  Each workload gets at least one server, and the rest are distributed by
+  largest remainder, so that all servers are used.  Servers of a workload
+  have consecutive indexes.
+
+  Args:
+    workloads: List of workloads returned by ParseWorkloadSpec().
+    server_count: Number of JMeter servers of the cluster.
+  Returns:
+    List of workload names by server index.
+  Raises:
+    WorkloadSpecError: There are fewer servers than workloads.
+  """
+  if server_count < len(workloads):
+    raise WorkloadSpecError('%d workload(s) need at least as many servers, '
+                            'but the cluster has %d.' % (len(workloads),
+                                                         server_count))
+  total_weight = float(sum(w['weight'] for w in workloads))
+  shares = [w['weight'] / total_weight * server_count for w in workloads]
+  counts = [max(1, int(share)) for share in shares]
+  # Remainders by largest fractional part, ties by order of the spec.
+  indexes = range(len(workloads))
+  while sum(counts) < server_count:
+    counts[min(indexes, key=lambda i: (counts[i] - shares[i], i))] += 1
+  # Workloads raised to the minimum of one server may exceed the total.
+  while sum(counts) > server_count:
+    counts[min([i for i in indexes if counts[i] > 1],
+               key=lambda i: (shares[i] - counts[i], i))] -= 1
+  assignment = []
+  for workload, count in zip(workloads, counts):
+    assignment.extend([workload['name']] * count)
+  return assignment
+
+
+def MakeLabel(workload, label):
+  return LABEL_FORMAT % (workload, label)
+
+
+def GetWorkload(label):
+  """Returns workload name of sample label, or None."""
+  match = LABEL_PATTERN.match(label)
+  return match.group(1) if match else None
+
+
+def _Pairs(tree):
+  """Returns list of tuples of element and its hashTree in the tree."""
+  children = list(tree)
+  return [(children[i], children[i + 1] if i + 1 < len(children) and
+           children[i + 1].tag == 'hashTree' else None)
+          for i in xrange(len(children)) if children[i].tag != 'hashTree']
+
+
+def _IsThreadGroup(element):
+  return element.tag.endswith('ThreadGroup')
+
+
+def _PrefixLabels(tree, workload):
+  """Prefixes labels of samplers and transactions in the tree."""
+  for element in tree.iter():
+    testclass = element.get('testclass', '')
+    if 'Sampler' in testclass or testclass == 'TransactionController':
+      element.set('testname', MakeLabel(workload, element.get('testname',
+                                                               '')))
+
+
+def _ReadPlan(plan_path):
+  """Reads test plan.
+
+  Returns:
+    Tuple of ElementTree of the plan, its TestPlan element and the hashTree
+    of elements under the TestPlan element.
+  """
+  try:
+    document = ElementTree.parse(plan_path)
+  except (IOError, SyntaxError) as e:
+    raise WorkloadSpecError('Failed to read %s: %s' % (plan_path, e))
+  root_tree = document.getroot().find('hashTree')
+  if root_tree is None or root_tree.find('TestPlan') is None:
+    raise WorkloadSpecError('%s is not a JMeter test plan' % plan_path)
+  plan_tree = root_tree.find('hashTree')
+  if plan_tree is None:
+    plan_tree = ElementTree.Element('hashTree')
+  return document, root_tree.find('TestPlan'), plan_tree
+
+
+def _MergeVariables(test_plan, other, plan_path):
+  """Adds user defined variables of other TestPlan element to test_plan."""
+  path = "elementProp[@name='%s']/collectionProp" % USER_DEFINED_VARIABLES
+  other_collection = other.find(path)
+  if other_collection is None:
+    return
+  if test_plan.find(path) is None:
+    test_plan.append(copy.deepcopy(other.find(
+        "elementProp[@name='%s']" % USER_DEFINED_VARIABLES)))
+    return
+  collection = test_plan.find(path)
+
+  def Variables(collection):
+    return dict((v.get('name'), v) for v in collection)
+
+  existing = Variables(collection)
+  for name, variable in sorted(Variables(other_collection).items()):
+    if name not in existing:
+      collection.append(copy.deepcopy(variable))
+    elif (ElementTree.tostring(existing[name]) !=
+          ElementTree.tostring(variable)):
+      raise WorkloadSpecError('Variable %s of %s differs from other workload '
+                              'plan' % (name, plan_path))
+
+
+def _SetThreads(group, workload, scale_threads):
+  """Makes thread count of the thread group depend on the server.
+
+  Args:
+    group: Thread group element.
+    workload: Name of the workload.
+    scale_threads: Whether the thread count is multiplied by the scale, or
+        the group runs as is on servers of the workload, e.g. setUp Thread
+        Group.
+  """
+  num_threads = group.find("stringProp[@name='%s']" % NUM_THREADS)
+  if num_threads is None:
+    raise WorkloadSpecError('Thread group %s has no %s' % (
+        group.get('testname'), NUM_THREADS))
+  scale = SCALE_EXPRESSION % workload
+  # Functions nested in the expression are evaluated before __javaScript(),
+  # including those in the original thread count.
+  if scale_threads:
+    num_threads.text = '${__javaScript(Math.round(%s * %s))}' % (
+        num_threads.text, scale)
+  else:
+    num_threads.text = '${__javaScript(%s > 0 ? %s : 0)}' % (
+        scale, num_threads.text)
+
+
+def _CountThreads(plan_tree):
+  """Returns total thread count of thread groups, or None if not numeric."""
+  total = 0
+  for element, _ in _Pairs(plan_tree):
+    if element.tag == 'ThreadGroup':
+      num_threads = element.find("stringProp[@name='%s']" % NUM_THREADS)
+      if num_threads is None or not (num_threads.text or '').isdigit():
+        return None
+      total += int(num_threads.text)
+  return total
+
+
+def BuildPlan(workloads, output_path):
+  """Writes test plan that combines the plans of the workloads.
+
+  Each thread group is renamed after its workload, and gets copies of
+  plan-level elements of its plan, such as config elements and listeners,
+  so that they keep applying to the plan only.  Test fragments stay at plan
+  level.
+
+  Args:
+    workloads: List of workloads returned by ParseWorkloadSpec().
+    output_path: Path to write the combined plan to.
+  Returns:
+    Dictionary of workload name to thread count multiplier, to pass to
+    MakeJMeterArgs().
+  Raises:
+    WorkloadSpecError: Plan can't be read or combined.
+  """
+  document = None
+  combined_tree = None
+  scales = {}
+  for workload in workloads:
+    name = workload['name']
+    plan_document, test_plan, plan_tree = _ReadPlan(workload['plan'])
+    if document is None:
+      document = plan_document
+      combined_tree = ElementTree.Element('hashTree')
+      root_tree = document.getroot().find('hashTree')
+      old_tree = root_tree.find('hashTree')
+      if old_tree is not None:
+        root_tree.remove(old_tree)
+      root_tree.append(combined_tree)
+      combined_plan = test_plan
+      combined_plan.set('testname', 'jmeter_cluster workloads')
+    else:
+      _MergeVariables(combined_plan, test_plan, workload['plan'])
+
+    scales[name] = 1.0
+    if workload['threads']:
+      total = _CountThreads(plan_tree)
+      if not total:
+        raise WorkloadSpecError('Threads of %s can\'t be set, as thread '
+                                'counts of the plan are not numbers.' % name)
+      scales[name] = float(workload['threads']) / total
+
+    pairs = _Pairs(plan_tree)
+    shared = [(e, t) for e, t in pairs if not _IsThreadGroup(e) and
+              e.tag != 'TestFragmentController']
+    groups = 0
+    for element, tree in pairs:
+      if tree is None:
+        tree = ElementTree.Element('hashTree')
+      if _IsThreadGroup(element):
+        groups += 1
+        element.set('testname', MakeLabel(name, element.get('testname', '')))
+        _SetThreads(element, name, element.tag == 'ThreadGroup')
+        for index, (shared_element, shared_tree) in enumerate(shared):
+          tree.insert(2 * index, copy.deepcopy(shared_element))
+          tree.insert(2 * index + 1, copy.deepcopy(
+              shared_tree if shared_tree is not None else
+              ElementTree.Element('hashTree')))
+      elif element.tag != 'TestFragmentController':
+        continue
+      _PrefixLabels(tree, name)
+      combined_tree.append(element)
+      combined_tree.append(tree)
+    if not groups:
+      raise WorkloadSpecError('%s has no thread group' % workload['plan'])
+  document.write(output_path, encoding='UTF-8')
+  return scales
+
+
+def MakeJMeterArgs(assignment, server_ports, scales):
+  """Returns JMeter client parameters to pass the assignment to servers.
+
+  Args:
+    assignment: List of workload names by server index, returned by
+        AssignServers().
+    server_ports: List of ports of the servers by server index, which the
+        servers have in their 'server_port' property.
+    scales: Dictionary of workload name to thread count multiplier,
+        returned by BuildPlan().
+  Returns:
+    List of '-G' parameters.
+  """
+  return ['-G%s=%s' % (SCALE_PROPERTY % (name, port), repr(scales[name]))
+          for name, port in zip(assignment, server_ports)]
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# Copyright 2013 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests of jmeter_workloads.py."""
+
+
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import xml.etree.ElementTree as ElementTree
+
+import jmeter_workloads
+from jmeter_workloads import WorkloadSpecError
+
+
+PLAN_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<jmeterTestPlan version="1.2">
+  <hashTree>
+    <TestPlan testclass="TestPlan" testname="%(name)s plan">
+      <elementProp name="TestPlan.user_defined_variables"
+          elementType="Arguments">
+        <collectionProp name="Arguments.arguments">
+          <elementProp name="host" elementType="Argument">
+            <stringProp name="Argument.value">%(host)s</stringProp>
+          </elementProp>
+        </collectionProp>
+      </elementProp>
+    </TestPlan>
+    <hashTree>
+      <ConfigTestElement testclass="ConfigTestElement" testname="Defaults"/>
+      <hashTree/>
+      <ThreadGroup testclass="ThreadGroup" testname="Users">
+        <stringProp name="ThreadGroup.num_threads">%(threads)s</stringProp>
+      </ThreadGroup>
+      <hashTree>
+        <HTTPSamplerProxy testclass="HTTPSamplerProxy" testname="%(name)s"/>
+        <hashTree/>
+      </hashTree>
+      %(extra)s
+    </hashTree>
+  </hashTree>
+</jmeterTestPlan>
+"""
+
+
+def _Workload(name, weight=1, threads=None):
+  return {'name': name, 'plan': name + '.jmx', 'weight': weight,
+          'threads': threads}
+
+
+class JMeterWorkloadsTest(unittest.TestCase):
+  """Unit test class of workload sharding."""
+
+  def setUp(self):
+    self.tmp_dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp_dir)
+
+  def _WritePlan(self, name, threads='10', host='example.com', extra=''):
+    path = os.path.join(self.tmp_dir, name + '.jmx')
+    with open(path, 'w') as f:
+      f.write(PLAN_TEMPLATE % {'name': name, 'threads': threads,
+                               'host': host, 'extra': extra})
+    return path
+
+  def testParseWorkloadSpec(self):
+    workloads = jmeter_workloads.ParseWorkloadSpec(
+        {'workloads': [{'name': 'browse', 'plan': 'browse.jmx',
+                        'weight': 70},
+                       {'name': 'search', 'plan': 'search.jmx',
+                        'threads': 50}]}, 'specs')
+
+    self.assertEqual(
+        [{'name': 'browse', 'plan': 'specs/browse.jmx', 'weight': 70,
+          'threads': None},
+         {'name': 'search', 'plan': 'specs/search.jmx', 'weight': 1,
+          'threads': 50}], workloads)
+
+  def testParseWorkloadSpec_Invalid(self):
+    for spec in [
+        {},
+        {'workloads': [{'name': 'a b', 'plan': 'a.jmx'}]},
+        {'workloads': [{'name': 'a', 'plan': 'a.jmx'},
+                       {'name': 'a', 'plan': 'b.jmx'}]},
+        {'workloads': [{'name': 'a'}]},
+        {'workloads': [{'name': 'a', 'plan': 'a.jmx', 'weight': 0}]},
+        {'workloads': [{'name': 'a', 'plan': 'a.jmx', 'threads': 1.5}]},
+        {'workloads': [{'name': 'a', 'plan': 'a.jmx', 'users': 1}]}]:
+      self.assertRaises(WorkloadSpecError,
+                        jmeter_workloads.ParseWorkloadSpec, spec)
+
+  def testLoadWorkloadSpec(self):
+    spec_file = os.path.join(self.tmp_dir, 'mix.json')
+    with open(spec_file, 'w') as f:
+      json.dump({'workloads': [{'name': 'a', 'plan': 'a.jmx'}]}, f)
+
+    self.assertEqual(os.path.join(self.tmp_dir, 'a.jmx'),
+                     jmeter_workloads.LoadWorkloadSpec(spec_file)[0]['plan'])
+
+    with open(spec_file, 'w') as f:
+      f.write('{')
+    self.assertRaises(WorkloadSpecError, jmeter_workloads.LoadWorkloadSpec,
+                      spec_file)
+
+  def testAssignServers(self):
+    workloads = [_Workload('browse', 70), _Workload('search', 20),
+                 _Workload('checkout', 10)]
+
+    self.assertEqual(['browse'] * 7 + ['search'] * 2 + ['checkout'],
+                     jmeter_workloads.AssignServers(workloads, 10))
+    # Remainders go to the largest fractions.
+    self.assertEqual(['browse'] * 8 + ['search'] * 2 + ['checkout'],
+                     jmeter_workloads.AssignServers(workloads, 11))
+
+  def testAssignServers_Minimum(self):
+    workloads = [_Workload('browse', 70), _Workload('search', 20),
+                 _Workload('checkout', 10)]
+
+    # Every workload has at least one server.
+    self.assertEqual(['browse', 'search', 'checkout'],
+                     jmeter_workloads.AssignServers(workloads, 3))
+    self.assertEqual(['browse', 'browse', 'search', 'checkout'],
+                     jmeter_workloads.AssignServers(workloads, 4))
+    self.assertRaises(WorkloadSpecError, jmeter_workloads.AssignServers,
+                      workloads, 2)
+
+  def testGetWorkload(self):
+    self.assertEqual('browse', jmeter_workloads.GetWorkload(
+        jmeter_workloads.MakeLabel('browse', 'Home')))
+    self.assertIsNone(jmeter_workloads.GetWorkload('Home'))
+    self.assertIsNone(jmeter_workloads.GetWorkload('[a b] Home'))
+
+  def testBuildPlan(self):
+    workloads = [
+        dict(_Workload('browse'), plan=self._WritePlan('browse')),
+        dict(_Workload('search', threads=5), plan=self._WritePlan(
+            'search', threads='20', extra=(
+                '<TestFragmentController testclass="TestFragmentController" '
+                'testname="Fragment"/><hashTree><HTTPSamplerProxy '
+                'testclass="HTTPSamplerProxy" testname="Common"/><hashTree/>'
+                '</hashTree>')))]
+    output = os.path.join(self.tmp_dir, 'workloads.jmx')
+
+    scales = jmeter_workloads.BuildPlan(workloads, output)
+
+    self.assertEqual({'browse': 1.0, 'search': 0.25}, scales)
+    plan_tree = ElementTree.parse(output).getroot().find('hashTree')
+    self.assertEqual('jmeter_cluster workloads',
+                     plan_tree.find('TestPlan').get('testname'))
+    elements = plan_tree.find('hashTree')
+    self.assertEqual(
+        ['[browse] Users', '[search] Users', 'Fragment'],
+        [e.get('testname') for e in elements if e.tag != 'hashTree'])
+    groups = elements.findall('ThreadGroup')
+    self.assertEqual(
+        '${__javaScript(Math.round(10 * ${__P(jmeter_cluster.scale.browse.'
+        '${__P(server_port,0)},0)}))}',
+        groups[0].find("stringProp[@name='ThreadGroup.num_threads']").text)
+    # Plan-level elements apply to the thread groups of their plan only.
+    group_trees = elements.findall('hashTree')
+    self.assertEqual(
+        ['Defaults', '[browse] browse'],
+        [e.get('testname') for e in group_trees[0] if e.tag != 'hashTree'])
+    self.assertEqual(
+        ['Defaults', '[search] search'],
+        [e.get('testname') for e in group_trees[1] if e.tag != 'hashTree'])
+    self.assertEqual('[search] Common',
+                     group_trees[2].find('HTTPSamplerProxy').get('testname'))
+
+  def testBuildPlan_SetupThreadGroup(self):
+    path = self._WritePlan('browse', extra=(
+        '<SetupThreadGroup testclass="SetupThreadGroup" testname="Login">'
+        '<stringProp name="ThreadGroup.num_threads">1</stringProp>'
+        '</SetupThreadGroup><hashTree/>'))
+    output = os.path.join(self.tmp_dir, 'workloads.jmx')
+
+    jmeter_workloads.BuildPlan([dict(_Workload('browse'), plan=path)], output)
+
+    group = ElementTree.parse(output).getroot().find(
+        'hashTree/hashTree/SetupThreadGroup')
+    self.assertEqual(
+        '${__javaScript(${__P(jmeter_cluster.scale.browse.'
+        '${__P(server_port,0)},0)} > 0 ? 1 : 0)}',
+        group.find("stringProp[@name='ThreadGroup.num_threads']").text)
+
+  def testBuildPlan_ConflictingVariables(self):
+    workloads = [
+        dict(_Workload('browse'), plan=self._WritePlan('browse')),
+        dict(_Workload('search'), plan=self._WritePlan(
+            'search', host='other.example.com'))]
+
+    self.assertRaises(WorkloadSpecError, jmeter_workloads.BuildPlan,
+                      workloads, os.path.join(self.tmp_dir, 'out.jmx'))
+
+  def testBuildPlan_NonNumericThreads(self):
+    workloads = [dict(_Workload('browse', threads=10),
+                      plan=self._WritePlan('browse', threads='${users}'))]
+
+    self.assertRaises(WorkloadSpecError, jmeter_workloads.BuildPlan,
+                      workloads, os.path.join(self.tmp_dir, 'out.jmx'))
+
+  def testBuildPlan_NotPlan(self):
+    path = os.path.join(self.tmp_dir, 'browse.jmx')
+    with open(path, 'w') as f:
+      f.write('<html/>')
+
+    self.assertRaises(WorkloadSpecError, jmeter_workloads.BuildPlan,
+                      [dict(_Workload('browse'), plan=path)],
+                      os.path.join(self.tmp_dir, 'out.jmx'))
+
+  def testMakeJMeterArgs(self):
+    self.assertEqual(
+        ['-Gjmeter_cluster.scale.browse.24000=1.0',
+         '-Gjmeter_cluster.scale.search.24001=0.25'],
+        jmeter_workloads.MakeJMeterArgs(['browse', 'search'], [24000, 24001],
+                                        {'browse': 1.0, 'search': 0.25}))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -30,11 +30,74 @@ gsutil cp $CLOUD_STORAGE/$JMETER_DIR.tar.gz .
 tar zxf $JMETER_DIR.tar.gz
 cd $JMETER_DIR
 
-# Get this server's ID from Compute Engine metadata.
-ID=$(curl http://metadata/computeMetadata/v1beta1/instance/attributes/id)
+METADATA_URL=http://metadata/computeMetadata/v1beta1/instance/attributes
 
-perl -pi -e "s/{{SERVER_PORT}}/24000+$ID/e" bin/jmeter.properties
-perl -pi -e "s/{{SERVER_RMI_PORT}}/26000+$ID/e" bin/jmeter.properties
+# Sample resource usage of this server in background, so that saturation
+# of the load generator can be detected.  Each line of telemetry file is:
+# timestamp (ms),CPU busy (percent),memory used (percent),GC pause (ms),
+# network received (bytes/s),network sent (bytes/s)
+# GC pause is the sum of all JMeter servers on this node.
+TELEMETRY_FILE=/var/log/jmeter-telemetry.csv
+TELEMETRY_INTERVAL=5
+GC_LOG_DIR=/var/log
+declare -A gc_offsets
+function sample_telemetry() {
+  local prev_busy=0 prev_total=0 prev_rx=0 prev_tx=0
+  while true; do
+    read -r _ user nice system idle iowait irq softirq steal _ < /proc/stat
+    local busy=$((user + nice + system + irq + softirq + steal))
+    local total=$((busy + idle + iowait))
+    local mem=$(awk '/^MemTotal:/ {t=$2} /^MemFree:/ {f=$2}
+                     /^Buffers:/ {b=$2} /^Cached:/ {c=$2}
+                     END {print int((t - f - b - c) * 100 / t)}' /proc/meminfo)
+    local net=$(awk '/eth0:/ {sub(/.*:/, ""); print $1, $9}' /proc/net/dev)
+    local rx=${net%%%% *} tx=${net##* }
+    local gc_ms=0 gc_log
+    for gc_log in $GC_LOG_DIR/jmeter-gc-*.log; do
+      [ -f $gc_log ] || continue
+      local gc_size=$(stat -c %%s $gc_log)
+      local ms=$(tail -c +$((${gc_offsets[$gc_log]:-0} + 1)) $gc_log | awk '
+          /Total time for which application threads were stopped/ {
+            s += $(NF - 1) }
+          END {print int(s * 1000)}')
+      gc_offsets[$gc_log]=$gc_size
+      gc_ms=$((gc_ms + ${ms:-0}))
+    done
+    if [ $prev_total -gt 0 ]; then
+      echo "$(date +%%s)000,$(((busy - prev_busy) * 100 / (total - prev_total))),$mem,$gc_ms,$(((rx - prev_rx) / TELEMETRY_INTERVAL)),$(((tx - prev_tx) / TELEMETRY_INTERVAL))" >> $TELEMETRY_FILE
+    fi
+    prev_busy=$busy prev_total=$total prev_rx=$rx prev_tx=$tx
+    sleep $TELEMETRY_INTERVAL
+  done
+}
+sample_telemetry &
 
-# Start JMeter server.
-bin/jmeter-server -Djava.rmi.server.hostname=127.0.0.1
+# Start JMeter servers, each with its own properties file for its ports.
+# GC log is written for telemetry.  When the servers exit, they are
+# restarted with the latest metadata, so that an instance of warm pool can
+# be reconfigured for the cluster that claims it.
+while true; do
+  # Get this node's ID from Compute Engine metadata.  With multiple JMeter
+  # servers per node, the servers get IDs from ID to ID+SERVERS_PER_NODE-1.
+  ID=$(curl $METADATA_URL/id)
+  SERVERS_PER_NODE=$(curl -f -s $METADATA_URL/servers_per_node)
+  SERVERS_PER_NODE=${SERVERS_PER_NODE:-1}
+  # Heap size and GC settings for the machine type, generated by
+  # jmeter_cluster.py.  Empty to use JVM default.
+  TUNED_JVM_ARGS=$(curl -f -s $METADATA_URL/jvm_args)
+
+  SERVER_PIDS=
+  for ((J = 0; J < SERVERS_PER_NODE; J++)); do
+    SERVER_ID=$((ID + J))
+    PROPERTIES=bin/jmeter-server-$J.properties
+    cp bin/jmeter.properties $PROPERTIES
+    perl -pi -e "s/{{SERVER_PORT}}/24000+$SERVER_ID/e" $PROPERTIES
+    perl -pi -e "s/{{SERVER_RMI_PORT}}/26000+$SERVER_ID/e" $PROPERTIES
+    JVM_ARGS="$TUNED_JVM_ARGS -Xloggc:$GC_LOG_DIR/jmeter-gc-$J.log -XX:+PrintGCApplicationStoppedTime" \
+        bin/jmeter-server -Djava.rmi.server.hostname=127.0.0.1 \
+        -p $PROPERTIES -j jmeter-server-$J.log &
+    SERVER_PIDS="$SERVER_PIDS $!"
+  done
+  wait $SERVER_PIDS
+  sleep 1
+done